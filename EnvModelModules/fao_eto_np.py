@@ -0,0 +1,624 @@
+"""
+Name:        fao_eto_np.py
+Purpose:     NumPy versions of the fao_eto functions for arrays of values
+
+Description
+===========
+Each function has the same name, arguments, equations and validation as its
+counterpart in fao_eto but accepts NumPy arrays, or anything array like, and
+broadcasts over them e.g. daily values with shape (ndays, nsites) together with
+latitudes and altitudes of shape (nsites,).
+
+Validation raises the same ValueError as fao_eto, reporting the first value
+found out of range. As for fao_eto, NaN values are not reported.
+
+Where fao_eto raises ValueError (math domain error) from math.sqrt or
+math.log, so do these functions, under the same conditions: net_out_lw_rad()
+for negative actual vapour pressure, sol_rad_from_t() where tmax is less than
+tmin and wind_speed_2m() for heights of 0.08 m or less. Where fao_eto returns
+a complex number, from a negative number raised to the power 0.5 in
+hargreaves_ETo() where tmax is less than tmin, these functions give NaN.
+
+hargreaves_pet() and penman_monteith_pet() chain the functions together to
+give daily ETo [mm day-1] from daily temperature records of shape
+(ndays, nsites) and days of the year of shape (ndays,), following the steps
+described in fao_eto.
+
+See fao_eto for references and for descriptions of the methods.
+"""
+__version__ = "1.3.03"
+
+import math
+
+import numpy as np
+
+def _check(values, lower, upper, mess):
+    """
+    Raises ValueError, as fao_eto, if any value is outside lower to upper.
+    """
+    values = np.asarray(values)
+    bad = (values < lower) | (values > upper)
+    if np.any(bad):
+        raise ValueError (mess % values[bad].flat[0])
+
+def atmos_pres(alt):
+    """
+    Calculates atmospheric pressure (kPa) using FAO equation 7.
+
+    Arguments:
+    alt - elevation/altitude above sea level (m)
+    """
+    _check(alt, -20, 11000, 'alt=%d is not in range -20 to 11000 m')
+
+    tmp1 = (293.0 - (0.0065 * np.asarray(alt))) / 293.0
+    tmp2 = np.power(tmp1, 5.26)
+    return 101.3 * tmp2
+
+def clear_sky_rad(alt, et_rad):
+    """
+    Calculates clear sky radiation [MJ m-2 day-1] based on FAO equation 37.
+
+    Arguments:
+    alt      - elevation above sea level [m]
+    et_rad   - extraterrestrial radiation [MJ m-2 day-1]
+    """
+    _check(alt, -20, 8850, 'altitude=%d is not in range -20 to 8850 m')
+    _check(et_rad, 0.0, 50.0, 'et_rad=%g is not in range 0-50')
+
+    return (0.00002 * np.asarray(alt) + 0.75) * et_rad
+
+def daily_mean_t(tmin, tmax):
+    """
+    Calculates mean daily temperature [deg C] from the daily minimum and
+    maximum temperatures.
+
+    Arguments:
+    tmin - minimum daily temperature [deg C]
+    tmax - maximum daily temperature [deg C]
+    """
+    _check(tmin, -95.0, 60.0, 'tmin=%g is not in range -95 to +60')
+    _check(tmax, -95.0, 60.0, 'tmax=%g is not in range -95 to +60')
+
+    return (np.asarray(tmax) + tmin) / 2.0
+
+def daily_soil_heat_flux(t_cur, t_prev, delta_t, soil_heat_cap=2.1, delta_z=0.10):
+    """
+    Estimates the daily soil heat flux (Gday) [MJ m-2 day-1] based on FAO
+    equation 41.
+
+    Arguments:
+    t_cur         - air temperature at tim i (current) [deg C]
+    t_prev        - air temperature at time i-1 [deg C]
+    delta_t       - length of time interval between t_cur and t_prev [day]
+    soil_heat_cap - soil heat capacity [MJ m-3 degC-1] (default value is 2.1)
+    delta_z       - effective soil depth [m] (default - 0.1 m)
+    """
+    _check(t_prev, -95.0, 60.0, 't_prev=%g is not in range -95 to +60')
+    _check(t_cur, -95.0, 60.0, 't_cur=%g is not in range -95 to +60')
+    _check(delta_t, 1.0, np.inf, 'delta_t=%g is less than 1 day')
+    _check(soil_heat_cap, 1.0, 4.5, 'soil_heat_cap=%g is not in range 1-4.5')
+    _check(delta_z, 0.0, 200.0, 'delta_z=%g is not in range 0-200 m')
+
+    return soil_heat_cap * ((np.asarray(t_cur) - t_prev) / delta_t) * delta_z
+
+def daylight_hours(sha):
+    """
+    Calculates the number of daylight hours from sunset hour angle based on
+    FAO equation 34.
+
+    Arguments:
+    sha - sunset hour angle [rad]
+    """
+    return (24.0 / math.pi) * np.asarray(sha)
+
+def delta_sat_vap_pres(t):
+    """
+    Calculates the slope of the saturation vapour pressure curve
+    [kPa degC-1] based on FAO equation 13.
+
+    Arguments:
+    t - air temperature (deg C) (use mean air temp for use in Penman-Monteith)
+    """
+    _check(t, -95.0, 60.0, 't=%g is not in range -95 to +60')
+
+    t = np.asarray(t)
+    tmp1 = (17.27 * t) / (t + 237.3)
+    tmp2 = 4098 * (0.6108 * np.exp(tmp1))
+    return tmp2 / np.power((t + 237.3), 2)
+
+def ea_from_tmin(tmin):
+    """
+    Calculates actual vapour pressure, ea [kPa] using FAO equation 48,
+    assuming the dewpoint temperature is the minimum temperature.
+
+    Arguments:
+    tmin - daily minimum temperature [deg C]
+    """
+    _check(tmin, -95.0, 60.0, 'tmin=%g is not in range -95 to 60 deg C')
+
+    tmin = np.asarray(tmin)
+    return 0.611 * np.exp((17.27 * tmin)/(tmin + 237.3))
+
+def ea_from_rhmin_rhmax(e_tmin, e_tmax, rh_min, rh_max):
+    """
+    Calculates actual vapour pressure [kPa] from relative humidity data
+    using FAO equation 17.
+
+    Arguments:
+    e_tmin  - saturation vapour pressure at daily minimum temperature [kPa]
+    e_tmax  - saturation vapour pressure at daily maximum temperature [kPa]
+    rh_min  - minimum relative humidity [%]
+    rh_max  - maximum relative humidity [%]
+    """
+    _check(rh_min, 0, 100, 'RH_min=%g is not in range 0-100')
+    _check(rh_max, 0, 100, 'RH_max=%g is not in range 0-100')
+
+    tmp1 = np.asarray(e_tmin) * (np.asarray(rh_max) / 100.0)
+    tmp2 = np.asarray(e_tmax) * (np.asarray(rh_min) / 100.0)
+    return (tmp1 + tmp2) / 2.0
+
+def ea_from_rhmax(e_tmin, rh_max):
+    """
+    Calculates actual vapour pressure [kPa] from maximum relative humidity
+    using FAO equation 18.
+
+    Arguments:
+    e_tmin  - saturation vapour pressure at daily minimum temperature [kPa]
+    rh_max  - maximum relative humidity [%]
+    """
+    _check(rh_max, 0, 100, 'RH_max=%g is not in range 0-100')
+
+    return np.asarray(e_tmin) * (np.asarray(rh_max) / 100.0)
+
+def ea_from_rhmean(e_tmin, e_tmax, rh_mean):
+    """
+    Calculates actual vapour pressure, ea [kPa] from mean relative humidity
+    using FAO equation 19.
+
+    Arguments:
+    e_tmin  - saturation vapour pressure at daily minimum temperature [kPa]
+    e_tmax  - saturation vapour pressure at daily maximum temperature [kPa]
+    rh_mean - mean relative humidity [%] (average between RH min and RH max)
+    """
+    _check(rh_mean, 0, 100, 'RH_mean=%g is not in range 0-100')
+
+    return (np.asarray(rh_mean) / 100.0) * ((np.asarray(e_tmax) + e_tmin) / 2.0)
+
+def ea_from_tdew(tdew):
+    """
+    Calculates actual vapour pressure, ea [kPa] from the dewpoint temperature
+    using FAO equation 14.
+
+    Arguments:
+    tdew - dewpoint temperature [deg C]
+    """
+    _check(tdew, -95.0, 65.0, 'tdew=%g is not in range -95 to +60 deg C')
+
+    tdew = np.asarray(tdew)
+    tmp = (17.27 * tdew) / (tdew + 237.3)
+    return 0.6108 * np.exp(tmp)
+
+def ea_from_twet_tdry(twet, tdry, e_twet, psy_const):
+    """
+    Calculates actual vapour pressure, ea [kPa] from the wet and dry bulb
+    temperatures using FAO equation 15.
+
+    Arguments:
+    twet       - wet bulb temperature [deg C]
+    tdry       - dry bulb temperature [deg C]
+    e_twet     - saturated vapour pressure at the wet bulb temperature [kPa]
+    psy_const  - psychrometric constant of the pyschrometer [kPa deg C-1]
+    """
+    _check(twet, -95.0, 65.0, 'T_wet=%g is not in range -95 to +65 deg C')
+    _check(tdry, -95.0, 65.0, 'T_dry=%g is not in range -95 to +65 deg C')
+
+    return np.asarray(e_twet) - (np.asarray(psy_const) * (np.asarray(tdry) - twet))
+
+def es_from_t(t):
+    """
+    Calculates the saturation vapour pressure es [kPa] using FAO equations
+    11 and 12.
+
+    Arguments:
+    t        - temperature (deg C)
+    """
+    t = np.asarray(t)
+    tmp1 = (17.27 * t) / (t + 237.3)
+    return 0.6108 * np.exp(tmp1)
+
+def et_rad(lat, sd, sha, irl):
+    """
+    Calculates daily extraterrestrial radiation [MJ m-2 day-1] using FAO
+    equation 21.
+
+    Arguments:
+    lat    - latitude [decimal degrees]
+    sd     - solar declination [rad]
+    sha    - sunset hour angle [rad]
+    irl    - inverse relative distance earth-sun [dimensionless]
+    """
+    _check(lat, -90.0, 90.0, 'latitude=%g is not in range -90 to +90')
+    _check(irl, 0.9669, 1.0331, 'irl=%g is not in range 0.9669-1.0331')
+
+    solar_const = 0.0820    # Solar constant [MJ m-2 min-1]
+    lat_rad = np.asarray(lat) * (math.pi / 180.0)
+
+    tmp1 = (24.0 * 60.0) / math.pi
+    tmp2 = sha * np.sin(lat_rad) * np.sin(sd)
+    tmp3 = np.cos(lat_rad) * np.cos(sd) * np.sin(sha)
+    return tmp1 * solar_const * irl * (tmp2 + tmp3)
+
+def hargreaves_ETo(tmin, tmax, tmean, Ra):
+    """
+    Calculates evapotranspiration over grass [mm day-1] using the Hargreaves
+    ETo equation. NaN where tmax is less than tmin, for which fao_eto returns
+    a complex number.
+
+    tmin    - minimum daily temperaure [deg C]
+    tmax    - maximum daily temperaure [deg C]
+    tmean   - mean daily temperaure [deg C]
+    Ra      - extraterrestrial radiation as equivalent evaporation [mm day-1]
+    """
+    return 0.0023 * (np.asarray(tmean) + 17.8) * np.power(np.asarray(tmax) - tmin, 0.5) * Ra
+
+def inv_rel_dist_earth_sun(doy):
+    """
+    Calculates the inverse relative distance between earth and sun from
+    day of the year using FAO equation 23.
+
+    Arguments:
+    doy - day of year [between 1 and 366]
+    """
+    _check(doy, 1, 366, 'doy=%d is not in range 1-366')
+
+    return 1 + (0.033 * np.cos((2.0 * math.pi / 365.0) * np.asarray(doy)))
+
+def mean_es(tmin, tmax):
+    """
+    Calculates mean saturation vapour pressure, es [kPa] using FAO
+    equations 11 and 12.
+
+    Arguments:
+    tmin        - minimum temperature (deg C)
+    tmax        - maximum temperature (deg C)
+    """
+    _check(tmin, -95.0, 60.0, 'tmin=%g is not in range -95 to +60')
+    _check(tmax, -95.0, 60.0, 'tmax=%g is not in range -95 to +60')
+
+    return (es_from_t(tmin) + es_from_t(tmax)) / 2.0
+
+def monthly_soil_heat_flux(t_month_prev, t_month_next):
+    """
+    Estimates the monthly soil heat flux (Gmonth) [MJ m-2 day-1] based on FAO
+    equation 43.
+
+    Arguments:
+    t_month_prev  - mean air temperature of previous month [deg C]
+    t_month_next  - mean air temperature of next month [deg C]
+    """
+    _check(t_month_prev, -95.0, 60.0, 't_month_prev=%g is not in range -95 to +60')
+    _check(t_month_next, -95.0, 60.0, 't_month_next=%g is not in range -95 to +60')
+
+    return 0.07 * (np.asarray(t_month_next) - t_month_prev)
+
+def monthly_soil_heat_flux2(t_month_prev, t_month_cur):
+    """
+    Estimates the monthly soil heat flux (Gmonth) [MJ m-2 day-1] based on FAO
+    equation 44.
+
+    Arguments:
+    t_month_prev - mean air temperature of previous month [deg C]
+    t_month_cur  - mean air temperature of current month [deg C]
+    """
+    _check(t_month_prev, -95.0, 60.0, 't_month_prev=%g is not in range -95 to +60')
+    _check(t_month_cur, -95.0, 60.0, 't_month_cur=%g is not in range -95 to +60')
+
+    return 0.14 * (np.asarray(t_month_cur) - t_month_prev)
+
+def net_out_lw_rad(tmin, tmax, sol_rad, clear_sky_rad, ea):
+    """
+    Calculates net outgoing longwave radiation [MJ m-2 day-1] based on
+    FAO equation 39. As for fao_eto, the cloudiness term is zero where clear
+    sky radiation is zero and ValueError is raised if ea is negative.
+
+    Arguments:
+    tmin          - absolute daily minimum temperature [deg C]
+    tmax          - absolute daily maximum temperature [deg C]
+    sol_rad       - solar radiation [MJ m-2 day-1]
+    clear_sky_rad - clear sky radiation [MJ m-2 day-1]
+    ea            - actual vapour pressure [kPa]
+    """
+    _check(tmin, -95.0, 60.0, 'tmin=%g is not in range -95 to +60')
+    _check(tmax, -95.0, 60.0, 'tmax=%g is not in range -95 to +60')
+    _check(ea, 0.0, np.inf, 'ea=%g is negative: math domain error')
+
+    tmin_abs = np.asarray(tmin) + 273.15
+    tmax_abs = np.asarray(tmax) + 273.15
+
+    sb_const = 0.000000004903 # Stefan-Boltzmann constant [MJ K-4 m-2 day-1]
+    tmp1 = sb_const * ((np.power(tmax_abs, 4) + np.power(tmin_abs, 4)) / 2)
+    tmp2 = 0.34 - (0.14 * np.sqrt(ea))
+
+    clear_sky_rad = np.asarray(clear_sky_rad)
+    zero_rad = clear_sky_rad == 0.0
+    if np.any(zero_rad):
+        print ('clear_sky_rad is zero for %d values' % np.count_nonzero(zero_rad))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tmp3 = np.where(zero_rad, 0.0, 1.35 * (sol_rad / np.where(zero_rad, 1.0, clear_sky_rad)) - 0.35)
+
+    return tmp1 * tmp2 * tmp3
+
+def net_rad(ni_sw_rad, no_lw_rad):
+    """
+    Calculates daily net radiation [MJ m-2 day-1] at the crop surface
+    based on FAO equation 40.
+
+    Arguments:
+    ni_sw_rad - net incoming shortwave radiation [MJ m-2 day-1]
+    no_lw_rad - net outgoing longwave radiation [MJ m-2 day-1]
+    """
+    return np.asarray(ni_sw_rad) - no_lw_rad
+
+def net_in_sol_rad(sol_rad):
+    """
+    Calculates net incoming solar radiation [MJ m-2 day-1] based on FAO
+    equation 38 for a grass reference crop.
+
+    Arguments:
+    sol_rad     - (gross) incoming solar radiation [MJ m-2 day-1]
+    """
+    grass_albedo = 0.23     # albedo coefficient for grass [dimensionless]
+    return (1 - grass_albedo) * np.asarray(sol_rad)
+
+def penman_monteith_ETo(Rn, t, ws, es, ea, delta_es, psy, shf=0.0):
+    """
+    Calculates the evapotransporation (ETo) [mm day-1] from a hypothetical
+    grass reference surface using the FAO Penman-Monteith equation 6.
+
+    Arguments:
+    Rn       - net radiation at crop surface [MJ m-2 day-1]
+    t        - air temperature at 2 m height [deg C]
+    ws       - wind speed at 2 m height [m s-1]
+    es       - saturation vapour pressure [kPa]
+    ea       - actual vapour pressure [kPa]
+    delta_es - slope of vapour pressure curve [kPa  deg C]
+    psy      - psychrometric constant [kPa deg C]
+    shf      - soil heat flux (MJ m-2 day-1] (default = 0)
+    """
+    _check(t, -95.0, 60.0, 't=%g is not in range -95 to +60')
+    _check(ws, 0.0, 150.0, 'ws=%g is not in range 0-150')
+
+    t = np.asarray(t) + 273.15
+    ws = np.asarray(ws)
+    denom = delta_es + (psy * (1 + 0.34 * ws))
+    a1 = 0.408 * (np.asarray(Rn) - shf) * delta_es / denom
+    a2 = 900 * ws / t * (np.asarray(es) - ea) * psy / denom
+    return a1 + a2
+
+def psy_const(atmos_pres):
+    """
+    Calculates the psychrometric constant (kPa degC-1) using FAO equation 8.
+
+    Arguments:
+    atmos_pres - atmospheric pressure [kPa]
+    """
+    return 0.000665 * np.asarray(atmos_pres)
+
+def psy_const_of_psychrometer(psychrometer, atmos_pres):
+    """
+    Calculates the psychrometric constant [kPa deg C-1] for different
+    types of psychrometer using FAO equation 16.
+
+    Arguments:
+    psychrometer - integer between 1 and 3 which denotes type of psychrometer,
+                   see fao_eto
+    atmos_pres - atmospheric pressure [kPa]
+    """
+    _check(psychrometer, 1, 3, 'psychrometer=%d not in range 1-3')
+
+    psychrometer = np.asarray(psychrometer)
+    psy_coeff = np.select([psychrometer == 1, psychrometer == 2], [0.000662, 0.000800], 0.001200)
+    return psy_coeff * np.asarray(atmos_pres)
+
+def rad2equiv_evap(energy):
+    """
+    Converts radiation in MJ m-2 day-1 to the equivalent evaporation in
+    mm day-1 using FAO equation 20.
+
+    Arguments:
+    energy - energy e.g. radiation, heat flux [MJ m-2 day-1]
+    """
+    return 0.408 * np.asarray(energy)
+
+def rh_from_ea_es(ea, es):
+    """
+    Calculates relative humidity as the ratio of actual vapour pressure
+    to saturation vapour pressure at the same temperature.
+
+    ea - actual vapour pressure [units don't matter as long as same as es]
+    es - saturated vapour pressure [units don't matter as long as same as ea]
+    """
+    return 100.0 * np.asarray(ea) / es
+
+def sol_dec(doy):
+    """
+    Calculates solar declination [rad] from day of the year based on FAO
+    equation 24.
+
+    Arguments:
+    doy - day of year (between 1 and 366)
+    """
+    _check(doy, 1, 366, 'doy=%d is not in range 1-366')
+
+    return 0.409 * np.sin(((2.0 * math.pi / 365.0) * np.asarray(doy) - 1.39))
+
+def sol_rad_from_sun_hours(dl_hours, sun_hours, et_rad):
+    """
+    Calculates incoming solar radiation [MJ m-2 day-1] from relative sunshine
+    duration based on FAO equations 34 and 35.
+
+    Arguments:
+    dl_hours     - number of daylight hours [hours]
+    sun_hours    - sunshine duration [hours]
+    et_rad       - extraterrestrial radiation [MJ m-2 day-1]
+    """
+    _check(sun_hours, 0, 24, 'sunshine hours=%g is not in range 0-24')
+    _check(dl_hours, 0, 24, 'daylight hours=%g is not in range 0-24')
+
+    a = 0.25
+    b = 0.50
+    return (b * np.asarray(sun_hours) / dl_hours + a) * et_rad
+
+def sol_rad_from_t(et_rad, cs_rad, tmin, tmax, coastal=-999):
+    """
+    Calculates incoming solar radiation (Rs) [MJ m-2 day-1] from min and max
+    temperatures based on FAO equation 50, constrained by the clear sky
+    radiation. As for fao_eto, ValueError is raised where tmax is less than
+    tmin.
+
+    Arguments:
+    et_rad  - extraterrestrial radiation [MJ m-2 day-1]
+    cs_rad  - clear sky radiation [MJ m-2 day-1]
+    tmin    - daily minimum temperature [deg C]
+    tmax    - daily maximum temperature [deg C]
+    coastal - True if coastal, False if interior, -999 indicates no data.
+              May be an array e.g. one value per site
+    """
+    _check(tmin, -95.0, 60.0, 'tmin=%g is not in range -95 to +60')
+    _check(tmax, -95.0, 60.0, 'tmax=%g is not in range -95 to +60')
+    _check(np.asarray(tmax) - tmin, 0.0, np.inf, 'tmax - tmin=%g is negative: math domain error')
+
+    coastal = np.asarray(coastal)
+    is_coastal = coastal == True
+    is_interior = coastal == False
+    if not np.all(is_coastal | is_interior):
+        print ("""WARNING! Location not specified as coastal or interior for
+        calculation of solar radiation. Using defalut adjustment factor.""")
+    adj = np.where(is_coastal, 0.19, np.where(is_interior, 0.16, 0.175))
+
+    solar_rad = adj * np.sqrt(np.asarray(tmax) - tmin) * et_rad
+    return np.minimum(solar_rad, cs_rad)
+
+def sol_rad_island(et_rad):
+    """
+    Estimates incoming solar radiation [MJ m-2 day-1] for an island location
+    using FAO equation 51.
+
+    Arguments:
+    et_rad  - extraterrestrial radiation [MJ m-2 day-1]
+    """
+    return (0.7 * np.asarray(et_rad)) - 4.0
+
+def sunset_hour_angle(lat, sd):
+    """
+    Calculates sunset hour angle [rad] from latitude and solar
+    declination using FAO equation 25.
+
+    Arguments:
+    lat    - latitude [decimal degrees]
+    sd     - solar declination [rad]
+    """
+    _check(lat, -90.0, 90.0, 'latitude=%g is not in range -90 - 906')
+
+    lat_rad = np.asarray(lat) * (math.pi / 180.0)
+    tmp = -np.tan(lat_rad) * np.tan(sd)
+    # Domain of acos = -1 <= x <= 1
+    tmp = np.clip(tmp, -0.999999, 0.999999)
+    return np.arccos(tmp)
+
+def wind_speed_2m(meas_ws, z):
+    """
+    Converts wind speeds measured at different heights above the soil
+    surface to wind speed at 2 m above the surface based on FAO equation 47.
+    As for fao_eto, ValueError is raised for heights of 0.08 m or less.
+
+    Arguments:
+    meas_ws - measured wind speed [m s-1]
+    z       - height of wind measurement above ground surface [m]
+    """
+    _check(meas_ws, 0.0, 150.0, 'meas_ws=%g is not in range 0-150 m s-1')
+    _check(z, 0.0, 100.0, 'z=%g is not in range 0-100 m')
+
+    tmp1 = (67.8 * np.asarray(z)) - 5.42
+    if np.any(tmp1 <= 0.0):
+        raise ValueError ('z=%g is too small: math domain error' % np.asarray(z)[tmp1 <= 0.0].flat[0])
+    return np.asarray(meas_ws) * (4.87 / np.log(tmp1))
+
+def et_rad_doy(lat, doy):
+    """
+    Daily extraterrestrial radiation [MJ m-2 day-1] and daylight hours from
+    latitude and day of the year, FAO equations 21 to 25 and 34. Computed once
+    for each distinct day of the year, so the trigonometry is not repeated for
+    every year of a long record.
+
+    Arguments:
+    lat    - latitude [decimal degrees], scalar or e.g. shape (nsites,)
+    doy    - day of year [between 1 and 366], shape (ndays,)
+    Returns:
+    et_rad, dl_hours each of shape (ndays,) + shape of lat
+    """
+    doy = np.asarray(doy)
+    if doy.ndim != 1:
+        raise ValueError ('doy must be one dimensional, found shape %s' % str(doy.shape))
+    _check(doy, 1, 366, 'doy=%d is not in range 1-366')
+    doy_uniq, doy_indx = np.unique(doy, return_inverse=True)
+
+    lat = np.asarray(lat, dtype=float)
+    sd = sol_dec(doy_uniq).reshape((-1,) + (1,)*lat.ndim)
+    irl = inv_rel_dist_earth_sun(doy_uniq).reshape(sd.shape)
+    sha = sunset_hour_angle(lat, sd)
+
+    return et_rad(lat, sd, sha, irl)[doy_indx], daylight_hours(sha)[doy_indx]
+
+def hargreaves_pet(tmin, tmax, lat, doy):
+    """
+    Daily ETo [mm day-1] using the Hargreaves equation from daily minimum and
+    maximum temperatures.
+
+    Arguments:
+    tmin    - minimum daily temperaure [deg C], shape (ndays, nsites)
+    tmax    - maximum daily temperaure [deg C], shape (ndays, nsites)
+    lat     - latitude [decimal degrees], shape (nsites,)
+    doy     - day of year [between 1 and 366], shape (ndays,)
+    """
+    tmean = daily_mean_t(tmin, tmax)
+    ra, dlh = et_rad_doy(lat, doy)
+
+    return hargreaves_ETo(tmin, tmax, tmean, rad2equiv_evap(ra))
+
+def penman_monteith_pet(tmin, tmax, lat, doy, alt, ws=2.0, ea=None, sol_rad=None, coastal=-999):
+    """
+    Daily ETo [mm day-1] using the FAO Penman-Monteith equation. Actual vapour
+    pressure and solar radiation are estimated from temperature, using
+    ea_from_tmin() and sol_rad_from_t(), when not supplied. Soil heat flux is
+    taken as zero, as recommended for daily time steps.
+
+    Arguments:
+    tmin    - minimum daily temperaure [deg C], shape (ndays, nsites)
+    tmax    - maximum daily temperaure [deg C], shape (ndays, nsites)
+    lat     - latitude [decimal degrees], shape (nsites,)
+    doy     - day of year [between 1 and 366], shape (ndays,)
+    alt     - elevation above sea level [m] e.g. shape (nsites,)
+    ws      - wind speed at 2 m height [m s-1], default 2 m s-1 as FAO
+    ea      - actual vapour pressure [kPa]
+    sol_rad - solar radiation [MJ m-2 day-1]
+    coastal - see sol_rad_from_t()
+    """
+    tmean = daily_mean_t(tmin, tmax)
+    ra, dlh = et_rad_doy(lat, doy)
+    cs_rad = clear_sky_rad(alt, ra)
+
+    if ea is None:
+        ea = ea_from_tmin(tmin)
+    if sol_rad is None:
+        sol_rad = sol_rad_from_t(ra, cs_rad, tmin, tmax, coastal)
+
+    ni_sw_rad = net_in_sol_rad(sol_rad)
+    no_lw_rad = net_out_lw_rad(tmin, tmax, sol_rad, cs_rad, ea)
+    rn = net_rad(ni_sw_rad, no_lw_rad)
+
+    es = mean_es(tmin, tmax)
+    delta_es = delta_sat_vap_pres(tmean)
+    psy = psy_const(atmos_pres(alt))
+
+    return penman_monteith_ETo(rn, tmean, ws, es, ea, delta_es, psy)
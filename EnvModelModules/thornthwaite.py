@@ -12,8 +12,9 @@
 
 import calendar
 import math
+from functools import lru_cache
 
-import fao_eto as fao
+import numpy as np
 
 _monthdays = [31,28,31,30,31,30,31,31,30,31,30,31]
 _leap_monthdays = [31,29,31,30,31,30,31,31,30,31,30,31]
@@ -62,7 +63,7 @@ def thornthwaite(monthly_t, lat, year=None):
     a = (6.75e-07 * I**3) - (7.71e-05 * I**2) + (1.792e-02 * I) + 0.49239
 
     # Calculate mean daylength (daylight hours) of each month
-    monthly_mean_dlh = _monthly_mean_daylight_hours(lat, year)
+    monthly_mean_dlh = daylight_hours_table(lat, _isleap(year))
 
     # Calculate PET (* 10 to convert cm to mm)
     pet = []
@@ -72,34 +73,90 @@ def thornthwaite(monthly_t, lat, year=None):
 
     return pet
 
-def _monthly_mean_daylight_hours(lat, year=None):
+def _isleap(year):
     """
-    Calculates the mean daylength (daylight hours) for each month of the year
-    at a given latitude. Note, leapyears are not handled.
+    True if year is given and is a leap year, as for thornthwaite
+    """
+    return year is not None and calendar.isleap(year)
+
+@lru_cache(maxsize=None)
+def daylight_hours_table(lat, leap=False):
+    """
+    Mean daylength (daylight hours) for each month of the year at a given
+    latitude, vectorised over the days of the year and memoised on
+    (lat, leap) since nothing else affects the result. Agrees with the
+    mean over the days of each month of fao.daylight_hours to within
+    rounding (~1e-14 hours).
 
     Arguments:
     lat       - Latitude [decimal degrees]
-    year      - The year for which PET is required. The only effect of year
-                is to change the number of days in Feb to 29 if it is a leap
-                year. If left as the default, None, then a normal (non-leap)
-                year is assumed.
+    leap      - True for a leap year
 
     Returns:
-    monthly_mean_dlh - List of mean daylight hours of each month of a year [hours]
+    monthly_mean_dlh - Tuple of mean daylight hours of each month of a year [hours]
     """
-    if year == None or not calendar.isleap(year):
-        month_days = _monthdays
+    if lat < -90.0 or lat > 90.0:
+        raise ValueError ('latitude=%g is not in range -90 - 906' %lat)
+
+    month_days = _leap_monthdays if leap else _monthdays
+
+    # FAO equations 24, 25 and 34 as for fao.sol_dec, fao.sunset_hour_angle
+    # and fao.daylight_hours
+    doy = np.arange(1, sum(month_days) + 1, dtype=float)
+    sd = 0.409 * np.sin(((2.0 * math.pi / 365.0) * doy - 1.39))
+    tmp = -math.tan(lat * (math.pi / 180.0)) * np.tan(sd)
+    tmp = np.clip(tmp, -0.999999, 0.999999)
+    dlh = (24.0 / math.pi) * np.arccos(tmp)
+
+    month_starts = np.cumsum([0] + month_days[:-1])
+    monthly_mean_dlh = np.add.reduceat(dlh, month_starts) / np.array(month_days)
+
+    return tuple(monthly_mean_dlh.tolist())
+
+def thornthwaite_matrix(monthly_t, lat, years=None):
+    """
+    Vectorised thornthwaite for many years at once.
+
+    Arguments:
+    monthly_t - Mean daily air temperature [deg C], array like of shape
+                (number of years, 12)
+    lat       - Latitude [decimal degrees]
+    years     - Sequence of years, one per row, used only to identify leap
+                years as for thornthwaite. If None then normal (non-leap)
+                years are assumed.
+    Return:
+    pet       - Array of estimated PET [mm/month] of shape (number of years, 12)
+                PET is zero for years in which no month is above zero deg C,
+                for which thornthwaite fails
+    """
+    monthly_t = np.asarray(monthly_t, dtype=float)
+    if monthly_t.ndim != 2 or monthly_t.shape[1] != 12:
+        raise ValueError ('monthly_t must have shape (nyears, 12), found %s' %str(monthly_t.shape))
+    nyears = monthly_t.shape[0]
+
+    if years is None:
+        leaps = np.zeros(nyears, dtype=bool)
     else:
-        month_days = _leap_monthdays
-    monthly_mean_dlh = []
-    doy = 1    # Day of the year
-    for mdays in month_days:
-        dlh = 0   # Cumulative daylight hours
-        for daynum in range (1, mdays+1):
-            sd = fao.sol_dec(doy)    # Solar declination
-            sha = fao.sunset_hour_angle(lat, sd)    # Sunset hour angle
-            dlh += fao.daylight_hours(sha) # Daylight hours (daylength)
-            doy +=1
-        # Calc mean day length for the month
-        monthly_mean_dlh.append(dlh / mdays)
-    return monthly_mean_dlh
+        leaps = np.array([_isleap(year) for year in years], dtype=bool)
+
+    # Negative temperatures should be set to zero
+    monthly_t = np.where(monthly_t >= 0.0, monthly_t, 0.0)
+
+    # Heat index, accumulated month by month in the same order as thornthwaite
+    I = np.zeros(nyears)
+    for imnth in range(12):
+        I += (monthly_t[:, imnth] / 5.0)**1.514
+
+    a = (6.75e-07 * I**3) - (7.71e-05 * I**2) + (1.792e-02 * I) + 0.49239
+
+    # Mean daylength and number of days for each year and month
+    month_dlh = np.where(leaps[:, np.newaxis], daylight_hours_table(lat, True), daylight_hours_table(lat, False))
+    month_days = np.where(leaps[:, np.newaxis], _leap_monthdays, _monthdays)
+
+    cold = I <= 0.0
+    I_safe = np.where(cold, 1.0, I)
+    pet = 1.6 * (month_dlh / 12.0) * (month_days / 30.0) * \
+                    ((10.0 * monthly_t / I_safe[:, np.newaxis])**a[:, np.newaxis]) * 10.0
+    pet[cold, :] = 0.0
+
+    return pet
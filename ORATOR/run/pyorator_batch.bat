@@ -0,0 +1,3 @@
+rem run ORATOR models over many inputs workbooks e.g. pyorator_batch.bat E:\ORATOR\inputs\*.xlsx -o E:\ORATOR\outputs -j 8
+@set PYTHONPATH=E:\AbUniv\EnvModelModules
+E:\Python38\python.exe -W ignore E:\AbUniv\PyOratorVer2\ora_batch_run.py %*
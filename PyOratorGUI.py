@@ -13,11 +13,12 @@ __prog__ = 'PyOratorGUI.py'
 __version__ = '0.0.1'
 __author__ = 's03mm5'
 
+import os
 import sys
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtWidgets import QLabel, QWidget, QApplication, QHBoxLayout, QVBoxLayout, QGridLayout, QLineEdit, \
-                                QComboBox, QRadioButton, QButtonGroup, QPushButton, QCheckBox, QFileDialog
-from PyQt5.QtCore import Qt
+                                QComboBox, QRadioButton, QButtonGroup, QPushButton, QCheckBox, QFileDialog, QProgressBar
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 import subprocess
 from time import sleep
 
@@ -26,7 +27,31 @@ from ora_economics_model import test_economics_algorithms
 from ora_livestock_model import test_livestock_algorithms
 from ora_crop_model import test_crop_algorithms
 from ora_high_level_fns import test_soil_cn_algorithms
+from ora_optimise import optimise_soil_cn
 from ora_excel_read import check_excel_input_file
+from generate_charts_funcs import generate_charts, join_charts_thread
+
+class OptimiseThread(QThread):
+    '''
+    runs optimise_soil_cn away from the GUI thread, progress is reported as a percentage and a message
+    the workbook and settings are read from the form by the GUI thread before the thread is created
+    '''
+    progress = pyqtSignal(int, str)
+
+    def __init__(self, form, xls_inp_fname, settings):
+
+        super(OptimiseThread, self).__init__(form)
+        self.xls_inp_fname = xls_inp_fname
+        self.settings = settings
+        self.rankings = None
+
+    def run(self):
+
+        self.rankings = optimise_soil_cn(self.xls_inp_fname, self.settings, progress = self.report)
+
+    def report(self, frac, mess):
+
+        self.progress.emit(int(round(100*frac)), mess)
 
 class Form(QWidget):
 
@@ -150,7 +175,7 @@ class Form(QWidget):
         self.w_soil_cn = w_soil_cn
 
         w_optimise = QPushButton('Optimise')
-        helpText = 'Optimisation - not ready'
+        helpText = 'Search for the organic waste and irrigation of each subplot which maximise SOC'
         w_optimise.setToolTip(helpText)
         w_optimise.setEnabled(False)
         w_optimise.clicked.connect(self.runOptimiseClicked)
@@ -189,6 +214,15 @@ class Form(QWidget):
         grid.addWidget(w_npp_calc, 20, 1)
         self.w_npp_calc = w_npp_calc
 
+        # line 21: progress of optimisation
+        # ==================================
+        w_progress = QProgressBar()
+        w_progress.setRange(0, 100)
+        w_progress.setVisible(False)
+        grid.addWidget(w_progress, 21, 0, 1, 7)
+        self.w_progress = w_progress
+        self.optimise_thread = None
+
         # add grid to RH vertical box
         # ===========================
         rh_vbox.addLayout(grid)
@@ -210,6 +244,8 @@ class Form(QWidget):
     def displayXlsxOutputClicked(self):
 
         excel_file = self.settings['out_dir'] + '\\' + self.w_combo17.currentText()
+        if self.settings.get('charts', 'background') != 'none':
+            generate_charts(excel_file)     # no-op if charts were added during or after the run
         exe_path = self.settings['exe_path']
         junk = subprocess.Popen(list([exe_path, excel_file]), stdout=subprocess.DEVNULL)
         '''
@@ -223,8 +259,40 @@ class Form(QWidget):
         test_economics_algorithms(self)
 
     def runOptimiseClicked(self):
+        '''
+        the optimiser runs in a worker thread so that the GUI stays responsive
+        '''
+        if self.optimise_thread is not None and self.optimise_thread.isRunning():
+            print('Optimisation is already running')
+            return
+
+        self.w_optimise.setEnabled(False)
+        self.w_soil_cn.setEnabled(False)
+        self.w_progress.setValue(0)
+        self.w_progress.setFormat('Optimising %p%')
+        self.w_progress.setVisible(True)
+
+        xls_inp_fname = os.path.normpath(self.w_lbl13.text())
+        self.optimise_thread = OptimiseThread(self, xls_inp_fname, dict(self.settings))
+        self.optimise_thread.progress.connect(self.optimiseProgress)
+        self.optimise_thread.finished.connect(self.optimiseFinished)
+        self.optimise_thread.start()
+
+    def optimiseProgress(self, pcnt, mess):
+
+        self.w_progress.setValue(pcnt)
+        self.w_progress.setFormat(mess + ' - %p%')
 
-        pass
+    def optimiseFinished(self):
+
+        rankings = self.optimise_thread.rankings
+        if rankings is None or len(rankings) == 0:
+            self.w_progress.setFormat('Optimisation failed - see console')
+        else:
+            self.w_progress.setValue(100)
+            self.w_progress.setFormat('Optimised {} subplots'.format(len(rankings)))
+        self.w_optimise.setEnabled(True)
+        self.w_soil_cn.setEnabled(True)
 
     def runLivestockClicked(self):
 
@@ -284,6 +352,16 @@ class Form(QWidget):
             for key in self.fobjs:
                 self.fobjs[key].close()
 
+        # optimisation must finish before its worker thread is destroyed
+        # ==============================================================
+        if self.optimise_thread is not None and self.optimise_thread.isRunning():
+            print('Waiting for optimisation to finish...')
+            self.optimise_thread.wait()
+
+        # charts added in the background must be saved before exiting
+        # ============================================================
+        join_charts_thread(getattr(self, 'charts_thread', None))
+
         # close logging
         # =============
         try:
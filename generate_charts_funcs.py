@@ -15,30 +15,29 @@ __version__ = '0.0.1'
 # 0.0.1  Wrote.
 #
 import os
+from tempfile import mkstemp
+from threading import Lock, Thread
 from string import ascii_uppercase
-from openpyxl import Workbook, load_workbook
+from openpyxl import load_workbook
 from openpyxl.chart import (
     LineChart,
     Reference,
 )
 
 preferred_line_width = 25000       # 100020 taken from chart_example.py     width in EMUs
+CHART_SHEET = 'charts'
+CHART_MODES = list(['inline', 'background', 'on_demand', 'none'])
 
-def generate_charts(fname, data_frame, sheet_name):
+# serialises deferred chart generation so that the background thread and the display output action never
+# load and save the same workbook at once
+# ======================================
+_CHARTS_LOCK = Lock()
+
+def add_charts(wb_obj, sheet_name):
     '''
-    add charts to an existing Excel file
+    add charts sheet to an open workbook, either freshly written or reloaded, the workbook is not saved
     '''
-    func_name =  __prog__ + ' generate_charts'
-
-    #  name of comparisons
-    # ==============================
     min_num_cols = 26
-    if not os.path.exists(fname):
-        print('File ' + fname + ' must exist')
-        return -1
-
-    # wrkbk = Workbook()
-    wb_obj = load_workbook(fname, data_only=True)
     sheet = wb_obj[sheet_name]
     if sheet.max_column < min_num_cols:
         print('Sheet ' + sheet_name + ' must must have at least {} columns, found: {}'
@@ -48,13 +47,7 @@ def generate_charts(fname, data_frame, sheet_name):
     alphabet_string = ascii_uppercase
     alphabet = list(alphabet_string)
 
-    chart_sheet = wb_obj.create_sheet('charts')
-    '''
-    for row in range(2, sheet.max_row + 1):
-        tstep_cell = 'D' + str(row)
-        total_cell = 'Y' + str(row)
-        chart_sheet.append([sheet[total_cell].value])
-    '''
+    chart_sheet = wb_obj.create_sheet(CHART_SHEET)
     nrow_chart = 10
 
     # generate charts for all metrics except for period, month and tstep
@@ -86,11 +79,80 @@ def generate_charts(fname, data_frame, sheet_name):
         chart_sheet.add_chart(metric_chart, "D" + str(nrow_chart))
         nrow_chart += 20
 
-    try:
-        wb_obj.active = 1   # make the charts sheet active - assumes there are only two sheets
-        wb_obj.save(fname)
-        print('\tcreated: ' + fname)
-    except PermissionError as e:
-        print(str(e) + ' - could not create: ' + fname)
+    wb_obj.active = 1   # make the charts sheet active - assumes there are only two sheets
+
+    return 0
+
+def has_charts(fname):
+    '''
+    True if an existing Excel file already has a charts sheet
+    '''
+    wb_obj = load_workbook(fname, read_only = True)
+    sheet_names = wb_obj.sheetnames
+    wb_obj.close()
+
+    return CHART_SHEET in sheet_names
+
+def generate_charts(fname, data_frame = None, sheet_name = None):
+    '''
+    add charts to an existing Excel file, deferred alternative to add_charts when the file was written without
+    sheet_name defaults to the first sheet, nothing is done if the file already has charts
+    '''
+    if not os.path.exists(fname):
+        print('File ' + fname + ' must exist')
+        return -1
+
+    with _CHARTS_LOCK:
+        if has_charts(fname):
+            return 0
+
+        wb_obj = load_workbook(fname, data_only=True)
+        if sheet_name is None:
+            sheet_name = wb_obj.sheetnames[0]
+        if add_charts(wb_obj, sheet_name) != 0:
+            return -1
+
+        # save to a temporary file which then replaces the original so that an interrupted save never leaves a
+        # truncated workbook
+        # ==================
+        fd, tmp_fname = mkstemp(suffix = '.xlsx', dir = os.path.dirname(os.path.abspath(fname)))
+        os.close(fd)
+        try:
+            wb_obj.save(tmp_fname)
+            os.replace(tmp_fname, fname)
+            print('\tcreated: ' + fname)
+        except PermissionError as e:
+            print(str(e) + ' - could not create: ' + fname)
+            os.remove(tmp_fname)
+            return -1
+
+    return 0
+
+def generate_charts_deferred(fnames):
+    '''
+    add charts to each Excel file in turn
+    '''
+    for fname in fnames:
+        generate_charts(fname)
+
+    return
+
+def start_charts_thread(fnames):
+    '''
+    add charts to Excel files in a background thread, returns the started thread
+    the thread is not a daemon so that the interpreter cannot exit mid save, see join_charts_thread
+    '''
+    thread = Thread(target = generate_charts_deferred, args = (fnames,))
+    thread.start()
+
+    return thread
+
+def join_charts_thread(thread):
+    '''
+    wait for charts started by start_charts_thread to be saved, thread may be None
+    '''
+    if thread is not None and thread.is_alive():
+        print('Waiting for charts to be added to Excel output files...')
+        thread.join()
 
     return
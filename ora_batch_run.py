@@ -0,0 +1,214 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_batch_run.py
+# Purpose:     run ORATOR models over many input workbooks without the GUI
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   command line and library entry point e.g.
+#       python ora_batch_run.py "E:\ORATOR\inputs\*.xlsx" -o E:\ORATOR\outputs --models soil_cn crop -j 8
+#
+#   each workbook writes to its own sub-directory of the output directory. Workbooks are processed concurrently by
+#   up to njobs worker processes; when there is only one workbook the workers are used for its subplots instead
+#
+#   model modules, and hence pandas, are imported only when a workbook is run so that startup stays cheap
+#   as for the GUI, EnvModelModules must be on the PYTHONPATH
+#
+#   soil C and N results are written as CSV by default, see --format; Excel output and charts are much slower
+#   with --format sqlite the results of all workbooks are appended to orator_results.sqlite in the output directory
+#   --kernel runs soil C and N through the fused kernel of ora_cn_kernel; it is only faster when Numba is installed,
+#   without Numba the kernel runs as plain Python and is slower than the default run
+#   --coupled advances the soil N model within the carbon loops; this avoids a second pass over the records of the
+#   steady state but the N model of the forward run reads steady state records, so there it gives no saving
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_batch_run.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import sys
+from argparse import ArgumentParser
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+
+MODEL_NAMES = list(['soil_cn', 'crop', 'livestock'])
+RESULTS_STORE_FNAME = 'orator_results.sqlite'     # as ora_results_store
+OUTPUT_FORMATS = list(['excel', 'csv', 'parquet', 'npz', 'sqlite'])     # as ora_output_write, not imported to keep startup cheap
+
+def expand_input_fnames(inp_patterns):
+    '''
+    expand list of workbook names and/or glob patterns, preserving order and removing duplicates
+    '''
+    xls_inp_fnames = []
+    for pattern in inp_patterns:
+        matches = sorted(glob(pattern))
+        if len(matches) == 0:
+            print('*** Warning *** no input workbooks match ' + pattern)
+
+        for fname in matches:
+            fname = os.path.normpath(fname)
+            if os.path.isfile(fname) and fname not in xls_inp_fnames:
+                xls_inp_fnames.append(fname)
+
+    return xls_inp_fnames
+
+def run_workbook(xls_inp_fname, out_dir, models = None, nworkers = 1, ss_solver = 'iterative',
+                    output_format = 'excel', crop_rotations = False, use_cache = True, output_charts = True,
+                        results_store = None, checkpoint_dir = None, use_kernel = False, coupled = False):
+    '''
+    run selected models for a single ORATOR inputs workbook, soil C and N results are written in output_format
+    soil C and N steady states are restored from and saved to checkpoint_dir, if supplied
+    use_kernel selects the fused soil water, carbon and nitrogen kernel, see ora_cn_kernel
+    coupled advances the soil N model within the carbon loops, see cn_forward_run
+    returns dictionary of model results: soil_cn gives the dictionary of complete_run tuples, crop and livestock
+    give the lists of crop and livestock objects
+    '''
+    if models is None:
+        models = MODEL_NAMES
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    results = {}
+    if 'soil_cn' in models:
+        from ora_high_level_fns import run_soil_cn_study
+
+        study_run = run_soil_cn_study(xls_inp_fname, out_dir, nworkers, ss_solver, output_format, use_cache,
+                                            output_charts, results_store, checkpoint_dir, use_kernel, coupled)
+        results['soil_cn'] = None if study_run is None else study_run[1]
+
+    if 'crop' in models:
+        from ora_crop_model import run_crop_model
+
+        results['crop'] = run_crop_model(xls_inp_fname, crop_rotations)
+
+    if 'livestock' in models:
+        from ora_livestock_model import run_livestock_model
+
+        results['livestock'] = run_livestock_model(xls_inp_fname, crop_rotations)
+
+    return results
+
+def _run_workbook_summary(xls_inp_fname, out_dir, models, nworkers, ss_solver, output_format, crop_rotations,
+                                use_cache, output_charts, results_store, checkpoint_dir, use_kernel, coupled):
+    '''
+    run a workbook in a worker process and return a summary, rather than the results, to the parent process
+    '''
+    results = run_workbook(xls_inp_fname, out_dir, models, nworkers, ss_solver, output_format, crop_rotations,
+                                use_cache, output_charts, results_store, checkpoint_dir, use_kernel, coupled)
+
+    summary = {}
+    for model in results:
+        if results[model] is None:
+            summary[model] = 'failed'
+        elif model == 'soil_cn':
+            nsuccess = len([subplot for subplot in results[model] if results[model][subplot] is not None])
+            summary[model] = '{} of {} subplots completed'.format(nsuccess, len(results[model]))
+        else:
+            summary[model] = '{} completed'.format(len(results[model]))
+
+    return summary
+
+def run_batch(inp_patterns, out_dir, models = None, njobs = 1, ss_solver = 'iterative', output_format = 'csv',
+                            crop_rotations = False, use_cache = True, output_charts = False, checkpoint_dir = None,
+                                                                            use_kernel = False, coupled = False):
+    '''
+    run selected models over all workbooks matching inp_patterns with at most njobs worker processes
+    workbooks share the steady state checkpoints in checkpoint_dir, if supplied
+    returns dictionary of summaries keyed by workbook, an error message replaces the summary of a failed workbook
+    '''
+    xls_inp_fnames = expand_input_fnames(inp_patterns)
+    if len(xls_inp_fnames) == 0:
+        print('No input workbooks found')
+        return {}
+
+    # for sqlite output all workbooks share a single results store in the output directory
+    # ====================================================================================
+    results_store = None
+    if output_format == 'sqlite':
+        results_store = os.path.join(out_dir, RESULTS_STORE_FNAME)
+
+    # each workbook has its own output directory, distinguish workbooks with the same name
+    # =====================================================================================
+    out_dirs = []
+    nstems = {}
+    for xls_inp_fname in xls_inp_fnames:
+        stem = os.path.splitext(os.path.basename(xls_inp_fname))[0]
+        nstems[stem] = nstems.get(stem, 0) + 1
+        if nstems[stem] > 1:
+            stem += '_{}'.format(nstems[stem] - 1)
+        out_dirs.append(os.path.join(out_dir, stem))
+
+    print('Running {} workbooks with models {} using {} jobs'.format(len(xls_inp_fnames), models, njobs))
+
+    summaries = {}
+    if njobs <= 1 or len(xls_inp_fnames) == 1:
+        for xls_inp_fname, wb_out_dir in zip(xls_inp_fnames, out_dirs):
+            try:
+                summaries[xls_inp_fname] = _run_workbook_summary(xls_inp_fname, wb_out_dir, models, njobs,
+                                ss_solver, output_format, crop_rotations, use_cache, output_charts, results_store,
+                                                                            checkpoint_dir, use_kernel, coupled)
+            except Exception as err:
+                summaries[xls_inp_fname] = '*** Error *** ' + repr(err)
+        return summaries
+
+    with ProcessPoolExecutor(max_workers = min(njobs, len(xls_inp_fnames))) as executor:
+        futures = {}
+        for xls_inp_fname, wb_out_dir in zip(xls_inp_fnames, out_dirs):
+            futures[xls_inp_fname] = executor.submit(_run_workbook_summary, xls_inp_fname, wb_out_dir, models, 1,
+                                ss_solver, output_format, crop_rotations, use_cache, output_charts, results_store,
+                                                                            checkpoint_dir, use_kernel, coupled)
+        for xls_inp_fname in xls_inp_fnames:
+            try:
+                summaries[xls_inp_fname] = futures[xls_inp_fname].result()
+            except Exception as err:
+                summaries[xls_inp_fname] = '*** Error *** ' + repr(err)
+
+    return summaries
+
+def main(argv = None):
+    '''
+    command line entry point, returns 0 if all workbooks succeeded and 1 otherwise
+    '''
+    parser = ArgumentParser(prog = __prog__, description = 'Run ORATOR models over ORATOR inputs workbooks')
+    parser.add_argument('inputs', nargs = '+', help = 'ORATOR inputs workbooks and/or glob patterns')
+    parser.add_argument('-o', '--out_dir', required = True, help = 'output directory')
+    parser.add_argument('-m', '--models', nargs = '+', choices = MODEL_NAMES, default = ['soil_cn'],
+                                                                        help = 'models to run, default: soil_cn')
+    parser.add_argument('-j', '--jobs', type = int, default = 1, help = 'maximum number of worker processes')
+    parser.add_argument('--solver', choices = ['iterative', 'analytic'], default = 'iterative',
+                                                                        help = 'steady state solver')
+    parser.add_argument('-f', '--format', choices = OUTPUT_FORMATS + ['none'], default = 'csv',
+                                                            help = 'soil C and N output format, default: csv')
+    parser.add_argument('--charts', action = 'store_true', help = 'add charts to Excel output files')
+    parser.add_argument('--crop_rotations', action = 'store_true', help = 'use crop rotations in crop model')
+    parser.add_argument('--no_cache', action = 'store_true', help = 'always read inputs from the workbooks')
+    parser.add_argument('--checkpoint_dir', help = 'directory of steady state checkpoints, forward runs restart '
+                                                                    'from these when the baseline is unchanged')
+    parser.add_argument('--kernel', action = 'store_true', help = 'use the fused soil C and N kernel, faster only '
+                                                    'when Numba is installed, otherwise slower than the default')
+    parser.add_argument('--coupled', action = 'store_true', help = 'run the soil N model within the carbon loops '
+                                                        'rather than after them, results are unchanged')
+    args = parser.parse_args(argv)
+
+    output_format = None if args.format == 'none' else args.format
+    summaries = run_batch(args.inputs, args.out_dir, args.models, args.jobs, args.solver, output_format,
+                            args.crop_rotations, not args.no_cache, args.charts, args.checkpoint_dir, args.kernel,
+                                                                                                    args.coupled)
+    retcode = 0 if len(summaries) > 0 else 1
+    print()
+    for xls_inp_fname in summaries:
+        summary = summaries[xls_inp_fname]
+        print(xls_inp_fname + ': ' + str(summary))
+        if type(summary) is str or 'failed' in summary.values():
+            retcode = 1
+
+    return retcode
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_benchmark.py
+# Purpose:     time each stage of the soil C and N pipeline
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   times the workbook read, steady state, forward run, nitrogen and Excel output stages for an ORATOR inputs
+#   workbook and for synthetic studies scaled up from it e.g.
+#       python ora_benchmark.py ORATOR\inputs\ORATOR_inputs.xlsx --subplots 10 100 1000 --years 10 100 -o bench.json
+#
+#   synthetic subplots cycle through the workbook subplots with measured SOC perturbed by up to 2% so that no two
+#   neighbouring subplots are identical; other horizons repeat the weather and crop rotations of the workbook, the
+#   rotation is cut short at the last crop harvested within the horizon
+#
+#   cn_steady_state and cn_forward_run times include the nitrogen model which each runs; soil_nitrogen is also
+#   timed on its own by rerunning it on the steady state
+#   with --kernel the fused kernels of ora_cn_kernel are also timed, without Numba they run as plain Python and are
+#   slower than the originals; unless Numba has cached them the first subplot of the first case includes the
+#   compile time
+#   results are written as JSON, one record per case with total, mean and max seconds for per subplot stages; a case
+#   which fails is recorded with its error and the remaining cases are still run
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_benchmark.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import sys
+import json
+import platform
+from argparse import ArgumentParser
+from copy import copy
+from contextlib import redirect_stdout
+from math import ceil
+from tempfile import mkdtemp
+from time import perf_counter, strftime
+
+import numpy as np
+
+from ora_excel_read import ReadStudy, ReadInputParms, ReadWeather, ReadInputSubplots
+from ora_classes_main import MngmntSubplot
+from ora_high_level_fns import _cn_steady_state
+from ora_forward_run import cn_forward_run
+from ora_nitrogen_model import soil_nitrogen
+from ora_cn_kernel import cn_steady_state_kernel, cn_forward_run_kernel, NUMBA_FLAG
+from ora_excel_write import generate_excel_outfiles
+
+READ_STAGES = list(['ReadStudy', 'ReadInputParms', 'ReadWeather', 'ReadInputSubplots'])
+SUBPLOT_STAGES = list(['cn_steady_state', 'soil_nitrogen', 'cn_forward_run', 'cn_steady_state_kernel',
+                                                                'cn_forward_run_kernel', 'generate_excel_outfiles'])
+SOC_PERTURB = 0.02
+
+class _Timer(object, ):
+    '''
+    accumulate elapsed times for each stage
+    '''
+    def __init__(self):
+        self.times = {}
+
+    def add(self, stage, elapsed):
+        self.times.setdefault(stage, []).append(elapsed)
+
+    def summary(self):
+        summary = {}
+        for stage, times in self.times.items():
+            summary[stage] = {'total': sum(times), 'mean': sum(times)/len(times), 'max': max(times),
+                                                                                                'count': len(times)}
+        return summary
+
+def _timed(timer, stage, func, *args):
+    '''
+    call func, recording the elapsed time against stage
+    '''
+    time_strt = perf_counter()
+    retval = func(*args)
+    timer.add(stage, perf_counter() - time_strt)
+
+    return retval
+
+def read_workbook(xls_inp_fname, out_dir, ss_solver = 'iterative'):
+    '''
+    read ORATOR inputs workbook, timing each of the Read classes
+    returns study, parameters, weather, subplots and the read times
+    '''
+    timer = _Timer()
+    study = _timed(timer, 'ReadStudy', ReadStudy, xls_inp_fname, out_dir, 'excel', ss_solver)
+    ora_parms = _timed(timer, 'ReadInputParms', ReadInputParms, xls_inp_fname)
+    ora_weather = _timed(timer, 'ReadWeather', ReadWeather, xls_inp_fname, study.latitude)
+    ora_subplots = _timed(timer, 'ReadInputSubplots', ReadInputSubplots, xls_inp_fname, ora_parms.crop_vars)
+
+    return study, ora_parms, ora_weather, ora_subplots, timer.summary()
+
+def _repeat_rotation(crop_mngmnt, nyears):
+    '''
+    repeat crop rotation until it covers nyears, months of each repeat are offset by the rotation length
+    crops not harvested within nyears are dropped so that the management never outruns the weather
+    '''
+    nyears_rot = ceil(crop_mngmnt[-1].harvest_mnth/12)
+    nrepeats = ceil(nyears/nyears_rot)
+    nmnths = nyears*12
+
+    crop_mngmnt_new = []
+    for irepeat in range(nrepeats):
+        offset = irepeat*nyears_rot*12
+        for crop in crop_mngmnt:
+            if crop.harvest_mnth + offset > nmnths:
+                break
+            crop_new = copy(crop)
+            for attrib in ['sowing_mnth', 'harvest_mnth', 'fert_mnth', 'ow_mnth']:
+                setattr(crop_new, attrib, getattr(crop, attrib) + offset)
+            crop_new.irrig = {imnth + offset: crop.irrig[imnth] for imnth in crop.irrig}
+            crop_mngmnt_new.append(crop_new)
+
+    return crop_mngmnt_new
+
+def _repeat_weather(pettmp, nyears):
+    '''
+    repeat monthly weather until it covers nyears
+    '''
+    nmnths = nyears*12
+    pettmp_new = {}
+    for metric in pettmp:
+        vals = list(pettmp[metric])
+        pettmp_new[metric] = (vals*ceil(nmnths/len(vals)))[:nmnths]
+
+    return pettmp_new
+
+def scale_study(ora_weather, ora_subplots, nsubplots = None, nyears = None):
+    '''
+    synthetic weather and subplots with nsubplots subplots and a horizon of nyears years
+    None retains the number of subplots or horizon of the workbook
+    '''
+    if nyears is not None:
+        ora_weather = copy(ora_weather)
+        ora_weather.pettmp_ss = _repeat_weather(ora_weather.pettmp_ss, nyears)
+        ora_weather.pettmp_fwd = _repeat_weather(ora_weather.pettmp_fwd, nyears)
+
+    subplots = list(ora_subplots.soil_all_areas.keys())
+    if nsubplots is None:
+        nsubplots = len(subplots)
+
+    soil_all_areas = {}
+    crop_mngmnt_ss = {}
+    crop_mngmnt_fwd = {}
+    nwidth = len(str(nsubplots))
+    for isub in range(nsubplots):
+        subplot = subplots[isub % len(subplots)]
+        if nsubplots == len(subplots):
+            name = subplot
+            soil = ora_subplots.soil_all_areas[subplot]
+        else:
+            name = subplot + '_' + str(isub).zfill(nwidth)
+            soil = copy(ora_subplots.soil_all_areas[subplot])
+            soil.tot_soc_meas *= 1.0 + SOC_PERTURB*((isub % 11) - 5)/5
+
+        soil_all_areas[name] = soil
+        crop_mngmnt_ss[name] = ora_subplots.crop_mngmnt_ss[subplot]
+        crop_mngmnt_fwd[name] = ora_subplots.crop_mngmnt_fwd[subplot]
+        if nyears is not None:
+            crop_mngmnt_ss[name] = _repeat_rotation(crop_mngmnt_ss[name], nyears)
+            crop_mngmnt_fwd[name] = _repeat_rotation(crop_mngmnt_fwd[name], nyears)
+
+    ora_subplots = copy(ora_subplots)
+    ora_subplots.soil_all_areas = soil_all_areas
+    ora_subplots.crop_mngmnt_ss = crop_mngmnt_ss
+    ora_subplots.crop_mngmnt_fwd = crop_mngmnt_fwd
+
+    return ora_weather, ora_subplots
+
+def run_case(study, ora_parms, ora_weather, ora_subplots, excel_max = 2, verbose = False, kernel = False):
+    '''
+    run steady state, nitrogen, forward run and, for the first excel_max subplots, Excel output for each subplot
+    if kernel is set the steady state and forward run are repeated using the fused kernels
+    returns summary of stage times and number of subplots which reached steady state
+    '''
+    timer = _Timer()
+    nconverged = 0
+    time_strt = perf_counter()
+    with redirect_stdout(sys.stdout if verbose else open(os.devnull, 'w')):
+        for isub, subplot in enumerate(ora_subplots.soil_all_areas):
+            soil_vars = ora_subplots.soil_all_areas[subplot]
+
+            mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+            steady_state = _timed(timer, 'cn_steady_state', _cn_steady_state, ora_parms, ora_weather, mngmnt_ss,
+                                                                                        soil_vars, study, subplot)
+            if steady_state is None:
+                continue
+            nconverged += 1
+
+            carbon_change, nitrogen_change, soil_water = steady_state
+            _timed(timer, 'soil_nitrogen', soil_nitrogen, carbon_change, soil_water, ora_parms,
+                                                                    ora_weather.pettmp_ss, mngmnt_ss, soil_vars)
+
+            mngmnt_fwd = MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms,
+                                                                                carbon_change.data['c_pi_mnth'])
+            complete_run = _timed(timer, 'cn_forward_run', cn_forward_run, ora_parms, ora_weather, mngmnt_fwd,
+                                                                                        soil_vars, steady_state)
+            if isub < excel_max:
+                _timed(timer, 'generate_excel_outfiles', generate_excel_outfiles, study, subplot, ora_weather,
+                                                                                                    complete_run)
+            if kernel:
+                mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+                steady_state = _timed(timer, 'cn_steady_state_kernel', cn_steady_state_kernel, ora_parms,
+                                                                ora_weather, mngmnt_ss, soil_vars, study, subplot)
+                mngmnt_fwd = MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms,
+                                                                            steady_state[0].data['c_pi_mnth'])
+                _timed(timer, 'cn_forward_run_kernel', cn_forward_run_kernel, ora_parms, ora_weather, mngmnt_fwd,
+                                                                                        soil_vars, steady_state)
+
+    summary = timer.summary()
+    summary['all_subplots'] = {'total': perf_counter() - time_strt}
+
+    return summary, nconverged
+
+def run_benchmark(xls_inp_fname, nsubplots_list = None, nyears_list = None, ss_solver = 'iterative', excel_max = 2,
+                                                                out_dir = None, verbose = False, kernel = False):
+    '''
+    benchmark the workbook as is, then each combination of number of subplots and horizon in years
+    returns dictionary of results suitable for writing as JSON
+    '''
+    if out_dir is None:
+        out_dir = mkdtemp(prefix = 'ora_bench_')
+
+    with redirect_stdout(sys.stdout if verbose else open(os.devnull, 'w')):
+        study, ora_parms, ora_weather, ora_subplots, read_times = read_workbook(xls_inp_fname, out_dir, ss_solver)
+
+    print('Read: ' + ', '.join(['{}: {:.3f}s'.format(stage, read_times[stage]['total']) for stage in READ_STAGES]),
+                                                                                                file = sys.stderr)
+    cases = [(None, None)]
+    for nsubplots in (nsubplots_list or []):
+        for nyears in (nyears_list or [None]):
+            cases.append((nsubplots, nyears))
+
+    results = {'workbook': os.path.abspath(xls_inp_fname), 'created': strftime('%Y-%m-%d %H:%M:%S'),
+               'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+               'ss_solver': ss_solver, 'excel_max': excel_max, 'kernel': kernel, 'numba': NUMBA_FLAG,
+                                                                                'read': read_times, 'cases': []}
+
+    for nsubplots, nyears in cases:
+        weather_case, subplots_case = scale_study(ora_weather, ora_subplots, nsubplots, nyears)
+        nsubplots_case = len(subplots_case.soil_all_areas)
+        nyears_case = int(len(weather_case.pettmp_fwd['tair'])/12)
+        print('Benchmarking {} subplots over {} years...'.format(nsubplots_case, nyears_case), file = sys.stderr)
+
+        case = {'synthetic': (nsubplots, nyears) != (None, None), 'nsubplots': nsubplots_case,
+                                                                                            'nyears': nyears_case}
+        results['cases'].append(case)
+        try:
+            stages, nconverged = run_case(study, ora_parms, weather_case, subplots_case, excel_max, verbose, kernel)
+        except Exception as err:
+            case['error'] = '{}: {}'.format(type(err).__name__, err)
+            print('*** Error *** case of {} subplots over {} years failed - {}'
+                                                .format(nsubplots_case, nyears_case, case['error']), file = sys.stderr)
+            continue
+
+        case['nconverged'] = nconverged
+        case['stages'] = stages
+        print('\t' + ', '.join(['{}: {:.3f}s'.format(stage, stages[stage]['total'])
+                                    for stage in SUBPLOT_STAGES + ['all_subplots'] if stage in stages]), file = sys.stderr)
+    return results
+
+def main(argv = None):
+    '''
+    command line entry point
+    '''
+    parser = ArgumentParser(prog = __prog__, description = 'Time each stage of the ORATOR soil C and N pipeline')
+    parser.add_argument('workbook', nargs = '?', default = os.path.join('ORATOR', 'inputs', 'ORATOR_inputs.xlsx'),
+                                                                                help = 'ORATOR inputs workbook')
+    parser.add_argument('--subplots', type = int, nargs = '*', default = [10, 100, 1000],
+                                                                help = 'numbers of subplots for synthetic cases')
+    parser.add_argument('--years', type = int, nargs = '*', default = [10, 100],
+                                                                help = 'horizons in years for synthetic cases')
+    parser.add_argument('--solver', choices = ['iterative', 'analytic'], default = 'iterative',
+                                                                                    help = 'steady state solver')
+    parser.add_argument('--excel_max', type = int, default = 2,
+                                                help = 'number of subplots per case for which Excel output is timed')
+    parser.add_argument('-d', '--out_dir', help = 'directory for Excel output, default is a temporary directory')
+    parser.add_argument('-o', '--output', help = 'JSON results file, default is standard output')
+    parser.add_argument('-v', '--verbose', action = 'store_true', help = 'show output of the model')
+    parser.add_argument('--kernel', action = 'store_true', help = 'also time the fused kernels of ora_cn_kernel')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.workbook):
+        print('*** Error *** workbook ' + args.workbook + ' does not exist')
+        return 1
+
+    results = run_benchmark(args.workbook, args.subplots, args.years, args.solver, args.excel_max, args.out_dir,
+                                                                                        args.verbose, args.kernel)
+    if args.output is None:
+        print(json.dumps(results, indent = 2))
+    else:
+        with open(args.output, 'w') as fobj:
+            json.dump(results, fobj, indent = 2)
+        print('Wrote benchmark results to ' + args.output, file = sys.stderr)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
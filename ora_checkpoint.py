@@ -0,0 +1,127 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_checkpoint.py
+# Purpose:     converged steady states saved so that forward runs can restart without the spin up
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   a checkpoint holds the steady state carbon, nitrogen and soil water records of a subplot, hence the converged
+#   pools, the losses returned by get_last_tstep_pools, the adjusted plant inputs and the N state, together with the
+#   soil water drainage carried into the forward run. Each is written as a compressed NPZ file of a few KB
+#
+#   the key is the SHA-256 hash of the soil, the baseline i.e. steady state management, the steady state weather,
+#   the model parameters, the steady state solver and the source of the modules of CHECKPOINT_MODULES, so scenarios
+#   which vary only the forward management share a checkpoint while any change to the baseline or to the code which
+#   computes the steady state gives a new key
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_checkpoint.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+from hashlib import sha256
+from zipfile import BadZipFile
+
+import numpy as np
+
+from ora_classes_carbon import CarbonChange
+from ora_classes_nitrogen import NitrogenChange
+from ora_input_cache import source_digest
+from ora_water_model import SoilWater
+
+CHECKPOINT_VERSION = 1      # increment when the records change
+CHECKPOINT_MODULES = list(['ora_high_level_fns', 'ora_cn_vectorised', 'ora_cn_kernel', 'ora_classes_carbon',
+                                                                            'ora_water_model', 'ora_nitrogen_model'])
+CHECKPOINT_EXT = '.npz'
+STORE_NAMES = list(['carbon', 'nitrogen', 'soil_water'])
+
+def _hash_obj(hasher, obj):
+    '''
+    add attributes of an object, or a list of objects, to hash in a repeatable order
+    '''
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            _hash_obj(hasher, item)
+    elif hasattr(obj, '__dict__'):
+        hasher.update(repr(sorted(vars(obj).items())).encode())
+    else:
+        hasher.update(repr(obj).encode())
+
+def steady_state_key(parameters, weather, crop_mngmnt_ss, soil_vars, ss_solver):
+    '''
+    hex digest identifying the inputs and the code which determine the steady state
+    '''
+    hasher = sha256(str(CHECKPOINT_VERSION).encode())
+    hasher.update(source_digest(CHECKPOINT_MODULES))
+    _hash_obj(hasher, soil_vars)
+    _hash_obj(hasher, crop_mngmnt_ss)
+    for var_name in ['precip', 'tair', 'pet']:
+        hasher.update(np.asarray(weather.pettmp_ss[var_name], dtype = float).tobytes())
+    for parms in [parameters.crop_vars, parameters.ow_parms, parameters.n_parms]:
+        hasher.update(repr(parms).encode())
+    hasher.update(ss_solver.encode())
+
+    return hasher.hexdigest()
+
+def _checkpoint_fname(checkpoint_dir, key):
+
+    return os.path.join(checkpoint_dir, key + CHECKPOINT_EXT)
+
+def save_steady_state(checkpoint_dir, key, steady_state):
+    '''
+    write checkpoint atomically so that concurrent runs never see a partial file, returns 0 on success
+    '''
+    checkpoint_fname = _checkpoint_fname(checkpoint_dir, key)
+    checkpoint_fname_tmp = checkpoint_fname + '.{}.tmp'.format(os.getpid())
+
+    arrays = {'wat_drain_prev': np.array(steady_state[2].wat_drain_prev)}
+    for store_name, store_obj in zip(STORE_NAMES, steady_state):
+        arrays[store_name] = store_obj.store[:, :store_obj.nrecs]
+        arrays[store_name + '_vars'] = np.array(store_obj.var_name_list)
+    try:
+        os.makedirs(checkpoint_dir, exist_ok = True)
+        with open(checkpoint_fname_tmp, 'wb') as fobj:
+            np.savez_compressed(fobj, **arrays)
+        os.replace(checkpoint_fname_tmp, checkpoint_fname)
+    except OSError as err:
+        print('*** Warning *** could not write steady state checkpoint ' + checkpoint_fname + ': ' + str(err))
+        if os.path.isfile(checkpoint_fname_tmp):
+            os.remove(checkpoint_fname_tmp)
+        return -1
+
+    return 0
+
+def load_steady_state(checkpoint_dir, key):
+    '''
+    steady_state tuple of carbon, nitrogen and soil water objects, as returned by _cn_steady_state, or None if there
+    is no usable checkpoint
+    '''
+    checkpoint_fname = _checkpoint_fname(checkpoint_dir, key)
+    if not os.path.isfile(checkpoint_fname):
+        return None
+
+    steady_state = (CarbonChange('steady state'), NitrogenChange(), SoilWater())
+    try:
+        with np.load(checkpoint_fname) as npz:
+            for store_name, store_obj in zip(STORE_NAMES, steady_state):
+                if npz[store_name + '_vars'].tolist() != store_obj.var_name_list:
+                    print('*** Warning *** ignoring out of date steady state checkpoint ' + checkpoint_fname)
+                    return None
+
+                records = npz[store_name]
+                store_obj.extend_vars(dict(zip(store_obj.var_name_list, records)))
+            steady_state[2].wat_drain_prev = float(npz['wat_drain_prev'])
+    except (OSError, KeyError, ValueError, BadZipFile) as err:
+        print('*** Warning *** discarding unreadable steady state checkpoint ' + checkpoint_fname + ': ' + str(err))
+        try:
+            os.remove(checkpoint_fname)
+        except OSError:
+            pass
+        return None
+
+    return steady_state
@@ -19,95 +19,113 @@ __version__ = '0.0.0'
 # Version history
 # ---------------
 #
-from math import ceil
+from itertools import repeat
 
-class CarbonChange(object, ):
+from ora_classes_store import ColumnStore
 
-    def __init__(self, run_type):
-        """
-        A1. Change in soil organic matter
-        """
-        self.title = 'CarbonChange'
-        self.run_type = run_type
-        self.data = {}
+# values supplied to the N model by get_vals_for_tstep rather than those of the run
+# TODO: these variables are currently hard coded
+# ==================================================================================
+C_N_RAT_OW = 0.5
+PROP_CO2 = 0.5
+PROP_BIO = 0.5
+PROP_HUM = 0.5
+C_N_RAT_SOM = 10
 
-        var_name_list = list(['month', 'rate_mod', 'c_pi_mnth', 'cow', 'c_n_rat_ow',
+CARBON_VARS = list(['month', 'rate_mod', 'c_pi_mnth', 'cow', 'c_n_rat_ow',
                                         'pool_c_dpm', 'pi_to_dpm', 'cow_to_dpm', 'c_loss_dpm',
                                         'pool_c_rpm', 'pi_to_rpm', 'c_loss_rpm',
                                         'pool_c_bio', 'c_input_bio', 'c_loss_bio',
                                         'pool_c_hum', 'cow_to_hum', 'c_input_hum', 'c_loss_hum',
                                         'pool_c_iom', 'ioc_to_iom', 'tot_soc_simul', 'co2_release'])
-        for var_name in var_name_list:
-            self.data[var_name] = []
 
-        self.var_name_list = var_name_list
+_INDX = {var_name: indx for indx, var_name in enumerate(CARBON_VARS)}
+_LAST_TSTEP_INDICES = [_INDX[var_name] for var_name in ['pool_c_dpm', 'pool_c_rpm', 'pool_c_bio', 'pool_c_hum',
+                                    'pool_c_iom', 'tot_soc_simul', 'c_input_bio', 'c_input_hum', 'c_loss_dpm',
+                                    'c_loss_rpm', 'c_loss_hum', 'c_loss_bio']]
+_NITROGEN_INPUT_VARS = list(['cow', 'rate_mod', 'co2_release', 'c_loss_bio', 'pool_c_dpm', 'pi_to_dpm', 'cow_to_dpm',
+                    'c_loss_dpm', 'pool_c_hum', 'cow_to_hum', 'c_loss_hum', 'pool_c_rpm', 'pi_to_rpm', 'c_loss_rpm'])
+
+def nitrogen_inputs(cow, rate_mod, co2_release, c_loss_bio, pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm,
+                            pool_c_hum, cow_to_hum, c_loss_hum, pool_c_rpm, pi_to_rpm, c_loss_rpm):
+    '''
+    values for one timestep in the order returned by CarbonChange.get_vals_for_tstep, for use within the carbon loop
+    '''
+    return cow, C_N_RAT_OW, PROP_CO2, rate_mod, C_N_RAT_SOM, co2_release, \
+                            c_loss_bio, PROP_BIO, pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm,  \
+                            pool_c_hum, PROP_HUM, cow_to_hum, c_loss_hum, pool_c_rpm, pi_to_rpm, c_loss_rpm
+
+class CarbonChange(ColumnStore, ):
+
+    def __init__(self, run_type, ntsteps = None):
+        """
+        A1. Change in soil organic matter
+        columns refer to A1. SOM change sheet
+        """
+        super(CarbonChange, self).__init__(CARBON_VARS, ntsteps)
+
+        self.title = 'CarbonChange'
+        self.run_type = run_type
 
     def get_last_tstep_pools(self):
         '''
-        TODO: these variables are currently hard coded:
-             c_n_rat_ow = 0.5; prop_co2 = 0.5;  prop_bio =  0.5; prop_hum = 0.5;  c_n_rat_som = 10
+        TODO: these variables are currently hard coded: C_N_RAT_OW, PROP_CO2, PROP_BIO, PROP_HUM and C_N_RAT_SOM
         '''
-        pool_c_dpm = self.data['pool_c_dpm'][-1]
-        pool_c_rpm = self.data['pool_c_rpm'][-1]
-        pool_c_hum = self.data['pool_c_hum'][-1]
-        pool_c_bio = self.data['pool_c_bio'][-1]
-        pool_c_iom = self.data['pool_c_iom'][-1]
-
-        c_input_bio = self.data['c_input_bio'][-1]
-        c_input_hum = self.data['c_input_hum'][-1]
-        c_loss_dpm = self.data['c_loss_dpm'][-1]
-        c_loss_rpm = self.data['c_loss_rpm'][-1]
-        c_loss_hum = self.data['c_loss_hum'][-1]
-        c_loss_bio = self.data['c_loss_bio'][-1]
+        vals = self.get_tstep(-1)
 
-        tot_soc_simul = self.data['tot_soc_simul'][-1]      # TODO
-
-        last_tstep_vars = (pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul,
-                                        c_input_bio , c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio)
+        last_tstep_vars = tuple([vals[indx] for indx in _LAST_TSTEP_INDICES])
 
         return last_tstep_vars
 
     def get_vals_for_tstep(self, tstep):
         '''
-        TODO: these variables are currently hard coded:
-             c_n_rat_ow = 0.5; prop_co2 = 0.5;  prop_bio =  0.5; prop_hum = 0.5;  c_n_rat_som = 10
+        TODO: these variables are currently hard coded: C_N_RAT_OW, PROP_CO2, PROP_BIO, PROP_HUM and C_N_RAT_SOM
         '''
-        rate_mod = self.data['rate_mod'][tstep]
-        cow = self.data['cow'][tstep]
-        c_n_rat_ow = 0.5  # TODO
-        # c_n_rat_ow = self.data['c_n_rat_ow'][tstep]
+        vals = self.get_tstep(tstep)
+
+        rate_mod = vals[_INDX['rate_mod']]
+        cow = vals[_INDX['cow']]
+        c_n_rat_ow = C_N_RAT_OW  # TODO
+        # c_n_rat_ow = vals[_INDX['c_n_rat_ow']]
 
-        prop_co2 = 0.5  # TODO
-        # prop_co2 = self.data['prop_co2'][tstep]
+        prop_co2 = PROP_CO2  # TODO
 
-        co2_release = self.data['co2_release'][tstep]
-        c_n_rat_som = 10 # TODO
-        # c_n_rat_som = self.data['c_n_rat_som'][tstep]
+        co2_release = vals[_INDX['co2_release']]
+        c_n_rat_som = C_N_RAT_SOM # TODO
 
-        c_loss_bio = self.data['c_loss_bio'][tstep]
-        prop_bio =  0.5  # TODO
-        # prop_bio = self.data['prop_bio'][tstep]
+        c_loss_bio = vals[_INDX['c_loss_bio']]
+        prop_bio =  PROP_BIO  # TODO
 
-        pool_c_dpm = self.data['pool_c_dpm'][tstep]
-        pi_to_dpm = self.data['pi_to_dpm'][tstep]
-        cow_to_dpm = self.data['cow_to_dpm'][tstep]
-        c_loss_dpm = self.data['c_loss_dpm'][tstep]
+        pool_c_dpm = vals[_INDX['pool_c_dpm']]
+        pi_to_dpm = vals[_INDX['pi_to_dpm']]
+        cow_to_dpm = vals[_INDX['cow_to_dpm']]
+        c_loss_dpm = vals[_INDX['c_loss_dpm']]
 
-        pool_c_rpm = self.data['pool_c_rpm'][tstep]
-        pi_to_rpm = self.data['pi_to_rpm'][tstep]
-        c_loss_rpm = self.data['c_loss_rpm'][tstep]
+        pool_c_rpm = vals[_INDX['pool_c_rpm']]
+        pi_to_rpm = vals[_INDX['pi_to_rpm']]
+        c_loss_rpm = vals[_INDX['c_loss_rpm']]
 
-        pool_c_hum = self.data['pool_c_hum'][tstep]
-        # prop_hum = self.data['prop_hum'][tstep]
-        prop_hum = 0.5  # TODO
+        pool_c_hum = vals[_INDX['pool_c_hum']]
+        prop_hum = PROP_HUM  # TODO
 
-        cow_to_hum = self.data['cow_to_hum'][tstep]
-        c_loss_hum = self.data['c_loss_hum'][tstep]
+        cow_to_hum = vals[_INDX['cow_to_hum']]
+        c_loss_hum = vals[_INDX['c_loss_hum']]
 
         return cow, c_n_rat_ow, prop_co2, rate_mod, c_n_rat_som, co2_release, \
                             c_loss_bio, prop_bio, pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm,  \
                             pool_c_hum, prop_hum, cow_to_hum, c_loss_hum, pool_c_rpm, pi_to_rpm, c_loss_rpm
 
+    def vals_by_tstep(self, ntsteps):
+        '''
+        values returned by get_vals_for_tstep for each of the first ntsteps timesteps, read column by column
+        '''
+        cols = {var_name: self.store[_INDX[var_name], :ntsteps].tolist() for var_name in _NITROGEN_INPUT_VARS}
+        return list(zip(cols['cow'], repeat(C_N_RAT_OW), repeat(PROP_CO2), cols['rate_mod'], repeat(C_N_RAT_SOM),
+                        cols['co2_release'], cols['c_loss_bio'], repeat(PROP_BIO), cols['pool_c_dpm'],
+                        cols['pi_to_dpm'], cols['cow_to_dpm'], cols['c_loss_dpm'], cols['pool_c_hum'],
+                        repeat(PROP_HUM), cols['cow_to_hum'], cols['c_loss_hum'], cols['pool_c_rpm'],
+                        cols['pi_to_rpm'], cols['c_loss_rpm']))
+
     def append_vars(self, month, rate_mod, c_pi_mnth, cow, c_n_rat_ow,
                                                 pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm,
                                                 pool_c_rpm, pi_to_rpm, c_loss_rpm,
@@ -115,36 +133,11 @@ class CarbonChange(object, ):
                                                 pool_c_hum, cow_to_hum, c_input_hum, c_loss_hum,
                                                 pool_c_iom, ioc_to_iom, tot_soc_simul, co2_release):
         '''
-        add one set of values for this timestep to each of lists
-        columns refer to A1. SOM change sheet
+        add one set of values for this timestep, arguments are in CARBON_VARS order
         '''
-
-        # rate modifier start of each month cols D, G and H
-        # ==================================================
-        for var in ['month', 'rate_mod', 'c_pi_mnth', 'cow', 'c_n_rat_ow']:
-            self.data[var].append(eval(var))
-
-        # DPM pool cols K to M
-        # ====================
-        for var in ['pool_c_dpm', 'cow_to_dpm', 'pi_to_dpm', 'c_loss_dpm']:
-            self.data[var].append(eval(var))
-
-        # RPM pool cols N to P
-        # ====================
-        for var in ['pool_c_rpm', 'pi_to_rpm', 'c_loss_rpm']:
-            self.data[var].append(eval(var))
-
-        # BIO pool cols Q to S
-        # ====================
-        for var in ['pool_c_bio', 'c_input_bio', 'c_loss_bio']:
-            self.data[var].append(eval(var))
-
-        # HUM pool cols K to M
-        # ====================
-        for var in ['pool_c_hum', 'cow_to_hum', 'c_input_hum', 'c_loss_hum']:
-            self.data[var].append(eval(var))
-
-        # IOM pool cols X to AA
-        # =====================
-        for var in ['pool_c_iom', 'ioc_to_iom', 'tot_soc_simul', 'co2_release']:
-            self.data[var].append(eval(var))
+        self.append_row((month, rate_mod, c_pi_mnth, cow, c_n_rat_ow,
+                         pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm,
+                         pool_c_rpm, pi_to_rpm, c_loss_rpm,
+                         pool_c_bio, c_input_bio, c_loss_bio,
+                         pool_c_hum, cow_to_hum, c_input_hum, c_loss_hum,
+                         pool_c_iom, ioc_to_iom, tot_soc_simul, co2_release))
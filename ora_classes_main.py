@@ -20,12 +20,14 @@ __version__ = '0.0.0'
 # ---------------
 #
 from math import ceil
+import numpy as np
 
 from ora_nitrogen_fns import no3_crop_uptake, loss_adjustment_ratio, no3_immobilisation, no3_leaching, \
                                                                                                 no3_denitrific
 from ora_nh4_fns import nh4_nitrification, nh4_mineralisation, nh4_immobilisation, nh4_volatilisation, nh4_crop_uptake
 
-from ora_low_level_fns import populate_org_fert
+from ora_low_level_fns import populate_org_fert, get_rate_temp
+from ora_water_model import get_soil_water, get_soil_water_constants
 
 class MngmntSubplot(object, ):
     '''
@@ -100,6 +102,74 @@ class MngmntSubplot(object, ):
         self.pi_props  = pi_prop_list[1:]
         self.crop_currs = crop_currs[1:]
 
+class CompiledMngmnt(object, ):
+    '''
+    weather, management and crop and organic waste parameters resolved once into dense per timestep arrays
+    '''
+    def __init__(self, pettmp, management, ora_parms, soil_vars = None):
+        """
+        plant inputs are excluded since they are adjusted during the steady state
+        if soil_vars is supplied the soil water and rate modifier trace is also computed, see set_soil_trace
+        """
+        ntsteps = management.ntsteps
+        crop_vars = ora_parms.crop_vars
+        ow_parms = ora_parms.ow_parms
+
+        clim_vals = []
+        mngmnt_vals = []
+        for tstep in range(ntsteps):
+            crop_name = management.crop_currs[tstep]
+            org_fert = management.org_fert[tstep]
+            ow_type = org_fert['ow_type']
+
+            clim_vals.append((pettmp['tair'][tstep], pettmp['precip'][tstep], pettmp['pet'][tstep],
+                                                                                            management.irrig[tstep]))
+            mngmnt_vals.append((ow_parms[ow_type]['c_n_rat'], crop_vars[crop_name]['rat_dpm_rpm'],
+                                org_fert['amount']*ow_parms[ow_type]['pcnt_c'], ow_parms[ow_type]['rat_dpm_hum_ow'],
+                                ow_parms[ow_type]['prop_iom_ow'], crop_vars[crop_name]['max_root_dpth']))
+
+        self.ntsteps = ntsteps
+        self.clim_vals = clim_vals
+        self.mngmnt_vals = mngmnt_vals
+
+        for indx, var_name in enumerate(['tair', 'precip', 'pet', 'irrig']):
+            setattr(self, var_name, np.array([vals[indx] for vals in clim_vals], dtype = float))
+
+        for indx, var_name in enumerate(['c_n_rat_ow', 'rat_dpm_rpm', 'cow', 'rat_dpm_hum_ow', 'prop_iom_ow',
+                                                                                                'max_root_dpth']):
+            setattr(self, var_name, np.array([vals[indx] for vals in mngmnt_vals], dtype = float))
+
+        self.soil_trace = None
+        if soil_vars is not None:
+            self.set_soil_trace(soil_vars)
+
+    def set_soil_trace(self, soil_vars):
+        '''
+        soil water and rate modifier for each timestep depend only on the weather, irrigation and soil so are
+        computed once rather than in every iteration of the steady state
+        '''
+        wc_fld_cap, wc_pwp = get_soil_water_constants(soil_vars)
+        t_pH_h2o = soil_vars.t_pH_h2o
+
+        wc_t0, wc_t1 = 2*[0]
+        soil_trace = []
+        for tstep, (tair, precip, pet, irrig) in enumerate(self.clim_vals):
+            wat_soil, wc_t0, wc_t1 = get_soil_water(tstep, precip, pet, irrig, wc_fld_cap, wc_pwp, wc_t0, wc_t1)
+            rate_mod, rate_moist = get_rate_temp(tair, t_pH_h2o, wc_fld_cap, wc_pwp, wat_soil)
+            soil_trace.append((wat_soil, rate_mod))
+
+        self.wc_fld_cap = wc_fld_cap
+        self.wc_pwp = wc_pwp
+        self.soil_trace = soil_trace
+        self.wat_soil = np.array([vals[0] for vals in soil_trace], dtype = float)
+        self.rate_mod = np.array([vals[1] for vals in soil_trace], dtype = float)
+
+    def get_values_for_tstep(self, tstep, pi_tonnes):
+        '''
+        same values, in the same order, as ora_low_level_fns.get_values_for_tstep
+        '''
+        return self.clim_vals[tstep] + (pi_tonnes[tstep],) + self.mngmnt_vals[tstep]
+
 class A1SomChange(object, ):
 
     def __init__(self, pettmp, carbon_obj, soil_water_obj):
@@ -141,7 +211,7 @@ class A1SomChange(object, ):
         self.sheet_data['cow'] = carbon_obj.data['cow']             # col I
         self.sheet_data['dpm'] = carbon_obj.data['pool_c_dpm']  # col K
         self.sheet_data['dpm_inpt'] \
-                    = [carbon_obj.data['pi_to_dpm'][i] + carbon_obj.data['cow_to_dpm'][i] for i in range(ntsteps)]
+                    = carbon_obj.data['pi_to_dpm'][:ntsteps] + carbon_obj.data['cow_to_dpm'][:ntsteps]  # col L
 
         self.sheet_data['dpm_loss'] = carbon_obj.data['c_loss_dpm']  # col M
         self.sheet_data['rpm'] = carbon_obj.data['pool_c_rpm']
@@ -0,0 +1,95 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_classes_store.py
+# Purpose:     preallocated columnar storage for per timestep results
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   each variable is held as one row of a 2D NumPy array which is sized from the number of timesteps and written by
+#   index. The data attribute gives a dictionary of variable name to view of the recorded timesteps, as previously
+#   provided by the dictionary of lists
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_classes_store.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import numpy as np
+
+NTSTEPS_DEFAULT = 120
+
+class ColumnStore(object, ):
+    '''
+    base class for the result containers
+    '''
+    def __init__(self, var_name_list, ntsteps = None):
+        """
+        ntsteps: number of timesteps to allocate, the store grows if more are appended
+        """
+        if ntsteps is None:
+            ntsteps = NTSTEPS_DEFAULT
+
+        self.var_name_list = var_name_list
+        self.var_indices = {var_name: indx for indx, var_name in enumerate(var_name_list)}
+        self.store = np.zeros((len(var_name_list), max(1, ntsteps)))
+        self.nrecs = 0
+        self._data = None
+
+    @property
+    def data(self):
+        '''
+        views of each variable for the timesteps recorded so far - views are only valid until the next append
+        '''
+        if self._data is None:
+            nrecs = self.nrecs
+            self._data = {var_name: self.store[indx, :nrecs] for var_name, indx in self.var_indices.items()}
+
+        return self._data
+
+    def reserve(self, ntsteps_extra):
+        '''
+        make sure there is room for a further ntsteps_extra timesteps
+        '''
+        nrecs_reqd = self.nrecs + ntsteps_extra
+        capacity = self.store.shape[1]
+        if nrecs_reqd > capacity:
+            store = np.zeros((self.store.shape[0], max(nrecs_reqd, 2*capacity)))
+            store[:, :self.nrecs] = self.store[:, :self.nrecs]
+            self.store = store
+            self._data = None
+
+    def append_row(self, vals):
+        '''
+        write one value for each variable, in var_name_list order, at the next timestep
+        '''
+        nrecs = self.nrecs
+        if nrecs == self.store.shape[1]:
+            self.reserve(1)
+
+        self.store[:, nrecs] = vals
+        self.nrecs = nrecs + 1
+        self._data = None
+
+    def extend_vars(self, var_arrays):
+        '''
+        append a block of timesteps given as a dictionary of equal length arrays, one for each variable
+        '''
+        ntsteps = len(var_arrays[self.var_name_list[0]])
+        self.reserve(ntsteps)
+        for var_name, indx in self.var_indices.items():
+            self.store[indx, self.nrecs:self.nrecs + ntsteps] = var_arrays[var_name]
+        self.nrecs += ntsteps
+        self._data = None
+
+    def get_tstep(self, tstep):
+        '''
+        values of all variables for a timestep as a list of floats, in var_name_list order
+        '''
+        if tstep < 0:
+            tstep += self.nrecs
+
+        return self.store[:, tstep].tolist()
@@ -0,0 +1,510 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_cn_kernel.py
+# Purpose:     monthly soil water, carbon and nitrogen steps fused into a single loop, compiled by Numba if available
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   cn_steady_state_kernel and cn_forward_run_kernel take the same arguments and return the same objects as
+#   _cn_steady_state and cn_forward_run. Each timestep of _cn_kernel advances the soil water, the carbon pools and
+#   mineral N in turn; the arithmetic follows get_soil_water, get_rate_temp, _ss_carbon_period, SoilWater.append_vars
+#   and soil_nitrogen step for step. The steady state iterations run carbon only, as in _cn_steady_state, and the
+#   converged period is then rerun by _cn_kernel to record every timestep
+#
+#   the kernels take tuples of floats and float arrays only so that they can be compiled by numba.njit; if Numba is
+#   not installed the same functions run as plain Python and give results identical to the original functions,
+#   but are then 1.5 to 2 times slower than them so the kernel is only worthwhile with Numba. Compiled by Numba 0.68,
+#   ora_benchmark.py --kernel gave steady states about 19 times and forward runs about 13 times faster than the
+#   originals for 100 subplots over 100 years, once compiled functions had been cached
+#   parity of both the plain Python and the compiled kernel is checked by tests/test_cn_kernel.py, the compiled test
+#   is skipped unless Numba is installed
+#   Compiled results may differ in the last bit where exp, atan and pow are taken from a different maths library
+#
+#   as for soil_nitrogen after cn_forward_run, the N model of a forward run is driven by the first timesteps of the
+#   combined steady state and forward records, hence the n_prefix arrays of _cn_kernel
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_cn_kernel.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+from math import exp, atan
+
+import numpy as np
+
+from ora_classes_carbon import CarbonChange, CARBON_VARS, C_N_RAT_OW, PROP_CO2, PROP_BIO, PROP_HUM, C_N_RAT_SOM
+from ora_classes_main import CompiledMngmnt
+from ora_classes_nitrogen import NitrogenChange, NITROGEN_VARS
+from ora_low_level_fns import get_soil_vars, init_ss_carbon_pools
+from ora_nitrogen_fns import get_n_parameters
+from ora_timestep import MONTHLY, NDAYS_MNTH
+from ora_water_model import get_soil_water_constants, SoilWater, SOIL_WATER_VARS
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+NUMBA_FLAG = njit is not None
+MAX_ITERS = 1000
+SOC_MIN_DIFF = 0.0000001  # convergence criteria tonne/hectare
+
+# per timestep drivers, in the order of CompiledMngmnt.get_values_for_tstep, then days per timestep
+# ================================================================================================
+DRIVER_VARS = list(['tair', 'precip', 'pet', 'irrig', 'c_pi_mnth', 'c_n_rat_ow', 'rat_dpm_rpm', 'cow',
+                                                        'rat_dpm_hum_ow', 'prop_iom_ow', 'max_root_dpth', 'ndays'])
+KERNEL_PARMS = list(['t_depth', 't_pH_h2o', 'wc_fld_cap', 'wc_pwp', 'prop_hum', 'prop_bio', 'prop_co2',
+                     'k_dpm', 'k_rpm', 'k_bio', 'k_hum', 'aet_max', 'no3_atmos', 'nh4_atmos', 'k_nitrif',
+                     'min_no3_nh4', 'n_d50', 'n_denit_max', 'c_n_rat_pi', 'nut_n_min', 'nut_n_opt', 'nsteps_grow',
+                                                                                                    'precip_critic'])
+NCARBON = len(CARBON_VARS)
+NWATER = len(SOIL_WATER_VARS)
+NNITROGEN = len(NITROGEN_VARS)
+
+# rows of the carbon and soil water records read by the N model
+# =============================================================
+_RATE_MOD, _CO2_RELEASE, _C_LOSS_BIO = [CARBON_VARS.index(var_name) for var_name in
+                                                                        ['rate_mod', 'co2_release', 'c_loss_bio']]
+_POOL_C_DPM, _PI_TO_DPM, _COW_TO_DPM, _C_LOSS_DPM = [CARBON_VARS.index(var_name) for var_name in
+                                                            ['pool_c_dpm', 'pi_to_dpm', 'cow_to_dpm', 'c_loss_dpm']]
+_POOL_C_RPM, _PI_TO_RPM, _C_LOSS_RPM = [CARBON_VARS.index(var_name) for var_name in
+                                                                            ['pool_c_rpm', 'pi_to_rpm', 'c_loss_rpm']]
+_POOL_C_HUM, _COW_TO_HUM, _C_LOSS_HUM = [CARBON_VARS.index(var_name) for var_name in
+                                                                            ['pool_c_hum', 'cow_to_hum', 'c_loss_hum']]
+_WAT_SOIL, _WC_PWP, _WC_FLD_CAP = [SOIL_WATER_VARS.index(var_name) for var_name in
+                                                                                ['wat_soil', 'wc_pwp', 'wc_fld_cap']]
+
+def _jit(func):
+    '''
+    compile func in nopython mode if Numba is available, otherwise return it unchanged
+    '''
+    if njit is None:
+        return func
+
+    return njit(cache = True)(func)
+
+@_jit
+def _record(store, tstep, vals):
+    '''
+    write a tuple of floats to column tstep of store
+    '''
+    for indx in range(len(vals)):
+        store[indx, tstep] = vals[indx]
+
+@_jit
+def _soil_water_step(tstep, tair, precip, pet, irrig, t_pH_h2o, wc_fld_cap, wc_pwp, wc_t0, wc_t1):
+    '''
+    soil water and rate modifier as for get_soil_water and get_rate_temp
+    '''
+    if tstep == 0:
+        wc_t0 = (wc_fld_cap + wc_pwp)/2     # see Initialisation of soil water in 2.2. Soil water
+        wat_soil = wc_t0
+    elif tstep == 1:
+        wc_t1 = max( wc_pwp, min((wc_t0 + precip - pet + irrig), wc_fld_cap) ) # (eq.2.2.14)
+        wat_soil = wc_t1
+    else:
+        wat_soil = max( wc_pwp, min((wc_t1 + precip - pet + irrig), wc_fld_cap) )  # (eq.2.2.14)
+
+    rate_temp = 47.91/(1.0 + exp(106.06/(tair + 18.27)))    # (eq.2.1.3)
+    rate_moisture = min(1.0, 1.0 - (0.8 * (wc_fld_cap - wat_soil))/(wc_fld_cap - wc_pwp))   # (eq.2.1.4)
+    rate_ph = 0.56+(atan(3.14*0.45*(t_pH_h2o - 5.0)))/3.14    # (eq.2.1.5)
+    rate_salinity = exp(-0.09 * 0.01)    # (eq.2.1.6)
+    rate_mod = rate_temp*rate_moisture*rate_ph*rate_salinity
+
+    return wat_soil, rate_mod, wc_t0, wc_t1
+
+@_jit
+def _carbon_step(pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, c_input_bio, c_input_hum,
+                 c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio, c_pi_mnth, cow, rat_dpm_rpm, rat_dpm_hum_ow,
+                                    prop_iom_ow, rate_mod, k_dpm, k_rpm, k_bio, k_hum, prop_bio, prop_hum, prop_co2):
+    '''
+    advance the carbon pools by one timestep as for _ss_carbon_period and cn_forward_run
+    '''
+    pi_to_dpm = c_pi_mnth * rat_dpm_rpm/(1.0 + rat_dpm_rpm)                       # (eq.2.1.10)
+    cow_to_dpm = cow * rat_dpm_hum_ow * (1.0 - prop_iom_ow)/(1 + rat_dpm_hum_ow)  # (eq.2.1.12)
+    pool_c_dpm += pi_to_dpm + cow_to_dpm - c_loss_dpm
+    pool_c_dpm = max(0.0, pool_c_dpm)
+
+    pi_to_rpm = c_pi_mnth * 1.0 / (1.0 + rat_dpm_rpm)   # (eq.2.1.11)
+    pool_c_rpm += pi_to_rpm - c_loss_rpm
+
+    pool_c_bio += c_input_bio - c_loss_bio
+
+    cow_to_hum = cow * (1 - prop_iom_ow)/(1 + rat_dpm_hum_ow)  # (eq.2.1.13)
+    pool_c_hum += cow_to_hum + c_input_hum - c_loss_hum
+
+    ioc_to_iom = prop_iom_ow*cow    # (eq.2.1.16)
+    pool_c_iom += ioc_to_iom
+
+    c_loss_dpm = pool_c_dpm*(1.0 - exp(-k_dpm*rate_mod))    # (eq.2.1.2)
+    c_loss_rpm = pool_c_rpm*(1.0 - exp(-k_rpm*rate_mod))
+    c_loss_bio = pool_c_bio*(1.0 - exp(-k_bio*rate_mod))
+    c_loss_hum = pool_c_hum*(1.0 - exp(-k_hum*rate_mod))
+    c_loss_total = c_loss_dpm + c_loss_rpm + c_loss_hum + c_loss_bio
+
+    c_input_bio = prop_bio * c_loss_total
+    c_input_hum = prop_hum * c_loss_total
+    co2_release = prop_co2 * c_loss_total
+
+    return pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, c_input_bio, c_input_hum, \
+                c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio, pi_to_dpm, cow_to_dpm, pi_to_rpm, cow_to_hum, \
+                                                                                            ioc_to_iom, co2_release
+
+@_jit
+def _loss_adjustment_ratio(n_start, n_sum_inputs, n_sum_losses):
+    '''
+    as loss_adjustment_ratio (eq.2.4.1)
+    '''
+    if n_sum_losses <= n_start + n_sum_inputs:
+        return 1.0
+
+    return (n_start + n_sum_inputs)/n_sum_losses
+
+@_jit
+def _ss_kernel(drivers, parms, state, pi_tonnes, tot_soc_meas, max_iters, soc_min_diff):
+    '''
+    steady state iterations of _cn_steady_state: carbon pools only, the plant inputs being rescaled after each
+    period by the ratio of measured to simulated SOC
+    returns convergence flag, number of iterations, state at the start of the last period, plant inputs for that
+    period and simulated SOC at its end
+    '''
+    tairs, precips, pets, irrigs, c_pi_mnths, c_n_rat_ows, rat_dpm_rpms, cows, rat_dpm_hum_ows, prop_iom_ows, \
+                                                                            max_root_dpths, ndays = drivers
+    t_depth, t_pH_h2o, wc_fld_cap, wc_pwp, prop_hum, prop_bio, prop_co2, k_dpm, k_rpm, k_bio, k_hum, aet_max, \
+        no3_atmos, nh4_atmos, k_nitrif, min_no3_nh4, n_d50, n_denit_max, c_n_rat_pi, nut_n_min, nut_n_opt, \
+                                                                            nsteps_grow, precip_critic = parms
+    ntsteps = len(pi_tonnes)
+
+    # rate modifiers do not change from one iteration to the next
+    # ============================================================
+    rate_mods = np.empty(ntsteps)
+    wc_t0, wc_t1 = 0.0, 0.0
+    for tstep in range(ntsteps):
+        wat_soil, rate_mod, wc_t0, wc_t1 = _soil_water_step(tstep, tairs[tstep], precips[tstep], pets[tstep],
+                                                    irrigs[tstep], t_pH_h2o, wc_fld_cap, wc_pwp, wc_t0, wc_t1)
+        rate_mods[tstep] = rate_mod
+    tot_soc_simul = state[5]
+    for iteration in range(max_iters):
+        state_start = state
+        pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul, \
+                                c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio = state
+        for tstep in range(ntsteps):
+            pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, c_input_bio, c_input_hum, \
+            c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio, pi_to_dpm, cow_to_dpm, pi_to_rpm, cow_to_hum, \
+            ioc_to_iom, co2_release = _carbon_step(pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom,
+                            c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio,
+                            pi_tonnes[tstep], cows[tstep], rat_dpm_rpms[tstep], rat_dpm_hum_ows[tstep],
+                            prop_iom_ows[tstep], rate_mods[tstep], k_dpm, k_rpm, k_bio, k_hum, prop_bio, prop_hum,
+                                                                                                        prop_co2)
+        tot_soc_simul = pool_c_dpm + pool_c_rpm + pool_c_bio + pool_c_hum + pool_c_iom
+        state = (pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul,
+                                    c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio)
+
+        if abs(tot_soc_meas - tot_soc_simul) < soc_min_diff:
+            return True, iteration + 1, state_start, pi_tonnes, tot_soc_simul
+
+        pi_tonnes = pi_tonnes*(tot_soc_meas/tot_soc_simul)   # (eq.2.1.1)
+
+    return False, max_iters, state, pi_tonnes, tot_soc_simul
+
+@_jit
+def _cn_kernel(drivers, parms, state, wat_drain_prev, imnth_carbon, n_prefix_carbon, n_prefix_water):
+    '''
+    soil water, carbon pools and mineral N for every timestep of a period starting from state, in the order
+    returned by CarbonChange.get_last_tstep_pools
+    the N model of timestep tstep reads column tstep of the n_prefix records, or of this period's records once
+    these are exhausted
+    returns carbon, soil water and nitrogen records, in CARBON_VARS, SOIL_WATER_VARS and NITROGEN_VARS order, and
+    the soil water drainage at the last timestep
+    '''
+    tairs, precips, pets, irrigs, c_pi_mnths, c_n_rat_ows, rat_dpm_rpms, cows, rat_dpm_hum_ows, prop_iom_ows, \
+                                                                            max_root_dpths, ndays = drivers
+    t_depth, t_pH_h2o, wc_fld_cap, wc_pwp, prop_hum, prop_bio, prop_co2, k_dpm, k_rpm, k_bio, k_hum, aet_max, \
+        no3_atmos, nh4_atmos, k_nitrif, min_no3_nh4, n_d50, n_denit_max, c_n_rat_pi, nut_n_min, nut_n_opt, \
+                                                                            nsteps_grow, precip_critic = parms
+    pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul, \
+                                c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio = state
+    ntsteps = len(tairs)
+    nprefix = n_prefix_carbon.shape[1]
+    carbon = np.zeros((NCARBON, ntsteps))
+    water = np.zeros((NWATER, ntsteps))
+    nitrogen = np.zeros((NNITROGEN, ntsteps))
+
+    # constants as supplied by CarbonChange.get_vals_for_tstep, mineral N pools are not yet carried over
+    # =================================================================================================
+    c_n_rat_ow, prop_co2_n, prop_bio_n, prop_hum_n = C_N_RAT_OW, PROP_CO2, PROP_BIO, PROP_HUM
+    c_n_rat_som = float(C_N_RAT_SOM)
+    no3_start, nh4_manure, nh4_start, nh4_fert, no3_fert, wc_start = 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+    c_n_rat_dpm_prev, c_n_rat_rpm_prev = c_n_rat_pi, c_n_rat_pi
+    c_n_rat_hum_prev = 8.5      # (8.5 after Bradbury et al., 1993)
+    dpm_prev, rpm_prev, hum_prev = 0.0, 0.0, 0.0
+
+    wc_t0, wc_t1 = 0.0, 0.0
+    for tstep in range(ntsteps):
+        precip = precips[tstep]
+        pet = pets[tstep]
+        irrig = irrigs[tstep]
+        max_root_dpth = max_root_dpths[tstep]
+
+        # soil water and rate modifier
+        # ============================
+        wat_soil, rate_mod, wc_t0, wc_t1 = _soil_water_step(tstep, tairs[tstep], precip, pet, irrig, t_pH_h2o,
+                                                                            wc_fld_cap, wc_pwp, wc_t0, wc_t1)
+        aet = min(pet, (wat_soil - wc_pwp), aet_max)
+        dpth_soil_root_rat = t_depth/max_root_dpth
+        wat_drain = max((wat_drain_prev + precip + wc_pwp) - pet - (wc_fld_cap*dpth_soil_root_rat), 0.0)
+        wat_drain_prev = wat_drain
+        _record(water, tstep, (wc_pwp, wat_soil, wc_fld_cap, aet, irrig, wat_soil, aet, wat_soil, wat_drain))
+
+        # carbon pools
+        # ============
+        c_pi_mnth = c_pi_mnths[tstep]
+        cow = cows[tstep]
+        pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, c_input_bio, c_input_hum, \
+        c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio, pi_to_dpm, cow_to_dpm, pi_to_rpm, cow_to_hum, \
+        ioc_to_iom, co2_release = _carbon_step(pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom,
+                            c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio, c_pi_mnth,
+                            cow, rat_dpm_rpms[tstep], rat_dpm_hum_ows[tstep], prop_iom_ows[tstep], rate_mod,
+                                                    k_dpm, k_rpm, k_bio, k_hum, prop_bio, prop_hum, prop_co2)
+        _record(carbon, tstep, (imnth_carbon, rate_mod, c_pi_mnth, cow, c_n_rat_ows[tstep],
+                                pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm,
+                                pool_c_rpm, pi_to_rpm, c_loss_rpm,
+                                pool_c_bio, c_input_bio, c_loss_bio,
+                                pool_c_hum, cow_to_hum, c_input_hum, c_loss_hum,
+                                pool_c_iom, ioc_to_iom, tot_soc_simul, co2_release))
+
+        # mineral N, driven by the records of this or the prefix period
+        # ==============================================================
+        if tstep < nprefix:
+            src_carbon, src_water, icol = n_prefix_carbon, n_prefix_water, tstep
+        else:
+            src_carbon, src_water, icol = carbon, water, tstep - nprefix
+
+        if tstep == 0:
+            dpm_prev = src_carbon[_POOL_C_DPM, icol]
+            rpm_prev = src_carbon[_POOL_C_RPM, icol]
+            hum_prev = src_carbon[_POOL_C_HUM, icol]
+
+        n_pi_to_dpm = src_carbon[_PI_TO_DPM, icol]
+        n_cow_to_dpm = src_carbon[_COW_TO_DPM, icol]
+        n_pi_to_rpm = src_carbon[_PI_TO_RPM, icol]
+        n_cow_to_hum = src_carbon[_COW_TO_HUM, icol]
+        n_loss_dpm = src_carbon[_C_LOSS_DPM, icol]
+        n_loss_rpm = src_carbon[_C_LOSS_RPM, icol]
+        n_loss_bio = src_carbon[_C_LOSS_BIO, icol]
+        n_loss_hum = src_carbon[_C_LOSS_HUM, icol]
+        n_wat_soil = src_water[_WAT_SOIL, icol]
+        n_wc_pwp = src_water[_WC_PWP, icol]
+        n_wc_fld_cap = src_water[_WC_FLD_CAP, icol]
+        imnth = tstep % 12 + 1
+
+        # C to N ratios A2a soil N supply
+        # ===============================
+        dpm_inpt = n_pi_to_dpm + n_cow_to_dpm
+        denom = (dpm_prev/c_n_rat_dpm_prev) + (dpm_inpt/c_n_rat_pi) + (n_cow_to_dpm/c_n_rat_ow)
+        c_n_rat_dpm = (dpm_prev + dpm_inpt)/denom                                                       # (eq.3.3.10)
+        c_n_rat_rpm = (rpm_prev + n_pi_to_rpm)/((rpm_prev/c_n_rat_rpm_prev) + (n_pi_to_rpm/c_n_rat_pi)) # (eq.3.3.11)
+        c_n_rat_hum = (hum_prev + n_cow_to_hum)/((hum_prev/c_n_rat_hum_prev) + (n_cow_to_hum/c_n_rat_ow)) # (eq.3.3.12)
+        c_n_rat_dpm_prev = c_n_rat_dpm
+        c_n_rat_rpm_prev = c_n_rat_rpm
+        c_n_rat_hum_prev = c_n_rat_hum
+
+        # (eq.3.3.8) and (eq.3.3.9)
+        # =========================
+        n_release = prop_co2_n* 1000 * ((n_loss_dpm/c_n_rat_dpm) + n_loss_rpm/c_n_rat_rpm +
+                                                                            (n_loss_bio + n_loss_hum)/c_n_rat_som)
+        n_adjust = prop_bio_n*(n_loss_dpm*(1/c_n_rat_som - 1/c_n_rat_dpm) +
+                                                                n_loss_rpm*(1/c_n_rat_som - 1/c_n_rat_rpm)) \
+            + prop_hum_n*(n_loss_dpm*(1/c_n_rat_hum - 1/c_n_rat_dpm) + n_loss_rpm*(1/c_n_rat_hum - 1/c_n_rat_rpm))
+        nut_n_soil = n_release - 1000 * n_adjust    # soil N supply (kg ha-1)
+        prop_n_opt = (nut_n_soil - nut_n_min)/(nut_n_opt - nut_n_min)  # (eq.3.3.1)
+
+        # Ammonium N (kg/ha) NB required before nitrate due to nitrification
+        # ==================================================================
+        nh4_miner = max(nut_n_soil, 0.0)                            # (eq.2.4.21)
+        nh4_immob = min(max( - nut_n_soil, 0.0), min_no3_nh4)       # (eq.2.4.22)
+        nh4_total_inp = nh4_fert + nh4_miner + nh4_atmos
+        nh4_nitrif = min(nh4_start * (1 - exp(-k_nitrif*src_carbon[_RATE_MOD, icol])), nh4_total_inp)  # (eq.2.4.23)
+
+        # Nitrate N (kg/ha)
+        # =================
+        no3_nitrif = nh4_nitrif
+        no3_total_inp = no3_atmos + no3_fert + no3_nitrif
+        no3_avail = no3_start + no3_total_inp
+        nh4_avail = nh4_start + nh4_total_inp
+        n_crop = prop_n_opt*nut_n_opt/nsteps_grow                   # (eq.2.4.17)
+        no3_cropup = n_crop*(no3_avail/(no3_avail + nh4_avail))     # (eq.2.4.18)
+
+        no3_immob = min(max( - (nut_n_soil - nh4_immob), 0.0), min_no3_nh4)   # (eq.2.4.5)
+        no3_wat_drain = max((precip - pet) - (n_wc_fld_cap - wc_start), 0.0)     # (eq.2.4.7)
+        no3_leach = ((no3_start + no3_total_inp - min_no3_nh4)/(wc_start + precip - pet))*no3_wat_drain  # (eq.2.4.6)
+
+        # denitrification
+        # ===============
+        n_denit_max = min(no3_avail, n_denit_max * t_depth * ndays[tstep])     # (eq.2.4.9)
+        rate_denit_no3 = no3_avail/(n_d50 * t_depth + no3_avail)        # (eq.2.4.10)
+        sigma_c = n_wat_soil - n_wc_pwp
+        sigma_f = n_wc_fld_cap - n_wc_pwp
+        prop_n2_wat = 0.5*(sigma_c/sigma_f)                             # (eq.2.4.14)
+        prop_n2_no3 = 1 - no3_avail/(40*t_depth + no3_avail)            # (eq.2.4.15)
+        rate_denit_moist = min(1.0, ((abs((sigma_c/sigma_f) - 0.62))/0.38)**1.74)    # (eq.2.4.11)
+        rate_denit_bio = min(1.0, src_carbon[_CO2_RELEASE, icol] * 0.1)     # (eq.2.4.12)
+        no3_denitr = n_denit_max * rate_denit_no3 * rate_denit_moist * rate_denit_bio   # (eq.2.4.8)
+
+        no3_total_loss = no3_immob + no3_leach + no3_denitr + no3_cropup
+        loss_adj_rat_no3 = _loss_adjustment_ratio(no3_start, no3_total_inp, no3_total_loss)
+        no3_loss_adjust = loss_adj_rat_no3 * no3_total_loss
+
+        # back to Ammonium N
+        # ==================
+        if precip < precip_critic:
+            nh4_volat = 0.15*(nh4_manure + nh4_fert)    # (eq.2.4.25)
+        else:
+            nh4_volat = 0.0
+        nh4_cropup = n_crop * (nh4_avail/(no3_avail + nh4_avail))   # (eq.2.4.26)
+        nh4_total_loss = nh4_immob + nh4_nitrif + nh4_volat + nh4_cropup
+        nh4_loss_adjust = _loss_adjustment_ratio(nh4_start, nh4_total_inp, nh4_total_loss)
+        nh4_end = nh4_start + nh4_total_inp - nh4_total_loss * nh4_loss_adjust
+
+        n2o_release = (1.0 - (prop_n2_wat * prop_n2_no3)) * (no3_denitr * loss_adj_rat_no3)  # (eq.2.4.13)
+        no3_leach_adjust = no3_leach*no3_loss_adjust
+        nh4_volat_adj = nh4_volat*no3_loss_adjust
+        no3_end = no3_start + no3_total_inp - no3_loss_adjust
+
+        _record(nitrogen, tstep, (float(imnth), float(tstep), n_wat_soil, no3_start, no3_atmos, no3_fert, no3_nitrif,
+                    no3_total_inp, no3_immob, no3_leach, no3_leach_adjust, no3_denitr, no3_cropup, no3_total_loss,
+                    no3_loss_adjust, loss_adj_rat_no3, no3_end, n2o_release, nh4_start, nh4_atmos, nh4_fert,
+                    nh4_miner, nh4_total_inp, nh4_immob, nh4_nitrif, nh4_volat, nh4_volat_adj, nh4_cropup,
+                                                                        nh4_total_loss, nh4_loss_adjust, nh4_end))
+
+    return carbon, water, nitrogen, wat_drain_prev
+
+def _kernel_drivers(compiled, pi_tonnes):
+    '''
+    tuple of DRIVER_VARS arrays of shape (ntsteps,)
+    '''
+    ntsteps = compiled.ntsteps
+    arrays = {var_name: getattr(compiled, var_name) for var_name in DRIVER_VARS[:4] + DRIVER_VARS[5:-1]}
+    arrays['c_pi_mnth'] = np.array(pi_tonnes[:ntsteps], dtype = float)
+    arrays['ndays'] = np.array([NDAYS_MNTH[tstep % 12] for tstep in range(ntsteps)], dtype = float)
+
+    return tuple(np.ascontiguousarray(arrays[var_name], dtype = float) for var_name in DRIVER_VARS)
+
+def _kernel_parms(parameters, management, soil_vars):
+    '''
+    tuple of KERNEL_PARMS values, the crop N parameters are those of the first crop as in soil_nitrogen
+    '''
+    t_depth, t_bulk, t_pH_h2o, tot_soc_meas, prop_hum, prop_bio, prop_co2 = get_soil_vars(soil_vars)
+    wc_fld_cap, wc_pwp = get_soil_water_constants(soil_vars)
+    no3_atmos, nh4_atmos, k_nitrif, min_no3_nh4, n_d50, n_denit_max = \
+                                                    get_n_parameters(parameters.n_parms, MONTHLY.nsteps_yr)
+    crop_vars = parameters.crop_vars[management.crop_currs[0]]
+
+    parms = (t_depth, t_pH_h2o, wc_fld_cap, wc_pwp, prop_hum, prop_bio, prop_co2) + MONTHLY.rate_constants() + \
+            (MONTHLY.aet_max(), no3_atmos, nh4_atmos, k_nitrif/MONTHLY.steps_per_mnth, min_no3_nh4, n_d50,
+             n_denit_max, crop_vars['c_n_rat_pi'], crop_vars['n_supply_min'], crop_vars['n_supply_opt'],
+             crop_vars['nmnths_grow']*MONTHLY.steps_per_mnth, MONTHLY.precip_critic)
+
+    return tuple(float(val) for val in parms)
+
+def cn_steady_state_kernel(parameters, weather, management, soil_vars, study, subplot):
+    '''
+    equivalent of _cn_steady_state, study.ss_solver determines how the pools and plant inputs are initialised
+    returns steady_state tuple of carbon, nitrogen and soil water objects, or None if SOC failed to converge
+    '''
+    from ora_high_level_fns import _ss_period_drivers, _analytic_steady_state
+
+    pettmp = weather.pettmp_ss
+    t_depth, t_bulk, t_pH_h2o, tot_soc_meas, prop_hum, prop_bio, prop_co2 = get_soil_vars(soil_vars)
+    pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul = init_ss_carbon_pools(tot_soc_meas)
+    c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio = 6*[0]
+
+    analytic_flag = study.ss_solver == 'analytic'
+    compiled = CompiledMngmnt(pettmp, management, parameters, soil_vars if analytic_flag else None)
+    parms = _kernel_parms(parameters, management, soil_vars)
+    k_dpm, k_rpm, k_bio, k_hum = MONTHLY.rate_constants()
+
+    iters_estim = None
+    if analytic_flag:
+        period_drivers = _ss_period_drivers(compiled, management.pi_tonnes)
+        init_pools = [pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum]
+        equilib = _analytic_steady_state(period_drivers, pool_c_iom, tot_soc_meas, prop_bio, prop_hum, init_pools)
+        if equilib is not None:
+            pools, pool_c_iom, pi_scale, iters_estim = equilib
+            pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum = pools
+            management.pi_tonnes = [val*pi_scale for val in management.pi_tonnes]
+
+            # losses carried over from the last timestep of the previous period
+            # =================================================================
+            rate_mod = period_drivers[-1][0]
+            c_loss_dpm = pool_c_dpm*(1.0 - exp(-k_dpm*rate_mod))
+            c_loss_rpm = pool_c_rpm*(1.0 - exp(-k_rpm*rate_mod))
+            c_loss_bio = pool_c_bio*(1.0 - exp(-k_bio*rate_mod))
+            c_loss_hum = pool_c_hum*(1.0 - exp(-k_hum*rate_mod))
+            c_loss_total = c_loss_dpm + c_loss_rpm + c_loss_hum + c_loss_bio
+            c_input_bio = prop_bio * c_loss_total
+            c_input_hum = prop_hum * c_loss_total
+            tot_soc_simul = pool_c_dpm + pool_c_rpm + pool_c_bio + pool_c_hum + pool_c_iom
+
+    state = tuple(float(val) for val in (pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul,
+                                    c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio))
+    drivers = _kernel_drivers(compiled, management.pi_tonnes)
+    converge_flag, niters, state_start, pi_tonnes, tot_soc_simul = _ss_kernel(drivers, parms, state, drivers[4],
+                                                            float(tot_soc_meas), MAX_ITERS, SOC_MIN_DIFF)
+    management.pi_tonnes = pi_tonnes.tolist()
+    if not converge_flag:
+        print('Simulated SOC: {}\tMeasured SOC: {}\t *** failed to converge *** after iterations: {}'
+              .format(round(tot_soc_simul, 3), tot_soc_meas, niters))
+        return None
+
+    print('Simulated and Measured SOC: {}\t*** converged *** after {} iterations'
+                                                                    .format(round(tot_soc_simul, 3), niters))
+    if iters_estim is not None:
+        print('Analytic steady state solver saved {} of an estimated {} iterations'
+                                                                    .format(iters_estim - niters, iters_estim))
+
+    # repeat the final iteration recording each timestep
+    # ==================================================
+    drivers = drivers[:4] + (pi_tonnes,) + drivers[5:]
+    no_prefix = np.zeros((NCARBON, 0)), np.zeros((NWATER, 0))
+    carbon, water, nitrogen, wat_drain_prev = _cn_kernel(drivers, parms, state_start, 0.0, 0.0, *no_prefix)
+
+    return _kernel_objects(CarbonChange('steady state', compiled.ntsteps), SoilWater(compiled.ntsteps),
+                                                                        carbon, water, nitrogen, wat_drain_prev)
+
+def cn_forward_run_kernel(parameters, weather, management, soil_vars, steady_state):
+    '''
+    equivalent of cn_forward_run, the forward run is appended to the steady state carbon and soil water objects
+    '''
+    pettmp = weather.pettmp_fwd
+    carbon_change, nitrogen_change, soil_water = steady_state
+    state = tuple(float(val) for val in carbon_change.get_last_tstep_pools())
+
+    compiled = CompiledMngmnt(pettmp, management, parameters)
+    drivers = _kernel_drivers(compiled, management.pi_tonnes)
+    parms = _kernel_parms(parameters, management, soil_vars)
+
+    nprefix = min(carbon_change.nrecs, compiled.ntsteps)
+    n_prefix_carbon = np.ascontiguousarray(carbon_change.store[:, :nprefix])
+    n_prefix_water = np.ascontiguousarray(soil_water.store[:, :nprefix])
+    carbon, water, nitrogen, wat_drain_prev = _cn_kernel(drivers, parms, state, float(soil_water.wat_drain_prev),
+                                                                        1.0, n_prefix_carbon, n_prefix_water)
+
+    return _kernel_objects(carbon_change, soil_water, carbon, water, nitrogen, wat_drain_prev)
+
+def _kernel_objects(carbon_change, soil_water, carbon, water, nitrogen, wat_drain_prev):
+    '''
+    append kernel records to the carbon and soil water objects and return them with a new NitrogenChange
+    '''
+    ntsteps = carbon.shape[1]
+    carbon_change.extend_vars(dict(zip(CARBON_VARS, carbon)))
+    soil_water.extend_vars(dict(zip(SOIL_WATER_VARS, water)))
+    soil_water.wat_drain_prev = float(wat_drain_prev)
+    nitrogen_change = NitrogenChange(ntsteps)
+    nitrogen_change.extend_vars(dict(zip(NITROGEN_VARS, nitrogen)))
+
+    return (carbon_change, nitrogen_change, soil_water)
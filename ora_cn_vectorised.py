@@ -0,0 +1,686 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_cn_vectorised.py
+# Purpose:     carbon pools for many subplots advanced together using NumPy arrays
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   all subplots must have the same number of timesteps. Soil variables are held as arrays of shape (nsubplots,) and
+#   drivers (rate modifiers, plant and organic waste inputs) as arrays of shape (nsubplots, ntsteps) so that each
+#   timestep advances every subplot with a single set of NumPy operations. Weather is either shared by all subplots,
+#   lists of shape (ntsteps,), or given for each subplot e.g. grid cells as arrays of shape (nsubplots, ntsteps)
+#
+#   the arithmetic follows _cn_steady_state and cn_forward_run step for step, results are returned as
+#   CarbonChange objects so that soil_nitrogen and the Excel output functions can be used unchanged
+#
+#   the decomposition rate constants are taken from a TimeStep, see ora_timestep, monthly by default
+#
+#   nitrogen_batch follows soil_nitrogen likewise; only the C:N ratios of the DPM, RPM and HUM pools and the maximum
+#   rate of denitrification carry over from one timestep to the next so every other term is a whole array operation
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_cn_vectorised.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import numpy as np
+
+from ora_classes_carbon import CarbonChange, CARBON_VARS, C_N_RAT_OW, PROP_CO2, PROP_BIO, PROP_HUM, C_N_RAT_SOM
+from ora_classes_main import CompiledMngmnt
+from ora_classes_nitrogen import NITROGEN_VARS
+from ora_low_level_fns import get_soil_vars
+from ora_nitrogen_fns import get_n_parameters
+from ora_nitrogen_model import soil_nitrogen
+from ora_timestep import MONTHLY, NDAYS_MNTH
+from ora_water_model import get_soil_water_constants, SoilWater
+from thornthwaite import thornthwaite_matrix
+
+MAX_ITERS = 1000
+SOC_MIN_DIFF = 0.0000001  # convergence criteria tonne/hectare
+
+STATE_VARS = list(['pool_c_dpm', 'pool_c_rpm', 'pool_c_bio', 'pool_c_hum', 'pool_c_iom',
+                   'c_input_bio', 'c_input_hum', 'c_loss_dpm', 'c_loss_rpm', 'c_loss_hum', 'c_loss_bio'])
+
+def pettmp_batch(precip, tair, latitudes):
+    '''
+    precip, tair and Thornthwaite PET of shape (nsubplots, nmnths) for whole years, see add_pet_to_weather
+    '''
+    nyears = int(precip.shape[1]/12)
+    nmnths = nyears*12
+    pet = np.empty((len(latitudes), nmnths))
+    for isub, latitude in enumerate(latitudes.tolist()):
+        pet[isub] = thornthwaite_matrix(tair[isub, :nmnths].reshape(nyears, 12), latitude, range(nyears)).ravel()
+
+    return {'precip': precip[:, :nmnths], 'tair': tair[:, :nmnths], 'pet': pet}
+
+def get_soil_arrays(soil_list):
+    '''
+    soil variables and water constants for each subplot
+    '''
+    soil_arrs = {}
+    for var_name in ['t_depth', 't_bulk', 't_pH_h2o', 'tot_soc_meas', 'prop_hum', 'prop_bio', 'prop_co2',
+                                                                                        'wc_fld_cap', 'wc_pwp']:
+        soil_arrs[var_name] = []
+
+    for soil_vars in soil_list:
+        t_depth, t_bulk, t_pH_h2o, tot_soc_meas, prop_hum, prop_bio, prop_co2 = get_soil_vars(soil_vars)
+        wc_fld_cap, wc_pwp = get_soil_water_constants(soil_vars)
+        for var_name, val in zip(soil_arrs, [t_depth, t_bulk, t_pH_h2o, tot_soc_meas, prop_hum, prop_bio, prop_co2,
+                                                                                                wc_fld_cap, wc_pwp]):
+            soil_arrs[var_name].append(val)
+
+    for var_name in soil_arrs:
+        soil_arrs[var_name] = np.array(soil_arrs[var_name], dtype=float)
+
+    return soil_arrs
+
+def get_mngmnt_arrays(pettmp, mngmnt_list, parameters):
+    '''
+    per timestep management and organic waste values for each subplot, see CompiledMngmnt
+    returns None if the subplots do not all have the same number of timesteps
+    '''
+    ntsteps = mngmnt_list[0].ntsteps
+    for management in mngmnt_list:
+        if management.ntsteps != ntsteps:
+            print('*** Error *** subplots must have the same number of timesteps, found {} and {}'
+                                                                            .format(ntsteps, management.ntsteps))
+            return None
+
+    nsubplots = len(mngmnt_list)
+    mngmnt_arrs = {}
+    for var_name in ['irrig', 'c_pi_mnth', 'rat_dpm_rpm', 'max_root_dpth', 'cow', 'c_n_rat_ow', 'rat_dpm_hum_ow',
+                                                                                                    'prop_iom_ow']:
+        mngmnt_arrs[var_name] = np.zeros((nsubplots, ntsteps))
+
+    for isub, management in enumerate(mngmnt_list):
+        mngmnt_arrs['c_pi_mnth'][isub] = management.pi_tonnes[:ntsteps]
+
+        compiled = CompiledMngmnt(pettmp, management, parameters)
+        for var_name in ['irrig', 'rat_dpm_rpm', 'max_root_dpth', 'cow', 'c_n_rat_ow', 'rat_dpm_hum_ow',
+                                                                                                    'prop_iom_ow']:
+            mngmnt_arrs[var_name][isub] = getattr(compiled, var_name)
+
+    return mngmnt_arrs
+
+def get_rate_mods(pettmp, irrig, soil_arrs):
+    '''
+    soil water and rate modifiers for each subplot, see get_soil_water and get_rate_temp
+    weather has shape (ntsteps,) if shared by all subplots or (nsubplots, ntsteps), irrigation has shape
+    (nsubplots, ntsteps)
+    '''
+    ntsteps = irrig.shape[1]
+    tair = np.atleast_2d(np.asarray(pettmp['tair'], dtype=float)[..., :ntsteps])
+    precip = np.atleast_2d(np.asarray(pettmp['precip'], dtype=float)[..., :ntsteps])
+    pet = np.atleast_2d(np.asarray(pettmp['pet'], dtype=float)[..., :ntsteps])
+
+    wc_fld_cap = soil_arrs['wc_fld_cap'][:, np.newaxis]
+    wc_pwp = soil_arrs['wc_pwp'][:, np.newaxis]
+
+    # initialisation of soil water then (eq.2.2.14) relative to the first timestep
+    # ============================================================================
+    wat_soil = np.empty(irrig.shape)
+    wc_t0 = (wc_fld_cap + wc_pwp)/2
+    wat_soil[:, :1] = wc_t0
+    wc_t1 = np.maximum(wc_pwp, np.minimum((wc_t0 + precip[:, 1:2] - pet[:, 1:2] + irrig[:, 1:2]), wc_fld_cap))
+    wat_soil[:, 1:2] = wc_t1
+    wat_soil[:, 2:] = np.maximum(wc_pwp, np.minimum((wc_t1 + precip[:, 2:] - pet[:, 2:] + irrig[:, 2:]), wc_fld_cap))
+
+    rate_temp = 47.91/(1.0 + np.exp(106.06/(tair + 18.27)))    # (eq.2.1.3)
+    rate_moisture = np.minimum(1.0, 1.0 - (0.8 * (wc_fld_cap - wat_soil))/(wc_fld_cap - wc_pwp))   # (eq.2.1.4)
+    rate_ph = 0.56 + (np.arctan(3.14*0.45*(soil_arrs['t_pH_h2o'][:, np.newaxis] - 5.0)))/3.14    # (eq.2.1.5)
+    salinity = 0.01
+    rate_salinity = np.exp(-0.09 * salinity)    # (eq.2.1.6)
+
+    rate_mod = rate_temp*rate_moisture*rate_ph*rate_salinity
+
+    return rate_mod, wat_soil
+
+class CarbonDrivers(object, ):
+    '''
+    per timestep drivers of the carbon pools for a batch of subplots
+    '''
+    def __init__(self, pettmp, mngmnt_list, parameters, soil_list, timestep = None, mngmnt_arrs = None):
+        """
+        plant inputs are held separately as they are rescaled during the steady state
+        mngmnt_arrs, as returned by get_mngmnt_arrays, may be supplied e.g. when expanded to daily timesteps
+        """
+        if timestep is None:
+            timestep = MONTHLY
+        self.timestep = timestep
+
+        self.soil_arrs = get_soil_arrays(soil_list)
+        if mngmnt_arrs is None:
+            mngmnt_arrs = get_mngmnt_arrays(pettmp, mngmnt_list, parameters)
+        if mngmnt_arrs is None:
+            self.ntsteps = None
+            return
+
+        self.mngmnt_arrs = mngmnt_arrs
+        self.nsubplots, self.ntsteps = mngmnt_arrs['cow'].shape
+        self.rate_mod, self.wat_soil = get_rate_mods(pettmp, mngmnt_arrs['irrig'], self.soil_arrs)
+
+        # decomposition fractions, see carbon_lost_from_pool
+        # ==================================================
+        k_dpm, k_rpm, k_bio, k_hum = timestep.rate_constants()
+        self.frac_dpm = 1.0 - np.exp(-k_dpm*self.rate_mod)
+        self.frac_rpm = 1.0 - np.exp(-k_rpm*self.rate_mod)
+        self.frac_bio = 1.0 - np.exp(-k_bio*self.rate_mod)
+        self.frac_hum = 1.0 - np.exp(-k_hum*self.rate_mod)
+
+        rat_dpm_hum_ow = mngmnt_arrs['rat_dpm_hum_ow']
+        prop_iom_ow = mngmnt_arrs['prop_iom_ow']
+        cow = mngmnt_arrs['cow']
+        self.cow_to_dpm = cow * rat_dpm_hum_ow * (1.0 - prop_iom_ow)/(1 + rat_dpm_hum_ow)  # (eq.2.1.12)
+        self.cow_to_hum = cow * (1 - prop_iom_ow)/(1 + rat_dpm_hum_ow)                     # (eq.2.1.13)
+        self.ioc_to_iom = prop_iom_ow*cow                                                  # (eq.2.1.16)
+
+    def plant_inputs(self, c_pi_mnth):
+        '''
+        split plant inputs between the DPM and RPM pools (eq.2.1.10) and (eq.2.1.11)
+        '''
+        rat_dpm_rpm = self.mngmnt_arrs['rat_dpm_rpm']
+        pi_to_dpm = c_pi_mnth * rat_dpm_rpm/(1.0 + rat_dpm_rpm)
+        pi_to_rpm = c_pi_mnth * 1.0 / (1.0 + rat_dpm_rpm)
+
+        return pi_to_dpm, pi_to_rpm
+
+def new_history(shape):
+    '''
+    arrays of CARBON_VARS of the given shape e.g. (nsubplots, ntsteps) to be filled by advance_carbon_pools
+    '''
+    history = {}
+    for var_name in CARBON_VARS:
+        history[var_name] = np.zeros(shape)
+
+    return history
+
+def advance_carbon_pools(drivers, state, c_pi_mnth, prop_bio, prop_hum, prop_co2, history = None,
+                                                                            tot_soc_simul = None, imnth = 0):
+    '''
+    advance the pools of all subplots through every timestep
+    state is a dictionary of STATE_VARS, each an array of shape (nsubplots,) or any shape which broadcasts against
+    it e.g. (nbasis, nsubplots); plant inputs are broadcast similarly against (nsubplots, ntsteps)
+    if history is supplied then every timestep is recorded in it: only the pools are kept during the loop, the
+    losses and inputs which follow from them are recovered afterwards with whole array operations
+    '''
+    pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, c_input_bio, c_input_hum, \
+                                        c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio = [state[var] for var in STATE_VARS]
+
+    pi_to_dpm_all, pi_to_rpm_all = drivers.plant_inputs(c_pi_mnth)
+
+    # columns of the drivers are taken once, the loop then only indexes lists
+    # =======================================================================
+    frac_dpm, frac_rpm, frac_bio, frac_hum = [list(frac.T) for frac in (drivers.frac_dpm, drivers.frac_rpm,
+                                                                                drivers.frac_bio, drivers.frac_hum)]
+    cow_to_dpm_all, cow_to_hum_all, ioc_to_iom_all = [list(arr.T) for arr in (drivers.cow_to_dpm,
+                                                                            drivers.cow_to_hum, drivers.ioc_to_iom)]
+    pi_to_dpm_all = list(np.moveaxis(pi_to_dpm_all, -1, 0))
+    pi_to_rpm_all = list(np.moveaxis(pi_to_rpm_all, -1, 0))
+
+    if history is not None:
+        pools_hist = np.zeros((5,) + history['pool_c_dpm'].shape)
+
+    for tstep in range(drivers.ntsteps):
+        pool_c_dpm = np.maximum(0, pool_c_dpm + (pi_to_dpm_all[tstep] + cow_to_dpm_all[tstep] - c_loss_dpm))
+        pool_c_rpm = pool_c_rpm + (pi_to_rpm_all[tstep] - c_loss_rpm)
+        pool_c_bio = pool_c_bio + (c_input_bio - c_loss_bio)
+        pool_c_hum = pool_c_hum + (cow_to_hum_all[tstep] + c_input_hum - c_loss_hum)
+        pool_c_iom = pool_c_iom + ioc_to_iom_all[tstep]
+
+        # carbon losses
+        # =============
+        c_loss_dpm = pool_c_dpm*frac_dpm[tstep]
+        c_loss_rpm = pool_c_rpm*frac_rpm[tstep]
+        c_loss_bio = pool_c_bio*frac_bio[tstep]
+        c_loss_hum = pool_c_hum*frac_hum[tstep]
+        c_loss_total = c_loss_dpm + c_loss_rpm + c_loss_hum + c_loss_bio
+
+        c_input_bio = prop_bio * c_loss_total
+        c_input_hum = prop_hum * c_loss_total
+
+        if history is not None:
+            pools_hist[0, ..., tstep] = pool_c_dpm
+            pools_hist[1, ..., tstep] = pool_c_rpm
+            pools_hist[2, ..., tstep] = pool_c_bio
+            pools_hist[3, ..., tstep] = pool_c_hum
+            pools_hist[4, ..., tstep] = pool_c_iom
+
+    if history is not None:
+        _fill_history(history, drivers, pools_hist, c_pi_mnth, prop_bio, prop_hum, prop_co2, tot_soc_simul, imnth)
+
+    return dict(zip(STATE_VARS, [pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, c_input_bio,
+                                    c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio]))
+
+def _fill_history(history, drivers, pools_hist, c_pi_mnth, prop_bio, prop_hum, prop_co2, tot_soc_simul, imnth):
+    '''
+    record every timestep of a period from the pools at the end of each timestep
+    the arithmetic is that of advance_carbon_pools so the values are identical to those computed in the loop
+    '''
+    pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom = pools_hist
+    pi_to_dpm, pi_to_rpm = drivers.plant_inputs(c_pi_mnth)
+
+    c_loss_dpm = pool_c_dpm*drivers.frac_dpm
+    c_loss_rpm = pool_c_rpm*drivers.frac_rpm
+    c_loss_bio = pool_c_bio*drivers.frac_bio
+    c_loss_hum = pool_c_hum*drivers.frac_hum
+    c_loss_total = c_loss_dpm + c_loss_rpm + c_loss_hum + c_loss_bio
+
+    prop_bio, prop_hum, prop_co2 = [np.asarray(prop)[..., np.newaxis] for prop in (prop_bio, prop_hum, prop_co2)]
+    if tot_soc_simul is not None:
+        tot_soc_simul = np.asarray(tot_soc_simul)[..., np.newaxis]
+
+    step_vals = {'month': imnth, 'rate_mod': drivers.rate_mod, 'c_pi_mnth': c_pi_mnth,
+                 'cow': drivers.mngmnt_arrs['cow'], 'c_n_rat_ow': drivers.mngmnt_arrs['c_n_rat_ow'],
+                 'pool_c_dpm': pool_c_dpm, 'pi_to_dpm': pi_to_dpm, 'cow_to_dpm': drivers.cow_to_dpm,
+                 'c_loss_dpm': c_loss_dpm, 'pool_c_rpm': pool_c_rpm, 'pi_to_rpm': pi_to_rpm,
+                 'c_loss_rpm': c_loss_rpm, 'pool_c_bio': pool_c_bio, 'c_input_bio': prop_bio * c_loss_total,
+                 'c_loss_bio': c_loss_bio, 'pool_c_hum': pool_c_hum, 'cow_to_hum': drivers.cow_to_hum,
+                 'c_input_hum': prop_hum * c_loss_total, 'c_loss_hum': c_loss_hum, 'pool_c_iom': pool_c_iom,
+                 'ioc_to_iom': drivers.ioc_to_iom, 'tot_soc_simul': tot_soc_simul,
+                 'co2_release': prop_co2 * c_loss_total}
+    for var_name in history:
+        history[var_name][...] = step_vals[var_name]
+
+    return history
+
+def losses_from_pools(drivers, state, prop_bio, prop_hum):
+    '''
+    losses carried over from the last timestep of a period
+    '''
+    rate_indx = drivers.ntsteps - 1
+    state['c_loss_dpm'] = state['pool_c_dpm']*drivers.frac_dpm[:, rate_indx]
+    state['c_loss_rpm'] = state['pool_c_rpm']*drivers.frac_rpm[:, rate_indx]
+    state['c_loss_bio'] = state['pool_c_bio']*drivers.frac_bio[:, rate_indx]
+    state['c_loss_hum'] = state['pool_c_hum']*drivers.frac_hum[:, rate_indx]
+    c_loss_total = state['c_loss_dpm'] + state['c_loss_rpm'] + state['c_loss_hum'] + state['c_loss_bio']
+    state['c_input_bio'] = prop_bio * c_loss_total
+    state['c_input_hum'] = prop_hum * c_loss_total
+
+    return state
+
+def _analytic_pools(drivers, c_pi_mnth, soil_arrs, pool_c_iom):
+    '''
+    pools at the start of the converged period of the iterative spin-up for every subplot, replayed on the affine
+    period map - see _analytic_steady_state
+    returns the pools, IOM and plant input scalings, all NaN for any subplot which does not converge or which
+    converges in the first iteration
+    '''
+    prop_bio = soil_arrs['prop_bio']
+    prop_hum = soil_arrs['prop_hum']
+    tot_soc_meas = soil_arrs['tot_soc_meas']
+    nsubplots = drivers.nsubplots
+
+    # basis 0 gives V, basis 1 gives U + V, bases 2 to 5 give the columns of M plus V and basis 6 is the first
+    # period of the spin-up which starts from the initial pools with no losses carried over
+    # ========================================================================================================
+    nbasis = 7
+    state = {}
+    for var_name in STATE_VARS:
+        state[var_name] = np.zeros((nbasis, nsubplots))
+    for ipool, var_name in enumerate(STATE_VARS[:4]):
+        state[var_name][ipool + 2] = 1.0
+    state = losses_from_pools(drivers, state, prop_bio, prop_hum)
+    for var_name in STATE_VARS[:4]:
+        state[var_name][6] = 1.0
+
+    pi_scale = np.zeros((nbasis, 1, 1))
+    pi_scale[1] = 1.0
+    pi_scale[6] = 1.0
+    end_state = advance_carbon_pools(drivers, state, pi_scale*c_pi_mnth, prop_bio, prop_hum, soil_arrs['prop_co2'])
+
+    pools_end = np.stack([end_state[var_name] for var_name in STATE_VARS[:4]], axis=-1)   # (nbasis, nsubplots, 4)
+    vec_v = pools_end[0]
+    vec_u = pools_end[1] - vec_v
+    mat_m = np.transpose(pools_end[2:6] - vec_v, (1, 2, 0))     # (nsubplots, 4, 4) columns are basis responses
+
+    # replay the spin-up, as in carbon_steady_state_batch each subplot stops when its own SOC has converged
+    # ======================================================================================================
+    ioc_period = drivers.ioc_to_iom.sum(axis=1)
+    pools_iter = pools_end[6]
+    pools_start = np.full((nsubplots, 4), np.nan)
+    iom_start = np.full(nsubplots, np.nan)
+    scale_iter = np.ones(nsubplots)
+    active = np.ones(nsubplots, dtype=bool)
+    for iteration in range(MAX_ITERS):
+        pool_c_iom = pool_c_iom + ioc_period
+        tot_soc_simul = pools_iter.sum(axis=1) + pool_c_iom
+        active &= ~(np.abs(tot_soc_meas - tot_soc_simul) < SOC_MIN_DIFF)
+        if not active.any():
+            break
+        pools_start[active] = pools_iter[active]
+        iom_start[active] = pool_c_iom[active]
+        scale_iter[active] *= tot_soc_meas[active]/tot_soc_simul[active]
+        pools_next = np.einsum('nij,nj->ni', mat_m, pools_iter) + scale_iter[:, np.newaxis]*vec_u + vec_v
+        pools_iter = np.where(active[:, np.newaxis], pools_next, pools_iter)
+
+    invalid = active | np.isnan(iom_start)
+    pools_start[invalid] = np.nan
+    iom_start[invalid] = np.nan
+    scale_iter[invalid] = np.nan
+
+    return pools_start, iom_start, scale_iter
+
+def carbon_steady_state_batch(drivers, c_pi_mnth, ss_solver = 'iterative'):
+    '''
+    steady state for all subplots, see _cn_steady_state
+    each subplot iterates until its own simulated SOC matches the measured SOC, its history and plant inputs
+    are taken from that iteration
+    returns history, a dictionary of arrays of shape (nsubplots, ntsteps), the adjusted plant inputs and a boolean
+    array flagging the subplots which converged
+    '''
+    soil_arrs = drivers.soil_arrs
+    prop_bio = soil_arrs['prop_bio']
+    prop_hum = soil_arrs['prop_hum']
+    prop_co2 = soil_arrs['prop_co2']
+    tot_soc_meas = soil_arrs['tot_soc_meas']
+    nsubplots, ntsteps = drivers.nsubplots, drivers.ntsteps
+
+    # initialise carbon pools - see init_ss_carbon_pools
+    # ==================================================
+    state = {}
+    for var_name in STATE_VARS:
+        state[var_name] = np.zeros(nsubplots)
+    for var_name in STATE_VARS[:4]:
+        state[var_name][:] = 1
+    state['pool_c_iom'] = 0.049 * (tot_soc_meas ** 1.139)    # Falloon
+    tot_soc_simul = state['pool_c_dpm'] + state['pool_c_rpm'] + state['pool_c_bio'] + state['pool_c_hum'] \
+                                                                                            + state['pool_c_iom']
+    c_pi_mnth = np.array(c_pi_mnth, dtype=float)
+
+    if ss_solver == 'analytic':
+        pools, pool_c_iom, pi_scale = _analytic_pools(drivers, c_pi_mnth, soil_arrs, state['pool_c_iom'])
+        seeded = ~np.isnan(pi_scale)
+        seed_state = {'pool_c_iom': pool_c_iom}
+        for var_name, pool in zip(STATE_VARS[:4], pools.T):
+            seed_state[var_name] = pool
+        seed_state = losses_from_pools(drivers, seed_state, prop_bio, prop_hum)
+        for var_name in seed_state:
+            state[var_name] = np.where(seeded, seed_state[var_name], state[var_name])
+
+        c_pi_mnth[seeded] = c_pi_mnth[seeded]*pi_scale[seeded, np.newaxis]
+        tot_soc_simul = np.where(seeded, pools.sum(axis=1) + state['pool_c_iom'], tot_soc_simul)
+
+    history_ss = new_history((nsubplots, ntsteps))
+    pi_tonnes_ss = c_pi_mnth.copy()
+    active = np.ones(nsubplots, dtype=bool)
+    niters = np.zeros(nsubplots, dtype=int)
+    for iteration in range(MAX_ITERS):
+        history = new_history((nsubplots, ntsteps))
+        new_state = advance_carbon_pools(drivers, state, c_pi_mnth, prop_bio, prop_hum, prop_co2, history,
+                                                                                                    tot_soc_simul)
+
+        # after steady state period has completed adjust plant inputs
+        # ===========================================================
+        tot_soc_new = new_state['pool_c_dpm'] + new_state['pool_c_rpm'] + new_state['pool_c_bio'] \
+                                                            + new_state['pool_c_hum'] + new_state['pool_c_iom']
+        rat_meas_simul_soc = tot_soc_meas/tot_soc_new
+        converged = active & (np.abs(tot_soc_meas - tot_soc_new) < SOC_MIN_DIFF)
+
+        for var_name in history_ss:
+            history_ss[var_name][converged] = history[var_name][converged]
+        pi_tonnes_ss[converged] = c_pi_mnth[converged]
+        niters[converged] = iteration + 1
+
+        active &= ~converged
+        for var_name in state:
+            state[var_name] = np.where(active, new_state[var_name], state[var_name])
+        tot_soc_simul = np.where(active, tot_soc_new, tot_soc_simul)
+        c_pi_mnth[active] = c_pi_mnth[active]*rat_meas_simul_soc[active, np.newaxis]   # (eq.2.1.1)
+
+        if not active.any():
+            break
+
+    converged = ~active
+    mess = 'Vectorised steady state: {} of {} subplots converged'.format(converged.sum(), nsubplots)
+    if converged.any():
+        mess += ' after {} to {} iterations'.format(niters[converged].min(), niters[converged].max())
+    print(mess)
+
+    return history_ss, pi_tonnes_ss, converged
+
+def carbon_forward_batch(drivers, c_pi_mnth, init_state, tot_soc_simul):
+    '''
+    forward run for all subplots starting from the last timestep of the steady state, see cn_forward_run
+    '''
+    soil_arrs = drivers.soil_arrs
+    history = new_history((drivers.nsubplots, drivers.ntsteps))
+    advance_carbon_pools(drivers, init_state, np.array(c_pi_mnth, dtype=float), soil_arrs['prop_bio'],
+                                    soil_arrs['prop_hum'], soil_arrs['prop_co2'], history, tot_soc_simul, imnth = 1)
+    return history
+
+def _c_n_ratios(history, c_n_rat_pi, c_n_rat_ow, c_n_rat_hum_init):
+    '''
+    C:N ratios of the DPM, RPM and HUM pools for every timestep (eq.3.3.10) to (eq.3.3.12), the only part of
+    soil_nitrogen which must be stepped through time
+    '''
+    nsubplots, ntsteps = history['pool_c_dpm'].shape
+    dpm_prev = history['pool_c_dpm'][:, 0]
+    rpm_prev = history['pool_c_rpm'][:, 0]
+    hum_prev = history['pool_c_hum'][:, 0]
+    c_n_rat_dpm_prev = c_n_rat_pi
+    c_n_rat_rpm_prev = c_n_rat_pi
+    c_n_rat_hum_prev = c_n_rat_hum_init
+
+    dpm_inpts = list((history['pi_to_dpm'] + history['cow_to_dpm']).T)
+    cow_to_dpms, pi_to_rpms, cow_to_hums = [list(history[var_name].T)
+                                                        for var_name in ('cow_to_dpm', 'pi_to_rpm', 'cow_to_hum')]
+    c_n_rats = np.zeros((3, ntsteps, nsubplots))
+    for tstep in range(ntsteps):
+        dpm_inpt = dpm_inpts[tstep]
+        pi_to_rpm = pi_to_rpms[tstep]
+        cow_to_hum = cow_to_hums[tstep]
+        denom = (dpm_prev/c_n_rat_dpm_prev) + (dpm_inpt/c_n_rat_pi) + (cow_to_dpms[tstep]/c_n_rat_ow)
+        c_n_rat_dpm_prev = (dpm_prev + dpm_inpt)/denom
+        c_n_rat_rpm_prev = (rpm_prev + pi_to_rpm)/((rpm_prev/c_n_rat_rpm_prev) + (pi_to_rpm/c_n_rat_pi))
+        c_n_rat_hum_prev = (hum_prev + cow_to_hum)/((hum_prev/c_n_rat_hum_prev) + (cow_to_hum/c_n_rat_ow))
+        c_n_rats[:, tstep] = c_n_rat_dpm_prev, c_n_rat_rpm_prev, c_n_rat_hum_prev
+
+    return [c_n_rat.T for c_n_rat in c_n_rats]
+
+def nitrogen_batch(history, wat_soil, soil_arrs, pettmp, n_parms, crop_arrs, timestep = None):
+    '''
+    vectorised equivalent of calling soil_nitrogen for each subplot
+    history and wat_soil have shape (nsubplots, ntsteps), weather is shared or given for each subplot as for
+    get_rate_mods; values of n_parms and of crop_arrs, keyed by c_n_rat_pi, n_supply_min, n_supply_opt and
+    nmnths_grow, are scalars or arrays of shape (nsubplots,)
+    returns a dictionary of NITROGEN_VARS arrays of shape (nsubplots, ntsteps)
+    '''
+    if timestep is None:
+        timestep = MONTHLY
+    nsubplots, ntsteps = wat_soil.shape
+
+    def _column(val):
+        return np.asarray(val, dtype = float)[..., np.newaxis]
+
+    no3_atmos, nh4_atmos, k_nitrif, min_no3_nh4, n_d50, n_denit_max = get_n_parameters(n_parms, timestep.nsteps_yr)
+    no3_atmos, nh4_atmos, min_no3_nh4, n_d50 = [_column(val) for val in (no3_atmos, nh4_atmos, min_no3_nh4, n_d50)]
+    t_depth = _column(soil_arrs['t_depth'])
+    wc_fld_cap = _column(soil_arrs['wc_fld_cap'])
+    wc_pwp = _column(soil_arrs['wc_pwp'])
+
+    c_n_rat_pi = np.asarray(crop_arrs['c_n_rat_pi'], dtype = float)
+    nut_n_min = _column(crop_arrs['n_supply_min'])
+    nut_n_opt = _column(crop_arrs['n_supply_opt'])
+    nsteps_grow = _column(crop_arrs['nmnths_grow'])*timestep.steps_per_mnth
+
+    precip = np.atleast_2d(np.asarray(pettmp['precip'], dtype = float)[..., :ntsteps])
+    pet = np.atleast_2d(np.asarray(pettmp['pet'], dtype = float)[..., :ntsteps])
+    if timestep.monthly:
+        imnth = np.arange(ntsteps) % 12 + 1
+        ndays = np.array(NDAYS_MNTH)[imnth - 1]
+    else:
+        imnth = np.asarray(pettmp.get('month', np.ones(ntsteps)), dtype = float)[:ntsteps]
+        ndays = np.full(ntsteps, timestep.ndays)
+
+    # constants as supplied by CarbonChange.get_vals_for_tstep
+    # ========================================================
+    c_n_rat_ow, prop_co2, prop_bio, prop_hum, c_n_rat_som = C_N_RAT_OW, PROP_CO2, PROP_BIO, PROP_HUM, C_N_RAT_SOM
+    c_n_rat_dpm, c_n_rat_rpm, c_n_rat_hum = _c_n_ratios(history, c_n_rat_pi, c_n_rat_ow, 8.5)
+    c_loss_dpm, c_loss_rpm, c_loss_bio, c_loss_hum = [history[var_name] for var_name in
+                                                            ('c_loss_dpm', 'c_loss_rpm', 'c_loss_bio', 'c_loss_hum')]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+
+        # soil N supply (eq.3.3.8) and (eq.3.3.9)
+        # =======================================
+        n_release = prop_co2* 1000 * ((c_loss_dpm/c_n_rat_dpm) + c_loss_rpm/c_n_rat_rpm +
+                                                                            (c_loss_bio + c_loss_hum)/c_n_rat_som)
+        n_adjust = prop_bio*(c_loss_dpm*(1/c_n_rat_som - 1/c_n_rat_dpm) + c_loss_rpm*(1/c_n_rat_som - 1/c_n_rat_rpm)) \
+                 + prop_hum*(c_loss_dpm*(1/c_n_rat_hum - 1/c_n_rat_dpm) + c_loss_rpm*(1/c_n_rat_hum - 1/c_n_rat_rpm))
+        nut_n_soil = n_release - 1000 * n_adjust
+        prop_n_opt = (nut_n_soil - nut_n_min)/(nut_n_opt - nut_n_min)  # (eq.3.3.1)
+
+        # ammonium inputs and nitrification, starting pools are zero as in soil_nitrogen
+        # ===============================================================================
+        nh4_miner = np.maximum(nut_n_soil, 0)                           # (eq.2.4.21)
+        nh4_immob = np.minimum(-np.minimum(nut_n_soil, 0), min_no3_nh4)     # (eq.2.4.22)
+        nh4_total_inp = nh4_miner + nh4_atmos
+        # nitrification (eq.2.4.23) acts on nh4_start which is zero, so k_nitrif has no effect
+        nh4_nitrif = np.zeros_like(nh4_total_inp)
+
+        no3_nitrif = nh4_nitrif
+        no3_total_inp = no3_atmos + no3_nitrif
+        no3_avail = no3_total_inp
+        nh4_avail = nh4_total_inp
+
+        n_crop = prop_n_opt*nut_n_opt/nsteps_grow      # (eq.2.4.17)
+        no3_cropup = n_crop*(no3_avail/(no3_avail + nh4_avail))    # (eq.2.4.18)
+
+        # nitrate losses
+        # ==============
+        no3_immob = np.minimum(-np.minimum(nut_n_soil - nh4_immob, 0), min_no3_nh4)    # (eq.2.4.5)
+        wat_drain = np.maximum((precip - pet) - wc_fld_cap, 0)     # (eq.2.4.7)
+        no3_leach = ((no3_total_inp - min_no3_nh4)/(precip - pet))*wat_drain    # (eq.2.4.6)
+
+        # denitrification, the maximum rate is carried from one timestep to the next as in soil_nitrogen
+        # ===============================================================================================
+        n_denit_max = np.broadcast_to(np.asarray(n_denit_max, dtype = float), (nsubplots,))
+        n_denit_maxs = np.empty((ntsteps, nsubplots))
+        t_depth_days = [t_depth[:, 0]*ndays_tstep for ndays_tstep in ndays.tolist()]
+        for tstep, no3_avail_tstep in enumerate(no3_avail.T):
+            n_denit_max = np.minimum(no3_avail_tstep, n_denit_max * t_depth_days[tstep])   # (eq.2.4.9)
+            n_denit_maxs[tstep] = n_denit_max
+        n_denit_max = n_denit_maxs.T
+
+        rate_denit_no3 = no3_avail/(n_d50 * t_depth + no3_avail)      # (eq.2.4.10)
+        sigma_c = wat_soil - wc_pwp
+        sigma_f = wc_fld_cap - wc_pwp
+        prop_n2_wat = 0.5*(sigma_c/sigma_f)                         # (eq.2.4.14)
+        prop_n2_no3 = 1 - no3_avail/(40*t_depth + no3_avail)        # (eq.2.4.15)
+        rate_denit_moist = np.minimum(1, ((np.abs((sigma_c/sigma_f) - 0.62))/0.38)**1.74)     # (eq.2.4.11)
+        rate_denit_bio = np.minimum(1, history['co2_release'] * 0.1)     # (eq.2.4.12)
+        no3_denitr = n_denit_max * rate_denit_no3 * rate_denit_moist * rate_denit_bio   # (eq.2.4.8)
+
+        no3_total_loss = no3_immob + no3_leach + no3_denitr + no3_cropup
+        loss_adj_rat_no3 = np.where(no3_total_loss <= no3_total_inp, 1, no3_total_inp/no3_total_loss)  # (eq.2.4.1)
+        no3_loss_adjust = loss_adj_rat_no3 * no3_total_loss
+
+        # ammonium losses, no manure or fertiliser so nothing is volatilised
+        # ==================================================================
+        nh4_volat = np.zeros((nsubplots, ntsteps))
+        nh4_cropup = n_crop * (nh4_avail/(no3_avail + nh4_avail))     # (eq.2.4.26)
+        nh4_total_loss = nh4_immob + nh4_nitrif + nh4_volat + nh4_cropup
+        nh4_loss_adjust = np.where(nh4_total_loss <= nh4_total_inp, 1, nh4_total_inp/nh4_total_loss)
+        nh4_end = nh4_total_inp - nh4_total_loss * nh4_loss_adjust
+
+        n2o_release = (1.0 - (prop_n2_wat * prop_n2_no3)) * (no3_denitr * loss_adj_rat_no3)  # (eq.2.4.13)
+
+    zeros = np.zeros((nsubplots, ntsteps))
+    step_vals = {'imnth': imnth, 'tstep': np.arange(ntsteps), 'wat_soil': wat_soil, 'no3_start': zeros,
+                 'no3_atmos': no3_atmos, 'no3_fert': zeros, 'no3_nitrif': no3_nitrif, 'no3_total_inp': no3_total_inp,
+                 'no3_immob': no3_immob, 'no3_leach': no3_leach, 'no3_leach_adj': no3_leach*no3_loss_adjust,
+                 'no3_denitr': no3_denitr, 'no3_cropup': no3_cropup, 'no3_total_loss': no3_total_loss,
+                 'no3_loss_adj': no3_loss_adjust, 'loss_adj_rat_no3': loss_adj_rat_no3,
+                 'no3_end': no3_total_inp - no3_loss_adjust, 'n2o_release': n2o_release, 'nh4_start': zeros,
+                 'nh4_atmos': nh4_atmos, 'nh4_fert': zeros, 'nh4_miner': nh4_miner, 'nh4_total_inp': nh4_total_inp,
+                 'nh4_immob': nh4_immob, 'nh4_nitrif': nh4_nitrif, 'nh4_volat': nh4_volat,
+                 'nh4_volat_adj': nh4_volat*no3_loss_adjust, 'nh4_cropup': nh4_cropup,
+                 'nh4_total_loss': nh4_total_loss, 'nh4_loss_adj': nh4_loss_adjust, 'nh4_end': nh4_end}
+    nitrogen = {}
+    for var_name in NITROGEN_VARS:
+        nitrogen[var_name] = np.broadcast_to(step_vals[var_name], (nsubplots, ntsteps)).astype(float)
+
+    return nitrogen
+
+def history_to_carbon_change(history, isub, carbon_change):
+    '''
+    add the history of one subplot to a CarbonChange object
+    '''
+    carbon_change.extend_vars({var_name: history[var_name][isub] for var_name in CARBON_VARS})
+
+    return carbon_change
+
+def soil_water_history(drivers, isub, soil_vars, pettmp, soil_water):
+    '''
+    add soil water for one subplot to a SoilWater object
+    '''
+    t_depth = soil_vars.t_depth
+    wc_fld_cap = drivers.soil_arrs['wc_fld_cap'][isub]
+    wc_pwp = drivers.soil_arrs['wc_pwp'][isub]
+    soil_water.reserve(drivers.ntsteps)
+    for wat_soil, max_root_dpth, precip, pet, irrig in zip(drivers.wat_soil[isub].tolist(),
+                        drivers.mngmnt_arrs['max_root_dpth'][isub].tolist(), pettmp['precip'][:drivers.ntsteps],
+                                        pettmp['pet'][:drivers.ntsteps], drivers.mngmnt_arrs['irrig'][isub].tolist()):
+        soil_water.append_vars(t_depth, max_root_dpth, precip, pet, irrig, wc_pwp, wat_soil, wc_fld_cap)
+
+    return soil_water
+
+def cn_steady_state_batch(parameters, weather, mngmnt_list, soil_list, ss_solver = 'iterative'):
+    '''
+    vectorised equivalent of calling _cn_steady_state for each subplot
+    returns a list of steady_state tuples, None for subplots which failed to converge
+    management.pi_tonnes of each subplot is set to the converged plant inputs
+    '''
+    pettmp = weather.pettmp_ss
+    drivers = CarbonDrivers(pettmp, mngmnt_list, parameters, soil_list)
+    if drivers.ntsteps is None:
+        return None
+
+    history, pi_tonnes, converged = \
+                    carbon_steady_state_batch(drivers, drivers.mngmnt_arrs['c_pi_mnth'], ss_solver)
+
+    steady_states = []
+    for isub, (management, soil_vars) in enumerate(zip(mngmnt_list, soil_list)):
+        if not converged[isub]:
+            steady_states.append(None)
+            continue
+
+        management.pi_tonnes = pi_tonnes[isub].tolist()
+        carbon_change = history_to_carbon_change(history, isub, CarbonChange('steady state', drivers.ntsteps))
+        soil_water = soil_water_history(drivers, isub, soil_vars, pettmp, SoilWater(drivers.ntsteps))
+        nitrogen_change = soil_nitrogen(carbon_change, soil_water, parameters, pettmp, management, soil_vars)
+        steady_states.append((carbon_change, nitrogen_change, soil_water))
+
+    return steady_states
+
+def cn_forward_run_batch(parameters, weather, mngmnt_list, soil_list, steady_states):
+    '''
+    vectorised equivalent of calling cn_forward_run for each subplot
+    as with cn_forward_run the forward run is appended to the steady state objects, subplots which failed to reach
+    steady state should be removed beforehand
+    '''
+    pettmp = weather.pettmp_fwd
+    drivers = CarbonDrivers(pettmp, mngmnt_list, parameters, soil_list)
+    if drivers.ntsteps is None:
+        return None
+
+    init_vals = np.array([steady_state[0].get_last_tstep_pools() for steady_state in steady_states])
+    last_tstep_vars = ['pool_c_dpm', 'pool_c_rpm', 'pool_c_bio', 'pool_c_hum', 'pool_c_iom', 'tot_soc_simul',
+                       'c_input_bio', 'c_input_hum', 'c_loss_dpm', 'c_loss_rpm', 'c_loss_hum', 'c_loss_bio']
+    init_state = dict(zip(last_tstep_vars, init_vals.T))
+    tot_soc_simul = init_state.pop('tot_soc_simul')
+
+    history = carbon_forward_batch(drivers, drivers.mngmnt_arrs['c_pi_mnth'], init_state, tot_soc_simul)
+
+    complete_runs = []
+    for isub, (management, soil_vars, steady_state) in enumerate(zip(mngmnt_list, soil_list, steady_states)):
+        carbon_change, nitrogen_change, soil_water = steady_state
+        history_to_carbon_change(history, isub, carbon_change)
+        soil_water_history(drivers, isub, soil_vars, pettmp, soil_water)
+        nitrogen_change = soil_nitrogen(carbon_change, soil_water, parameters, pettmp, management, soil_vars)
+        complete_runs.append((carbon_change, nitrogen_change, soil_water))
+
+    return complete_runs
@@ -24,7 +24,7 @@ import numpy as np
 from pandas import DataFrame
 from ora_excel_read import read_single_crop_and_soil_data, read_rotations_crop_and_soil_data, read_weather_data_crops, \
     _read_weather_sheet, _read_crop_vars, _read_location_sheet
-from thornthwaite import thornthwaite
+from thornthwaite import thornthwaite_matrix
 from ora_water_model import SoilWater
 
 
@@ -32,6 +32,8 @@ from ora_water_model import SoilWater
 # from ora_water_model import get_soil_water_constants, add_pet_to_weather
 # from ora_low_level_fns import soil_water
 
+NPP_CALC_DEFAULT = 'MIAMI Model (Leith 1972)'
+
 def test_crop_algorithms(form):
 
     # Set flag to indicate whether single crop or rotations to be used
@@ -39,6 +41,13 @@ def test_crop_algorithms(form):
     # Set npp calculation method
     npp_calc = str(form.w_npp_calc.currentText())
     xls_inp_fname = os.path.normpath(form.w_lbl13.text())
+
+    return run_crop_model(xls_inp_fname, crop_rotations, npp_calc)
+
+def run_crop_model(xls_inp_fname, crop_rotations = False, npp_calc = NPP_CALC_DEFAULT):
+    '''
+    crop model without reference to the GUI
+    '''
     if not os.path.isfile(xls_inp_fname):
         print('Excel input file ' + xls_inp_fname + 'must exist')
 
@@ -407,22 +416,15 @@ def test_crop_algorithms(form):
             def calc_potential_evapotrans_ss(self):
                 """calculate potential evapotransportation for steady state and forward runs"""
 
-                thornthwaite_ten_years_ss = []
-                for column in ss_air_temp_data:
-                    year_temps = ss_air_temp_data[column].to_list()
-                    thornthwaite_year = thornthwaite(year_temps, farm_lat)
-                    thornthwaite_ten_years_ss.append(thornthwaite_year)
+                # one column per year
+                thornthwaite_ten_years_ss = thornthwaite_matrix(ss_air_temp_data.T.values, farm_lat).tolist()
 
                 return thornthwaite_ten_years_ss
 
             def calc_potential_evapotrans_fr(self):
                 """calculate potential evapotransportation for forward runs"""
 
-                thornthwaite_ten_years_fr = []
-                for column in fr_air_temp_data:
-                    year_temps = fr_air_temp_data[column].to_list()
-                    thornthwaite_year = thornthwaite(year_temps, farm_lat)
-                    thornthwaite_ten_years_fr.append(thornthwaite_year)
+                thornthwaite_ten_years_fr = thornthwaite_matrix(fr_air_temp_data.T.values, farm_lat).tolist()
                 return thornthwaite_ten_years_fr
 
             self.potential_evapotrans_ss = calc_potential_evapotrans_ss(self)
@@ -0,0 +1,205 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_daily_run.py
+# Purpose:     soil C and N for a batch of subplots with daily timesteps
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   management is specified monthly; monthly totals i.e. plant inputs, organic waste and irrigation are spread evenly
+#   over the days of each month while ratios and rooting depth apply to every day of the month
+#
+#   daily weather may be supplied as a dictionary of lists: precip, tair and either pet or tmin and tmax from which
+#   PET is estimated using the Hargreaves equation. If not supplied, monthly weather is disaggregated i.e. rainfall
+#   and PET are spread evenly and temperature applies to every day of the month
+#
+#   the carbon pools are advanced by ora_cn_vectorised with rate constants from ora_timestep.DAILY, so a 100 year
+#   run i.e. 36,500 timesteps per subplot is dominated by whole array operations
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_daily_run.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+from calendar import isleap
+
+import numpy as np
+
+from fao_eto_np import hargreaves_pet
+from ora_classes_carbon import CarbonChange
+from ora_cn_vectorised import CarbonDrivers, get_mngmnt_arrays, carbon_steady_state_batch, advance_carbon_pools, \
+                    losses_from_pools, new_history, history_to_carbon_change, soil_water_history, STATE_VARS
+from ora_nitrogen_model import soil_nitrogen
+from ora_timestep import DAILY, NDAYS_MNTH, NDAYS_LEAP_MNTH
+from ora_water_model import SoilWater
+
+MNGMNT_FLUXES = list(['irrig', 'c_pi_mnth', 'cow'])     # totals per month, other management values are per month
+
+def daily_calendar(nmnths, start_year = None):
+    '''
+    number of days in each month and for each day its calendar month and day of year
+    leap years are only recognised when start_year is supplied, otherwise every year has 365 days
+    '''
+    ndays_mnth = []
+    for imnth in range(nmnths):
+        if start_year is not None and isleap(start_year + imnth//12):
+            ndays_mnth.append(NDAYS_LEAP_MNTH[imnth % 12])
+        else:
+            ndays_mnth.append(NDAYS_MNTH[imnth % 12])
+    ndays_mnth = np.array(ndays_mnth)
+
+    months = np.repeat(np.arange(nmnths) % 12 + 1, ndays_mnth)
+
+    # day of year restarts each January
+    # =================================
+    ndays_yr = np.add.reduceat(ndays_mnth, np.arange(0, nmnths, 12))
+    doys = np.arange(len(months)) - np.repeat(np.cumsum(ndays_yr) - ndays_yr, ndays_yr) + 1
+
+    return ndays_mnth, months, doys
+
+def monthly_to_daily(mngmnt_arrs, ndays_mnth):
+    '''
+    expand management arrays of shape (nsubplots, nmnths) to shape (nsubplots, ndays)
+    '''
+    daily_arrs = {}
+    for var_name, arr in mngmnt_arrs.items():
+        if var_name in MNGMNT_FLUXES:
+            arr = arr/ndays_mnth
+        daily_arrs[var_name] = np.repeat(arr, ndays_mnth, axis = 1)
+
+    return daily_arrs
+
+def daily_weather(pettmp, ndays_mnth, months, doys, latitude = None, pettmp_daily = None):
+    '''
+    daily precip, tair and PET, from pettmp_daily if supplied otherwise disaggregated from monthly pettmp
+    the calendar month of each day is added under key month, see soil_nitrogen
+    returns None if PET is required but cannot be estimated
+    '''
+    ndays = int(ndays_mnth.sum())
+    nmnths = len(ndays_mnth)
+    if pettmp_daily is None:
+        precip = np.repeat(np.array(pettmp['precip'][:nmnths], dtype = float)/ndays_mnth, ndays_mnth)
+        tair = np.repeat(np.array(pettmp['tair'][:nmnths], dtype = float), ndays_mnth)
+        pet = np.repeat(np.array(pettmp['pet'][:nmnths], dtype = float)/ndays_mnth, ndays_mnth)
+    else:
+        if len(pettmp_daily['precip']) < ndays:
+            print('*** Error *** daily weather has {} days, {} are required'.format(len(pettmp_daily['precip']), ndays))
+            return None
+
+        precip = np.array(pettmp_daily['precip'][:ndays], dtype = float)
+        tair = np.array(pettmp_daily['tair'][:ndays], dtype = float)
+        if 'pet' in pettmp_daily:
+            pet = np.array(pettmp_daily['pet'][:ndays], dtype = float)
+        elif 'tmin' in pettmp_daily and 'tmax' in pettmp_daily and latitude is not None:
+            tmin = np.array(pettmp_daily['tmin'][:ndays], dtype = float)[:, np.newaxis]
+            tmax = np.array(pettmp_daily['tmax'][:ndays], dtype = float)[:, np.newaxis]
+            pet = hargreaves_pet(tmin, tmax, np.array([latitude], dtype = float), doys)[:, 0]
+        else:
+            print('*** Error *** daily weather requires pet or tmin, tmax and latitude')
+            return None
+
+    return {'precip': precip.tolist(), 'tair': tair.tolist(), 'pet': pet.tolist(), 'month': months.tolist()}
+
+def _daily_drivers(parameters, pettmp, mngmnt_list, soil_list, start_year, latitude, pettmp_daily):
+    '''
+    daily weather and carbon drivers from monthly management
+    '''
+    mngmnt_arrs = get_mngmnt_arrays(pettmp, mngmnt_list, parameters)
+    if mngmnt_arrs is None:
+        return None, None
+
+    ndays_mnth, months, doys = daily_calendar(mngmnt_arrs['cow'].shape[1], start_year)
+    pettmp_day = daily_weather(pettmp, ndays_mnth, months, doys, latitude, pettmp_daily)
+    if pettmp_day is None:
+        return None, None
+
+    drivers = CarbonDrivers(pettmp_day, mngmnt_list, parameters, soil_list, DAILY,
+                                                                        monthly_to_daily(mngmnt_arrs, ndays_mnth))
+    drivers.ndays_mnth = ndays_mnth
+
+    return pettmp_day, drivers
+
+def _daily_run_objects(parameters, pettmp_day, drivers, history, mngmnt_list, soil_list, run_type):
+    '''
+    carbon, nitrogen and soil water objects for each subplot
+    '''
+    runs = []
+    for isub, (management, soil_vars) in enumerate(zip(mngmnt_list, soil_list)):
+        carbon_change = history_to_carbon_change(history, isub, CarbonChange(run_type, drivers.ntsteps))
+        soil_water = soil_water_history(drivers, isub, soil_vars, pettmp_day, SoilWater(drivers.ntsteps, DAILY))
+        nitrogen_change = soil_nitrogen(carbon_change, soil_water, parameters, pettmp_day, management, soil_vars,
+                                                                timestep = DAILY, ntsteps = drivers.ntsteps)
+        runs.append((carbon_change, nitrogen_change, soil_water))
+
+    return runs
+
+def cn_daily_steady_state_batch(parameters, weather, mngmnt_list, soil_list, ss_solver = 'analytic',
+                                                    start_year = None, latitude = None, pettmp_daily = None):
+    '''
+    daily equivalent of cn_steady_state_batch, the analytic solver is recommended as each iteration is a daily run
+    management.pi_tonnes of each subplot is set to the monthly totals of the converged plant inputs
+    returns a list of steady_state tuples, None for subplots which failed to converge
+    '''
+    pettmp_day, drivers = _daily_drivers(parameters, weather.pettmp_ss, mngmnt_list, soil_list, start_year,
+                                                                                            latitude, pettmp_daily)
+    if drivers is None:
+        return None
+
+    history, pi_tonnes, converged = \
+                    carbon_steady_state_batch(drivers, drivers.mngmnt_arrs['c_pi_mnth'], ss_solver)
+
+    runs = _daily_run_objects(parameters, pettmp_day, drivers, history, mngmnt_list, soil_list, 'steady state')
+
+    mnth_starts = np.cumsum(drivers.ndays_mnth) - drivers.ndays_mnth
+    pi_tonnes_mnth = np.add.reduceat(pi_tonnes, mnth_starts, axis = 1)
+    steady_states = []
+    for isub, (management, run) in enumerate(zip(mngmnt_list, runs)):
+        if converged[isub]:
+            management.pi_tonnes = pi_tonnes_mnth[isub].tolist()
+            steady_states.append(run)
+        else:
+            steady_states.append(None)
+
+    return steady_states
+
+def cn_daily_forward_batch(parameters, weather, mngmnt_list, soil_list, steady_states, start_year = None,
+                                                                            latitude = None, pettmp_daily = None):
+    '''
+    daily forward run for all subplots starting from the pools at the end of the steady state, which may be monthly
+    losses are recalculated from the pools using daily rate constants
+    unlike cn_forward_run_batch new objects are returned rather than appending to the steady state objects, and
+    subplots whose steady state is None, as returned by cn_daily_steady_state_batch for those which failed to
+    converge, are skipped
+    returns a list of complete_run tuples, None for skipped subplots
+    '''
+    isubs = [isub for isub, steady_state in enumerate(steady_states) if steady_state is not None]
+    complete_runs = len(steady_states)*[None]
+    if len(isubs) == 0:
+        print('*** Warning *** no subplot reached steady state, skipping daily forward run')
+        return complete_runs
+
+    mngmnt_list, soil_list, steady_states = [[items[isub] for isub in isubs]
+                                                            for items in (mngmnt_list, soil_list, steady_states)]
+    pettmp_day, drivers = _daily_drivers(parameters, weather.pettmp_fwd, mngmnt_list, soil_list, start_year,
+                                                                                            latitude, pettmp_daily)
+    if drivers is None:
+        return None
+
+    soil_arrs = drivers.soil_arrs
+    init_vals = np.array([steady_state[0].get_last_tstep_pools() for steady_state in steady_states])
+    init_state = dict(zip(STATE_VARS[:5], init_vals.T[:5]))
+    tot_soc_simul = init_vals.T[5]
+    init_state = losses_from_pools(drivers, init_state, soil_arrs['prop_bio'], soil_arrs['prop_hum'])
+
+    history = new_history((drivers.nsubplots, drivers.ntsteps))
+    advance_carbon_pools(drivers, init_state, drivers.mngmnt_arrs['c_pi_mnth'], soil_arrs['prop_bio'],
+                    soil_arrs['prop_hum'], soil_arrs['prop_co2'], history, tot_soc_simul, np.array(pettmp_day['month']))
+
+    runs = _daily_run_objects(parameters, pettmp_day, drivers, history, mngmnt_list, soil_list, 'forward run')
+    for isub, run in zip(isubs, runs):
+        complete_runs[isub] = run
+
+    return complete_runs
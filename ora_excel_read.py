@@ -20,14 +20,16 @@ __version__ = '0.0.0'
 # ---------------
 #
 import os
-from openpyxl import load_workbook
-from pandas import Series, read_excel, DataFrame
+from contextlib import contextmanager
+from pandas import Series, read_excel, DataFrame, ExcelFile
 from zipfile import BadZipFile
 from ora_excel_write import check_out_dir, retrieve_output_xls_files
 from ora_water_model import add_pet_to_weather
 from ora_low_level_fns import average_weather
 
 METRIC_LIST = list(['precip', 'tair'])
+SS_SOLVERS = list(['iterative', 'analytic'])
+SOIL_VARS = list(['t_depth', 't_clay', 't_silt', 't_sand', 't_carbon', 't_bulk', 't_pH_h2o', 't_salinity'])  # Soil
 MNTH_NAMES_SHORT = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
 REQUIRED_SHEET_NAMES = list(['Inputs1- Farm location', 'N constants', 'Inputs3- Soils & Crops',
                              'Inputs3b- Soils & Rotations', 'Inputs3d- Changes in rotations', 'Crop parms',
@@ -36,6 +38,67 @@ REQUIRED_SHEET_NAMES = list(['Inputs1- Farm location', 'N constants', 'Inputs3-
 
 ERR_MESS_SHEET = '*** Error *** reading sheet '
 
+class WorkbookSession(object, ):
+    '''
+    ORATOR inputs workbook opened once, read only, and shared by the readers of one read pass
+    each sheet is parsed on first use and the resulting data frame is retained
+    used as a context manager so that the workbook is closed when the read pass finishes
+    '''
+    def __init__(self, xls_fname):
+        """
+        raises PermissionError or BadZipFile if the workbook cannot be opened
+        """
+        self.xls_fname = xls_fname
+        self.xls_file = ExcelFile(xls_fname, engine = 'openpyxl')
+        self.sheet_names = self.xls_file.sheet_names
+        self.sheets = {}
+
+    @property
+    def book(self):
+        '''
+        underlying read only openpyxl workbook
+        '''
+        return self.xls_file.book
+
+    def read_sheet(self, sheet_name, skip_until = 0, usecols = None):
+        '''
+        equivalent of read_excel(xls_fname, sheet_name, skiprows = range(0, skip_until), usecols = usecols)
+        a copy is returned so that callers may modify it
+        '''
+        key = (sheet_name, skip_until, str(usecols))
+        if key not in self.sheets:
+            self.sheets[key] = read_excel(self.xls_file, sheet_name, skiprows = range(0, skip_until),
+                                                                                                usecols = usecols)
+        return self.sheets[key].copy()
+
+    def close(self):
+        '''
+        release the workbook
+        '''
+        self.xls_file.close()
+        self.sheets = {}
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+
+        self.close()
+
+@contextmanager
+def workbook_session(xls_fname):
+    '''
+    session for a workbook which is closed on exit, xls_fname may already be a session in which case it is left
+    open for its owner to close
+    '''
+    if isinstance(xls_fname, WorkbookSession):
+        yield xls_fname
+        return
+
+    with WorkbookSession(xls_fname) as wb_sess:
+        yield wb_sess
+
 
 def check_excel_input_file(form, xls_inp_fname):
     '''
@@ -49,30 +112,32 @@ def check_excel_input_file(form, xls_inp_fname):
     form.w_study.setText('Study not set')
     form.settings['inp_dir'] = ''
     form.w_soil_cn.setEnabled(False)
+    form.w_optimise.setEnabled(False)
     form.w_disp_out.setEnabled(False)
 
     print('Loading: ' + xls_inp_fname)
     try:
-        wb_obj = load_workbook(xls_inp_fname, data_only=True)
-        sheet_names = wb_obj.sheetnames
+        wb_sess = WorkbookSession(xls_inp_fname)
     except (PermissionError, BadZipFile) as e:
         print('Error: ' + str(e))
         return None
 
-    wb_obj.close()
-
     # all required sheets must be present
     # ===================================
-    for sheet in REQUIRED_SHEET_NAMES:
-        if sheet not in sheet_names:
-            fileOkFlag = False
-            break
+    with wb_sess:
+        for sheet in REQUIRED_SHEET_NAMES:
+            if sheet not in wb_sess.sheet_names:
+                fileOkFlag = False
+                break
+
+        if fileOkFlag:
+            study, latitude, longitude = _read_location_sheet(wb_sess, 'Inputs1- Farm location', 13)
 
     if fileOkFlag:
         mess = 'Excel input file is valid'
         form.w_soil_cn.setEnabled(True)
+        form.w_optimise.setEnabled(True)
 
-        study, latitude, longitude = _read_location_sheet(xls_inp_fname, 'Inputs1- Farm location', 13)
         study_desc = 'Study: ' + study
         study_desc += '\tLatitude: {}'.format(latitude)
         study_desc += '\tLongitude: {}'.format(longitude)
@@ -92,7 +157,8 @@ def check_excel_input_file(form, xls_inp_fname):
 
 def _read_location_sheet(xls_fname, sheet_name, skip_until):
     nlines_crop_desc = 26  # temporary
-    data = read_excel(xls_fname, sheet_name, skiprows=range(0, skip_until), usecols=range(2, 4))
+    with workbook_session(xls_fname) as wb_sess:
+        data = wb_sess.read_sheet(sheet_name, skip_until, usecols=range(2, 4))
 
     location = data.dropna(how='all')
     location = location.rename(columns={'Unnamed: 2': 'Description', 'Unnamed: 3': 'Value'})
@@ -113,7 +179,8 @@ def _read_n_constants_sheet(xls_fname, sheet_name, skip_until):
                          'n_denit_max', 'n_d50', 'prop_n2o_fc', 'prop_nitrif_gas', 'prop_nitrif_no',
                          'precip_critic', 'prop_volat', 'prop_atmos_dep_nh4', 'c_n_rat_som', 'r_dry'])
 
-    data = read_excel(xls_fname, sheet_name, skiprows=range(0, skip_until), usecols=range(1, 3))
+    with workbook_session(xls_fname) as wb_sess:
+        data = wb_sess.read_sheet(sheet_name, skip_until, usecols=range(1, 3))
     n_parms_df = data.dropna(how='all')
     n_parms = {}
     for indx, defn in enumerate(n_parm_names):
@@ -124,7 +191,8 @@ def _read_n_constants_sheet(xls_fname, sheet_name, skip_until):
 
 def _read_crop_mngmnt_sheet(xls_fname, sheet_name, skip_until, crop_vars):
     nlines_crop_desc = 26  # temporary
-    data = read_excel(xls_fname, sheet_name, skiprows=range(0, skip_until), usecols=range(1, 9))
+    with workbook_session(xls_fname) as wb_sess:
+        data = wb_sess.read_sheet(sheet_name, skip_until, usecols=range(1, 9))
     management = data.dropna(how='all')
     area_names = management.columns[3:]
     management = management.rename(columns={'Unnamed: 1': 'Crop'})
@@ -179,7 +247,8 @@ def _read_weather_sheet(xls_fname, sheet_name, skip_until):
     '''
     reads weather
     '''
-    data = read_excel(xls_fname, sheet_name, skiprows=range(0, skip_until), usecols=range(3, 16))
+    with workbook_session(xls_fname) as wb_sess:
+        data = wb_sess.read_sheet(sheet_name, skip_until, usecols=range(3, 16))
     pettmp_dframe = data.dropna(how='all')
     year_strt = pettmp_dframe.columns[2]
     ncols = len(pettmp_dframe.columns)
@@ -210,7 +279,8 @@ def _read_crop_vars(xls_fname, sheet_name):
         ['dummy2',
          'c_n_rat_pi', 'n_supply_min', 'n_supply_opt', 'n_respns_coef', 'fert_use_eff']))
 
-    data = read_excel(xls_fname, sheet_name)
+    with workbook_session(xls_fname) as wb_sess:
+        data = wb_sess.read_sheet(sheet_name)
     data = data.dropna(how='all')
     try:
         crop_dframe = data.set_index(crop_parm_names)
@@ -249,7 +319,8 @@ def _read_organic_waste_sheet(xls_fname, sheet_name, skip_until):
     ow_parms_names = Series(list(['c_n_rat', 'prop_nh4', 'rat_dpm_hum_ow', 'prop_iom_ow', 'pcnt_c', 'min_e_pcnt_wd',
                                   'max_e_pcnt_wd', 'ann_c_input', 'pcnt_urea']))
 
-    data = read_excel(xls_fname, sheet_name, skiprows=range(0, skip_until))
+    with workbook_session(xls_fname) as wb_sess:
+        data = wb_sess.read_sheet(sheet_name, skip_until)
     data = data.dropna(how='all')
     try:
         ow_dframe = data.set_index(ow_parms_names)
@@ -264,9 +335,9 @@ def _read_organic_waste_sheet(xls_fname, sheet_name, skip_until):
 def read_livestock_data(xls_fname):
     """A function to pull livestock data from excel file, and store as
     pandas dataframe"""
-    excel_file = xls_fname
-    data = read_excel(excel_file, sheet_name="Inputs4- Livestock",
-                      usecols=range(3, 10), skiprows=range(0, 17))
+    with workbook_session(xls_fname) as wb_sess:
+        data = read_excel(wb_sess.xls_file, sheet_name="Inputs4- Livestock",
+                          usecols=range(3, 10), skiprows=range(0, 17))
     livestock_input = DataFrame(data)
 
     return livestock_input
@@ -275,13 +346,13 @@ def read_livestock_data(xls_fname):
 def read_livestock_supp_data(xls_fname):
     """A function to pull the data on location etc. from sheet C1 of Orator, and
     store as a dictionary"""
-    wb = load_workbook(xls_fname, data_only=True)
-    input_supp_info = wb["C1. Change in animal production"]
-    farm_info = {'Region': input_supp_info['C18'].value,
-                 'Production': input_supp_info['F18'].value,
-                 'Climate': input_supp_info['H18'].value,
-                 'System': input_supp_info['K18'].value
-                 }
+    with workbook_session(xls_fname) as wb_sess:
+        input_supp_info = wb_sess.book["C1. Change in animal production"]
+        farm_info = {'Region': input_supp_info['C18'].value,
+                     'Production': input_supp_info['F18'].value,
+                     'Climate': input_supp_info['H18'].value,
+                     'System': input_supp_info['K18'].value
+                     }
 
     return farm_info
 
@@ -290,17 +361,17 @@ def read_africa_animal_prod(xls_fname):
     """A function to pull African animal production data from excel file,
     and store as pandas dataframe"""
     global africa_animal_prod
-    excel_file = xls_fname
-    data = read_excel(excel_file, sheet_name="C1a. Typical animal production",
-                      usecols=range(1, 15), skiprows=range(0, 12))
+    with workbook_session(xls_fname) as wb_sess:
+        data = read_excel(wb_sess.xls_file, sheet_name="C1a. Typical animal production",
+                          usecols=range(1, 15), skiprows=range(0, 12))
     africa_animal_prod = DataFrame(data)
 
     return africa_animal_prod
 
 def read_single_crop_and_soil_data(xls_fname):
     """Pull data from ORATOR Excel sheet 'Inputs3- Soils & Crops'"""
-    excel_file = xls_fname
-    data = read_excel(excel_file, sheet_name="Inputs3- Soils & Crops",
+    with workbook_session(xls_fname) as wb_sess:
+        data = read_excel(wb_sess.xls_file, sheet_name="Inputs3- Soils & Crops",
                                 usecols= 'B, D:J, L, M, N', skiprows=range(0,13))
     single_crop_data = DataFrame(data)
 
@@ -308,8 +379,8 @@ def read_single_crop_and_soil_data(xls_fname):
 
 def read_rotations_crop_and_soil_data(xls_fname):
     """Pull data from ORATOR Excel Sheet 'Inputs3b- Soils & Rotations'"""
-    excel_file = xls_fname
-    data = read_excel(excel_file, sheet_name='Inputs3b- Soils & Rotations',
+    with workbook_session(xls_fname) as wb_sess:
+        data = read_excel(wb_sess.xls_file, sheet_name='Inputs3b- Soils & Rotations',
                                 usecols= 'E:I', skiprows=range(0,12))
     crop_rotation_data = DataFrame(data)
 
@@ -319,9 +390,9 @@ def read_rotations_crop_and_soil_data(xls_fname):
 def read_weather_data_crops(xls_fname):
     """Get steady state and forward run air temp and rainfall data from ORATOR excel sheet 'Inputs2- Weather'
     This is duplication of _read_weather_sheet above, can be unified later """
-    excel_file = xls_fname
-    data = read_excel(excel_file, sheet_name="Weather",
-                         usecols='F:O', skiprows=range(0, 14),)
+    with workbook_session(xls_fname) as wb_sess:
+        data = read_excel(wb_sess.xls_file, sheet_name="Weather",
+                             usecols='F:O', skiprows=range(0, 14),)
     weather_data = DataFrame(data)
     weather_data.columns = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
     return weather_data
@@ -329,30 +400,53 @@ def read_weather_data_crops(xls_fname):
 
 class ReadStudy(object, ):
 
-    def __init__(self, xls_inp_fname, out_dir, output_excel=True):
+    def __init__(self, xls_inp_fname, out_dir, output_format='excel', ss_solver='iterative', output_charts=True):
         '''
-        read location sheet from ORATOR inputs Excel file
+        read location sheet from ORATOR inputs Excel file, xls_inp_fname may be a WorkbookSession
+        output_format: excel, csv, parquet or npz, None for no output files - True and False are taken as excel and None
+        ss_solver: method used to reach steady state, either iterative or analytic
+        output_charts: add charts to Excel output files
         '''
-
-        self.output_excel = output_excel
-        self.out_dir = out_dir
+        self.set_run_options(out_dir, output_format, ss_solver, output_charts)
 
         # Farm location
         # =============
-        self.study_name, self.latitude, self.longitude \
-            = _read_location_sheet(xls_inp_fname, 'Inputs1- Farm location', 13)
+        with workbook_session(xls_inp_fname) as wb_sess:
+            self.study_name, self.latitude, self.longitude \
+                = _read_location_sheet(wb_sess, 'Inputs1- Farm location', 13)
+
+    def set_run_options(self, out_dir, output_format='excel', ss_solver='iterative', output_charts=True):
+        '''
+        options which do not depend on the workbook
+        '''
+        if output_format is True:
+            output_format = 'excel'
+        elif output_format is False:
+            output_format = None
+
+        self.out_dir = out_dir
+        self.output_format = output_format
+        self.output_excel = output_format == 'excel'
+        self.output_charts = output_charts
+
+        if ss_solver not in SS_SOLVERS:
+            print('*** Warning *** steady state solver ' + str(ss_solver) + ' must be one of '
+                                                                    + ', '.join(SS_SOLVERS) + ' - using iterative')
+            ss_solver = 'iterative'
+        self.ss_solver = ss_solver
 
 
 class ReadWeather(object, ):
 
     def __init__(self, xls_inp_fname, latitude):
         '''
-        read parameters from ORATOR inputs Excel file
+        read parameters from ORATOR inputs Excel file, xls_inp_fname may be a WorkbookSession
         '''
 
         print('Reading weather sheet...')
 
-        pettmp_ss, pettmp_fwd = _read_weather_sheet(xls_inp_fname, 'Weather', 14)
+        with workbook_session(xls_inp_fname) as wb_sess:
+            pettmp_ss, pettmp_fwd = _read_weather_sheet(wb_sess, 'Weather', 14)
 
         # generate PET from weather
         # =========================
@@ -376,36 +470,38 @@ class ReadInputParms(object, ):
 
     def __init__(self, xls_inp_fname):
         '''
-        read parameters from ORATOR inputs Excel file
+        read parameters from ORATOR inputs Excel file, xls_inp_fname may be a WorkbookSession
         '''
 
         print('Reading parameter sheets...')
+        with workbook_session(xls_inp_fname) as wb_sess:
 
-        # Nitrogen params plus r_dry, drying potential
-        # ============================================
-        self.n_parms = _read_n_constants_sheet(xls_inp_fname, 'N constants', 0)
+            # Nitrogen params plus r_dry, drying potential
+            # ============================================
+            self.n_parms = _read_n_constants_sheet(wb_sess, 'N constants', 0)
 
-        # Organic Waste and Crop params e.g. max rooting depths
-        # =====================================================
-        self.ow_parms = _read_organic_waste_sheet(xls_inp_fname, 'Org Waste parms', 0)
-        self.crop_vars = _read_crop_vars(xls_inp_fname, 'Crop parms')
+            # Organic Waste and Crop params e.g. max rooting depths
+            # =====================================================
+            self.ow_parms = _read_organic_waste_sheet(wb_sess, 'Org Waste parms', 0)
+            self.crop_vars = _read_crop_vars(wb_sess, 'Crop parms')
 
 
 class ReadInputSubplots(object, ):
 
     def __init__(self, xls_inp_fname, crop_vars):
         '''
-        read parameters from ORATOR inputs Excel file
+        read parameters from ORATOR inputs Excel file, xls_inp_fname may be a WorkbookSession
         '''
 
         print('Reading management sheets...')
-
-        # Soil params and management
-        # ==========================
-        self.crop_mngmnt_ss, self.soil_all_areas = \
-            _read_crop_mngmnt_sheet(xls_inp_fname, 'Inputs3b- Soils & Rotations', 13, crop_vars)
-        self.crop_mngmnt_fwd, dummy = \
-            _read_crop_mngmnt_sheet(xls_inp_fname, 'Inputs3d- Changes in rotations', 14, crop_vars)
+        with workbook_session(xls_inp_fname) as wb_sess:
+
+            # Soil params and management
+            # ==========================
+            self.crop_mngmnt_ss, self.soil_all_areas = \
+                _read_crop_mngmnt_sheet(wb_sess, 'Inputs3b- Soils & Rotations', 13, crop_vars)
+            self.crop_mngmnt_fwd, dummy = \
+                _read_crop_mngmnt_sheet(wb_sess, 'Inputs3d- Changes in rotations', 14, crop_vars)
 
 
 class Soil(object, ):
@@ -24,9 +24,12 @@ from glob import glob
 from pandas import DataFrame, ExcelWriter, Series
 
 from ora_classes_main import A1SomChange
-from generate_charts_funcs import generate_charts
+from generate_charts_funcs import add_charts
 
-def generate_excel_outfiles(study, subplot, weather, complete_run):
+def som_change_sheet(weather, complete_run):
+    '''
+    A1. SOM change for steady state and forward run
+    '''
 
     # concatenate weather into single entity
     # ======================================
@@ -43,9 +46,14 @@ def generate_excel_outfiles(study, subplot, weather, complete_run):
     pettmp = {'period':period_lst, 'precip':precip_lst, 'tair':tair_lst, 'pet':pet_lst}
 
     carbon_change, nitrogen_change, soil_water = complete_run
+
+    return A1SomChange(pettmp, carbon_change, soil_water)
+
+def generate_excel_outfiles(study, subplot, weather, complete_run, charts = True):
+
     study_pass_name = study.study_name + '_' + subplot
-    som_change_a1 = A1SomChange(pettmp, carbon_change, soil_water)
-    write_excel_out(study.out_dir, som_change_a1, study_pass_name, 'A1. SOM change')
+    som_change_a1 = som_change_sheet(weather, complete_run)
+    write_excel_out(study.out_dir, som_change_a1, study_pass_name, 'A1. SOM change', charts)
 
     return
 
@@ -67,16 +75,23 @@ def check_out_dir(form):
     form.settings['out_dir'] = out_dir
     if out_dir is not None:
         form.w_soil_cn.setEnabled(True)
+        form.w_optimise.setEnabled(True)
 
     return
 
+def output_xls_files(out_dir, study_name):
+    '''
+    list of Excel output files of a study
+    '''
+    return glob(out_dir + '/' + study_name + '*.xlsx')
+
 def retrieve_output_xls_files(form, study_name):
     '''
     retrieve list of Excel files in the output directory
 
     '''
     out_dir = form.settings['out_dir']      # existence has been pre-checked in check_excel_input_fname
-    xlsx_list = glob(out_dir + '/' + study_name + '*.xlsx')
+    xlsx_list = output_xls_files(out_dir, study_name)
     form.w_combo17.clear()
     if len(xlsx_list) > 0:
         form.w_disp_out.setEnabled(True)
@@ -85,9 +100,10 @@ def retrieve_output_xls_files(form, study_name):
             form.w_combo17.addItem(short_fn)
     return
 
-def write_excel_out(out_dir, output_obj, study, sheet_name):
+def write_excel_out(out_dir, output_obj, study, sheet_name, charts = True):
     '''
     condition data before outputting
+    charts are added to the workbook, as it is written, only if charts is set, see generate_charts for deferred charts
     '''
     func_name =  __prog__ +  ' write_excel_out'
 
@@ -119,12 +135,21 @@ def write_excel_out(out_dir, output_obj, study, sheet_name):
     # write to Excel
     # ==============
     # print('Will write ' + fname)
-    writer = ExcelWriter(fname)
+    writer = ExcelWriter(fname, engine = 'openpyxl')
     data_frame.to_excel(writer, sheet_name)
-    writer.save()
 
-    # reopen Excel file and write a chart
-    # ===================================
-    generate_charts(fname, data_frame, sheet_name)
+    # add charts to the workbook before it is saved
+    # =============================================
+    if charts:
+        add_charts(writer.book, sheet_name)
+
+    try:
+        writer.close()
+    except PermissionError as e:
+        print(str(e) + ' - could not create: ' + fname)
+        return -1
+
+    if charts:
+        print('\tcreated: ' + fname)
 
     return 0
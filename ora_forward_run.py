@@ -25,26 +25,31 @@ __version__ = '0.0.0'
 #
 from time import time
 from ora_water_model import get_soil_water_constants
-from ora_low_level_fns import get_rate_temp, inert_organic_carbon, carbon_lost_from_pool, get_soil_vars, \
-                                                                init_ss_carbon_pools, get_values_for_tstep
-from ora_nitrogen_model import soil_nitrogen
-from ora_water_model import get_soil_water, SoilWater
+from ora_low_level_fns import inert_organic_carbon, carbon_lost_from_pool, get_soil_vars, init_ss_carbon_pools
+from ora_nitrogen_model import soil_nitrogen, soil_nitrogen_stepper
+from ora_water_model import SoilWater
+from ora_classes_main import CompiledMngmnt
 
 
 # rate constant for decomposition of the pool
 # ===========================================
 K_DPM = 10/12;    K_RPM = 0.3/12;   K_BIO = 0.66/12;  K_HUM = 0.02/12  # per month
 
-def cn_forward_run(parameters, weather, management, soil_vars, steady_state):
+def cn_forward_run(parameters, weather, management, soil_vars, steady_state, coupled = False):
     '''
-
+    the N model is driven by the first ntsteps records of the carbon and soil water objects which begin with those of
+    the steady state; if coupled is set the N model is advanced within the carbon loop, reading record tstep at each
+    timestep, otherwise soil_nitrogen is run afterwards on the records
+    while the steady state is at least as long as the forward run, as for ORATOR inputs workbooks, the records read
+    are all those of the steady state, so coupling only interleaves the N model with the carbon loop: the results,
+    the work and the memory are those of the two pass run
     '''
     pettmp = weather.pettmp_fwd
     t_depth, t_bulk, t_pH_h2o, tot_soc_meas, prop_hum, prop_bio, prop_co2 = get_soil_vars(soil_vars)
 
-    # water content at initial and first time step
-    # ============================================
-    wc_t0 = 0; wc_t1 = 0; imnth =1
+    # water content at field capacity and permanent wilting point
+    # ===========================================================
+    imnth =1
     wc_fld_cap, wc_pwp = get_soil_water_constants(soil_vars)
 
     ntsteps = management.ntsteps
@@ -52,13 +57,19 @@ def cn_forward_run(parameters, weather, management, soil_vars, steady_state):
     pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul, \
                                     c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio \
                                                                                 = carbon_change.get_last_tstep_pools()
+    carbon_change.reserve(ntsteps)
+    soil_water.reserve(ntsteps)
+    compiled = CompiledMngmnt(pettmp, management, parameters, soil_vars)
+    pi_tonnes = management.pi_tonnes
+    if coupled:
+        n_stepper = soil_nitrogen_stepper(parameters, pettmp, management, soil_vars)
+        nitrogen_change = next(n_stepper)
+
     for tstep in range(ntsteps):
         tair, precip, pet, irrig, c_pi_mnth, c_n_rat_ow, rat_dpm_rpm, cow, rat_dpm_hum_ow, prop_iom_ow, \
-                                    max_root_dpth = get_values_for_tstep(pettmp, management, parameters, tstep)
-
-        wat_soil, wc_t0, wc_t1 = get_soil_water(tstep, precip, pet, irrig, wc_fld_cap, wc_pwp, wc_t0, wc_t1)
+                                    max_root_dpth = compiled.get_values_for_tstep(tstep, pi_tonnes)
 
-        rate_mod, rate_moist = get_rate_temp(tair, t_pH_h2o, wc_fld_cap, wc_pwp, wat_soil)
+        wat_soil, rate_mod = compiled.soil_trace[tstep]
 
         # plant inputs and losses (t ha-1) passed to the DPM pool
         # =======================================================
@@ -107,6 +118,11 @@ def cn_forward_run(parameters, weather, management, soil_vars, steady_state):
 
         soil_water.append_vars(t_depth, max_root_dpth, precip, pet, irrig, wc_pwp, wat_soil, wc_fld_cap)
 
-    nitrogen_change = soil_nitrogen(carbon_change, soil_water, parameters, pettmp, management, soil_vars)
+        # as for soil_nitrogen, record tstep is read which, beyond the steady state, has already been appended
+        # =====================================================================================================
+        if coupled:
+            n_stepper.send((precip, pet, carbon_change.get_vals_for_tstep(tstep), soil_water.get_vals_for_tstep(tstep)))
+    if not coupled:
+        nitrogen_change = soil_nitrogen(carbon_change, soil_water, parameters, pettmp, management, soil_vars)
 
     return (carbon_change, nitrogen_change, soil_water)
@@ -0,0 +1,512 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_grid_run.py
+# Purpose:     run the soil C and N model over a regional grid of soil and weather cells
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   command line and library entry point e.g.
+#       python ora_grid_run.py ORATOR_inputs.xlsx soils.csv weather.nc -o E:\ORATOR\grid -j 8
+#
+#   each cell has its own soil and weather, parameters and the steady state and forward run rotations are taken
+#   from one subplot of the inputs workbook and are shared by all cells
+#
+#   soils are read from a CSV file with columns cell_id, latitude and the soil variables of SOIL_VARS, one row
+#   per cell. Monthly weather, variables of GRID_WEATHER_VARS each of shape (ncells, nmnths) in the order of the
+#   soils file, is read a chunk at a time from:
+#       NetCDF     - requires netCDF4
+#       directory  - one NumPy .npy file per variable e.g. precip_ss.npy, memory mapped
+#       NPZ        - as written by numpy.savez or savez_compressed
+#       CSV        - columns cell_id, var then one column per month
+#   NPZ and CSV weather is first spooled, SPOOL_ROWS rows at a time, to memory mapped arrays in a temporary
+#   directory so that memory use is bounded by the chunk size for every format
+#
+#   cells are processed in chunks by ora_cn_vectorised, chunks are run concurrently by up to nworkers processes with
+#   at most two chunks per worker in flight. Results are streamed as chunks complete: to orator_results.sqlite in the
+#   output directory, the cell id taking the place of the subplot, or one NPZ, CSV or Parquet file per chunk
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_grid_run.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from shutil import rmtree
+from tempfile import mkdtemp
+from zipfile import ZipFile, BadZipFile
+
+import numpy as np
+from numpy.lib.format import open_memmap, read_magic, read_array_header_1_0, read_array_header_2_0
+from pandas import DataFrame, read_csv, concat
+
+from ora_classes_carbon import CarbonChange
+from ora_classes_main import MngmntSubplot
+from ora_cn_vectorised import CarbonDrivers, get_mngmnt_arrays, carbon_steady_state_batch, carbon_forward_batch, \
+                                        history_to_carbon_change, soil_water_history, pettmp_batch, STATE_VARS
+from ora_excel_read import Soil, SOIL_VARS
+from ora_input_cache import read_inputs
+from ora_nitrogen_model import soil_nitrogen
+from ora_output_write import output_tables, OUTPUT_EXTNS, safe_name, write_table
+from ora_results_store import ResultsStore, RESULTS_STORE_FNAME
+from ora_water_model import SoilWater
+
+GRID_WEATHER_VARS = list(['precip_ss', 'tair_ss', 'precip_fwd', 'tair_fwd'])
+GRID_OUTPUT_FORMATS = list(['sqlite', 'npz', 'csv', 'parquet'])
+CHUNK_SIZE = 500
+SPOOL_ROWS = 10000      # rows of an NPZ array or CSV file held in memory while spooling weather
+SHARED_COLUMNS = list(['period', 'month', 'tstep'])     # identical for every cell so written once per chunk to NPZ
+
+class GridSoils(object, ):
+    '''
+    cell ids, latitudes and soil variables of every cell
+    '''
+    def __init__(self, soils_fname):
+        """
+        cell_ids is set to None if the file cannot be read
+        """
+        self.cell_ids = None
+        try:
+            data_frame = read_csv(soils_fname, dtype = {'cell_id': str})
+        except (OSError, ValueError) as err:
+            print('*** Error *** could not read grid soils file ' + soils_fname + ': ' + str(err))
+            return
+
+        missing = [var_name for var_name in ['cell_id', 'latitude'] + SOIL_VARS
+                                                                            if var_name not in data_frame.columns]
+        if len(missing) > 0:
+            print('*** Error *** grid soils file ' + soils_fname + ' lacks columns: ' + ', '.join(missing))
+            return
+
+        self.cell_ids = data_frame['cell_id'].tolist()
+        self.latitudes = data_frame['latitude'].to_numpy(dtype = float)
+        self.soil_arr = data_frame[SOIL_VARS].to_numpy(dtype = float)
+        self.ncells = len(self.cell_ids)
+
+class GridChunk(object, ):
+    '''
+    cells of one chunk of the grid, only the chunk is sent to a worker process
+    '''
+    def __init__(self, grid_soils, ichunk, start, stop):
+
+        self.ichunk = ichunk
+        self.cell_ids = grid_soils.cell_ids[start:stop]
+        self.latitudes = grid_soils.latitudes[start:stop]
+        self.soil_arr = grid_soils.soil_arr[start:stop]
+
+    def soils(self):
+        '''
+        Soil objects for the cells of the chunk
+        '''
+        return [Soil(soil_slice) for soil_slice in self.soil_arr.tolist()]
+
+class GridWeather(object, ):
+    '''
+    monthly weather for every cell, only the cells of a chunk are read into memory at a time
+    '''
+    def __init__(self, weather_fname, cell_ids):
+        """
+        NetCDF variables and NumPy arrays of a directory are read in place, NPZ and CSV files are first spooled to
+        temporary NumPy arrays which are memory mapped
+        arrays is set to None if the file cannot be read or does not match the cells
+        """
+        self.arrays = None
+        self.dset = None
+        self.spool_dir = None
+        extn = os.path.splitext(weather_fname)[1].lower()
+        try:
+            if extn == '.nc':
+                try:
+                    from netCDF4 import Dataset
+                except ImportError:
+                    print('*** Error *** netCDF4 is required to read ' + weather_fname)
+                    return
+                self.dset = Dataset(weather_fname)
+                arrays = {var_name: self.dset.variables[var_name] for var_name in GRID_WEATHER_VARS}
+            elif os.path.isdir(weather_fname):
+                arrays = {var_name: np.load(os.path.join(weather_fname, var_name + '.npy'), mmap_mode = 'r')
+                                                                                for var_name in GRID_WEATHER_VARS}
+            else:
+                self.spool_dir = mkdtemp(prefix = 'ora_grid_weather_')
+                if extn == '.npz':
+                    arrays = _spool_weather_npz(weather_fname, self.spool_dir)
+                else:
+                    arrays = _spool_weather_csv(weather_fname, cell_ids, self.spool_dir)
+        except (OSError, KeyError, ValueError, BadZipFile) as err:
+            print('*** Error *** could not read grid weather file ' + weather_fname + ': ' + str(err))
+            self.close()
+            return
+
+        if arrays is None:
+            self.close()
+            return
+
+        for var_name in GRID_WEATHER_VARS:
+            if arrays[var_name].shape[0] != len(cell_ids):
+                print('*** Error *** {} in {} has {} cells, soils file has {}'
+                                .format(var_name, weather_fname, arrays[var_name].shape[0], len(cell_ids)))
+                self.close()
+                return
+
+        self.arrays = arrays
+
+    def read_chunk(self, start, stop):
+        '''
+        dictionary of weather arrays of shape (ncells_chunk, nmnths)
+        '''
+        return {var_name: np.array(self.arrays[var_name][start:stop], dtype = float) for var_name in GRID_WEATHER_VARS}
+
+    def close(self):
+
+        if self.dset is not None:
+            self.dset.close()
+            self.dset = None
+        if self.spool_dir is not None:
+            self.arrays = None
+            rmtree(self.spool_dir, ignore_errors = True)
+            self.spool_dir = None
+
+def _spool_weather_npz(weather_fname, spool_dir):
+    '''
+    copy the weather arrays of an NPZ file, as written by numpy.savez or savez_compressed, to memory mapped NumPy
+    arrays a block of SPOOL_ROWS cells at a time
+    '''
+    arrays = {}
+    with ZipFile(weather_fname) as zip_file:
+        for var_name in GRID_WEATHER_VARS:
+            with zip_file.open(var_name + '.npy') as fobj:
+                version = read_magic(fobj)
+                read_header = read_array_header_1_0 if version == (1, 0) else read_array_header_2_0
+                shape, fortran_order, dtype = read_header(fobj)
+                if fortran_order or len(shape) != 2 or dtype.hasobject:
+                    print('*** Error *** {} in {} must be a 2D array of numbers in C order'
+                                                                                .format(var_name, weather_fname))
+                    return None
+
+                arr = open_memmap(os.path.join(spool_dir, var_name + '.npy'), mode = 'w+', shape = shape)
+                for start in range(0, shape[0], SPOOL_ROWS):
+                    nrows = min(SPOOL_ROWS, shape[0] - start)
+                    block = fobj.read(nrows*shape[1]*dtype.itemsize)
+                    arr[start:start + nrows] = np.frombuffer(block, dtype = dtype).reshape(nrows, shape[1])
+                arr.flush()
+                arrays[var_name] = arr
+
+    return arrays
+
+def _spool_weather_csv(weather_fname, cell_ids, spool_dir):
+    '''
+    weather arrays from CSV with columns cell_id, var then one column per month, rows in any order, are copied to
+    memory mapped NumPy arrays in the order of cell_ids, reading SPOOL_ROWS rows at a time
+    trailing months which are empty for every cell are dropped
+    '''
+    cell_indices = {cell_id: icell for icell, cell_id in enumerate(cell_ids)}
+    arrays, found, nmnths = {}, {}, {}
+    for data_frame in read_csv(weather_fname, dtype = {'cell_id': str, 'var': str}, chunksize = SPOOL_ROWS):
+        mnth_cols = [col for col in data_frame.columns if col not in ('cell_id', 'var')]
+        if len(arrays) == 0:
+            for var_name in GRID_WEATHER_VARS:
+                arrays[var_name] = open_memmap(os.path.join(spool_dir, var_name + '.npy'), mode = 'w+',
+                                                                            shape = (len(cell_ids), len(mnth_cols)))
+                arrays[var_name][:] = np.nan
+                found[var_name] = np.zeros(len(cell_ids), dtype = bool)
+                nmnths[var_name] = 0
+
+        for var_name in GRID_WEATHER_VARS:
+            var_frame = data_frame[(data_frame['var'] == var_name) & data_frame['cell_id'].isin(cell_indices)]
+            if len(var_frame) == 0:
+                continue
+            indices = var_frame['cell_id'].map(cell_indices).to_numpy()
+            vals = var_frame[mnth_cols].to_numpy(dtype = float)
+            arrays[var_name][indices] = vals
+            found[var_name][indices] = True
+            filled = np.flatnonzero(~np.isnan(vals).all(axis = 0))
+            if len(filled) > 0:
+                nmnths[var_name] = max(nmnths[var_name], filled[-1] + 1)
+
+    for var_name in GRID_WEATHER_VARS:
+        nmissing = 0 if var_name not in found else int((~found[var_name]).sum())
+        if nmissing > 0 or var_name not in found:
+            example = cell_ids[0] if var_name not in found else cell_ids[int(np.argmin(found[var_name]))]
+            print('*** Error *** {} in {} lacks {} cells e.g. {}'.format(var_name, weather_fname,
+                                                                        nmissing or len(cell_ids), example))
+            return None
+        arrays[var_name].flush()
+        arrays[var_name] = arrays[var_name][:, :nmnths[var_name]]
+
+    return arrays
+
+class GridCellWeather(object, ):
+    '''
+    weather for one cell with the pettmp_ss and pettmp_fwd attributes of ReadWeather
+    '''
+    def __init__(self, pettmp_ss, pettmp_fwd):
+
+        self.pettmp_ss = pettmp_ss
+        self.pettmp_fwd = pettmp_fwd
+
+def _cell_pettmp(pettmp, icell):
+
+    return {var_name: pettmp[var_name][icell].tolist() for var_name in ['precip', 'tair', 'pet']}
+
+def _shared_mngmnt_arrays(pettmp, management, parameters, ncells):
+    '''
+    management arrays of a rotation repeated for each cell
+    '''
+    mngmnt_arrs = get_mngmnt_arrays(_cell_pettmp(pettmp, 0), [management], parameters)
+
+    return {var_name: np.repeat(arr, ncells, axis = 0) for var_name, arr in mngmnt_arrs.items()}
+
+def cn_grid_chunk(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, soils, latitudes, weather_chunk,
+                                                                                        ss_solver = 'analytic'):
+    '''
+    steady state and forward run for a chunk of cells, the vectorised equivalent of _cn_subplot_run for each cell
+    returns lists of complete_run tuples, None for cells which failed to reach steady state, and cell weather
+    '''
+    ncells = len(soils)
+    pettmp_ss = pettmp_batch(weather_chunk['precip_ss'], weather_chunk['tair_ss'], latitudes)
+    pettmp_fwd = pettmp_batch(weather_chunk['precip_fwd'], weather_chunk['tair_fwd'], latitudes)
+    cell_weathers = [GridCellWeather(_cell_pettmp(pettmp_ss, icell), _cell_pettmp(pettmp_fwd, icell))
+                                                                                        for icell in range(ncells)]
+    complete_runs = ncells*[None]
+
+    # steady state
+    # ============
+    mngmnt_ss = MngmntSubplot(crop_mngmnt_ss, parameters)
+    mngmnt_arrs = _shared_mngmnt_arrays(pettmp_ss, mngmnt_ss, parameters, ncells)
+    drivers_ss = CarbonDrivers(pettmp_ss, None, parameters, soils, mngmnt_arrs = mngmnt_arrs)
+    history_ss, pi_tonnes, converged = carbon_steady_state_batch(drivers_ss, mngmnt_arrs['c_pi_mnth'], ss_solver)
+    cells = np.flatnonzero(converged)
+    if len(cells) == 0:
+        return complete_runs, cell_weathers
+
+    # forward run, plant inputs from the steady state
+    # ===============================================
+    mngmnt_fwd = MngmntSubplot(crop_mngmnt_fwd, parameters)
+    if mngmnt_fwd.ntsteps > drivers_ss.ntsteps:
+        print('*** Error *** forward run of {} months exceeds steady state of {} months'
+                                                                    .format(mngmnt_fwd.ntsteps, drivers_ss.ntsteps))
+        return complete_runs, cell_weathers
+
+    pettmp_fwd_conv = {var_name: arr[cells] for var_name, arr in pettmp_fwd.items()}
+    mngmnt_arrs = _shared_mngmnt_arrays(pettmp_fwd_conv, mngmnt_fwd, parameters, len(cells))
+    mngmnt_arrs['c_pi_mnth'] = pi_tonnes[cells, :mngmnt_fwd.ntsteps]
+    soils_conv = [soils[icell] for icell in cells]
+    drivers_fwd = CarbonDrivers(pettmp_fwd_conv, None, parameters, soils_conv, mngmnt_arrs = mngmnt_arrs)
+
+    init_state = {var_name: history_ss[var_name][cells, -1] for var_name in STATE_VARS}
+    tot_soc_simul = history_ss['tot_soc_simul'][cells, -1]
+    history_fwd = carbon_forward_batch(drivers_fwd, mngmnt_arrs['c_pi_mnth'], init_state, tot_soc_simul)
+
+    # as cn_forward_run_batch the forward run is appended to the steady state
+    # =======================================================================
+    ntsteps = drivers_ss.ntsteps + drivers_fwd.ntsteps
+    for isub, icell in enumerate(cells.tolist()):
+        cell_weather = cell_weathers[icell]
+        carbon_change = history_to_carbon_change(history_ss, icell, CarbonChange('steady state', ntsteps))
+        history_to_carbon_change(history_fwd, isub, carbon_change)
+        soil_water = soil_water_history(drivers_ss, icell, soils[icell], cell_weather.pettmp_ss, SoilWater(ntsteps))
+        soil_water_history(drivers_fwd, isub, soils[icell], cell_weather.pettmp_fwd, soil_water)
+        nitrogen_change = soil_nitrogen(carbon_change, soil_water, parameters, cell_weather.pettmp_fwd, mngmnt_fwd,
+                                                                                                    soils[icell])
+        complete_runs[icell] = (carbon_change, nitrogen_change, soil_water)
+
+    return complete_runs, cell_weathers
+
+def _chunk_fname(out_dir, study_name, ichunk, sheet_name, output_format):
+
+    if sheet_name is None:
+        return os.path.join(out_dir, '{}_grid_{:05d}{}'.format(study_name, ichunk, OUTPUT_EXTNS[output_format]))
+
+    return os.path.join(out_dir, '{}_grid_{:05d}_{}{}'.format(study_name, ichunk, safe_name(sheet_name),
+                                                                                    OUTPUT_EXTNS[output_format]))
+
+def _write_chunk(out_dir, study_name, ichunk, cell_tables, output_format):
+    '''
+    write tables of all cells of a chunk: NPZ arrays of shape (ncells, ntsteps) or CSV/Parquet with a cell_id column
+    returns list of files written
+    '''
+    cell_ids = [cell_id for cell_id, tables in cell_tables]
+    sheet_names = list(cell_tables[0][1].keys())
+
+    fnames = []
+    if output_format == 'npz':
+        arrays = {'cell_id': np.array(cell_ids)}
+        for sheet_name in sheet_names:
+            for var_name in cell_tables[0][1][sheet_name]:
+                key = safe_name(sheet_name) + '/' + var_name
+                if var_name in SHARED_COLUMNS:
+                    arrays[key] = np.asarray(cell_tables[0][1][sheet_name][var_name])
+                else:
+                    arrays[key] = np.array([tables[sheet_name][var_name] for cell_id, tables in cell_tables])
+        fname = _chunk_fname(out_dir, study_name, ichunk, None, output_format)
+        np.savez(fname, **arrays)
+        fnames.append(fname)
+    else:
+        for sheet_name in sheet_names:
+            frames = []
+            for cell_id, tables in cell_tables:
+                columns = tables[sheet_name]
+                nrows = len(next(iter(columns.values())))
+                frame = DataFrame({var_name: np.asarray(columns[var_name]) for var_name in columns})
+                frame.insert(0, 'cell_id', nrows*[cell_id])
+                frames.append(frame)
+            fname = _chunk_fname(out_dir, study_name, ichunk, sheet_name, output_format)
+            columns = concat(frames, ignore_index = True)
+            if write_table(fname, {var_name: columns[var_name] for var_name in columns.columns}, output_format) == 0:
+                fnames.append(fname)
+
+    return fnames
+
+def _grid_chunk_run(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, grid_chunk, weather_chunk, ss_solver, study_name,
+                                                                                            out_dir, output_format):
+    '''
+    run a chunk of cells and, except for sqlite, write its outputs
+    returns ichunk, number of cells which reached steady state, files written and, for sqlite, tables of each cell
+    '''
+    ichunk = grid_chunk.ichunk
+    complete_runs, cell_weathers = cn_grid_chunk(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, grid_chunk.soils(),
+                                                                grid_chunk.latitudes, weather_chunk, ss_solver)
+    cell_tables = []
+    for cell_id, complete_run, cell_weather in zip(grid_chunk.cell_ids, complete_runs, cell_weathers):
+        if complete_run is not None:
+            tables = output_tables(cell_weather, complete_run)
+            cell_tables.append((cell_id, {sheet_name: {var_name: np.asarray(columns[var_name])
+                                for var_name in columns} for sheet_name, columns in tables.items()}))
+
+    nconverged = len(cell_tables)
+    if output_format is None or nconverged == 0:
+        return ichunk, nconverged, [], None
+
+    if output_format == 'sqlite':
+        return ichunk, nconverged, [], cell_tables
+
+    return ichunk, nconverged, _write_chunk(out_dir, study_name, ichunk, cell_tables, output_format), None
+
+def run_grid(xls_inp_fname, soils_fname, weather_fname, out_dir, subplot = None, nworkers = 1,
+                ss_solver = 'analytic', output_format = 'sqlite', chunk_size = CHUNK_SIZE, use_cache = True):
+    '''
+    run steady state and forward run for every cell of a grid, parameters and rotations of the given subplot, by
+    default the first, are taken from the inputs workbook
+    returns dictionary of numbers of cells run and reaching steady state, or None if inputs could not be read
+    '''
+    if output_format is not None and output_format not in GRID_OUTPUT_FORMATS:
+        print('*** Error *** grid output format {} must be one of {}'.format(output_format, GRID_OUTPUT_FORMATS))
+        return None
+
+    inputs = read_inputs(xls_inp_fname, out_dir, None, ss_solver, use_cache)
+    if inputs is None:
+        return None
+    study, ora_parms, ora_weather, ora_subplots = inputs
+
+    subplots = list(ora_subplots.soil_all_areas.keys())
+    if subplot is None:
+        subplot = subplots[0]
+    if subplot not in subplots:
+        print('*** Error *** subplot ' + subplot + ' is not one of ' + ', '.join(subplots))
+        return None
+    crop_mngmnt_ss = ora_subplots.crop_mngmnt_ss[subplot]
+    crop_mngmnt_fwd = ora_subplots.crop_mngmnt_fwd[subplot]
+
+    grid_soils = GridSoils(soils_fname)
+    if grid_soils.cell_ids is None:
+        return None
+    grid_weather = GridWeather(weather_fname, grid_soils.cell_ids)
+    if grid_weather.arrays is None:
+        return None
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    store = None
+    if output_format == 'sqlite':
+        store = ResultsStore(os.path.join(out_dir, RESULTS_STORE_FNAME))
+
+    ncells = grid_soils.ncells
+    chunks = [(ichunk, start, min(start + chunk_size, ncells))
+                                                for ichunk, start in enumerate(range(0, ncells, chunk_size))]
+    summary = {'cells': ncells, 'converged': 0, 'failed chunks': 0}
+    print('Processing {} cells in {} chunks of up to {} cells'.format(ncells, len(chunks), chunk_size))
+
+    def _record(result):
+        ichunk, nconverged, fnames, cell_tables = result
+        summary['converged'] += nconverged
+        if cell_tables is not None:
+            for cell_id, tables in cell_tables:
+                store.write_subplot(study.study_name, cell_id, tables)
+        print('Completed chunk {} of {}: {} cells reached steady state'.format(ichunk + 1, len(chunks), nconverged))
+
+    if nworkers is None or nworkers <= 1:
+        for ichunk, start, stop in chunks:
+            _record(_grid_chunk_run(ora_parms, crop_mngmnt_ss, crop_mngmnt_fwd,
+                                GridChunk(grid_soils, ichunk, start, stop), grid_weather.read_chunk(start, stop),
+                                                            ss_solver, study.study_name, out_dir, output_format))
+    else:
+        # submit chunks as earlier ones complete so that the weather of at most two chunks per worker is in memory
+        # ========================================================================================================
+        nworkers = min(nworkers, len(chunks))
+        max_pending = 2*nworkers
+        with ProcessPoolExecutor(max_workers = nworkers) as executor:
+            pending = {}
+            next_chunk = 0
+            while next_chunk < len(chunks) or len(pending) > 0:
+                while next_chunk < len(chunks) and len(pending) < max_pending:
+                    ichunk, start, stop = chunks[next_chunk]
+                    future = executor.submit(_grid_chunk_run, ora_parms, crop_mngmnt_ss, crop_mngmnt_fwd,
+                                GridChunk(grid_soils, ichunk, start, stop), grid_weather.read_chunk(start, stop),
+                                                            ss_solver, study.study_name, out_dir, output_format)
+                    pending[future] = ichunk
+                    next_chunk += 1
+
+                done, not_done = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    ichunk = pending.pop(future)
+                    try:
+                        _record(future.result())
+                    except Exception as err:
+                        print('*** Error *** chunk {} failed: {}'.format(ichunk + 1, repr(err)))
+                        summary['failed chunks'] += 1
+
+    grid_weather.close()
+    if store is not None:
+        store.close()
+
+    return summary
+
+def main(argv = None):
+    '''
+    command line entry point, returns 0 if all chunks succeeded and 1 otherwise
+    '''
+    parser = ArgumentParser(prog = __prog__, description = 'Run ORATOR soil C and N model over a grid of cells')
+    parser.add_argument('inputs', help = 'ORATOR inputs workbook providing parameters and rotations')
+    parser.add_argument('soils', help = 'CSV file of cell soils')
+    parser.add_argument('weather', help = 'NetCDF, NPZ or CSV file, or directory of .npy files, '
+                                                                                            'of cell weather')
+    parser.add_argument('-o', '--out_dir', required = True, help = 'output directory')
+    parser.add_argument('-s', '--subplot', help = 'subplot providing rotations, default: first subplot')
+    parser.add_argument('-j', '--jobs', type = int, default = 1, help = 'maximum number of worker processes')
+    parser.add_argument('-c', '--chunk_size', type = int, default = CHUNK_SIZE, help = 'cells per chunk')
+    parser.add_argument('--solver', choices = ['iterative', 'analytic'], default = 'analytic',
+                                                                        help = 'steady state solver')
+    parser.add_argument('-f', '--format', choices = GRID_OUTPUT_FORMATS + ['none'], default = 'sqlite',
+                                                                        help = 'output format, default: sqlite')
+    parser.add_argument('--no_cache', action = 'store_true', help = 'always read inputs from the workbook')
+    args = parser.parse_args(argv)
+
+    output_format = None if args.format == 'none' else args.format
+    summary = run_grid(args.inputs, args.soils, args.weather, args.out_dir, args.subplot, args.jobs, args.solver,
+                                                            output_format, args.chunk_size, not args.no_cache)
+    print()
+    print(str(summary))
+    if summary is None or summary['failed chunks'] > 0:
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
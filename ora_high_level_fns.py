@@ -24,15 +24,24 @@ __version__ = '0.0.0'
 # ---------------
 #
 import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from numpy import identity, array
+
 from ora_forward_run import cn_forward_run
-from ora_low_level_fns import get_rate_temp, inert_organic_carbon, carbon_lost_from_pool, summary_table_add, \
-                                                        get_values_for_tstep, get_soil_vars, init_ss_carbon_pools
-from ora_classes_main import MngmntSubplot
-from ora_classes_carbon import CarbonChange
-from ora_nitrogen_model import soil_nitrogen
-from ora_water_model import get_soil_water, get_soil_water_constants, SoilWater
-from ora_excel_write import retrieve_output_xls_files, generate_excel_outfiles
-from ora_excel_read import ReadInputParms, ReadInputSubplots, ReadStudy, ReadWeather
+from ora_low_level_fns import inert_organic_carbon, carbon_lost_from_pool, summary_table_add, get_soil_vars, \
+                                                                                                init_ss_carbon_pools
+from ora_classes_main import MngmntSubplot, CompiledMngmnt
+from ora_classes_carbon import CarbonChange, nitrogen_inputs
+from ora_nitrogen_model import soil_nitrogen, soil_nitrogen_stepper
+from ora_water_model import SoilWater
+from ora_excel_write import retrieve_output_xls_files, output_xls_files
+from generate_charts_funcs import start_charts_thread, join_charts_thread
+from ora_output_write import generate_outfiles, results_store_fname, write_results_store
+from ora_results_store import ResultsStore
+from ora_input_cache import read_inputs
+from ora_checkpoint import steady_state_key, load_steady_state, save_steady_state
+from ora_cn_kernel import cn_steady_state_kernel, cn_forward_run_kernel, NUMBA_FLAG
 
 # rate constant for decomposition of the pool
 # ===========================================
@@ -40,92 +49,248 @@ K_DPM = 10/12;    K_RPM = 0.3/12;   K_BIO = 0.66/12;  K_HUM = 0.02/12  # per mon
 MAX_ITERS = 1000
 SOC_MIN_DIFF = 0.0000001  # convergence criteria tonne/hectare
 
-def _cn_steady_state(parameters, weather, management, soil_vars, study, subplot):
+def _ss_period_drivers(compiled, pi_tonnes):
     '''
-
+    per timestep rate modifiers and carbon inputs for one steady state period - these depend only on the weather,
+    management and soil so do not change from one iteration to the next
+    plant inputs are per unit scaling of pi_tonnes
     '''
-    run_mode = 'steady state'
-    pettmp = weather.pettmp_ss
+    period_drivers = []
+    for tstep in range(compiled.ntsteps):
+        tair, precip, pet, irrig, c_pi_mnth, c_n_rat_ow, rat_dpm_rpm, cow, rat_dpm_hum_ow, prop_iom_ow, \
+                        max_root_dpth = compiled.get_values_for_tstep(tstep, pi_tonnes)
+        wat_soil, rate_mod = compiled.soil_trace[tstep]
 
-    t_depth, t_bulk, t_pH_h2o, tot_soc_meas, prop_hum, prop_bio, prop_co2 = get_soil_vars(soil_vars)
-    pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul = init_ss_carbon_pools(tot_soc_meas)
+        pi_to_dpm = c_pi_mnth * rat_dpm_rpm/(1.0 + rat_dpm_rpm)                       # (eq.2.1.10)
+        pi_to_rpm = c_pi_mnth * 1.0 / (1.0 + rat_dpm_rpm)                              # (eq.2.1.11)
+        cow_to_dpm = cow * rat_dpm_hum_ow * (1.0 - prop_iom_ow)/(1 + rat_dpm_hum_ow)  # (eq.2.1.12)
+        cow_to_hum = cow * (1 - prop_iom_ow)/(1 + rat_dpm_hum_ow)                     # (eq.2.1.13)
+        ioc_to_iom = inert_organic_carbon(prop_iom_ow, cow)
 
-    summary_table = summary_table_add(pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, management.pi_tonnes)
+        period_drivers.append((rate_mod, pi_to_dpm, pi_to_rpm, cow_to_dpm, cow_to_hum, ioc_to_iom))
 
-    # water content at initial and first time step
-    # ============================================
-    wc_t0, wc_t1, imnth = 3*[0]
-    wc_fld_cap, wc_pwp = get_soil_water_constants(soil_vars)
+    return period_drivers
 
-    c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio = 6*[0]
+def _carbon_period(period_drivers, pools, pi_scale, prop_bio, prop_hum, losses = None):
+    '''
+    advance the DPM, RPM, BIO and HUM pools through one steady state period using the same arithmetic as the main
+    loop of _cn_steady_state. If losses are not supplied then they are derived from the rate modifier of the
+    last timestep i.e. as if the pools had been carried over from a previous period
+    '''
+    pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum = pools
+
+    if losses is None:
+        rate_mod = period_drivers[-1][0]
+        c_loss_dpm = carbon_lost_from_pool(pool_c_dpm, K_DPM, rate_mod)
+        c_loss_rpm = carbon_lost_from_pool(pool_c_rpm, K_RPM, rate_mod)
+        c_loss_bio = carbon_lost_from_pool(pool_c_bio, K_BIO, rate_mod)
+        c_loss_hum = carbon_lost_from_pool(pool_c_hum, K_HUM, rate_mod)
+        c_loss_total = c_loss_dpm + c_loss_rpm + c_loss_hum + c_loss_bio
+        c_input_bio = prop_bio * c_loss_total
+        c_input_hum = prop_hum * c_loss_total
+    else:
+        c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio = losses
+
+    for rate_mod, pi_to_dpm, pi_to_rpm, cow_to_dpm, cow_to_hum, ioc_to_iom in period_drivers:
+        pool_c_dpm += pi_scale*pi_to_dpm + cow_to_dpm - c_loss_dpm
+        pool_c_dpm = max(0, pool_c_dpm)
+        pool_c_rpm += pi_scale*pi_to_rpm - c_loss_rpm
+        pool_c_bio += c_input_bio - c_loss_bio
+        pool_c_hum += cow_to_hum + c_input_hum - c_loss_hum
+
+        c_loss_dpm = carbon_lost_from_pool(pool_c_dpm, K_DPM, rate_mod)
+        c_loss_rpm = carbon_lost_from_pool(pool_c_rpm, K_RPM, rate_mod)
+        c_loss_bio = carbon_lost_from_pool(pool_c_bio, K_BIO, rate_mod)
+        c_loss_hum = carbon_lost_from_pool(pool_c_hum, K_HUM, rate_mod)
+        c_loss_total = c_loss_dpm + c_loss_rpm + c_loss_hum + c_loss_bio
+        c_input_bio = prop_bio * c_loss_total
+        c_input_hum = prop_hum * c_loss_total
+
+    return [pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum]
+
+def _analytic_steady_state(period_drivers, pool_c_iom, tot_soc_meas, prop_bio, prop_hum, init_pools):
+    '''
+    for a fixed sequence of rate modifiers the pools at the end of a period are an affine function of the pools at
+    the start of the period and of the plant input scaling:  p_end = M p_start + s U + V
+    the iterative spin-up, including the rescaling of plant inputs after each period, is replayed on this map so that
+    the pools and plant inputs of its converged period are reproduced at the cost of a 4x4 product per iteration
+    NB the periodic equilibrium p* = s a + b, where (I - M) a = U and (I - M) b = V, is not used since the iterative
+    solver stops when total SOC, rather than each pool, has converged and the slow HUM pool is then still drifting
+
+    returns the pools and IOM at the start of the converged period, the plant input scaling and the number of
+    iterations the iterative solver requires, or None if it does not converge or converges in the first iteration
+    '''
+    zero = 4*[0]
+    vec_v = array(_carbon_period(period_drivers, zero, 0, prop_bio, prop_hum))
+    vec_u = array(_carbon_period(period_drivers, zero, 1, prop_bio, prop_hum)) - vec_v
+    mat_m = identity(4)
+    for indx in range(4):
+        mat_m[:, indx] = array(_carbon_period(period_drivers, mat_m[:, indx], 0, prop_bio, prop_hum)) - vec_v
+
+    # the first period starts from the initial pools with no losses carried over
+    # ===========================================================================
+    ioc_period = sum([drivers[-1] for drivers in period_drivers])
+    pools_start, iom_start = None, pool_c_iom
+    pools_iter = array(_carbon_period(period_drivers, init_pools, 1, prop_bio, prop_hum, 6*[0]))
+    scale_iter = 1.0
+    for iteration in range(MAX_ITERS):
+        pool_c_iom += ioc_period
+        tot_soc_simul = pools_iter.sum() + pool_c_iom
+        if abs(tot_soc_meas - tot_soc_simul) < SOC_MIN_DIFF:
+            break
+        pools_start, iom_start = pools_iter, pool_c_iom
+        scale_iter *= tot_soc_meas/tot_soc_simul
+        pools_iter = mat_m.dot(pools_iter) + scale_iter*vec_u + vec_v
+    else:
+        print('*** Warning *** analytic steady state solver: no convergence after {} iterations'.format(MAX_ITERS))
+        return None
 
-    ntsteps = management.ntsteps
+    if pools_start is None:
+        return None
 
-    converge_flag = False
-    for iteration in range(MAX_ITERS):
-        pi_tonnes = management.pi_tonnes
-        carbon_change = CarbonChange('steady state')
-        soil_water = SoilWater()
+    return [float(val) for val in pools_start], iom_start, scale_iter, iteration + 1
 
-        for tstep in range(ntsteps):
+def _ss_carbon_period(compiled, pi_tonnes, soil_vars, state, carbon_change = None, soil_water = None,
+                                                                                                n_stepper = None):
+    '''
+    run the carbon pools through one steady state period starting from state, which comprises the pools, total SOC
+    and the carried over inputs and losses in the order returned by CarbonChange.get_last_tstep_pools
+    compiled must include the soil trace
+    each timestep is recorded only if carbon_change and soil_water are supplied and, if n_stepper is also supplied,
+    see soil_nitrogen_stepper, the N model is advanced
+    returns state at the end of the period, with total SOC updated from the pools
+    '''
+    t_depth, t_bulk, t_pH_h2o, tot_soc_meas, prop_hum, prop_bio, prop_co2 = get_soil_vars(soil_vars)
+    wc_fld_cap, wc_pwp = compiled.wc_fld_cap, compiled.wc_pwp
+    record_flag = carbon_change is not None
+
+    pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul, \
+                                c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio = state
+    imnth = 0
+
+    for tstep in range(compiled.ntsteps):
+
+        tair, precip, pet, irrig, c_pi_mnth, c_n_rat_ow, rat_dpm_rpm, cow, rat_dpm_hum_ow, prop_iom_ow, \
+                        max_root_dpth = compiled.get_values_for_tstep(tstep, pi_tonnes)
+
+        wat_soil, rate_mod = compiled.soil_trace[tstep]
+
+        # plant inputs and losses (t ha-1) passed to the DPM pool
+        # =======================================================
+        pi_to_dpm = c_pi_mnth * rat_dpm_rpm/(1.0 + rat_dpm_rpm)                       # (eq.2.1.10)
+        cow_to_dpm = cow * rat_dpm_hum_ow * (1.0 - prop_iom_ow)/(1 + rat_dpm_hum_ow)  # (eq.2.1.12)
+        pool_c_dpm += pi_to_dpm + cow_to_dpm - c_loss_dpm
+        pool_c_dpm = max(0, pool_c_dpm)
+
+        # RPM pool
+        # ========
+        pi_to_rpm = c_pi_mnth * 1.0 / (1.0 + rat_dpm_rpm)   # (eq.2.1.11)
+        pool_c_rpm += pi_to_rpm - c_loss_rpm
+
+        # BIO pool
+        # ========
+        pool_c_bio += c_input_bio - c_loss_bio
+
+        # HUM pool
+        # ========
+        cow_to_hum = cow * (1 - prop_iom_ow)/(1 + rat_dpm_hum_ow)  # (eq.2.1.13)
+        pool_c_hum += cow_to_hum + c_input_hum - c_loss_hum
+
+        # IOM pool
+        # ========
+        ioc_to_iom = inert_organic_carbon(prop_iom_ow, cow)  # add any IOM from organic waste added to the soil
+        pool_c_iom += ioc_to_iom
+
+        # carbon losses
+        # =============
+        c_loss_dpm = carbon_lost_from_pool(pool_c_dpm, K_DPM, rate_mod)
+        c_loss_rpm = carbon_lost_from_pool(pool_c_rpm, K_RPM, rate_mod)
+        c_loss_bio = carbon_lost_from_pool(pool_c_bio, K_BIO, rate_mod)
+        c_loss_hum = carbon_lost_from_pool(pool_c_hum, K_HUM, rate_mod)
+        c_loss_total = c_loss_dpm + c_loss_rpm + c_loss_hum + c_loss_bio
+
+        c_input_bio = prop_bio * c_loss_total
+        c_input_hum = prop_hum * c_loss_total
+        co2_release = prop_co2 * c_loss_total        # co2 due to aerobic decomp - Loss as CO2 (t ha-1)
+
+        if record_flag:
+            carbon_change.append_vars(imnth, rate_mod, c_pi_mnth, cow, c_n_rat_ow,
+                                      pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm,
+                                      pool_c_rpm, pi_to_rpm, c_loss_rpm,
+                                      pool_c_bio, c_input_bio, c_loss_bio,
+                                      pool_c_hum, cow_to_hum, c_input_hum, c_loss_hum,
+                                      pool_c_iom, ioc_to_iom, tot_soc_simul, co2_release)
 
-            tair, precip, pet, irrig, c_pi_mnth, c_n_rat_ow, rat_dpm_rpm, cow, rat_dpm_hum_ow, prop_iom_ow, \
-                            max_root_dpth = get_values_for_tstep(pettmp, management, parameters, tstep)
+            soil_water.append_vars(t_depth, max_root_dpth, precip, pet, irrig, wc_pwp, wat_soil, wc_fld_cap)
 
-            wat_soil, wc_t0, wc_t1 = get_soil_water(tstep, precip, pet, irrig, wc_fld_cap, wc_pwp, wc_t0, wc_t1)
+            if n_stepper is not None:
+                n_stepper.send((precip, pet, nitrogen_inputs(cow, rate_mod, co2_release, c_loss_bio, pool_c_dpm,
+                                    pi_to_dpm, cow_to_dpm, c_loss_dpm, pool_c_hum, cow_to_hum, c_loss_hum,
+                                    pool_c_rpm, pi_to_rpm, c_loss_rpm), (wat_soil, wc_pwp, wc_fld_cap)))
 
-            rate_mod, rate_moist = get_rate_temp(tair, t_pH_h2o, wc_fld_cap, wc_pwp, wat_soil)
+    tot_soc_simul = pool_c_dpm + pool_c_rpm + pool_c_bio + pool_c_hum + pool_c_iom
 
-            # plant inputs and losses (t ha-1) passed to the DPM pool
-            # =======================================================
-            pi_to_dpm = c_pi_mnth * rat_dpm_rpm/(1.0 + rat_dpm_rpm)                       # (eq.2.1.10)
-            cow_to_dpm = cow * rat_dpm_hum_ow * (1.0 - prop_iom_ow)/(1 + rat_dpm_hum_ow)  # (eq.2.1.12)
-            pool_c_dpm += pi_to_dpm + cow_to_dpm - c_loss_dpm
-            pool_c_dpm = max(0, pool_c_dpm)
+    return (pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul,
+                                    c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio)
 
-            # RPM pool
-            # ========
-            pi_to_rpm = c_pi_mnth * 1.0 / (1.0 + rat_dpm_rpm)   # (eq.2.1.11)
-            pool_c_rpm += pi_to_rpm - c_loss_rpm
+def _cn_steady_state(parameters, weather, management, soil_vars, study, subplot, coupled = False):
+    '''
+    study.ss_solver determines how the pools and plant inputs are initialised:
+        iterative - start from default pools and adjust plant inputs until simulated and measured SOC agree
+        analytic  - start from the converged period of the iterative spin-up as replayed by _analytic_steady_state,
+                    the iterations then serve as a check
+    if coupled is set the N model is advanced within the recorded final iteration, from the records as they are
+    appended, rather than in a second pass over them
+    '''
+    run_mode = 'steady state'
+    pettmp = weather.pettmp_ss
 
-            # BIO pool
-            # ========
-            pool_c_bio += c_input_bio - c_loss_bio
+    t_depth, t_bulk, t_pH_h2o, tot_soc_meas, prop_hum, prop_bio, prop_co2 = get_soil_vars(soil_vars)
+    pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul = init_ss_carbon_pools(tot_soc_meas)
 
-            # HUM pool
-            # ========
-            cow_to_hum = cow * (1 - prop_iom_ow)/(1 + rat_dpm_hum_ow)  # (eq.2.1.13)
-            pool_c_hum += cow_to_hum + c_input_hum - c_loss_hum
+    summary_table = summary_table_add(pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, management.pi_tonnes)
 
-            # IOM pool
-            # ========
-            ioc_to_iom = inert_organic_carbon(prop_iom_ow, cow)  # add any IOM from organic waste added to the soil
-            pool_c_iom += ioc_to_iom
+    c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio = 6*[0]
 
-            # carbon losses
-            # =============
+    ntsteps = management.ntsteps
+    compiled = CompiledMngmnt(pettmp, management, parameters, soil_vars)
+
+    iters_estim = None
+    if study.ss_solver == 'analytic':
+        period_drivers = _ss_period_drivers(compiled, management.pi_tonnes)
+        init_pools = [pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum]
+        equilib = _analytic_steady_state(period_drivers, pool_c_iom, tot_soc_meas, prop_bio, prop_hum, init_pools)
+        if equilib is not None:
+            pools, pool_c_iom, pi_scale, iters_estim = equilib
+            pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum = pools
+            management.pi_tonnes = [val*pi_scale for val in management.pi_tonnes]
+
+            # losses carried over from the last timestep of the previous period
+            # =================================================================
+            rate_mod = period_drivers[-1][0]
             c_loss_dpm = carbon_lost_from_pool(pool_c_dpm, K_DPM, rate_mod)
             c_loss_rpm = carbon_lost_from_pool(pool_c_rpm, K_RPM, rate_mod)
             c_loss_bio = carbon_lost_from_pool(pool_c_bio, K_BIO, rate_mod)
             c_loss_hum = carbon_lost_from_pool(pool_c_hum, K_HUM, rate_mod)
             c_loss_total = c_loss_dpm + c_loss_rpm + c_loss_hum + c_loss_bio
-
             c_input_bio = prop_bio * c_loss_total
             c_input_hum = prop_hum * c_loss_total
-            co2_release = prop_co2 * c_loss_total        # co2 due to aerobic decomp - Loss as CO2 (t ha-1)
+            tot_soc_simul = pool_c_dpm + pool_c_rpm + pool_c_bio + pool_c_hum + pool_c_iom
 
-            carbon_change.append_vars(imnth, rate_mod, c_pi_mnth, cow, c_n_rat_ow,
-                                      pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm,
-                                      pool_c_rpm, pi_to_rpm, c_loss_rpm,
-                                      pool_c_bio, c_input_bio, c_loss_bio,
-                                      pool_c_hum, cow_to_hum, c_input_hum, c_loss_hum,
-                                      pool_c_iom, ioc_to_iom, tot_soc_simul, co2_release)
+    state = (pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul,
+                                    c_input_bio, c_input_hum, c_loss_dpm, c_loss_rpm, c_loss_hum, c_loss_bio)
+    converge_flag = False
+    for iteration in range(MAX_ITERS):
+        pi_tonnes = management.pi_tonnes
 
-            soil_water.append_vars(t_depth, max_root_dpth, precip, pet, irrig, wc_pwp, wat_soil, wc_fld_cap)
+        # only the pools are carried between iterations, the history is recorded once they have converged
+        # =================================================================================================
+        state_start = state
+        state = _ss_carbon_period(compiled, pi_tonnes, soil_vars, state_start)
+        pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, tot_soc_simul = state[:6]
 
         # after steady state period has completed adjust plant inputs
         # ===========================================================
-        tot_soc_simul = pool_c_dpm + pool_c_rpm + pool_c_bio + pool_c_hum + pool_c_iom
         pcnt_c = tot_soc_simul/(t_depth * t_bulk)
         rat_meas_simul_soc = tot_soc_meas/tot_soc_simul
         management.pi_tonnes = [val*rat_meas_simul_soc for val in pi_tonnes]   # (eq.2.1.1)
@@ -136,16 +301,28 @@ def _cn_steady_state(parameters, weather, management, soil_vars, study, subplot)
         if  diff_abs < SOC_MIN_DIFF:
             print('Simulated and Measured SOC: {}\t*** converged *** after {} iterations'
                                                                         .format(round(tot_soc_simul, 3), iteration + 1))
+            if iters_estim is not None:
+                print('Analytic steady state solver saved {} of an estimated {} iterations'
+                                                                .format(iters_estim - iteration - 1, iters_estim))
 
-            # overwrite plant inputs with adjusted values
-            # ===========================================
+            # overwrite plant inputs with adjusted values and repeat the final iteration recording each timestep
+            # ===================================================================================================
             management.pi_tonnes = pi_tonnes
+            carbon_change = CarbonChange(run_mode, ntsteps)
+            soil_water = SoilWater(ntsteps)
+            n_stepper = None
+            if coupled:
+                n_stepper = soil_nitrogen_stepper(parameters, pettmp, management, soil_vars)
+                nitrogen_change = next(n_stepper)
+            _ss_carbon_period(compiled, pi_tonnes, soil_vars, state_start, carbon_change, soil_water, n_stepper)
             summary_table_add(pool_c_dpm, pool_c_rpm, pool_c_bio, pool_c_hum, pool_c_iom, pi_tonnes, summary_table)
             converge_flag = True
             break
 
     if converge_flag:
-        nitrogen_change = soil_nitrogen(carbon_change, soil_water, parameters, pettmp, management, soil_vars)
+        if not coupled:
+            nitrogen_change = soil_nitrogen(carbon_change, soil_water, parameters, pettmp, management, soil_vars,
+                                                                                                compiled)
         steady_state = (carbon_change, nitrogen_change, soil_water)
     else:
         steady_state = None
@@ -154,54 +331,172 @@ def _cn_steady_state(parameters, weather, management, soil_vars, study, subplot)
 
     return steady_state
 
-def test_soil_cn_algorithms(form):
+def _cn_subplot_run(ora_parms, ora_weather, study, subplot, soil_vars, crop_mngmnt_ss, crop_mngmnt_fwd,
+                            write_outputs = True, checkpoint_dir = None, use_kernel = False, coupled = False):
     """
-    retrieve weather and soil
+    steady state, forward run and, if write_outputs is set, outputs for a single subplot
+    if checkpoint_dir is supplied the steady state is restored from a checkpoint when the soil, baseline
+    management, weather and parameters are unchanged, otherwise it is computed and saved, see ora_checkpoint
+    if use_kernel is set the fused water, carbon and nitrogen kernel of ora_cn_kernel is used, otherwise if coupled
+    is set the N model is advanced within the carbon loops, see _cn_steady_state and cn_forward_run
+    returns complete_run tuple or None if steady state was not reached
     """
-    func_name = __prog__ + '\ttest_soil_cn_algorithms'
+    steady_state_func, forward_run_func = _cn_steady_state, cn_forward_run
+    if use_kernel:
+        steady_state_func, forward_run_func = cn_steady_state_kernel, cn_forward_run_kernel
+    elif coupled:
+        steady_state_func = partial(_cn_steady_state, coupled = True)
+        forward_run_func = partial(cn_forward_run, coupled = True)
+
+    steady_state = None
+    if checkpoint_dir is not None:
+        key = steady_state_key(ora_parms, ora_weather, crop_mngmnt_ss, soil_vars, study.ss_solver)
+        steady_state = load_steady_state(checkpoint_dir, key)
+        if steady_state is not None:
+            print('Restored steady state for ' + subplot + ' from checkpoint ' + key[:12])
+
+    if steady_state is None:
+        mngmnt_ss = MngmntSubplot(crop_mngmnt_ss, ora_parms)
+        steady_state = steady_state_func(ora_parms, ora_weather, mngmnt_ss, soil_vars, study, subplot)
+        if steady_state is None:
+            print('Skipping forward run for ' + subplot)
+            return None
 
-    xls_inp_fname = os.path.normpath(form.w_lbl13.text())
+        if checkpoint_dir is not None:
+            save_steady_state(checkpoint_dir, key, steady_state)
+
+    pi_tonnes = steady_state[0].data['c_pi_mnth']
+
+    mngmnt_fwd = MngmntSubplot(crop_mngmnt_fwd, ora_parms, pi_tonnes)
+    complete_run = forward_run_func(ora_parms, ora_weather, mngmnt_fwd, soil_vars, steady_state)
+
+    # outputs only
+    # ============
+    if write_outputs and study.output_format is not None:
+        generate_outfiles(study, subplot, ora_weather, complete_run)
+    print()
+
+    return complete_run
+
+def run_soil_cn_subplots(study, ora_parms, ora_weather, ora_subplots, nworkers = 1, results_store = None,
+                                                    checkpoint_dir = None, use_kernel = False, coupled = False):
+    """
+    process each subplot, either in turn or, if nworkers is greater than one, using a pool of processes
+    for sqlite output the results are streamed to the results store by this process as each subplot completes
+    steady states are restored from and saved to checkpoint_dir, if supplied
+    use_kernel selects the fused kernel of ora_cn_kernel and coupled advances the N model within the carbon loops,
+    see _cn_subplot_run
+    returns a dictionary of complete_run tuples in subplot order, None for subplots which failed
+    """
+    subplots = list(ora_subplots.soil_all_areas.keys())
+    complete_runs = {}
+
+    store = None
+    if study.output_format == 'sqlite':
+        store = ResultsStore(results_store_fname(study, results_store))
+    write_outputs = store is None
+
+    if nworkers is None or nworkers <= 1:
+        for subplot in subplots:
+            complete_runs[subplot] = _cn_subplot_run(ora_parms, ora_weather, study, subplot,
+                                                     ora_subplots.soil_all_areas[subplot],
+                                                     ora_subplots.crop_mngmnt_ss[subplot],
+                                                     ora_subplots.crop_mngmnt_fwd[subplot], write_outputs,
+                                                     checkpoint_dir, use_kernel, coupled)
+            if store is not None and complete_runs[subplot] is not None:
+                write_results_store(store, study, subplot, ora_weather, complete_runs[subplot])
+    else:
+        nworkers = min(nworkers, len(subplots))
+        print('Processing {} subplots using {} worker processes'.format(len(subplots), nworkers))
+        with ProcessPoolExecutor(max_workers = nworkers) as executor:
+            futures = {}
+            for subplot in subplots:
+                future = executor.submit(_cn_subplot_run, ora_parms, ora_weather, study, subplot,
+                                         ora_subplots.soil_all_areas[subplot],
+                                         ora_subplots.crop_mngmnt_ss[subplot],
+                                         ora_subplots.crop_mngmnt_fwd[subplot], write_outputs,
+                                         checkpoint_dir, use_kernel, coupled)
+                futures[future] = subplot
+
+            # collect as completed, an error in one subplot does not affect the others
+            # ========================================================================
+            results = {}
+            for future in as_completed(futures):
+                subplot = futures[future]
+                try:
+                    results[subplot] = future.result()
+                except Exception as err:
+                    print('*** Error *** subplot ' + subplot + ' failed: ' + repr(err))
+                    results[subplot] = None
+                if store is not None and results[subplot] is not None:
+                    write_results_store(store, study, subplot, ora_weather, results[subplot])
+
+        for subplot in subplots:
+            complete_runs[subplot] = results[subplot]
+
+    if store is not None:
+        store.close()
+
+    return complete_runs
+
+def run_soil_cn_study(xls_inp_fname, out_dir, nworkers = 1, ss_solver = 'iterative', output_format = 'excel',
+                        use_cache = True, output_charts = True, results_store = None, checkpoint_dir = None,
+                                                                            use_kernel = False, coupled = False):
+    """
+    read ORATOR inputs workbook and run soil C and N model for each subplot, no GUI is required
+    parsed inputs are taken from the input cache if the workbook is unchanged since it was last read
+    for sqlite output results_store is the store file name, by default orator_results.sqlite in out_dir
+    if checkpoint_dir is supplied steady states are restored from checkpoints where possible, see ora_checkpoint
+    use_kernel selects the fused water, carbon and nitrogen kernel which is only faster when compiled by Numba
+    coupled advances the N model within the carbon loops, see _cn_subplot_run
+    returns study and dictionary of complete_run tuples, or None if inputs could not be read
+    """
     if not os.path.isfile(xls_inp_fname):
         print('Excel input file ' + xls_inp_fname + 'must exist')
-        return
+        return None
 
     # read input Excel workbook
     # =========================
     print('Loading: ' + xls_inp_fname)
-    study = ReadStudy(xls_inp_fname, form.settings['out_dir'])
-    ora_parms = ReadInputParms(xls_inp_fname)
-    if ora_parms.ow_parms is None:
-        return
-    ora_weather = ReadWeather(xls_inp_fname, study.latitude)
-    ora_subplots = ReadInputSubplots(xls_inp_fname, ora_parms.crop_vars)
-
+    inputs = read_inputs(xls_inp_fname, out_dir, output_format, ss_solver, use_cache, output_charts = output_charts)
+    if inputs is None:
+        return None
+    study, ora_parms, ora_weather, ora_subplots = inputs
+
+    if use_kernel and not NUMBA_FLAG:
+        print('*** Warning *** Numba is not installed - the fused kernel runs as plain Python and is slower than '
+                                                                                                'the default run')
     # process each subplot
     # ====================
-    for subplot in ora_subplots.soil_all_areas:
-
-        soil_vars = ora_subplots.soil_all_areas[subplot]
+    complete_runs = run_soil_cn_subplots(study, ora_parms, ora_weather, ora_subplots, nworkers, results_store,
+                                                                                checkpoint_dir, use_kernel, coupled)
 
-        mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
-        steady_state = _cn_steady_state(ora_parms, ora_weather, mngmnt_ss, soil_vars, study, subplot)
-        if steady_state is None:
-            print('Skipping forward run for ' + subplot)
-            continue
-
-        pi_tonnes = steady_state[0].data['c_pi_mnth']
+    return study, complete_runs
 
-        mngmnt_fwd = MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms, pi_tonnes)
-        complete_run = cn_forward_run(ora_parms, ora_weather, mngmnt_fwd, soil_vars, steady_state)
+def test_soil_cn_algorithms(form):
+    """
+    retrieve weather and soil
+    number of worker processes is taken from the nworkers setting, if present
+    charts setting is one of CHART_MODES, by default charts are added in a background thread after the run
+    """
+    func_name = __prog__ + '\ttest_soil_cn_algorithms'
 
-        # outputs only
-        # ============
-        if study.output_excel:
-            generate_excel_outfiles(study, subplot, ora_weather, complete_run)
-        print()
+    xls_inp_fname = os.path.normpath(form.w_lbl13.text())
+    nworkers = form.settings.get('nworkers', 1)
+    charts = form.settings.get('charts', 'background')
+    join_charts_thread(getattr(form, 'charts_thread', None))     # charts of a previous run use the same files
+    study_run = run_soil_cn_study(xls_inp_fname, form.settings['out_dir'], nworkers,
+                                                                            output_charts = charts == 'inline')
+    if study_run is None:
+        return
+    study, complete_runs = study_run
 
-    # update GUI with new Excel output files
-    # ======================================
+    # update GUI with new Excel output files, charts may be added after the simulation or on display
+    # ==============================================================================================
     if study.output_excel:
         retrieve_output_xls_files(form, study.study_name)
+        if charts == 'background':
+            form.charts_thread = start_charts_thread(output_xls_files(study.out_dir, study.study_name))
 
     print('Finished with ' + func_name)
-    return
+    return complete_runs
@@ -0,0 +1,176 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_input_cache.py
+# Purpose:     cache of parsed ORATOR inputs keyed by workbook content
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   the study, parameters, weather (including PET) and subplot objects read from an inputs workbook are pickled to
+#   the cache directory under the SHA-256 hash of the workbook contents and of the source of the modules of
+#   CACHE_MODULES, so any edit to the workbook or to the code which builds the objects gives a new key
+#   entries are evicted, least recently used first, when the cache exceeds its size limit
+#
+#   run options held by the study i.e. output directory, output format and steady state solver are not cached
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_input_cache.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import pickle
+from hashlib import sha256
+from importlib.util import find_spec
+
+from ora_excel_read import ReadInputParms, ReadInputSubplots, ReadStudy, ReadWeather, WorkbookSession
+
+CACHE_VERSION = 1       # increment when the Read classes change what they store
+CACHE_MODULES = list(['ora_excel_read', 'ora_water_model', 'ora_low_level_fns', 'thornthwaite'])
+CACHE_DIR_DEFAULT = os.path.join(os.path.expanduser('~'), '.orator', 'cache')
+CACHE_MAX_BYTES = 256*1024*1024
+CACHE_EXT = '.pkl'
+
+_SOURCE_DIGESTS = {}
+
+def source_digest(module_names = None):
+    '''
+    digest of the source of the given modules, by default CACHE_MODULES i.e. those which build the cached objects,
+    computed once per process
+    '''
+    if module_names is None:
+        module_names = CACHE_MODULES
+    module_names = tuple(module_names)
+
+    if module_names not in _SOURCE_DIGESTS:
+        hasher = sha256()
+        for module_name in module_names:
+            with open(find_spec(module_name).origin, 'rb') as fobj:
+                hasher.update(fobj.read())
+        _SOURCE_DIGESTS[module_names] = hasher.digest()
+
+    return _SOURCE_DIGESTS[module_names]
+
+def workbook_hash(xls_fname, chunk_size = 1024*1024):
+    '''
+    hex digest of the workbook contents, cache version and source of CACHE_MODULES
+    '''
+    hasher = sha256(str(CACHE_VERSION).encode())
+    hasher.update(source_digest())
+    with open(xls_fname, 'rb') as fobj:
+        for chunk in iter(lambda: fobj.read(chunk_size), b''):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+def _cache_dir(cache_dir):
+    '''
+    cache directory, from argument, ORATOR_CACHE_DIR environment variable or default in that order
+    '''
+    if cache_dir is None:
+        cache_dir = os.environ.get('ORATOR_CACHE_DIR', CACHE_DIR_DEFAULT)
+
+    return cache_dir
+
+def _load_entry(cache_fname):
+    '''
+    return cached inputs or None if there is no usable entry
+    '''
+    if not os.path.isfile(cache_fname):
+        return None
+
+    try:
+        with open(cache_fname, 'rb') as fobj:
+            inputs = pickle.load(fobj)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError) as err:
+        print('*** Warning *** discarding unreadable input cache entry ' + cache_fname + ': ' + str(err))
+        try:
+            os.remove(cache_fname)
+        except OSError:
+            pass
+        return None
+
+    os.utime(cache_fname)     # mark as recently used for eviction
+
+    return inputs
+
+def _save_entry(cache_fname, inputs):
+    '''
+    write entry atomically so that concurrent runs never see a partial file
+    '''
+    cache_fname_tmp = cache_fname + '.{}.tmp'.format(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_fname), exist_ok = True)
+        with open(cache_fname_tmp, 'wb') as fobj:
+            pickle.dump(inputs, fobj, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(cache_fname_tmp, cache_fname)
+    except (OSError, pickle.PicklingError) as err:
+        print('*** Warning *** could not write input cache entry ' + cache_fname + ': ' + str(err))
+        if os.path.isfile(cache_fname_tmp):
+            os.remove(cache_fname_tmp)
+
+def evict(cache_dir = None, max_bytes = CACHE_MAX_BYTES):
+    '''
+    remove least recently used entries until the cache occupies no more than max_bytes
+    returns number of entries removed
+    '''
+    cache_dir = _cache_dir(cache_dir)
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for fname in os.listdir(cache_dir):
+        if fname.endswith(CACHE_EXT):
+            cache_fname = os.path.join(cache_dir, fname)
+            stat = os.stat(cache_fname)
+            entries.append((stat.st_mtime, stat.st_size, cache_fname))
+
+    nbytes = sum([entry[1] for entry in entries])
+    nremoved = 0
+    for mtime, size, cache_fname in sorted(entries):
+        if nbytes <= max_bytes:
+            break
+        try:
+            os.remove(cache_fname)
+        except OSError:
+            continue
+        nbytes -= size
+        nremoved += 1
+
+    return nremoved
+
+def read_inputs(xls_inp_fname, out_dir, output_format = 'excel', ss_solver = 'iterative', use_cache = True,
+                                        cache_dir = None, max_bytes = CACHE_MAX_BYTES, output_charts = True):
+    '''
+    equivalent of ReadStudy, ReadInputParms, ReadWeather and ReadInputSubplots, using the cache when possible
+    returns study, parameters, weather and subplots or None if the parameters could not be read
+    '''
+    cache_fname = None
+    if use_cache:
+        cache_dir = _cache_dir(cache_dir)
+        cache_fname = os.path.join(cache_dir, workbook_hash(xls_inp_fname) + CACHE_EXT)
+        inputs = _load_entry(cache_fname)
+        if inputs is not None:
+            print('Loaded inputs from cache ' + cache_fname)
+            inputs[0].set_run_options(out_dir, output_format, ss_solver, output_charts)
+            return inputs
+
+    # one session is shared by the readers and the workbook is closed once they have finished
+    # =======================================================================================
+    with WorkbookSession(xls_inp_fname) as wb_sess:
+        study = ReadStudy(wb_sess, out_dir, output_format, ss_solver, output_charts)
+        ora_parms = ReadInputParms(wb_sess)
+        if ora_parms.ow_parms is None:
+            return None
+        ora_weather = ReadWeather(wb_sess, study.latitude)
+        ora_subplots = ReadInputSubplots(wb_sess, ora_parms.crop_vars)
+    inputs = (study, ora_parms, ora_weather, ora_subplots)
+
+    if cache_fname is not None:
+        _save_entry(cache_fname, inputs)
+        evict(cache_dir, max_bytes)
+
+    return inputs
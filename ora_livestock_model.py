@@ -20,21 +20,31 @@ __version__ = '0.0.0'
 #
 import os
 from pandas import DataFrame
-from ora_excel_read import read_livestock_data, read_livestock_supp_data, read_africa_animal_prod
-from ora_crop_model import test_crop_algorithms
+from ora_excel_read import read_livestock_data, read_livestock_supp_data, read_africa_animal_prod, WorkbookSession
+from ora_crop_model import run_crop_model, NPP_CALC_DEFAULT
 
 
 def test_livestock_algorithms(form):
 
     xls_inp_fname = os.path.normpath(form.w_lbl13.text())
+    crop_rotations = form.w_crop_rotations.isChecked()
+    npp_calc = str(form.w_npp_calc.currentText())
+
+    return run_livestock_model(xls_inp_fname, crop_rotations, npp_calc)
+
+def run_livestock_model(xls_inp_fname, crop_rotations = False, npp_calc = NPP_CALC_DEFAULT):
+    '''
+    livestock model without reference to the GUI
+    '''
     if not os.path.isfile(xls_inp_fname):
         print('Excel input file ' + xls_inp_fname + 'must exist')
         return
 
     # Use functions to create dataframe/feed_avail_dic with data from ORATOR excel inputs
-    lv_data = read_livestock_data(xls_inp_fname)
-    supp_info = read_livestock_supp_data(xls_inp_fname)
-    an_prod = read_africa_animal_prod(xls_inp_fname)
+    with WorkbookSession(xls_inp_fname) as wb_sess:
+        lv_data = read_livestock_data(wb_sess)
+        supp_info = read_livestock_supp_data(wb_sess)
+        an_prod = read_africa_animal_prod(wb_sess)
 
     # Dictionary to give neatly formatted name for each livestock type (so it can be saved easily)
     form_name_dic = {'Dairy cattle': 'Dairy cattle',
@@ -69,7 +79,7 @@ def test_livestock_algorithms(form):
 
     # Import crop production data from ora_crop_model. Take name of crop and production compared to steady state
     # per month. Add this to list to allow calculation of feed availability change
-    crop_list = (test_crop_algorithms(form))
+    crop_list = run_crop_model(xls_inp_fname, crop_rotations, npp_calc)
     feed_avail_change = DataFrame()
     n = 1
     for crop in crop_list:
@@ -102,7 +102,7 @@ def nh4_nitrification(nh4, nh4_min, rate_mod, k_nitrif):
 
     return nh4_nitrif
 
-def nh4_volatilisation(precip, nh4_manure, nh4_fert):
+def nh4_volatilisation(precip, nh4_manure, nh4_fert, precip_critic = 21):
     '''
     Ammonia volatilisation: a chemical process that occurs at the soil surface when ammonium from urea or
     ammonium-containing fertilisers (e.g. urea) is converted to ammonia gas at high pH. Losses are minimal when
@@ -110,9 +110,9 @@ def nh4_volatilisation(precip, nh4_manure, nh4_fert):
 
     a fixed proportion of the ammonium-N or urea-N in applied manure and fertilisers is assumed to be lost in the
     month of application only if the rainfall in that month is less than a critical level (< 21 mm)
+    precip_critic is the critical level of rainfall per timestep below which losses due to volatilisation take place
     '''
     prop_volat = 0.15              # proportion of ammonium-N or urea-N that can be volatilised
-    precip_critic = 21          # critical level of rainfall below which losses due to volatilisation take place
     if precip < precip_critic:
         nh4_volatil = prop_volat*(nh4_manure + nh4_fert)   # (eq.2.4.25)
     else:
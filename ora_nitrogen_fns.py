@@ -30,17 +30,18 @@ from openpyxl import load_workbook
 from math import exp, atan
 from thornthwaite import thornthwaite
 
-def get_n_parameters(n_parms):
+def get_n_parameters(n_parms, nsteps_yr = 12):
     '''
     atmospheric deposition of N to the soil (eq.2.4.2)
     assume atmospheric deposition is composed of equal proportions of nitrate and ammonium-N
     This assumption may differ according to region
+    deposition is annual and is spread over nsteps_yr timesteps
     '''
     atmos_n_depos = n_parms['atmos_n_depos']
     prop_atmos_dep_no3 = n_parms['prop_atmos_dep_no3']
 
-    no3_atmos = prop_atmos_dep_no3 * atmos_n_depos/12  # (eq.2.4.2)
-    nh4_atmos = (1 - prop_atmos_dep_no3) * atmos_n_depos/12  # (eq.2.4.19)
+    no3_atmos = prop_atmos_dep_no3 * atmos_n_depos/nsteps_yr  # (eq.2.4.2)
+    nh4_atmos = (1 - prop_atmos_dep_no3) * atmos_n_depos/nsteps_yr  # (eq.2.4.19)
     k_nitrif = n_parms['k_nitrif']
     min_no3_nh4 = n_parms['no3_min']
     n_d50 = n_parms['n_d50']
@@ -112,16 +113,20 @@ def no3_leaching(precip, wc_start, pet, wc_fld_cap, no3_start, no3_inputs, no3_m
 
     return  no3_leach_tstep, wat_drain
 
-def no3_denitrific(imnth, t_depth, wat_soil, wc_pwp, wc_fld_cap, co2_aerobic_decomp, no3_avail, n_denit_max, n_d50):
+def no3_denitrific(imnth, t_depth, wat_soil, wc_pwp, wc_fld_cap, co2_aerobic_decomp, no3_avail, n_denit_max, n_d50,
+                                                                                                    ndays = None):
     '''
     Denitrification is a microbially facilitated process where nitrate is reduced and ultimately produces molecular
     nitrogen through a series of intermediate gaseous nitrogen oxide products. The process is performed primarily by
     heterotrophic bacteria although autotrophic denitrifiers have also been identified
     based on the simple approach used in ECOSSE
+    ndays is the length of the timestep in days, if None the timestep is the calendar month imnth
     '''
-    ndays_mnth = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]       # TODO - leap year
+    if ndays is None:
+        ndays_mnth = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]       # TODO - leap year
+        ndays = ndays_mnth[imnth - 1]
     no3_d50 = n_d50 * t_depth     # soil nitrate-N content at which denitrification is 50% of its full potential (kg ha-1)
-    n_denit_max = min(no3_avail, n_denit_max * t_depth * ndays_mnth[imnth - 1])    # (eq.2.4.9) maximum potential rate of denitrification (kg ha-1 month-1)
+    n_denit_max = min(no3_avail, n_denit_max * t_depth * ndays)    # (eq.2.4.9) maximum potential rate of denitrification (kg ha-1 month-1)
 
     rate_denit_no3 = no3_avail/(no3_d50 + no3_avail)    # (eq.2.4.10) nitrate rate modifier
 
@@ -149,7 +154,7 @@ def no3_crop_uptake(prop_n_opt, n_respns_coef, nut_n_opt, t_grow, no3_avail, nh4
     crop N demand is calculated from the proportion of the optimum yield estimated assuming no other losses of mineral N
     0 <= prop_n_opt <= 1
     nut_n_opt  is N supply required for the optimum yield
-    t_grow   is number of months in the growing season
+    t_grow   is number of timesteps in the growing season
     '''
     cn = n_respns_coef      # N response coefficient
 
@@ -32,24 +32,40 @@ from ora_nitrogen_fns import no3_crop_uptake, get_n_parameters, no3_immobilisati
                                                                             no3_leaching, loss_adjustment_ratio
 
 from ora_nh4_fns import nh4_mineralisation, nh4_immobilisation, nh4_nitrification, nh4_volatilisation, nh4_crop_uptake
+from ora_timestep import MONTHLY
 
-def soil_nitrogen(carbon_obj, soil_water_obj, parameters, pettmp, management, soil_vars):
+def soil_nitrogen_stepper(parameters, pettmp, management, soil_vars, timestep = None, ntsteps = None):
     '''
-    The soil organic matter pools (BIO and HUM-N) are assumed to have a constant C:N ratio (8.5 after Bradbury et al., 1993)
+    generator which advances the soil N model one timestep at a time so that it can run inside the carbon loop,
+    the C:N ratios of the DPM, RPM and HUM pools, the pools of the first timestep and the maximum denitrification
+    rate are carried between timesteps as local variables
+    the first next() returns the NitrogenChange object, thereafter send a tuple of precip, pet, the carbon values in
+    the order returned by CarbonChange.get_vals_for_tstep and the soil water values in the order returned by
+    SoilWater.get_vals_for_tstep; each timestep is appended to the NitrogenChange object
+    pettmp, timestep and ntsteps are as for soil_nitrogen
     '''
+    if timestep is None:
+        timestep = MONTHLY
+    if ntsteps is None:
+        ntsteps = management.ntsteps
 
     n_parms = parameters.n_parms
     crop_vars = parameters.crop_vars
 
     # initialise the zeroth timestep
     # ==============================
-    nitrogen_change = NitrogenChange()
+    nitrogen_change = NitrogenChange(ntsteps)
 
-    no3_atmos, nh4_atmos, k_nitrif, min_no3_nh4, n_d50, n_denit_max = get_n_parameters(n_parms)
+    no3_atmos, nh4_atmos, k_nitrif, min_no3_nh4, n_d50, n_denit_max = get_n_parameters(n_parms, timestep.nsteps_yr)
+    k_nitrif = k_nitrif/timestep.steps_per_mnth     # rate constant is per month
     t_depth = soil_vars.t_depth
 
     crop_curr = management.crop_currs[0]
     c_n_rat_pi = crop_vars[crop_curr]['c_n_rat_pi']
+    nut_n_min = crop_vars[crop_curr]['n_supply_min']
+    nut_n_opt = crop_vars[crop_curr]['n_supply_opt']
+    n_respns_coef = crop_vars[crop_curr]['n_respns_coef']
+    nsteps_grow = crop_vars[crop_curr]['nmnths_grow']*timestep.steps_per_mnth
     c_n_rat_dpm_prev, c_n_rat_rpm_prev = 2*[c_n_rat_pi]
     c_n_rat_hum_prev = 8.5      # (8.5 after Bradbury et al., 1993)
 
@@ -57,24 +73,28 @@ def soil_nitrogen(carbon_obj, soil_water_obj, parameters, pettmp, management, so
 
     wc_start = 0 # TODO
 
+    imnths = None if timestep.monthly else pettmp.get('month')
+    ndays = timestep.ndays
+    precip_critic = timestep.precip_critic
+
     # main temporal loop
     # ==================
     imnth = 1   # may not always be January
-    for tstep in range(management.ntsteps):
-        precip = pettmp['precip'][tstep]
-        pet = pettmp['pet'][tstep]
-
+    tstep = 0
+    tstep_vals = yield nitrogen_change
+    while tstep_vals is not None:
+        precip, pet, carbon_tstep, water_tstep = tstep_vals
         cow, c_n_rat_ow, prop_co2, rate_mod, c_n_rat_som, co2_release, \
         c_loss_bio, prop_bio, pool_c_dpm, pi_to_dpm, cow_to_dpm, c_loss_dpm, \
-        pool_c_hum, prop_hum, cow_to_hum, c_loss_hum, pool_c_rpm, pi_to_rpm, \
-                                                c_loss_rpm = carbon_obj.get_vals_for_tstep(tstep)
-        wat_soil, wc_pwp, wc_fld_cap = soil_water_obj.get_vals_for_tstep(tstep)
+        pool_c_hum, prop_hum, cow_to_hum, c_loss_hum, pool_c_rpm, pi_to_rpm, c_loss_rpm = carbon_tstep
+        wat_soil, wc_pwp, wc_fld_cap = water_tstep
+        if imnths is not None:
+            imnth = imnths[tstep]
         if tstep == 0:
             dpm_prev = pool_c_dpm
             rpm_prev = pool_c_rpm
             hum_prev = pool_c_hum
 
-
         # C to N ratios A2a soil N supply
         # ===============================
         dpm_inpt = pi_to_dpm + cow_to_dpm
@@ -100,9 +120,6 @@ def soil_nitrogen(carbon_obj, soil_water_obj, parameters, pettmp, management, so
         # A2b Crop N uptake
         # =================
         nut_n_fert = 0
-        nut_n_min = crop_vars[crop_curr]['n_supply_min']
-        nut_n_opt = crop_vars[crop_curr]['n_supply_opt']
-        n_respns_coef = crop_vars[crop_curr]['n_respns_coef']
 
         nut_n_soil = soil_n_supply
         prop_n_opt = (nut_n_soil + nut_n_fert - nut_n_min)/(nut_n_opt - nut_n_min)  # (eq.3.3.1)
@@ -120,11 +137,10 @@ def soil_nitrogen(carbon_obj, soil_water_obj, parameters, pettmp, management, so
         no3_nitrif = nh4_nitrif  # TODO: check
         no3_total_inp = no3_atmos + no3_fert + no3_nitrif
 
-        nmnths_grow = crop_vars[crop_curr]['nmnths_grow']
         no3_avail = no3_start + no3_total_inp
         nh4_avail = nh4_start + nh4_total_inp
         n_crop, no3_cropup, prop_yld_opt = \
-                            no3_crop_uptake(prop_n_opt, n_respns_coef, nut_n_opt, nmnths_grow, no3_avail, nh4_avail)
+                            no3_crop_uptake(prop_n_opt, n_respns_coef, nut_n_opt, nsteps_grow, no3_avail, nh4_avail)
 
         # Nitrate N (kg/ha)
         # =================
@@ -132,7 +148,8 @@ def soil_nitrogen(carbon_obj, soil_water_obj, parameters, pettmp, management, so
         no3_leach, wat_drain = no3_leaching(precip, wc_start, pet, wc_fld_cap, no3_start, no3_total_inp, min_no3_nh4)
 
         no3_denitr, n_denit_max, rate_denit_no3, rate_denit_moist, rate_denit_bio, prop_n2_wat, prop_n2_no3 = \
-               no3_denitrific(imnth, t_depth, wat_soil, wc_pwp, wc_fld_cap, co2_release, no3_avail, n_denit_max, n_d50)
+               no3_denitrific(imnth, t_depth, wat_soil, wc_pwp, wc_fld_cap, co2_release, no3_avail, n_denit_max, n_d50,
+                                                                                                            ndays)
 
         # crop uptake col M
         # =================
@@ -142,7 +159,7 @@ def soil_nitrogen(carbon_obj, soil_water_obj, parameters, pettmp, management, so
 
         # back to Ammonium N
         # ==================
-        nh4_volat = nh4_volatilisation(precip, nh4_manure, nh4_fert)
+        nh4_volat = nh4_volatilisation(precip, nh4_manure, nh4_fert, precip_critic)
         nh4_cropup = nh4_crop_uptake(n_crop, no3_avail, nh4_avail)
 
         nh4_total_loss = nh4_immob + nh4_nitrif + nh4_volat + nh4_cropup
@@ -167,5 +184,35 @@ def soil_nitrogen(carbon_obj, soil_water_obj, parameters, pettmp, management, so
         imnth += 1
         if imnth > 12:
             imnth = 1
+        tstep += 1
+        tstep_vals = yield nitrogen_change
+
+def soil_nitrogen(carbon_obj, soil_water_obj, parameters, pettmp, management, soil_vars, compiled = None,
+                                                                                timestep = None, ntsteps = None):
+    '''
+    The soil organic matter pools (BIO and HUM-N) are assumed to have a constant C:N ratio (8.5 after Bradbury et al., 1993)
+    if compiled, a CompiledMngmnt with soil trace for the same timesteps, is supplied then soil water is taken from the
+    trace rather than from soil_water_obj
+    timestep, see ora_timestep, is monthly by default; for other timesteps the calendar month of each timestep is
+    taken from pettmp['month'] if present. ntsteps defaults to the number of timesteps of the management
+    '''
+    if ntsteps is None:
+        ntsteps = management.ntsteps
+
+    # inputs for every timestep are read before the main loop
+    # =========================================================
+    precips = pettmp['precip'][:ntsteps]
+    pets = pettmp['pet'][:ntsteps]
+    carbon_vals = carbon_obj.vals_by_tstep(ntsteps)
+    if compiled is None:
+        water_vals = soil_water_obj.vals_by_tstep(ntsteps)
+    else:
+        water_vals = [(soil_trace[0], compiled.wc_pwp, compiled.wc_fld_cap)
+                                                                for soil_trace in compiled.soil_trace[:ntsteps]]
+
+    n_stepper = soil_nitrogen_stepper(parameters, pettmp, management, soil_vars, timestep, ntsteps)
+    nitrogen_change = next(n_stepper)
+    for tstep_vals in zip(precips, pets, carbon_vals, water_vals):
+        n_stepper.send(tstep_vals)
 
     return nitrogen_change
@@ -0,0 +1,396 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_optimise.py
+# Purpose:     search for the management of each subplot which maximises SOC
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   command line and library entry point e.g.
+#       python ora_optimise.py ORATOR_inputs.xlsx -o E:\ORATOR\optimise --objective soc -n 2000 -j 4
+#
+#   a candidate is a practice for each crop of the forward run rotation, applied to every season of that crop:
+#       organic waste type and amount, month of application relative to sowing and monthly irrigation over the
+#       growing season, or the irrigation of the workbook
+#   candidates are drawn at random from OW_AMOUNTS, OW_MNTH_OFFSETS, IRRIG_AMOUNTS and the organic waste types of
+#   ow_parms; the management of the workbook is always evaluated as the baseline candidate
+#
+#   the steady state of each subplot is computed once, or restored from a checkpoint, and every candidate starts its
+#   forward run from it. Candidates are evaluated in batches by ora_cn_vectorised, batches are run concurrently by
+#   up to nworkers processes. With pruning, candidates are first run over the opening years of the forward run,
+#   doubling the years at each stage, and only the best keep_frac of them go on to the next stage
+#
+#   progress may be reported through a function of the fraction done and a message e.g. from the GUI, where
+#   optimise_soil_cn is run in a worker thread
+#
+#   fertiliser N is left as in the workbook since soil_nitrogen does not yet take fertiliser inputs
+#
+#   leached nitrate and N2O are reported as by cn_forward_run: from the forward weather and crops but from the carbon
+#   and soil water of the first records of the steady state, see ora_uncertainty. They are therefore the same for
+#   every candidate, so cannot be optimised, and SOC is the only objective
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_optimise.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from math import ceil
+
+import numpy as np
+from pandas import DataFrame
+
+from ora_checkpoint import steady_state_key, load_steady_state, save_steady_state
+from ora_classes_main import MngmntSubplot
+from ora_cn_vectorised import CarbonDrivers, get_mngmnt_arrays, get_soil_arrays, cn_steady_state_batch, \
+                                                                    carbon_forward_batch, nitrogen_batch, STATE_VARS
+from ora_input_cache import read_inputs
+from ora_output_write import safe_name
+
+OBJECTIVES = list(['soc'])     # maximise SOC at the end of the forward run
+NCANDIDATES = 1000
+BATCH_SIZE = 250
+KEEP_FRAC = 0.5
+MIN_KEEP = 20
+
+OW_AMOUNTS = list([0, 2.5, 5, 10, 20])             # tonnes per hectare
+OW_MNTH_OFFSETS = list([-2, -1, 0, 1, 2, 3])        # months after sowing
+IRRIG_AMOUNTS = list([None, 0, 50, 100, 200])       # mm per month of the growing season, None for the workbook
+PRACTICE_VARS = list(['ow_type', 'ow_amount', 'ow_mnth_offset', 'irrig_amount'])
+RESULT_VARS = list(['soc_end', 'soc_change', 'no3_leach_total', 'n2o_total'])
+
+def _ow_types(ow_parms):
+    '''
+    organic waste types, excluding the row of descriptions
+    '''
+    return [ow_type for ow_type, vals in ow_parms.items() if isinstance(vals['pcnt_c'], (int, float))]
+
+def draw_candidates(crop_mngmnt, ow_types, ncandidates, seed = None):
+    '''
+    list of distinct candidates, each a dictionary of practices keyed by crop, the first candidate is None i.e.
+    the management of the workbook
+    '''
+    crop_names = sorted(set(crop.crop_lu for crop in crop_mngmnt))
+    choices = [ow_types, OW_AMOUNTS, OW_MNTH_OFFSETS, IRRIG_AMOUNTS]
+    rng = np.random.default_rng(seed)
+
+    candidates = [None]
+    keys = set()
+    max_draws = 10*ncandidates
+    for idraw in range(max_draws):
+        if len(candidates) >= ncandidates:
+            break
+
+        practices = {}
+        for crop_name in crop_names:
+            practices[crop_name] = tuple(vals[rng.integers(len(vals))] for vals in choices)
+        key = tuple(practices[crop_name] for crop_name in crop_names)
+        if key not in keys:
+            keys.add(key)
+            candidates.append(practices)
+
+    return candidates
+
+def apply_practices(crop_mngmnt, practices, ntsteps):
+    '''
+    copy of the rotation with the practice of each crop applied, see draw_candidates
+    '''
+    if practices is None:
+        return crop_mngmnt
+
+    new_mngmnt = []
+    for crop in crop_mngmnt:
+        ow_type, ow_amount, ow_mnth_offset, irrig_amount = practices[crop.crop_lu]
+        crop = copy(crop)
+        crop.ow_type = ow_type
+        crop.ow_amount = ow_amount
+        crop.ow_mnth = min(max(crop.sowing_mnth + ow_mnth_offset, 1), ntsteps)
+        if irrig_amount is not None:
+            crop.irrig = {imnth: irrig_amount for imnth in range(crop.sowing_mnth, crop.harvest_mnth + 1)
+                                                                                                if irrig_amount > 0}
+        new_mngmnt.append(crop)
+
+    return new_mngmnt
+
+def _crop_n_arrays(crop_vars, management):
+    '''
+    N parameters of the first crop of the rotation, see soil_nitrogen
+    '''
+    crop_curr = crop_vars[management.crop_currs[0]]
+
+    return {var_name: crop_curr[var_name] for var_name in ['c_n_rat_pi', 'n_supply_min', 'n_supply_opt',
+                                                                                                'nmnths_grow']}
+
+def evaluate_batch(parameters, pettmp, soil_vars, init_vals, mngmnt_arrs, ntsteps):
+    '''
+    forward carbon run of a batch of candidates over the first ntsteps timesteps starting from the steady state
+    init_vals are the pools and losses of the last timestep of the steady state, see get_last_tstep_pools
+    returns dictionary of SOC at the end of the run and SOC change, each an array of shape (ncandidates,)
+    '''
+    ncands = mngmnt_arrs['cow'].shape[0]
+    mngmnt_arrs = {var_name: arr[:, :ntsteps] for var_name, arr in mngmnt_arrs.items()}
+    pettmp = {var_name: pettmp[var_name][:ntsteps] for var_name in ['precip', 'tair', 'pet']}
+    drivers = CarbonDrivers(pettmp, None, parameters, ncands*[soil_vars], mngmnt_arrs = mngmnt_arrs)
+
+    init_state = dict(zip(['pool_c_dpm', 'pool_c_rpm', 'pool_c_bio', 'pool_c_hum', 'pool_c_iom', 'tot_soc_simul',
+                           'c_input_bio', 'c_input_hum', 'c_loss_dpm', 'c_loss_rpm', 'c_loss_hum', 'c_loss_bio'],
+                                                                    [np.full(ncands, val) for val in init_vals]))
+    tot_soc_simul = init_state.pop('tot_soc_simul')
+    history = carbon_forward_batch(drivers, mngmnt_arrs['c_pi_mnth'], init_state, tot_soc_simul)
+
+    soc_start = sum(init_state[var_name] for var_name in STATE_VARS[:5])
+    soc_end = sum(history[var_name][:, -1] for var_name in STATE_VARS[:5])
+
+    return {'soc_end': soc_end, 'soc_change': soc_end - soc_start}
+
+def nitrogen_totals(parameters, pettmp, soil_vars, steady_state, crop_arrs, ntsteps):
+    '''
+    leached nitrate and N2O over the first ntsteps timesteps of the forward run which, as for cn_forward_run, are
+    driven by the carbon and soil water of the first ntsteps records of the steady state
+    returns dictionary of totals, the same for every candidate
+    '''
+    carbon_change, nitrogen_change, soil_water = steady_state
+    history = {var_name: vals[np.newaxis, :ntsteps] for var_name, vals in carbon_change.data.items()}
+    wat_soil = soil_water.data['wat_soil'][np.newaxis, :ntsteps]
+    nitrogen = nitrogen_batch(history, wat_soil, get_soil_arrays([soil_vars]), pettmp, parameters.n_parms, crop_arrs)
+
+    return {'no3_leach_total': float(np.nansum(nitrogen['no3_leach_adj'])),
+            'n2o_total': float(np.nansum(nitrogen['n2o_release']))}
+
+def _scores(results, objective):
+    '''
+    larger is better, see OBJECTIVES
+    '''
+    return results['soc_end']
+
+def _stage_ntsteps(ntsteps, prune):
+    '''
+    timesteps of each stage: one year then doubling, the last stage is the whole forward run
+    '''
+    stages = []
+    if prune:
+        stage = 12
+        while stage < ntsteps:
+            stages.append(stage)
+            stage *= 2
+    stages.append(ntsteps)
+
+    return stages
+
+def _subplot_steady_state(parameters, weather, crop_mngmnt_ss, soil_vars, ss_solver, checkpoint_dir):
+    '''
+    steady state of a subplot, restored from or saved to checkpoint_dir if supplied
+    '''
+    if checkpoint_dir is not None:
+        key = steady_state_key(parameters, weather, crop_mngmnt_ss, soil_vars, ss_solver)
+        steady_state = load_steady_state(checkpoint_dir, key)
+        if steady_state is not None:
+            return steady_state
+
+    steady_states = cn_steady_state_batch(parameters, weather, [MngmntSubplot(crop_mngmnt_ss, parameters)],
+                                                                                        [soil_vars], ss_solver)
+    if steady_states is None or steady_states[0] is None:
+        return None
+
+    if checkpoint_dir is not None:
+        save_steady_state(checkpoint_dir, key, steady_states[0])
+
+    return steady_states[0]
+
+def optimise_subplot(parameters, weather, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, objective = 'soc',
+                        ncandidates = NCANDIDATES, prune = True, keep_frac = KEEP_FRAC, seed = None, executor = None,
+                        batch_size = BATCH_SIZE, ss_solver = 'analytic', checkpoint_dir = None, progress = None):
+    '''
+    evaluate candidate managements of a subplot, executor is an optional concurrent.futures executor
+    progress is an optional function of the fraction done and a message, called after each stage
+    returns data frame of the candidates which completed the forward run, best first, or None if steady state was
+    not reached
+    '''
+    steady_state = _subplot_steady_state(parameters, weather, crop_mngmnt_ss, soil_vars, ss_solver, checkpoint_dir)
+    if steady_state is None:
+        return None
+    pi_tonnes = steady_state[0].data['c_pi_mnth']
+    init_vals = steady_state[0].get_last_tstep_pools()
+
+    # management arrays of every candidate are compiled once and sliced at each stage
+    # ==============================================================================
+    pettmp = weather.pettmp_fwd
+    ntsteps = MngmntSubplot(crop_mngmnt_fwd, parameters).ntsteps
+    if ntsteps > steady_state[0].nrecs:
+        print('*** Error *** forward run of {} months is longer than the steady state of {} months'
+                                                                        .format(ntsteps, steady_state[0].nrecs))
+        return None
+
+    candidates = draw_candidates(crop_mngmnt_fwd, _ow_types(parameters.ow_parms), ncandidates, seed)
+    mngmnt_list = [MngmntSubplot(apply_practices(crop_mngmnt_fwd, practices, ntsteps), parameters, pi_tonnes)
+                                                                                    for practices in candidates]
+    mngmnt_arrs = get_mngmnt_arrays(pettmp, mngmnt_list, parameters)
+    if mngmnt_arrs is None:
+        return None
+    crop_arrs = _crop_n_arrays(parameters.crop_vars, mngmnt_list[0])
+
+    live = np.arange(len(candidates))
+    stages = _stage_ntsteps(ntsteps, prune)
+    for istage, stage_ntsteps in enumerate(stages):
+        batches = [live[istart:istart + batch_size] for istart in range(0, len(live), batch_size)]
+        args = [(parameters, pettmp, soil_vars, init_vals,
+                        {var_name: arr[batch] for var_name, arr in mngmnt_arrs.items()}, stage_ntsteps)
+                                                                                            for batch in batches]
+        if executor is None:
+            batch_results = [evaluate_batch(*batch_args) for batch_args in args]
+        else:
+            batch_results = list(executor.map(evaluate_batch, *zip(*args)))
+        results = {var_name: np.concatenate([batch_result[var_name] for batch_result in batch_results])
+                                                                            for var_name in ['soc_end', 'soc_change']}
+        scores = _scores(results, objective)
+        if progress is not None:
+            progress((istage + 1)/len(stages), '{} candidates run over {} months'.format(len(live), stage_ntsteps))
+        if stage_ntsteps == ntsteps:
+            break
+
+        # keep the best candidates and the baseline
+        # =========================================
+        nkeep = max(MIN_KEEP, ceil(keep_frac*len(live)))
+        order = np.argsort(-scores, kind = 'stable')
+        keep = np.union1d(order[:nkeep], np.flatnonzero(live == 0))
+        print('Pruned candidates after {} months: {} of {} kept'.format(stage_ntsteps, len(keep), len(live)))
+        live = live[keep]
+
+    # rank candidates which completed the forward run
+    # ===============================================
+    for var_name, total in nitrogen_totals(parameters, pettmp, soil_vars, steady_state, crop_arrs, ntsteps).items():
+        results[var_name] = np.full(len(live), total)
+    order = np.argsort(-scores, kind = 'stable')
+    rows = []
+    for rank, indx in enumerate(order.tolist()):
+        icand = int(live[indx])
+        row = {'rank': rank + 1, 'candidate': icand, 'baseline': icand == 0, 'score': scores[indx]}
+        for var_name in RESULT_VARS:
+            row[var_name] = results[var_name][indx]
+        practices = candidates[icand]
+        if practices is not None:
+            for crop_name, practice in practices.items():
+                for var_name, val in zip(PRACTICE_VARS, practice):
+                    row[crop_name + ' ' + var_name] = val
+        rows.append(row)
+
+    return DataFrame(rows)
+
+def _subplot_progress(progress, isub, nsubplots, subplot):
+    '''
+    progress of one subplot reported as a fraction of the progress of all subplots
+    '''
+    if progress is None:
+        return None
+
+    return lambda frac, mess: progress((isub + frac)/nsubplots, subplot + ': ' + mess)
+
+def run_optimise(xls_inp_fname, out_dir, subplots = None, objective = 'soc', ncandidates = NCANDIDATES,
+                    nworkers = 1, prune = True, keep_frac = KEEP_FRAC, seed = None, ss_solver = 'analytic',
+                    checkpoint_dir = None, use_cache = True, progress = None):
+    '''
+    optimise management of the given subplots, by default all, writing ranked candidates to a CSV file per subplot
+    progress is an optional function of the fraction done and a message, see optimise_subplot
+    returns dictionary of data frames keyed by subplot, or None if inputs could not be read
+    '''
+    if objective not in OBJECTIVES:
+        print('*** Error *** objective {} must be one of {}'.format(objective, OBJECTIVES))
+        return None
+
+    inputs = read_inputs(xls_inp_fname, out_dir, None, ss_solver, use_cache)
+    if inputs is None:
+        return None
+    study, ora_parms, ora_weather, ora_subplots = inputs
+
+    all_subplots = list(ora_subplots.soil_all_areas.keys())
+    if subplots is None:
+        subplots = all_subplots
+    for subplot in subplots:
+        if subplot not in all_subplots:
+            print('*** Error *** subplot ' + subplot + ' is not one of ' + ', '.join(all_subplots))
+            return None
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    executor = None
+    if nworkers is not None and nworkers > 1:
+        executor = ProcessPoolExecutor(max_workers = nworkers)
+
+    rankings = {}
+    try:
+        for isub, subplot in enumerate(subplots):
+            print('Optimising management of subplot {} for objective {}'.format(subplot, objective))
+            ranking = optimise_subplot(ora_parms, ora_weather, ora_subplots.crop_mngmnt_ss[subplot],
+                            ora_subplots.crop_mngmnt_fwd[subplot], ora_subplots.soil_all_areas[subplot], objective,
+                            ncandidates, prune, keep_frac, seed, executor, ss_solver = ss_solver,
+                            checkpoint_dir = checkpoint_dir,
+                            progress = _subplot_progress(progress, isub, len(subplots), subplot))
+            if ranking is None:
+                print('Skipping optimisation of ' + subplot)
+                continue
+
+            rankings[subplot] = ranking
+            fname = os.path.join(out_dir, '{}_{}_optimise_{}.csv'.format(study.study_name, safe_name(subplot),
+                                                                                                        objective))
+            try:
+                ranking.to_csv(fname, index = False)
+                print('Wrote ' + fname)
+            except OSError as err:
+                print('*** Warning *** could not write ' + fname + ': ' + str(err))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return rankings
+
+def optimise_soil_cn(xls_inp_fname, settings, progress = None):
+    '''
+    GUI entry point, objective and number of candidates are taken from the optimise_objective and
+    optimise_ncandidates settings, if present
+    the GUI runs this in a worker thread so the workbook name and a copy of the settings are passed rather than the
+    form, whose widgets must only be used from the GUI thread, progress is reported instead
+    '''
+    return run_optimise(xls_inp_fname, settings['out_dir'], objective = settings.get('optimise_objective', 'soc'),
+                        ncandidates = settings.get('optimise_ncandidates', NCANDIDATES),
+                        nworkers = settings.get('nworkers', 1), checkpoint_dir = settings.get('checkpoint_dir'),
+                        progress = progress)
+
+def main(argv = None):
+    '''
+    command line entry point, returns 0 if any subplot was optimised and 1 otherwise
+    '''
+    parser = ArgumentParser(prog = __prog__, description = 'Optimise management of ORATOR subplots')
+    parser.add_argument('inputs', help = 'ORATOR inputs workbook')
+    parser.add_argument('-o', '--out_dir', required = True, help = 'output directory')
+    parser.add_argument('-s', '--subplot', action = 'append', help = 'subplot to optimise, may be repeated')
+    parser.add_argument('--objective', choices = OBJECTIVES, default = 'soc', help = 'default: soc')
+    parser.add_argument('-n', '--ncandidates', type = int, default = NCANDIDATES, help = 'candidates per subplot')
+    parser.add_argument('-j', '--jobs', type = int, default = 1, help = 'maximum number of worker processes')
+    parser.add_argument('--keep_frac', type = float, default = KEEP_FRAC,
+                                                            help = 'fraction of candidates kept at each stage')
+    parser.add_argument('--no_prune', action = 'store_true', help = 'run every candidate over the whole forward run')
+    parser.add_argument('--seed', type = int, help = 'seed of the random number generator')
+    parser.add_argument('--solver', choices = ['iterative', 'analytic'], default = 'analytic',
+                                                                        help = 'steady state solver')
+    parser.add_argument('--checkpoint_dir', help = 'directory of steady state checkpoints')
+    parser.add_argument('--no_cache', action = 'store_true', help = 'always read inputs from the workbook')
+    args = parser.parse_args(argv)
+
+    rankings = run_optimise(args.inputs, args.out_dir, args.subplot, args.objective, args.ncandidates, args.jobs,
+                        not args.no_prune, args.keep_frac, args.seed, args.solver, args.checkpoint_dir,
+                        not args.no_cache)
+    if rankings is None or len(rankings) == 0:
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
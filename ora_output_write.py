@@ -0,0 +1,133 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_output_write.py
+# Purpose:     write soil C and N results in the output format selected for the study
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   excel   - A1. SOM change workbook, values rounded for display, with charts if study.output_charts is set
+#   csv     - one CSV file per table
+#   parquet - one Parquet file per table, requires pyarrow or fastparquet
+#   npz     - one NumPy .npz archive per subplot holding the columns of both tables
+#   sqlite  - rows appended to the consolidated results store of the output directory, see ora_results_store
+#
+#   the tables are A1. SOM change, as for Excel, and A2. Mineral N from the forward run nitrogen results
+#   apart from Excel, columns are written at full precision directly from the result containers
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_output_write.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import numpy as np
+from pandas import DataFrame
+
+from ora_excel_write import generate_excel_outfiles, som_change_sheet
+from ora_results_store import ResultsStore, RESULTS_STORE_FNAME
+
+OUTPUT_FORMATS = list(['excel', 'csv', 'parquet', 'npz', 'sqlite'])
+OUTPUT_EXTNS = {'excel': '.xlsx', 'csv': '.csv', 'parquet': '.parquet', 'npz': '.npz', 'sqlite': '.sqlite'}
+SHEET_SOM_CHANGE = 'A1. SOM change'
+SHEET_MINERAL_N = 'A2. Mineral N'
+
+def safe_name(sheet_name):
+    '''
+    sheet name suitable for a file name, as for write_excel_out
+    '''
+    return sheet_name.replace('.','').replace(' ','_')
+
+def output_tables(weather, complete_run):
+    '''
+    dictionary of table name to dictionary of columns, in output order
+    '''
+    carbon_change, nitrogen_change, soil_water = complete_run
+
+    som_change_a1 = som_change_sheet(weather, complete_run)
+    som_cols = {var_name: som_change_a1.sheet_data[var_name] for var_name in som_change_a1.var_name_list}
+
+    min_n_cols = nitrogen_change.data
+
+    return {SHEET_SOM_CHANGE: som_cols, SHEET_MINERAL_N: min_n_cols}
+
+def write_table(fname, columns, output_format):
+    '''
+    write one table as CSV or Parquet, returns 0 on success
+    '''
+    data_frame = DataFrame({var_name: np.asarray(columns[var_name]) for var_name in columns})
+    try:
+        if output_format == 'parquet':
+            data_frame.to_parquet(fname, index = False)
+        else:
+            data_frame.to_csv(fname, index = False)
+    except ImportError as err:
+        print('*** Error *** could not write ' + fname + ': ' + str(err))
+        return -1
+    except PermissionError as err:
+        print(err)
+        return -1
+
+    return 0
+
+def results_store_fname(study, results_store = None):
+    '''
+    results store file name, by default in the output directory of the study
+    '''
+    if results_store is None:
+        results_store = os.path.join(study.out_dir, RESULTS_STORE_FNAME)
+
+    return results_store
+
+def write_results_store(store, study, subplot, weather, complete_run):
+    '''
+    append results for a subplot to an open results store, returns number of rows written
+    '''
+    return store.write_subplot(study.study_name, subplot, output_tables(weather, complete_run))
+
+def generate_outfiles(study, subplot, weather, complete_run, results_store = None):
+    '''
+    write results for a subplot in study.output_format to study.out_dir or, for sqlite, to the results store
+    returns list of files written
+    '''
+    output_format = study.output_format
+    if output_format == 'sqlite':
+        fname = results_store_fname(study, results_store)
+        store = ResultsStore(fname)
+        write_results_store(store, study, subplot, weather, complete_run)
+        store.close()
+        return [fname]
+
+    if output_format == 'excel':
+        generate_excel_outfiles(study, subplot, weather, complete_run, study.output_charts)
+        fname = os.path.join(study.out_dir, study.study_name + '_' + subplot + '_' + safe_name(SHEET_SOM_CHANGE)
+                                                                                                        + '.xlsx')
+        return [fname]
+
+    if output_format not in OUTPUT_FORMATS:
+        print('*** Error *** output format {} must be one of {}'.format(output_format, OUTPUT_FORMATS))
+        return []
+
+    study_pass_name = study.study_name + '_' + subplot
+    tables = output_tables(weather, complete_run)
+    extn = OUTPUT_EXTNS[output_format]
+
+    fnames = []
+    if output_format == 'npz':
+        fname = os.path.join(study.out_dir, study_pass_name + extn)
+        arrays = {}
+        for sheet_name, columns in tables.items():
+            for var_name in columns:
+                arrays[safe_name(sheet_name) + '/' + var_name] = np.asarray(columns[var_name])
+        np.savez(fname, **arrays)
+        fnames.append(fname)
+    else:
+        for sheet_name, columns in tables.items():
+            fname = os.path.join(study.out_dir, study_pass_name + '_' + safe_name(sheet_name) + extn)
+            if write_table(fname, columns, output_format) == 0:
+                fnames.append(fname)
+
+    return fnames
@@ -0,0 +1,166 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_results_store.py
+# Purpose:     consolidated SQLite store of soil C and N results for many studies and subplots
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   one table per output table i.e. A1_SOM_change and A2_Mineral_N, each row keyed by study, subplot, period and
+#   tstep followed by the output variables. Rows are read back in the order they were written
+#
+#   a subplot is written in a single transaction, replacing any earlier rows for that study and subplot, so the
+#   store can be appended to as runs complete. Several processes may write to the same store, SQLite serialises
+#   the writes. Retrieval of one subplot uses the (study, subplot) index and does not load the rest of the store
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_results_store.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import sqlite3
+from itertools import repeat
+
+import numpy as np
+
+RESULTS_STORE_FNAME = 'orator_results.sqlite'
+KEY_VARS = list(['study', 'subplot', 'period', 'tstep'])
+PERIOD_DFLT = 'forward run'     # for tables without a period column e.g. mineral N
+BUSY_TIMEOUT = 600              # seconds to wait for another process to finish writing
+
+def _table_name(sheet_name):
+    '''
+    sheet name suitable for an SQL table name, as for write_excel_out
+    '''
+    return sheet_name.replace('.','').replace(' ','_')
+
+def _quote(name):
+    '''
+    quoted SQL identifier
+    '''
+    return '"' + name.replace('"', '""') + '"'
+
+class ResultsStore(object, ):
+    '''
+    append only store of output tables, keyed by study, subplot, period and tstep
+    '''
+    def __init__(self, db_fname):
+        '''
+        open or create store
+        '''
+        out_dir = os.path.dirname(db_fname)
+        if out_dir != '' and not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+
+        self.db_fname = db_fname
+        self.conn = sqlite3.connect(db_fname, timeout = BUSY_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.columns = {}
+
+    def close(self):
+        '''
+        close connection, any open transaction is committed
+        '''
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def table_columns(self, table_name):
+        '''
+        list of column names of a table, empty if the table does not exist
+        '''
+        if table_name not in self.columns:
+            cursor = self.conn.execute('PRAGMA table_info(' + _quote(table_name) + ')')
+            self.columns[table_name] = [row[1] for row in cursor.fetchall()]
+
+        return self.columns[table_name]
+
+    def _check_table(self, table_name, var_names):
+        '''
+        create table and index or add any new variables to an existing table
+        '''
+        existing = self.table_columns(table_name)
+        if len(existing) == 0:
+            cols = ['study TEXT', 'subplot TEXT', 'period TEXT', 'tstep INTEGER']
+            cols += [_quote(var_name) + ' REAL' for var_name in var_names]
+            self.conn.execute('CREATE TABLE IF NOT EXISTS ' + _quote(table_name) + ' (' + ', '.join(cols) + ')')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS ' + _quote('idx_' + table_name) + ' ON ' +
+                                                                    _quote(table_name) + ' (study, subplot)')
+        else:
+            for var_name in var_names:
+                if var_name not in existing:
+                    self.conn.execute('ALTER TABLE ' + _quote(table_name) + ' ADD COLUMN ' + _quote(var_name) +
+                                                                                                        ' REAL')
+        del self.columns[table_name]
+        return self.table_columns(table_name)
+
+    def write_subplot(self, study_name, subplot, tables):
+        '''
+        write dictionary of table name to dictionary of columns for a subplot, see output_tables
+        returns number of rows written
+        '''
+        nrows_total = 0
+        with self.conn:
+            for sheet_name, columns in tables.items():
+                table_name = _table_name(sheet_name)
+                var_names = [var_name for var_name in columns if var_name not in KEY_VARS]
+                self._check_table(table_name, var_names)
+
+                nrows = len(columns[var_names[0]]) if len(var_names) > 0 else 0
+                period = columns['period'] if 'period' in columns else nrows*[PERIOD_DFLT]
+                tstep = columns['tstep'] if 'tstep' in columns else range(nrows)
+
+                # columns are converted to lists of floats once rather than value by value
+                # =========================================================================
+                values = [np.asarray(columns[var_name], dtype = float)[:nrows].tolist() for var_name in var_names]
+                rows = list(zip(repeat(study_name, nrows), repeat(subplot, nrows), period,
+                                            np.asarray(tstep, dtype = int)[:nrows].tolist(), *values))
+
+                sql_cols = ', '.join([_quote(var_name) for var_name in KEY_VARS + var_names])
+                self.conn.execute('DELETE FROM ' + _quote(table_name) + ' WHERE study = ? AND subplot = ?',
+                                                                                            (study_name, subplot))
+                self.conn.executemany('INSERT INTO ' + _quote(table_name) + ' (' + sql_cols + ') VALUES (' +
+                                            ', '.join((len(KEY_VARS) + len(var_names))*['?']) + ')', rows)
+                nrows_total += nrows
+
+        return nrows_total
+
+    def subplots(self, sheet_name, study_name = None):
+        '''
+        list of (study, subplot) held in a table, optionally restricted to one study
+        '''
+        table_name = _table_name(sheet_name)
+        if len(self.table_columns(table_name)) == 0:
+            return []
+
+        sql = 'SELECT DISTINCT study, subplot FROM ' + _quote(table_name)
+        if study_name is None:
+            cursor = self.conn.execute(sql + ' ORDER BY study, subplot')
+        else:
+            cursor = self.conn.execute(sql + ' WHERE study = ? ORDER BY subplot', (study_name,))
+
+        return cursor.fetchall()
+
+    def read_subplot(self, study_name, subplot, sheet_name):
+        '''
+        dictionary of columns of a table for one subplot, in the order written, or None if there are no rows
+        '''
+        table_name = _table_name(sheet_name)
+        var_names = self.table_columns(table_name)
+        if len(var_names) == 0:
+            return None
+
+        cursor = self.conn.execute('SELECT ' + ', '.join([_quote(var_name) for var_name in var_names]) +
+                        ' FROM ' + _quote(table_name) + ' WHERE study = ? AND subplot = ? ORDER BY rowid',
+                                                                                            (study_name, subplot))
+        rows = cursor.fetchall()
+        if len(rows) == 0:
+            return None
+
+        return {var_name: list(values) for var_name, values in zip(var_names, zip(*rows))}
@@ -0,0 +1,343 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_sensitivity.py
+# Purpose:     global sensitivity analysis of SOC, CO2, N2O and leached nitrate to parameters and soil properties
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   command line and library entry point e.g.
+#       python ora_sensitivity.py ORATOR_inputs.xlsx -o E:\ORATOR\sensitivity --method sobol -n 1024 -j 4
+#
+#   each factor of SA_FACTORS is scaled by a multiplier drawn uniformly from 1 - rel_range to 1 + rel_range:
+#       N parameters        - those read by get_n_parameters except:
+#                               no3_min, omitted as its value is normally zero
+#                               k_nitrif, inert as soil_nitrogen starts each timestep with no ammonium to nitrify
+#                               n_denit_max, inert as its carried over value, scaled by soil depth and days
+#                               (eq.2.4.9), exceeds the available nitrate after the first timestep and is capped by it
+#       rate constants      - the annual decomposition rate constants of ora_timestep
+#       soil                - clay, bulk density, carbon and pH of Soil
+#       crop                - DPM:RPM ratio and C:N ratio of plant inputs, excluding:
+#                               max_root_dpth, inert as it is only recorded by SoilWater and does not enter the soil
+#                               water or rate modifiers
+#                               n_supply_opt, inert as crop N uptake (eq.2.4.17) reduces to the soil N supply divided
+#                               by the months of growth when the minimum N supply is zero, as for every
+#                               crop of the ORATOR inputs workbook
+#
+#   sobol   - Saltelli design of nbase*(nfactors + 2) runs, first order indices after Saltelli (2010) and total
+#             indices after Jansen (1999)
+#   morris  - ntrajectories one at a time trajectories of nfactors + 1 runs, mean, mean absolute and standard
+#             deviation of the elementary effects, expressed per full range of the factor
+#   confidence bounds are percentiles of bootstrap resamples of the base rows or trajectories
+#
+#   design rows are run in batches along the sample axis of ora_uncertainty.cn_uncertainty_batch, batches are run
+#   concurrently by up to nworkers processes. Rows which fail to reach steady state are excluded from the indices
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_sensitivity.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pandas import DataFrame, concat
+
+from ora_input_cache import read_inputs
+from ora_output_write import safe_name
+from ora_uncertainty import cn_uncertainty_batch, RATE_VARS, N_PARM_VARS
+
+SA_METHODS = list(['sobol', 'morris'])
+SA_FACTORS = [var_name for var_name in N_PARM_VARS if var_name not in ('no3_min', 'k_nitrif', 'n_denit_max')] + \
+                RATE_VARS + \
+                ['t_clay', 't_bulk', 't_carbon', 't_pH_h2o', 'rat_dpm_rpm', 'c_n_rat_pi']
+SA_OUTPUTS = {'soc_fwd': 'total SOC at the end of the forward run', 'co2_total': 'cumulative CO2 release',
+              'n2o_total': 'cumulative N2O release', 'no3_leach_total': 'cumulative adjusted nitrate leaching'}
+REL_RANGE = 0.2
+NBASE = 256
+NTRAJECTORIES = 50
+NLEVELS = 4
+NBOOT = 500
+CONF_LEVEL = 0.95
+BATCH_SIZE = 1000
+
+def saltelli_design(nbase, nfactors, seed = None):
+    '''
+    unit hypercube design of shape (nbase*(nfactors + 2), nfactors): matrices A and B followed by, for each factor,
+    A with the column of that factor taken from B
+    scrambled Sobol sequences are used if scipy is available, otherwise pseudo random numbers
+    '''
+    try:
+        from scipy.stats import qmc
+        sample = qmc.Sobol(2*nfactors, seed = seed).random(nbase)
+    except ImportError:
+        sample = np.random.default_rng(seed).random((nbase, 2*nfactors))
+
+    mat_a = sample[:, :nfactors]
+    mat_b = sample[:, nfactors:]
+    blocks = [mat_a, mat_b]
+    for ifactor in range(nfactors):
+        mat_ab = mat_a.copy()
+        mat_ab[:, ifactor] = mat_b[:, ifactor]
+        blocks.append(mat_ab)
+
+    return np.vstack(blocks)
+
+def morris_design(ntrajectories, nfactors, nlevels = NLEVELS, seed = None):
+    '''
+    unit hypercube design of shape (ntrajectories*(nfactors + 1), nfactors), each trajectory moves every factor
+    once, in random order, by delta = nlevels/(2*(nlevels - 1))
+    '''
+    rng = np.random.default_rng(seed)
+    delta = nlevels/(2*(nlevels - 1))
+    levels = np.arange(nlevels)/(nlevels - 1)
+
+    trajectories = []
+    for itraj in range(ntrajectories):
+        point = rng.choice(levels, nfactors)
+        points = [point.copy()]
+        for ifactor in rng.permutation(nfactors).tolist():
+            if point[ifactor] + delta <= 1:
+                point[ifactor] += delta
+            else:
+                point[ifactor] -= delta
+            points.append(point.copy())
+        trajectories.append(np.array(points))
+
+    return np.vstack(trajectories)
+
+def _evaluate_rows(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, weather, latitude, factor_names,
+                                                                                        multipliers, ss_solver):
+    '''
+    SA_OUTPUTS for rows of multipliers of shape (nrows, nfactors), NaN for rows which failed to reach steady state
+    '''
+    nrows = multipliers.shape[0]
+    outputs = {var_name: np.full(nrows, np.nan) for var_name in SA_OUTPUTS}
+    factors = dict(zip(factor_names, multipliers.T))
+    results = cn_uncertainty_batch(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, weather, latitude,
+                                                                                                factors, ss_solver)
+    if results is not None:
+        metrics, series, samples = results
+        for var_name in SA_OUTPUTS:
+            outputs[var_name][samples] = metrics[var_name]
+
+    return outputs
+
+def evaluate_design(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, weather, latitude, factor_names, design,
+                    rel_range = REL_RANGE, batch_size = BATCH_SIZE, executor = None, ss_solver = 'analytic'):
+    '''
+    run every row of a unit hypercube design, executor is an optional concurrent.futures executor
+    returns dictionary of SA_OUTPUTS each an array of shape (nrows,)
+    '''
+    multipliers = 1 + rel_range*(2*design - 1)
+    batches = [multipliers[istart:istart + batch_size] for istart in range(0, len(multipliers), batch_size)]
+    args = [(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, weather, latitude, factor_names, batch,
+                                                                                    ss_solver) for batch in batches]
+    if executor is None:
+        batch_outputs = [_evaluate_rows(*batch_args) for batch_args in args]
+    else:
+        batch_outputs = list(executor.map(_evaluate_rows, *zip(*args)))
+
+    return {var_name: np.concatenate([outputs[var_name] for outputs in batch_outputs]) for var_name in SA_OUTPUTS}
+
+def _bounds(boot_vals, conf):
+    '''
+    lower and upper percentiles of bootstrap estimates of shape (nboot, nfactors)
+    '''
+    tail = 50*(1 - conf)
+
+    return np.nanpercentile(boot_vals, tail, axis = 0), np.nanpercentile(boot_vals, 100 - tail, axis = 0)
+
+def sobol_indices(yvals, nfactors, nboot = NBOOT, conf = CONF_LEVEL, seed = None):
+    '''
+    first order and total indices from outputs of a Saltelli design, base rows with any failed run are excluded
+    returns dictionary of arrays of shape (nfactors,): S1, ST and their confidence bounds
+    '''
+    nbase = len(yvals)//(nfactors + 2)
+    y_a = yvals[:nbase]
+    y_b = yvals[nbase:2*nbase]
+    y_ab = yvals[2*nbase:].reshape(nfactors, nbase)
+    valid = np.isfinite(y_a) & np.isfinite(y_b) & np.isfinite(y_ab).all(axis = 0)
+    y_a, y_b, y_ab = y_a[valid], y_b[valid], y_ab[:, valid]
+    nvalid = int(valid.sum())
+
+    def _estimates(indices):
+        # indices has shape (nsets, nvalid), estimates have shape (nsets, nfactors)
+        ya, yb, yab = y_a[indices], y_b[indices], y_ab[:, indices]
+        variance = np.concatenate([ya, yb], axis = -1).var(axis = -1)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            s_first = (yb*(yab - ya)).mean(axis = -1)/variance
+            s_total = 0.5*((ya - yab)**2).mean(axis = -1)/variance
+        return s_first.T, s_total.T
+
+    indices = {'nruns': np.full(nfactors, nvalid)}
+    if nvalid < 2:
+        for var_name in ['S1', 'S1_low', 'S1_high', 'ST', 'ST_low', 'ST_high']:
+            indices[var_name] = np.full(nfactors, np.nan)
+        return indices
+
+    s_first, s_total = _estimates(np.arange(nvalid)[np.newaxis, :])
+    boot_first, boot_total = _estimates(np.random.default_rng(seed).integers(0, nvalid, (nboot, nvalid)))
+    indices['S1'], indices['ST'] = s_first[0], s_total[0]
+    indices['S1_low'], indices['S1_high'] = _bounds(boot_first, conf)
+    indices['ST_low'], indices['ST_high'] = _bounds(boot_total, conf)
+
+    return indices
+
+def morris_indices(design, yvals, nfactors, nboot = NBOOT, conf = CONF_LEVEL, seed = None):
+    '''
+    elementary effects from outputs of a Morris design, effects involving a failed run are excluded
+    returns dictionary of arrays of shape (nfactors,): mu, mu_star, sigma and confidence bounds of mu_star
+    '''
+    ntraj = len(yvals)//(nfactors + 1)
+    points = design.reshape(ntraj, nfactors + 1, nfactors)
+    steps = np.diff(points, axis = 1)                                   # (ntraj, nfactors, nfactors)
+    ifactors = np.abs(steps).argmax(axis = 2)
+    dy_vals = np.diff(yvals.reshape(ntraj, nfactors + 1), axis = 1)
+
+    effects = np.full((ntraj, nfactors), np.nan)
+    rows = np.arange(ntraj)[:, np.newaxis]
+    effects[rows, ifactors] = dy_vals/np.take_along_axis(steps, ifactors[..., np.newaxis], axis = 2)[..., 0]
+
+    indices = {'nruns': np.isfinite(effects).sum(axis = 0)}
+    with np.errstate(invalid = 'ignore'):
+        indices['mu'] = np.nanmean(effects, axis = 0)
+        indices['mu_star'] = np.nanmean(np.abs(effects), axis = 0)
+        indices['sigma'] = np.nanstd(effects, axis = 0, ddof = 1)
+        boot_rows = np.random.default_rng(seed).integers(0, ntraj, (nboot, ntraj))
+        boot_mu_star = np.nanmean(np.abs(effects)[boot_rows], axis = 1)
+    indices['mu_star_low'], indices['mu_star_high'] = _bounds(boot_mu_star, conf)
+
+    return indices
+
+def sensitivity_subplot(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, weather, latitude, method = 'sobol',
+                            factor_names = None, nbase = NBASE, ntrajectories = NTRAJECTORIES, rel_range = REL_RANGE,
+                            nboot = NBOOT, conf = CONF_LEVEL, seed = None, executor = None, batch_size = BATCH_SIZE,
+                            ss_solver = 'analytic'):
+    '''
+    sensitivity indices of SA_OUTPUTS for one subplot
+    returns data frame with a row for each output and factor
+    '''
+    if factor_names is None:
+        factor_names = SA_FACTORS
+    nfactors = len(factor_names)
+
+    if method == 'sobol':
+        design = saltelli_design(nbase, nfactors, seed)
+    else:
+        design = morris_design(ntrajectories, nfactors, NLEVELS, seed)
+    print('Running {} design of {} rows for {} factors'.format(method, len(design), nfactors))
+
+    outputs = evaluate_design(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, weather, latitude,
+                                            factor_names, design, rel_range, batch_size, executor, ss_solver)
+    frames = []
+    for var_name in SA_OUTPUTS:
+        if method == 'sobol':
+            indices = sobol_indices(outputs[var_name], nfactors, nboot, conf, seed)
+        else:
+            indices = morris_indices(design, outputs[var_name], nfactors, nboot, conf, seed)
+        frame = DataFrame(indices)
+        frame.insert(0, 'factor', factor_names)
+        frame.insert(0, 'output', var_name)
+        frames.append(frame)
+
+    return concat(frames, ignore_index = True)
+
+def run_sensitivity(xls_inp_fname, out_dir, subplots = None, method = 'sobol', factor_names = None, nbase = NBASE,
+                    ntrajectories = NTRAJECTORIES, rel_range = REL_RANGE, nboot = NBOOT, seed = None, nworkers = 1,
+                    ss_solver = 'analytic', use_cache = True):
+    '''
+    sensitivity indices for the given subplots, by default all, written to a CSV file per subplot
+    returns dictionary of data frames keyed by subplot, or None if inputs could not be read
+    '''
+    if method not in SA_METHODS:
+        print('*** Error *** method {} must be one of {}'.format(method, SA_METHODS))
+        return None
+
+    if factor_names is not None:
+        unknown = [var_name for var_name in factor_names if var_name not in SA_FACTORS]
+        if len(unknown) > 0:
+            print('*** Error *** unknown factors: ' + ', '.join(unknown) + ', must be from ' + ', '.join(SA_FACTORS))
+            return None
+
+    inputs = read_inputs(xls_inp_fname, out_dir, None, ss_solver, use_cache)
+    if inputs is None:
+        return None
+    study, ora_parms, ora_weather, ora_subplots = inputs
+
+    all_subplots = list(ora_subplots.soil_all_areas.keys())
+    if subplots is None:
+        subplots = all_subplots
+    for subplot in subplots:
+        if subplot not in all_subplots:
+            print('*** Error *** subplot ' + subplot + ' is not one of ' + ', '.join(all_subplots))
+            return None
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    executor = None
+    if nworkers is not None and nworkers > 1:
+        executor = ProcessPoolExecutor(max_workers = nworkers)
+
+    frames = {}
+    try:
+        for subplot in subplots:
+            print('Sensitivity analysis of subplot ' + subplot)
+            frame = sensitivity_subplot(ora_parms, ora_subplots.crop_mngmnt_ss[subplot],
+                            ora_subplots.crop_mngmnt_fwd[subplot], ora_subplots.soil_all_areas[subplot], ora_weather,
+                            study.latitude, method, factor_names, nbase, ntrajectories, rel_range, nboot,
+                            seed = seed, executor = executor, ss_solver = ss_solver)
+            frames[subplot] = frame
+            fname = os.path.join(out_dir, '{}_{}_sensitivity_{}.csv'.format(study.study_name, safe_name(subplot),
+                                                                                                        method))
+            try:
+                frame.to_csv(fname, index = False)
+                print('Wrote ' + fname)
+            except OSError as err:
+                print('*** Warning *** could not write ' + fname + ': ' + str(err))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return frames
+
+def main(argv = None):
+    '''
+    command line entry point, returns 0 on success and 1 otherwise
+    '''
+    parser = ArgumentParser(prog = __prog__, description = 'Sensitivity analysis of ORATOR soil C and N model')
+    parser.add_argument('inputs', help = 'ORATOR inputs workbook')
+    parser.add_argument('-o', '--out_dir', required = True, help = 'output directory')
+    parser.add_argument('-s', '--subplot', action = 'append', help = 'subplot to analyse, may be repeated')
+    parser.add_argument('--method', choices = SA_METHODS, default = 'sobol', help = 'default: sobol')
+    parser.add_argument('--factor', action = 'append', help = 'factor to vary, may be repeated, default: all')
+    parser.add_argument('-n', '--nbase', type = int, default = NBASE, help = 'base rows of the Saltelli design')
+    parser.add_argument('-t', '--ntrajectories', type = int, default = NTRAJECTORIES,
+                                                                        help = 'trajectories of the Morris design')
+    parser.add_argument('-r', '--rel_range', type = float, default = REL_RANGE,
+                                                                    help = 'relative range of every factor')
+    parser.add_argument('--nboot', type = int, default = NBOOT, help = 'bootstrap resamples')
+    parser.add_argument('-j', '--jobs', type = int, default = 1, help = 'maximum number of worker processes')
+    parser.add_argument('--seed', type = int, help = 'seed of the random number generator')
+    parser.add_argument('--solver', choices = ['iterative', 'analytic'], default = 'analytic',
+                                                                        help = 'steady state solver')
+    parser.add_argument('--no_cache', action = 'store_true', help = 'always read inputs from the workbook')
+    args = parser.parse_args(argv)
+
+    frames = run_sensitivity(args.inputs, args.out_dir, args.subplot, args.method, args.factor, args.nbase,
+                    args.ntrajectories, args.rel_range, args.nboot, args.seed, args.jobs, args.solver,
+                    not args.no_cache)
+    if frames is None:
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_timestep.py
+# Purpose:     length of the model timestep and the rate constants which depend on it
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   the soil C and N model was written for monthly timesteps; rates given per month or per year in the manual are
+#   converted to rates per timestep here so that the same engine can run with monthly or daily timesteps
+#
+#   MONTHLY reproduces the constants previously hard coded e.g. K_DPM = 10/12 and the 28 day cap on AET in SoilWater
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_timestep.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+NDAYS_MNTH = list([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+NDAYS_LEAP_MNTH = list([31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# decomposition rate constants per year (RothC)
+# =============================================
+K_DPM_YR = 10;    K_RPM_YR = 0.3;   K_BIO_YR = 0.66;  K_HUM_YR = 0.02
+
+PRECIP_CRITIC = 21      # rainfall per month below which volatilisation takes place, see nh4_volatilisation
+AET_DAYS_MNTH = 28      # days per month used to cap AET in SoilWater, as originally hard coded
+AET_MAX_DAY = 5         # maximum AET per day (mm)
+
+class TimeStep(object, ):
+    '''
+    timestep length and rate constants per timestep
+    '''
+    def __init__(self, nsteps_yr = 12, k_dpm_yr = K_DPM_YR, k_rpm_yr = K_RPM_YR, k_bio_yr = K_BIO_YR,
+                                                                                        k_hum_yr = K_HUM_YR):
+        """
+        nsteps_yr is the number of timesteps per year e.g. 12 for monthly or 365 for daily
+        """
+        self.nsteps_yr = nsteps_yr
+        self.monthly = nsteps_yr == 12
+        self.name = 'monthly' if self.monthly else ('daily' if nsteps_yr == 365 else '{} per year'.format(nsteps_yr))
+
+        # decomposition rate constants per timestep
+        # =========================================
+        self.k_dpm = k_dpm_yr/nsteps_yr
+        self.k_rpm = k_rpm_yr/nsteps_yr
+        self.k_bio = k_bio_yr/nsteps_yr
+        self.k_hum = k_hum_yr/nsteps_yr
+
+        # rates given per month are divided by the number of timesteps per month
+        # =======================================================================
+        if self.monthly:
+            self.steps_per_mnth = 1
+            self.ndays = None           # i.e. days in each calendar month
+            self.aet_days = AET_DAYS_MNTH
+        else:
+            self.steps_per_mnth = nsteps_yr/12
+            self.ndays = 365/nsteps_yr
+            self.aet_days = self.ndays
+
+        self.precip_critic = PRECIP_CRITIC/self.steps_per_mnth
+
+    def rate_constants(self):
+        '''
+        decomposition rate constants per timestep for the DPM, RPM, BIO and HUM pools
+        '''
+        return self.k_dpm, self.k_rpm, self.k_bio, self.k_hum
+
+    def aet_max(self):
+        '''
+        maximum AET per timestep (mm)
+        '''
+        return self.aet_days*AET_MAX_DAY
+
+MONTHLY = TimeStep(12)
+DAILY = TimeStep(365)
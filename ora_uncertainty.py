@@ -0,0 +1,382 @@
+#-------------------------------------------------------------------------------
+# Name:        ora_uncertainty.py
+# Purpose:     Monte Carlo estimates of the uncertainty in SOC change and N2O emissions
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   command line and library entry point e.g.
+#       python ora_uncertainty.py ORATOR_inputs.xlsx -o E:\ORATOR\uncertainty -n 5000 --seed 1
+#
+#   for each subplot the inputs of PERTURBATIONS are drawn for every sample:
+#       soil        - clay, bulk density and carbon content of Soil
+#       ow_parms    - percent C, DPM:HUM ratio and proportion of inert organic matter of the organic waste
+#       crop_vars   - DPM:RPM ratio and C:N ratio of plant inputs
+#       weather     - rainfall and air temperature, a bias applied to every month of the steady state and forward run
+#   each relative perturbation applies to every organic waste or crop type of the rotation. Factors are lognormal
+#   with a mean of one while the temperature offset is normal, in degrees C. Maximum rooting depth and optimum N
+#   supply may be given factors but are not perturbed by default since neither affects the outputs, see ora_sensitivity
+#
+#   samples are advanced together along the first axis of the arrays of ora_cn_vectorised, in batches, through
+#   the carbon pools, soil water and nitrogen. Only summaries are kept: SOC at the end of the steady state and of the
+#   forward run, SOC change and totals of CO2, N2O and leached nitrate over the forward run, together with SOC and N2O
+#   for every timestep of the forward run. Percentiles are rewritten to CSV files as each batch completes
+#
+#   N of the forward run is computed exactly as by cn_forward_run, and so as in the deterministic output: from the
+#   forward weather and crops but from the carbon and soil water of the first records of the steady state, since
+#   soil_nitrogen reads the first ntsteps records of the combined steady state and forward run. N2O and leached
+#   nitrate therefore respond to perturbations of the steady state but not to the carbon of the forward run
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'ora_uncertainty.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import sys
+from argparse import ArgumentParser
+
+import numpy as np
+from pandas import DataFrame, concat
+
+from ora_classes_main import MngmntSubplot
+from ora_cn_vectorised import CarbonDrivers, get_mngmnt_arrays, carbon_steady_state_batch, carbon_forward_batch, \
+                                                                            nitrogen_batch, pettmp_batch, STATE_VARS
+from ora_excel_read import Soil, SOIL_VARS
+from ora_input_cache import read_inputs
+from ora_output_write import safe_name
+from ora_timestep import TimeStep, K_DPM_YR, K_RPM_YR, K_BIO_YR, K_HUM_YR
+
+NSAMPLES = 1000
+BATCH_SIZE = 500
+PERCENTILES = list([2.5, 5, 25, 50, 75, 95, 97.5])
+
+# standard deviations: relative for factors, degrees C for tair
+# ============================================================
+PERTURBATIONS = {'t_clay': 0.1, 't_bulk': 0.05, 't_carbon': 0.1,
+                 'pcnt_c': 0.1, 'rat_dpm_hum_ow': 0.1, 'prop_iom_ow': 0.1,
+                 'rat_dpm_rpm': 0.1, 'c_n_rat_pi': 0.1,
+                 'precip': 0.1, 'tair': 0.5}
+OFFSET_VARS = list(['tair'])
+MNGMNT_FACTORS = {'cow': 'pcnt_c', 'rat_dpm_hum_ow': 'rat_dpm_hum_ow', 'prop_iom_ow': 'prop_iom_ow',
+                                                    'rat_dpm_rpm': 'rat_dpm_rpm', 'max_root_dpth': 'max_root_dpth'}
+CROP_N_VARS = list(['c_n_rat_pi', 'n_supply_min', 'n_supply_opt', 'nmnths_grow'])
+
+RATE_VARS = list(['k_dpm', 'k_rpm', 'k_bio', 'k_hum'])
+N_PARM_VARS = list(['atmos_n_depos', 'prop_atmos_dep_no3', 'k_nitrif', 'no3_min', 'n_d50', 'n_denit_max'])
+
+METRICS = list(['soc_ss', 'soc_fwd', 'soc_change', 'soc_change_yr', 'co2_total', 'n2o_total', 'no3_leach_total'])
+SERIES = list(['tot_soc', 'n2o_release'])
+
+def draw_perturbations(nsamples, perturbations = None, seed = None):
+    '''
+    dictionary of arrays of shape (nsamples,): factors with a mean of one or offsets for OFFSET_VARS
+    all samples are drawn at once so that results for a given seed do not depend on the batch size
+    '''
+    if perturbations is None:
+        perturbations = PERTURBATIONS
+    rng = np.random.default_rng(seed)
+
+    draws = {}
+    for var_name, sdev in perturbations.items():
+        zscores = rng.standard_normal(nsamples)
+        if var_name in OFFSET_VARS:
+            draws[var_name] = sdev*zscores
+        else:
+            draws[var_name] = np.exp(sdev*zscores - sdev**2/2)
+
+    return draws
+
+def _factor(factors, var_name, nsamples):
+    '''
+    factors or offsets of a variable, or their neutral values if the variable is not perturbed
+    '''
+    if var_name in factors:
+        return factors[var_name]
+
+    return np.full(nsamples, 0.0 if var_name in OFFSET_VARS else 1.0)
+
+def _sample_soils(soil_vars, factors, nsamples):
+    '''
+    Soil objects for each sample with the soil variables of SOIL_VARS scaled by their factors
+    '''
+    soil_vals = [(getattr(soil_vars, var_name)*_factor(factors, var_name, nsamples)).tolist()
+                                                                                for var_name in SOIL_VARS]
+
+    return [Soil(soil_slice) for soil_slice in zip(*soil_vals)]
+
+def _sample_mngmnt_arrays(pettmp, management, parameters, factors, nsamples):
+    '''
+    management arrays of the rotation scaled for each sample, see get_mngmnt_arrays
+    '''
+    mngmnt_arrs = get_mngmnt_arrays({var_name: pettmp[var_name][0] for var_name in pettmp}, [management], parameters)
+
+    for var_name, arr in mngmnt_arrs.items():
+        arr = np.repeat(arr, nsamples, axis = 0)
+        if var_name in MNGMNT_FACTORS:
+            arr *= _factor(factors, MNGMNT_FACTORS[var_name], nsamples)[:, np.newaxis]
+        mngmnt_arrs[var_name] = arr
+    mngmnt_arrs['prop_iom_ow'] = np.minimum(mngmnt_arrs['prop_iom_ow'], 1.0)
+
+    return mngmnt_arrs
+
+def _sample_pettmp(pettmp, latitude, factors, nsamples):
+    '''
+    weather of shape (nsamples, nmnths) with rainfall scaled and temperature offset, PET follows from temperature
+    '''
+    precip = np.outer(_factor(factors, 'precip', nsamples), np.asarray(pettmp['precip'], dtype = float))
+    tair = np.asarray(pettmp['tair'], dtype = float) + _factor(factors, 'tair', nsamples)[:, np.newaxis]
+
+    return pettmp_batch(precip, tair, np.full(nsamples, latitude))
+
+def _sample_timestep(factors, nsamples):
+    '''
+    monthly TimeStep with decomposition rate constants of shape (nsamples, 1) scaled by their factors
+    '''
+    k_yrs = [k_yr*_factor(factors, var_name, nsamples)[:, np.newaxis]
+                                for var_name, k_yr in zip(RATE_VARS, [K_DPM_YR, K_RPM_YR, K_BIO_YR, K_HUM_YR])]
+
+    return TimeStep(12, *k_yrs)
+
+def _sample_n_parms(n_parms, factors, nsamples):
+    '''
+    N parameters with those of N_PARM_VARS as arrays of shape (nsamples,) scaled by their factors
+    '''
+    n_parms = dict(n_parms)
+    for var_name in N_PARM_VARS:
+        if var_name in factors:
+            n_parms[var_name] = n_parms[var_name]*factors[var_name]
+
+    return n_parms
+
+def _crop_n_arrays(crop_vars, management, factors, nsamples):
+    '''
+    N parameters of the first crop of the rotation for each sample, see soil_nitrogen
+    '''
+    crop_curr = crop_vars[management.crop_currs[0]]
+    crop_arrs = {var_name: np.full(nsamples, float(crop_curr[var_name])) for var_name in CROP_N_VARS}
+    for var_name in ['c_n_rat_pi', 'n_supply_opt']:
+        crop_arrs[var_name] *= _factor(factors, var_name, nsamples)
+
+    return crop_arrs
+
+def cn_uncertainty_batch(parameters, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, weather, latitude, factors,
+                                                                                        ss_solver = 'analytic'):
+    '''
+    steady state and forward run of a batch of samples with the given factors, see draw_perturbations; factors may
+    also be given for the soil variables of SOIL_VARS, the rate constants of RATE_VARS and the N parameters of
+    N_PARM_VARS, variables without factors take their values from the inputs
+    returns dictionaries of METRICS, arrays of shape (nconverged,), and SERIES, arrays of shape (nconverged, ntsteps)
+    for the forward run, together with the indices of the samples which converged, or None if none did
+    '''
+    nsamples = len(next(iter(factors.values())))
+    soils = _sample_soils(soil_vars, factors, nsamples)
+    pettmp_ss = _sample_pettmp(weather.pettmp_ss, latitude, factors, nsamples)
+    pettmp_fwd = _sample_pettmp(weather.pettmp_fwd, latitude, factors, nsamples)
+    timestep = _sample_timestep(factors, nsamples)
+
+    # steady state
+    # ============
+    mngmnt_ss = MngmntSubplot(crop_mngmnt_ss, parameters)
+    mngmnt_arrs = _sample_mngmnt_arrays(pettmp_ss, mngmnt_ss, parameters, factors, nsamples)
+    drivers_ss = CarbonDrivers(pettmp_ss, None, parameters, soils, timestep, mngmnt_arrs)
+    history_ss, pi_tonnes, converged = carbon_steady_state_batch(drivers_ss, mngmnt_arrs['c_pi_mnth'], ss_solver)
+    samples = np.flatnonzero(converged)
+    if len(samples) == 0:
+        return None
+
+    mngmnt_fwd = MngmntSubplot(crop_mngmnt_fwd, parameters)
+    if mngmnt_fwd.ntsteps > drivers_ss.ntsteps:
+        print('*** Error *** forward run of {} months exceeds steady state of {} months'
+                                                                    .format(mngmnt_fwd.ntsteps, drivers_ss.ntsteps))
+        return None
+
+    # forward run of the samples which reached steady state
+    # =====================================================
+    nconverged = len(samples)
+    factors = {var_name: arr[samples] for var_name, arr in factors.items()}
+    soils = [soils[isamp] for isamp in samples.tolist()]
+    pettmp_fwd = {var_name: arr[samples] for var_name, arr in pettmp_fwd.items()}
+    timestep = _sample_timestep(factors, nconverged)
+    mngmnt_arrs = _sample_mngmnt_arrays(pettmp_fwd, mngmnt_fwd, parameters, factors, nconverged)
+    mngmnt_arrs['c_pi_mnth'] = pi_tonnes[samples, :mngmnt_fwd.ntsteps]
+    drivers_fwd = CarbonDrivers(pettmp_fwd, None, parameters, soils, timestep, mngmnt_arrs)
+
+    init_state = {var_name: history_ss[var_name][samples, -1] for var_name in STATE_VARS}
+    history_fwd = carbon_forward_batch(drivers_fwd, mngmnt_arrs['c_pi_mnth'], init_state,
+                                                                            history_ss['tot_soc_simul'][samples, -1])
+
+    # N from the steady state records, as read by soil_nitrogen in cn_forward_run
+    # ============================================================================
+    ntsteps = drivers_fwd.ntsteps
+    history_n = {var_name: history_ss[var_name][samples, :ntsteps] for var_name in history_ss}
+    nitrogen = nitrogen_batch(history_n, drivers_ss.wat_soil[samples, :ntsteps], drivers_fwd.soil_arrs, pettmp_fwd,
+                                _sample_n_parms(parameters.n_parms, factors, nconverged),
+                                _crop_n_arrays(parameters.crop_vars, mngmnt_fwd, factors, nconverged), timestep)
+
+    # summaries, total SOC is taken from the pools as tot_soc_simul is fixed during the forward run
+    # ============================================================================================
+    soc_ss = sum(init_state[var_name] for var_name in STATE_VARS[:5])
+    tot_soc = sum(history_fwd[var_name] for var_name in STATE_VARS[:5])
+    soc_change = tot_soc[:, -1] - soc_ss
+    metrics = {'soc_ss': soc_ss, 'soc_fwd': tot_soc[:, -1], 'soc_change': soc_change,
+               'soc_change_yr': soc_change*12/drivers_fwd.ntsteps,
+               'co2_total': history_fwd['co2_release'].sum(axis = 1),
+               'n2o_total': np.nansum(nitrogen['n2o_release'], axis = 1),
+               'no3_leach_total': np.nansum(nitrogen['no3_leach_adj'], axis = 1)}
+
+    return metrics, {'tot_soc': tot_soc, 'n2o_release': nitrogen['n2o_release']}, samples
+
+class UncertaintySummary(object, ):
+    '''
+    results of the samples of one subplot, filled batch by batch
+    '''
+    def __init__(self, nsamples, ntsteps):
+        """
+        space for every sample is reserved, nconverged counts those filled
+        """
+        self.nsamples = nsamples
+        self.nconverged = 0
+        self.metrics = {var_name: np.full(nsamples, np.nan) for var_name in METRICS}
+        self.series = {var_name: np.full((nsamples, ntsteps), np.nan) for var_name in SERIES}
+
+    def add_batch(self, metrics, series):
+        '''
+        record converged samples of a batch
+        '''
+        istart = self.nconverged
+        istop = istart + len(metrics[METRICS[0]])
+        for var_name in METRICS:
+            self.metrics[var_name][istart:istop] = metrics[var_name]
+        for var_name in SERIES:
+            self.series[var_name][istart:istop] = series[var_name]
+        self.nconverged = istop
+
+    def metric_percentiles(self):
+        '''
+        data frame with a row for each metric: number of samples, mean, standard deviation and PERCENTILES
+        '''
+        rows = []
+        for var_name in METRICS:
+            vals = self.metrics[var_name][:self.nconverged]
+            rows.append([var_name, self.nconverged, np.nanmean(vals), np.nanstd(vals)] +
+                                                                    np.nanpercentile(vals, PERCENTILES).tolist())
+
+        return DataFrame(rows, columns = ['metric', 'nsamples', 'mean', 'std'] + _pcntl_names())
+
+    def series_percentiles(self):
+        '''
+        data frame with mean and PERCENTILES of each variable of SERIES for every timestep of the forward run
+        '''
+        frames = []
+        for var_name in SERIES:
+            vals = self.series[var_name][:self.nconverged]
+            frame = DataFrame(np.nanpercentile(vals, PERCENTILES, axis = 0).T, columns = _pcntl_names())
+            frame.insert(0, 'mean', np.nanmean(vals, axis = 0))
+            frame.insert(0, 'tstep', np.arange(vals.shape[1]))
+            frame.insert(0, 'var', var_name)
+            frames.append(frame)
+
+        return concat(frames, ignore_index = True)
+
+def _pcntl_names():
+
+    return ['p{:g}'.format(pcntl) for pcntl in PERCENTILES]
+
+def _write_summary(out_dir, study_name, subplot, summary):
+    '''
+    rewrite percentile files of a subplot, returns list of files written
+    '''
+    fnames = []
+    for suffix, frame in [('uncertainty', summary.metric_percentiles()),
+                                                            ('uncertainty_tsteps', summary.series_percentiles())]:
+        fname = os.path.join(out_dir, '{}_{}_{}.csv'.format(study_name, safe_name(subplot), suffix))
+        try:
+            frame.to_csv(fname, index = False)
+        except OSError as err:
+            print('*** Warning *** could not write ' + fname + ': ' + str(err))
+            continue
+        fnames.append(fname)
+
+    return fnames
+
+def run_uncertainty(xls_inp_fname, out_dir, subplots = None, nsamples = NSAMPLES, batch_size = BATCH_SIZE,
+                            perturbations = None, seed = None, ss_solver = 'analytic', use_cache = True):
+    '''
+    Monte Carlo run of the given subplots, by default all, of the inputs workbook
+    returns dictionary of UncertaintySummary objects keyed by subplot, or None if inputs could not be read
+    '''
+    inputs = read_inputs(xls_inp_fname, out_dir, None, ss_solver, use_cache)
+    if inputs is None:
+        return None
+    study, ora_parms, ora_weather, ora_subplots = inputs
+
+    all_subplots = list(ora_subplots.soil_all_areas.keys())
+    if subplots is None:
+        subplots = all_subplots
+    for subplot in subplots:
+        if subplot not in all_subplots:
+            print('*** Error *** subplot ' + subplot + ' is not one of ' + ', '.join(all_subplots))
+            return None
+
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    draws = draw_perturbations(nsamples, perturbations, seed)
+    summaries = {}
+    for subplot in subplots:
+        crop_mngmnt_ss = ora_subplots.crop_mngmnt_ss[subplot]
+        crop_mngmnt_fwd = ora_subplots.crop_mngmnt_fwd[subplot]
+        soil_vars = ora_subplots.soil_all_areas[subplot]
+        summary = UncertaintySummary(nsamples, MngmntSubplot(crop_mngmnt_fwd, ora_parms).ntsteps)
+
+        for istart in range(0, nsamples, batch_size):
+            istop = min(istart + batch_size, nsamples)
+            factors = {var_name: draw[istart:istop] for var_name, draw in draws.items()}
+            results = cn_uncertainty_batch(ora_parms, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars, ora_weather,
+                                                                            study.latitude, factors, ss_solver)
+            if results is not None:
+                metrics, series, samples = results
+                summary.add_batch(metrics, series)
+
+            if summary.nconverged > 0:
+                fnames = _write_summary(out_dir, study.study_name, subplot, summary)
+            print('Subplot {}: {} of {} samples complete, {} reached steady state'
+                                                            .format(subplot, istop, nsamples, summary.nconverged))
+
+        if summary.nconverged > 0:
+            print('Wrote ' + ', '.join(fnames))
+        summaries[subplot] = summary
+
+    return summaries
+
+def main(argv = None):
+    '''
+    command line entry point, returns 0 if samples of every subplot reached steady state and 1 otherwise
+    '''
+    parser = ArgumentParser(prog = __prog__, description = 'Monte Carlo uncertainty of ORATOR SOC change and N2O')
+    parser.add_argument('inputs', help = 'ORATOR inputs workbook')
+    parser.add_argument('-o', '--out_dir', required = True, help = 'output directory')
+    parser.add_argument('-s', '--subplot', action = 'append', help = 'subplot to run, may be repeated, default: all')
+    parser.add_argument('-n', '--nsamples', type = int, default = NSAMPLES, help = 'number of samples')
+    parser.add_argument('-b', '--batch_size', type = int, default = BATCH_SIZE, help = 'samples per batch')
+    parser.add_argument('--seed', type = int, help = 'seed of the random number generator')
+    parser.add_argument('--solver', choices = ['iterative', 'analytic'], default = 'analytic',
+                                                                        help = 'steady state solver')
+    parser.add_argument('--no_cache', action = 'store_true', help = 'always read inputs from the workbook')
+    args = parser.parse_args(argv)
+
+    summaries = run_uncertainty(args.inputs, args.out_dir, args.subplot, args.nsamples, args.batch_size,
+                                                        seed = args.seed, ss_solver = args.solver,
+                                                        use_cache = not args.no_cache)
+    if summaries is None or any(summary.nconverged == 0 for summary in summaries.values()):
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -33,7 +33,10 @@ __version__ = '0.0.0'
 #
 import os
 from ora_nitrogen_fns import no3_crop_uptake
-from thornthwaite import thornthwaite
+from numpy import array
+from thornthwaite import thornthwaite_matrix
+from ora_classes_store import ColumnStore
+from ora_timestep import MONTHLY
 
 def _theta_values(pcnt_c, pcnt_clay, pcnt_silt, pcnt_sand, halaba_flag = True):
     '''
@@ -76,39 +79,25 @@ def get_soil_water_constants(soil_vars):
 def add_pet_to_weather(latitude, pettmp_grid_cell):
     '''
     feed monthly annual temperatures to Thornthwaite equations to estimate Potential Evapotranspiration [mm/month]
+    all years are processed in one call, the year index is passed as the year for consistency with earlier versions
     '''
     # initialise output var
     # =====================
     nyears = int(len(pettmp_grid_cell['precip'])/12)
-    pettmp_reform = {}
-    for metric in list(['precip','tair','pet']):
-        pettmp_reform[metric] = []
+    nmnths = nyears*12
 
-    precip = pettmp_grid_cell['precip']         #
-    temper = pettmp_grid_cell['tair']
+    precip = pettmp_grid_cell['precip'][:nmnths]
+    temper = pettmp_grid_cell['tair'][:nmnths]
 
-    indx1 = 0
+    tmean = array(temper, dtype = float).reshape(nyears, 12)
     for year in range(nyears):
-
-        indx2 = indx1 + 12
-
-        # precipitation and temperature
-        precipitation = precip[indx1:indx2]            #
-        tmean =         temper[indx1:indx2]
-
-        # pet
-        if max(tmean) > 0.0:
-            pet = thornthwaite(tmean, latitude, year)
-        else:
-            pet = [0.0]*12
+        if tmean[year].max() <= 0.0:
             mess = '*** Warning *** monthly temperatures are all below zero for latitude: {}'.format(latitude)
             print(mess)
 
-        pettmp_reform['precip'] += precipitation
-        pettmp_reform['tair']   += tmean
-        pettmp_reform['pet'] += pet
+    pet = thornthwaite_matrix(tmean, latitude, range(nyears))      # zero for years with no month above zero
 
-        indx1 += 12
+    pettmp_reform = {'precip': list(precip), 'tair': list(temper), 'pet': pet.ravel().tolist()}
 
     return pettmp_reform
 
@@ -127,72 +116,67 @@ def get_soil_water(ntstep, precip, pet, irrigation, wc_fld_cap, wc_pwp, wc_t0, w
 
     return wat_soil, wc_t0, wc_t1
 
-class SoilWater(object, ):
+SOIL_WATER_VARS = list(['wc_pwp', 'wat_soil', 'wc_fld_cap',  'aet', 'irrig', 'wc_soil_irri_root_zone',
+                                                                            'aet_irri', 'wc_soil_irri', 'wat_drain'])
+class SoilWater(ColumnStore, ):
     '''
 
     '''
-    def __init__(self):
+    def __init__(self, ntsteps = None, timestep = None):
         """
         A3 - Soil water
         Assumptions:
+            timestep, see ora_timestep, sets the cap on AET per timestep - monthly by default
         """
+        ColumnStore.__init__(self, SOIL_WATER_VARS, ntsteps)
         self.title = 'SoilWater'
 
+        if timestep is None:
+            timestep = MONTHLY
+        self.aet_max = timestep.aet_max()
+
         self.irrig = 0 # D1. Water use
+        self.wat_drain_prev = 0
 
-        self.data = {}
-        var_name_list = list(['wc_pwp', 'wat_soil', 'wc_fld_cap',  'aet', 'irrig', 'wc_soil_irri_root_zone',
-                                                                            'aet_irri', 'wc_soil_irri', 'wat_drain'])
-        for var_name in var_name_list:
-            self.data[var_name] = []
+    def vals_by_tstep(self, ntsteps):
+        '''
+        values returned by get_vals_for_tstep for each of the first ntsteps timesteps, read column by column
+        '''
+        store = self.store
+        indices = self.var_indices
 
-        self.var_name_list = var_name_list
+        return list(zip(store[indices['wat_soil'], :ntsteps].tolist(), store[indices['wc_pwp'], :ntsteps].tolist(),
+                                                                store[indices['wc_fld_cap'], :ntsteps].tolist()))
 
     def get_vals_for_tstep(self, tstep):
 
-        wc_pwp = self.data['wc_pwp'][tstep]
-        wat_soil = self.data['wat_soil'][tstep]
-        wc_fld_cap = self.data['wc_fld_cap'][tstep]
-        aet = self.data['aet'][tstep]
-
-        irrig = self.data['irrig'][tstep]
-        wc_soil_irri_root_zone = self.data['wc_soil_irri_root_zone'][tstep]
-        aet_irri = self.data['aet_irri'][tstep]
-        wc_soil_irri = self.data['wc_soil_irri'][tstep]
-        wat_drain = self.data['wat_drain'][tstep]
+        store = self.store
+        indices = self.var_indices
 
         # return wc_pwp, wat_soil, wc_fld_cap, aet, irrig, wc_soil_irri_root_zone, aet_irri, wc_soil_irri, wat_drain
-        return  wat_soil, wc_pwp, wc_fld_cap
+        return  float(store[indices['wat_soil'], tstep]), float(store[indices['wc_pwp'], tstep]), \
+                                                                    float(store[indices['wc_fld_cap'], tstep])
 
     def append_vars(self, t_depth, max_root_dpth, precip, pet, irrig, wc_pwp, wat_soil, wc_fld_cap):
-        
-        self.data['wc_pwp'].append(wc_pwp)            # col I - Lower limit for water extraction (mm)
-        self.data['wc_fld_cap'].append(wc_fld_cap)    # col J - Water content of root zone at field capacity (mm)
-        self.data['wat_soil'].append(wat_soil)        # col K - Soil water content of root zone before irrigation (mm)
-
-        days_in_mnth = 28
-        aet = min(pet, (wat_soil - wc_pwp), days_in_mnth*5)
-        self.data['aet'].append(aet)                  # col L - AET to rooting depth before irrigation (mm)
+        '''
+        wc_pwp      col I - Lower limit for water extraction (mm)
+        wc_fld_cap  col J - Water content of root zone at field capacity (mm)
+        wat_soil    col K - Soil water content of root zone before irrigation (mm)
+        '''
+        aet = min(pet, (wat_soil - wc_pwp), self.aet_max)     # col L - AET to rooting depth before irrigation (mm)
 
         # required: num months growing, col I in D2. Water use for crops
-        self.data['irrig'].append(irrig)         # col M - irrigation
-
-        wc_soil_irri = wat_soil
-        self.data['wc_soil_irri_root_zone'].append(wc_soil_irri) # col N - Soil water content of root zone after irrigation (mm)
+        # irrig is col M
 
-        aet_irri = aet
-        self.data['aet_irri'].append(aet_irri)         # col O - AET to rooting depth after irrigation (mm)
-        self.data['wc_soil_irri'].append(wc_soil_irri) # col P - Soil water content to soil depth after irrigation (mm)
+        wc_soil_irri = wat_soil     # cols N and P - Soil water content of root zone and soil depth after irrigation
+        aet_irri = aet              # col O - AET to rooting depth after irrigation (mm)
 
         # TODO: check
         # ===========
-        if len(self.data['wat_drain']) > 0:
-            wat_drain_prev = self.data['wat_drain'][-1]
-        else:
-            wat_drain_prev = 0
-
         dpth_soil_root_rat =  t_depth/max_root_dpth       # used in PET (eq.2.2.13)
-        wat_drain = max((wat_drain_prev + precip + wc_pwp) - pet - (wc_fld_cap*dpth_soil_root_rat), 0)
-        self.data['wat_drain'].append(wat_drain)       # col Q - Drainage from soil  depth (mm)
+        wat_drain = max((self.wat_drain_prev + precip + wc_pwp) - pet - (wc_fld_cap*dpth_soil_root_rat), 0)
+        self.wat_drain_prev = wat_drain                 # col Q - Drainage from soil  depth (mm)
+
+        self.append_row((wc_pwp, wat_soil, wc_fld_cap, aet, irrig, wc_soil_irri, aet_irri, wc_soil_irri, wat_drain))
 
 
@@ -0,0 +1,66 @@
+#-------------------------------------------------------------------------------
+# Name:        conftest.py
+# Purpose:     shared fixtures for the ORATOR tests
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   the tests run the model on the shipped ORATOR inputs workbook; as for the GUI, EnvModelModules must be on the
+#   path, it is added here so that pytest can be run from the root of the repository
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'conftest.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in [ROOT_DIR, os.path.join(ROOT_DIR, 'EnvModelModules')]:
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+WORKBOOK = os.path.join(ROOT_DIR, 'ORATOR', 'inputs', 'ORATOR_inputs.xlsx')
+
+@pytest.fixture(scope = 'session')
+def workbook():
+    '''
+    ORATOR inputs workbook shipped with the repository
+    '''
+    return WORKBOOK
+
+@pytest.fixture(scope = 'session')
+def orator_inputs(workbook, tmp_path_factory):
+    '''
+    study, parameters, weather and subplots read directly from the workbook, output files are not written
+    tests which change study options must restore them
+    '''
+    from ora_input_cache import read_inputs
+
+    return read_inputs(workbook, str(tmp_path_factory.mktemp('outputs')), None, use_cache = False)
+
+def _max_abs_diff(obj_a, obj_b):
+    '''
+    largest absolute difference between the records of two ColumnStore objects
+    '''
+    assert obj_a.var_name_list == obj_b.var_name_list
+    assert obj_a.nrecs == obj_b.nrecs
+    if obj_a.nrecs == 0:
+        return 0.0
+
+    return float(np.abs(obj_a.store[:, :obj_a.nrecs] - obj_b.store[:, :obj_b.nrecs]).max())
+
+@pytest.fixture(scope = 'session')
+def max_abs_diff():
+    '''
+    function giving the largest absolute difference between the records of two ColumnStore objects
+    '''
+    return _max_abs_diff
@@ -0,0 +1,66 @@
+#-------------------------------------------------------------------------------
+# Name:        test_analytic_steady_state.py
+# Purpose:     the analytic steady state solver must reproduce the iterative spin-up
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_analytic_steady_state.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import numpy as np
+import pytest
+
+from ora_classes_main import MngmntSubplot
+from ora_high_level_fns import _cn_steady_state, SOC_MIN_DIFF
+
+POOL_VARS = list(['pool_c_dpm', 'pool_c_rpm', 'pool_c_bio', 'pool_c_hum', 'pool_c_iom', 'c_pi_mnth'])
+
+def _steady_state(orator_inputs, subplot, ss_solver):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    study.ss_solver = ss_solver
+    try:
+        mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+        return _cn_steady_state(ora_parms, ora_weather, mngmnt_ss, ora_subplots.soil_all_areas[subplot], study,
+                                                                                                        subplot)
+    finally:
+        study.ss_solver = 'iterative'
+
+def test_analytic_matches_iterative(orator_inputs, capsys):
+
+    for subplot in orator_inputs[3].soil_all_areas:
+        iterative = _steady_state(orator_inputs, subplot, 'iterative')
+        analytic = _steady_state(orator_inputs, subplot, 'analytic')
+        assert 'solver saved' in capsys.readouterr().out
+
+        for var_name in POOL_VARS:
+            diff = np.abs(iterative[0].data[var_name] - analytic[0].data[var_name]).max()
+            assert diff < SOC_MIN_DIFF, subplot + ' ' + var_name
+
+@pytest.mark.parametrize('ss_solver', ['iterative', 'analytic'])
+def test_steady_state_converges(orator_inputs, ss_solver):
+
+    study = orator_inputs[0]
+    for subplot in orator_inputs[3].soil_all_areas:
+        steady_state = _steady_state(orator_inputs, subplot, ss_solver)
+        assert steady_state is not None
+        carbon_change = steady_state[0]
+        tot_soc_end = sum(carbon_change.data[var_name][-1] for var_name in POOL_VARS[:5])
+        assert abs(tot_soc_end - orator_inputs[3].soil_all_areas[subplot].tot_soc_meas) < SOC_MIN_DIFF
+    assert study.ss_solver == 'iterative'
+
+def test_unknown_solver_falls_back(orator_inputs, capsys):
+
+    study = orator_inputs[0]
+    study.set_run_options(study.out_dir, None, 'anderson')
+    try:
+        assert study.ss_solver == 'iterative'
+        assert '*** Warning ***' in capsys.readouterr().out
+    finally:
+        study.set_run_options(study.out_dir, None, 'iterative')
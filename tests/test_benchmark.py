@@ -0,0 +1,46 @@
+#-------------------------------------------------------------------------------
+# Name:        test_benchmark.py
+# Purpose:     synthetic studies of the benchmark must run for any horizon
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_benchmark.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+from math import ceil
+
+import pytest
+
+from ora_benchmark import scale_study
+from ora_classes_main import MngmntSubplot
+from ora_forward_run import cn_forward_run
+from ora_high_level_fns import _cn_steady_state
+
+@pytest.mark.parametrize('nyears', [12, 15])
+def test_horizon_not_multiple_of_rotation(orator_inputs, nyears):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    nyears_rot = ceil(next(iter(ora_subplots.crop_mngmnt_fwd.values()))[-1].harvest_mnth/12)
+    assert nyears % nyears_rot != 0
+
+    weather_case, subplots_case = scale_study(ora_weather, ora_subplots, 7, nyears)
+    assert len(subplots_case.soil_all_areas) == 7
+    for pettmp in [weather_case.pettmp_ss, weather_case.pettmp_fwd]:
+        assert len(pettmp['tair']) == nyears*12
+
+    for subplot, soil_vars in subplots_case.soil_all_areas.items():
+        for crop_mngmnt in [subplots_case.crop_mngmnt_ss[subplot], subplots_case.crop_mngmnt_fwd[subplot]]:
+            assert crop_mngmnt[-1].harvest_mnth <= nyears*12, subplot
+
+        mngmnt_ss = MngmntSubplot(subplots_case.crop_mngmnt_ss[subplot], ora_parms)
+        steady_state = _cn_steady_state(ora_parms, weather_case, mngmnt_ss, soil_vars, study, subplot)
+        assert steady_state is not None, subplot
+        mngmnt_fwd = MngmntSubplot(subplots_case.crop_mngmnt_fwd[subplot], ora_parms,
+                                                                            steady_state[0].data['c_pi_mnth'])
+        cn_forward_run(ora_parms, weather_case, mngmnt_fwd, soil_vars, steady_state)
@@ -0,0 +1,77 @@
+#-------------------------------------------------------------------------------
+# Name:        test_checkpoint.py
+# Purpose:     a forward run from a restored steady state checkpoint must reproduce the run without checkpoints
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_checkpoint.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+
+import pytest
+
+import ora_input_cache
+from ora_checkpoint import steady_state_key, save_steady_state, load_steady_state, CHECKPOINT_EXT, \
+                                                                                                CHECKPOINT_MODULES
+from ora_classes_main import MngmntSubplot
+from ora_high_level_fns import _cn_steady_state, _cn_subplot_run
+
+def _subplot_run(orator_inputs, subplot, checkpoint_dir, coupled = False):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    return _cn_subplot_run(ora_parms, ora_weather, study, subplot, ora_subplots.soil_all_areas[subplot],
+                           ora_subplots.crop_mngmnt_ss[subplot], ora_subplots.crop_mngmnt_fwd[subplot],
+                           write_outputs = False, checkpoint_dir = checkpoint_dir, coupled = coupled)
+
+@pytest.mark.parametrize('coupled', [False, True])
+def test_restored_run_matches(orator_inputs, max_abs_diff, tmp_path, capsys, coupled):
+
+    checkpoint_dir = str(tmp_path)
+    for subplot in orator_inputs[3].soil_all_areas:
+        reference = _subplot_run(orator_inputs, subplot, None, coupled)
+        saved = _subplot_run(orator_inputs, subplot, checkpoint_dir, coupled)
+        capsys.readouterr()
+        restored = _subplot_run(orator_inputs, subplot, checkpoint_dir, coupled)
+        assert 'Restored steady state for ' + subplot in capsys.readouterr().out
+
+        for obj_ref, obj_saved, obj_restored in zip(reference, saved, restored):
+            assert max_abs_diff(obj_ref, obj_saved) == 0, subplot + ' ' + obj_ref.title
+            assert max_abs_diff(obj_ref, obj_restored) == 0, subplot + ' ' + obj_ref.title
+
+def test_round_trip(orator_inputs, max_abs_diff, tmp_path):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    subplot = next(iter(ora_subplots.soil_all_areas))
+    soil_vars = ora_subplots.soil_all_areas[subplot]
+    crop_mngmnt_ss = ora_subplots.crop_mngmnt_ss[subplot]
+    steady_state = _cn_steady_state(ora_parms, ora_weather, MngmntSubplot(crop_mngmnt_ss, ora_parms), soil_vars,
+                                                                                                    study, subplot)
+    key = steady_state_key(ora_parms, ora_weather, crop_mngmnt_ss, soil_vars, study.ss_solver)
+    assert save_steady_state(str(tmp_path), key, steady_state) == 0
+    assert os.path.isfile(os.path.join(str(tmp_path), key + CHECKPOINT_EXT))
+
+    restored = load_steady_state(str(tmp_path), key)
+    assert restored is not None
+    for obj, obj_restored in zip(steady_state, restored):
+        assert max_abs_diff(obj, obj_restored) == 0, obj.title
+    assert restored[2].wat_drain_prev == steady_state[2].wat_drain_prev
+    assert restored[0].get_last_tstep_pools() == steady_state[0].get_last_tstep_pools()
+
+def test_key_tracks_source(orator_inputs, monkeypatch):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    subplot = next(iter(ora_subplots.soil_all_areas))
+    args = (ora_parms, ora_weather, ora_subplots.crop_mngmnt_ss[subplot], ora_subplots.soil_all_areas[subplot],
+                                                                                                    study.ss_solver)
+    key = steady_state_key(*args)
+    assert steady_state_key(*args) == key
+
+    monkeypatch.setitem(ora_input_cache._SOURCE_DIGESTS, tuple(CHECKPOINT_MODULES), b'changed source')
+    assert steady_state_key(*args) != key
@@ -0,0 +1,80 @@
+#-------------------------------------------------------------------------------
+# Name:        test_cn_kernel.py
+# Purpose:     the fused kernel must reproduce _cn_steady_state and cn_forward_run
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   the pure Python kernel is compared bit for bit, if Numba is installed its compiled functions are replaced by
+#   the originals for that comparison; the compiled kernel is compared to a tolerance since exp and atan may be
+#   taken from a different maths library
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_cn_kernel.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import pytest
+
+import ora_cn_kernel
+from ora_classes_main import MngmntSubplot
+from ora_high_level_fns import _cn_steady_state
+from ora_forward_run import cn_forward_run
+from ora_cn_kernel import cn_steady_state_kernel, cn_forward_run_kernel, NUMBA_FLAG
+
+JIT_FUNCS = list(['_record', '_soil_water_step', '_carbon_step', '_loss_adjustment_ratio', '_ss_kernel',
+                                                                                                    '_cn_kernel'])
+COMPILED_TOL = 1.0e-9
+
+@pytest.fixture
+def python_kernel(monkeypatch):
+    '''
+    run the kernel as plain Python whether or not Numba is installed
+    '''
+    for func_name in JIT_FUNCS:
+        func = getattr(ora_cn_kernel, func_name)
+        monkeypatch.setattr(ora_cn_kernel, func_name, getattr(func, 'py_func', func))
+
+def _complete_run(orator_inputs, subplot, ss_solver, steady_state_func, forward_run_func):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    soil_vars = ora_subplots.soil_all_areas[subplot]
+    study.ss_solver = ss_solver
+    try:
+        mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+        steady_state = steady_state_func(ora_parms, ora_weather, mngmnt_ss, soil_vars, study, subplot)
+    finally:
+        study.ss_solver = 'iterative'
+    nitrogen_ss = steady_state[1]
+
+    mngmnt_fwd = MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms, steady_state[0].data['c_pi_mnth'])
+    complete_run = forward_run_func(ora_parms, ora_weather, mngmnt_fwd, soil_vars, steady_state)
+
+    return (nitrogen_ss,) + complete_run, mngmnt_ss.pi_tonnes
+
+def _compare(orator_inputs, max_abs_diff, ss_solver, tolerance):
+
+    for subplot in orator_inputs[3].soil_all_areas:
+        objs, pi_tonnes = _complete_run(orator_inputs, subplot, ss_solver, _cn_steady_state, cn_forward_run)
+        objs_kernel, pi_tonnes_kernel = _complete_run(orator_inputs, subplot, ss_solver, cn_steady_state_kernel,
+                                                                                            cn_forward_run_kernel)
+        for obj, obj_kernel in zip(objs, objs_kernel):
+            assert max_abs_diff(obj, obj_kernel) <= tolerance, subplot + ' ' + obj.title
+        assert objs[3].wat_drain_prev == pytest.approx(objs_kernel[3].wat_drain_prev, abs = tolerance)
+        assert pi_tonnes == pytest.approx(pi_tonnes_kernel, abs = tolerance)
+
+@pytest.mark.parametrize('ss_solver', ['iterative', 'analytic'])
+def test_kernel_matches_original(orator_inputs, max_abs_diff, python_kernel, ss_solver):
+
+    _compare(orator_inputs, max_abs_diff, ss_solver, 0)
+
+@pytest.mark.skipif(not NUMBA_FLAG, reason = 'Numba is not installed')
+@pytest.mark.parametrize('ss_solver', ['iterative', 'analytic'])
+def test_compiled_kernel_matches_original(orator_inputs, max_abs_diff, ss_solver):
+
+    assert hasattr(ora_cn_kernel._cn_kernel, 'py_func')
+    _compare(orator_inputs, max_abs_diff, ss_solver, COMPILED_TOL)
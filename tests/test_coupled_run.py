@@ -0,0 +1,83 @@
+#-------------------------------------------------------------------------------
+# Name:        test_coupled_run.py
+# Purpose:     the coupled C and N run must reproduce the two pass run
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_coupled_run.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import pytest
+
+from ora_classes_main import MngmntSubplot
+from ora_classes_carbon import CarbonChange
+from ora_classes_nitrogen import NitrogenChange
+from ora_water_model import SoilWater
+from ora_high_level_fns import _cn_steady_state
+from ora_forward_run import cn_forward_run
+
+def _complete_run(orator_inputs, subplot, ss_solver, coupled):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    soil_vars = ora_subplots.soil_all_areas[subplot]
+    study.ss_solver = ss_solver
+    try:
+        mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+        steady_state = _cn_steady_state(ora_parms, ora_weather, mngmnt_ss, soil_vars, study, subplot, coupled)
+    finally:
+        study.ss_solver = 'iterative'
+    nitrogen_ss = steady_state[1]
+
+    mngmnt_fwd = MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms, steady_state[0].data['c_pi_mnth'])
+    complete_run = cn_forward_run(ora_parms, ora_weather, mngmnt_fwd, soil_vars, steady_state, coupled)
+
+    return nitrogen_ss, complete_run
+
+@pytest.mark.parametrize('ss_solver', ['iterative', 'analytic'])
+def test_coupled_matches_two_pass(orator_inputs, max_abs_diff, ss_solver):
+
+    for subplot in orator_inputs[3].soil_all_areas:
+        nitrogen_ss, two_pass = _complete_run(orator_inputs, subplot, ss_solver, False)
+        nitrogen_ss_cpld, coupled = _complete_run(orator_inputs, subplot, ss_solver, True)
+
+        assert max_abs_diff(nitrogen_ss, nitrogen_ss_cpld) == 0, subplot
+        for obj_a, obj_b in zip(two_pass, coupled):
+            assert max_abs_diff(obj_a, obj_b) == 0, subplot + ' ' + obj_a.title
+
+def _truncated(steady_state, nrecs):
+    '''
+    copy of steady state objects keeping only the first nrecs records
+    '''
+    objs = (CarbonChange('steady state'), NitrogenChange(), SoilWater())
+    for obj, obj_ss in zip(objs, steady_state):
+        obj.extend_vars({var_name: obj_ss.store[indx, :nrecs] for indx, var_name in enumerate(obj.var_name_list)})
+    objs[2].wat_drain_prev = steady_state[2].wat_drain_prev
+
+    return objs
+
+def test_coupled_reads_forward_records(orator_inputs, max_abs_diff):
+    '''
+    with a steady state shorter than the forward run the N model reaches the records of the forward run
+    '''
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    subplot = list(ora_subplots.soil_all_areas)[1]
+    soil_vars = ora_subplots.soil_all_areas[subplot]
+
+    mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+    steady_state = _cn_steady_state(ora_parms, ora_weather, mngmnt_ss, soil_vars, study, subplot)
+    pi_tonnes = steady_state[0].data['c_pi_mnth']
+
+    complete_runs = []
+    for coupled in (False, True):
+        mngmnt_fwd = MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms, pi_tonnes)
+        assert mngmnt_fwd.ntsteps > 50
+        complete_runs.append(cn_forward_run(ora_parms, ora_weather, mngmnt_fwd, soil_vars,
+                                                                        _truncated(steady_state, 50), coupled))
+    for obj_a, obj_b in zip(*complete_runs):
+        assert max_abs_diff(obj_a, obj_b) == 0, obj_a.title
@@ -0,0 +1,107 @@
+#-------------------------------------------------------------------------------
+# Name:        test_daily_run.py
+# Purpose:     checks of the daily timestep mode against the monthly scalar run and against itself
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   daily and monthly runs differ in their water balance so are not expected to agree timestep by timestep; both
+#   spin up to the measured SOC however, and a forward run with the weather and management of the steady state must
+#   reproduce the daily steady state
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_daily_run.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import numpy as np
+import pytest
+
+from ora_classes_main import MngmntSubplot
+from ora_daily_run import cn_daily_steady_state_batch, cn_daily_forward_batch
+from ora_high_level_fns import _cn_steady_state
+
+POOL_VARS = list(['pool_c_dpm', 'pool_c_rpm', 'pool_c_bio', 'pool_c_hum', 'pool_c_iom'])
+SOC_TOLERANCE = 1e-5
+PERIODIC_TOLERANCE = 1e-6    # steady state is converged to SOC_MIN_DIFF over a period
+
+class _SteadyWeather(object, ):
+    '''
+    weather of the steady state used for the forward run too
+    '''
+    def __init__(self, weather):
+
+        self.pettmp_ss = weather.pettmp_ss
+        self.pettmp_fwd = weather.pettmp_ss
+
+def _daily_steady_states(orator_inputs, ss_solver, weather = None):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    if weather is None:
+        weather = ora_weather
+    subplots = list(ora_subplots.soil_all_areas.keys())
+    soil_list = [ora_subplots.soil_all_areas[subplot] for subplot in subplots]
+    mngmnt_list = [MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms) for subplot in subplots]
+    steady_states = cn_daily_steady_state_batch(ora_parms, weather, mngmnt_list, soil_list, ss_solver)
+
+    return subplots, soil_list, mngmnt_list, steady_states
+
+def _final_soc(carbon_change):
+
+    return sum(carbon_change.data[var_name][-1] for var_name in POOL_VARS)
+
+@pytest.mark.parametrize('ss_solver', ['iterative', 'analytic'])
+def test_daily_steady_state_matches_monthly(orator_inputs, ss_solver):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    subplots, soil_list, mngmnt_list, steady_states = _daily_steady_states(orator_inputs, ss_solver)
+    for subplot, soil_vars, steady_state in zip(subplots, soil_list, steady_states):
+        assert steady_state is not None, subplot
+        mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+        steady_state_mnthly = _cn_steady_state(ora_parms, ora_weather, mngmnt_ss, soil_vars, study, subplot)
+
+        soc_mnthly = _final_soc(steady_state_mnthly[0])
+        assert _final_soc(steady_state[0]) == pytest.approx(soc_mnthly, abs = SOC_TOLERANCE), subplot
+        assert soc_mnthly == pytest.approx(soil_vars.tot_soc_meas, abs = SOC_TOLERANCE), subplot
+
+def test_daily_forward_run_stays_at_steady_state(orator_inputs):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    weather = _SteadyWeather(ora_weather)
+    subplots, soil_list, mngmnt_list, steady_states = _daily_steady_states(orator_inputs, 'analytic', weather)
+    mngmnt_fwd = [MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms, management.pi_tonnes)
+                                                            for subplot, management in zip(subplots, mngmnt_list)]
+    complete_runs = cn_daily_forward_batch(ora_parms, weather, mngmnt_fwd, soil_list, steady_states)
+
+    for subplot, steady_state, complete_run in zip(subplots, steady_states, complete_runs):
+        for obj_ss, obj_fwd in zip(steady_state, complete_run):
+            assert obj_ss.nrecs == obj_fwd.nrecs, subplot
+        for var_name in POOL_VARS + ['co2_release']:
+            diff = np.abs(np.asarray(steady_state[0].data[var_name]) - np.asarray(complete_run[0].data[var_name]))
+            assert diff.max() < PERIODIC_TOLERANCE, subplot + ' ' + var_name
+        for var_name in ['n2o_release', 'no3_leach_adj']:
+            vals_ss = np.asarray(steady_state[1].data[var_name], dtype = float)
+            vals_fwd = np.asarray(complete_run[1].data[var_name], dtype = float)
+            assert np.nanmax(np.abs(vals_ss - vals_fwd)) < PERIODIC_TOLERANCE, subplot + ' ' + var_name
+
+def test_daily_forward_run_skips_failed_steady_states(orator_inputs, max_abs_diff):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    subplots, soil_list, mngmnt_list, steady_states = _daily_steady_states(orator_inputs, 'analytic')
+    mngmnt_fwd = [MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms, management.pi_tonnes)
+                                                            for subplot, management in zip(subplots, mngmnt_list)]
+    complete_runs = cn_daily_forward_batch(ora_parms, ora_weather, mngmnt_fwd, soil_list, steady_states)
+
+    failed = [None] + steady_states[1:]
+    partial_runs = cn_daily_forward_batch(ora_parms, ora_weather, mngmnt_fwd, soil_list, failed)
+    assert partial_runs[0] is None
+    for subplot, complete_run, partial_run in zip(subplots[1:], complete_runs[1:], partial_runs[1:]):
+        for obj, obj_partial in zip(complete_run, partial_run):
+            assert max_abs_diff(obj, obj_partial) == 0, subplot + ' ' + obj.title
+
+    assert cn_daily_forward_batch(ora_parms, ora_weather, mngmnt_fwd, soil_list, len(subplots)*[None]) == \
+                                                                                            len(subplots)*[None]
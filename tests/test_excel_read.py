@@ -0,0 +1,62 @@
+#-------------------------------------------------------------------------------
+# Name:        test_excel_read.py
+# Purpose:     workbook sessions are closed once a read pass finishes
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_excel_read.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import pytest
+
+import ora_excel_read
+from ora_excel_read import ReadStudy, WorkbookSession, workbook_session
+from ora_input_cache import read_inputs
+
+@pytest.fixture
+def sessions(monkeypatch):
+    '''
+    every WorkbookSession opened, with its count of closes
+    '''
+    opened = []
+    orig_init = WorkbookSession.__init__
+    orig_close = WorkbookSession.close
+
+    def _init(self, xls_fname):
+        orig_init(self, xls_fname)
+        self.nclosed = 0
+        opened.append(self)
+
+    def _close(self):
+        self.nclosed += 1
+        orig_close(self)
+
+    monkeypatch.setattr(ora_excel_read.WorkbookSession, '__init__', _init)
+    monkeypatch.setattr(ora_excel_read.WorkbookSession, 'close', _close)
+
+    return opened
+
+def test_read_pass_closes_workbook(workbook, tmp_path, sessions):
+
+    inputs = read_inputs(workbook, str(tmp_path), None, use_cache = False)
+    assert inputs is not None
+    assert len(sessions) == 1
+    assert sessions[0].nclosed == 1
+
+    ReadStudy(workbook, str(tmp_path), None)
+    assert len(sessions) == 2
+    assert sessions[1].nclosed == 1
+
+def test_shared_session_left_open(workbook, sessions):
+
+    with WorkbookSession(workbook) as wb_sess:
+        with workbook_session(wb_sess) as inner_sess:
+            assert inner_sess is wb_sess
+        assert wb_sess.nclosed == 0
+    assert wb_sess.nclosed == 1
@@ -0,0 +1,121 @@
+#-------------------------------------------------------------------------------
+# Name:        test_fao_eto_np.py
+# Purpose:     each NumPy function of fao_eto_np must agree with its scalar counterpart in fao_eto
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_fao_eto_np.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import numpy as np
+import pytest
+
+import fao_eto
+import fao_eto_np
+
+NVALS = 50
+TOLERANCE = 1e-12
+
+def _uniform(lower, upper):
+    return lambda rng: rng.uniform(lower, upper, NVALS)
+
+def _integers(lower, upper):
+    return lambda rng: rng.integers(lower, upper + 1, NVALS)
+
+TMIN = _uniform(-20.0, 15.0)
+TMAX = _uniform(20.0, 45.0)
+
+# arguments of each function, drawn within the ranges accepted by fao_eto
+# =======================================================================
+FUNC_ARGS = {'atmos_pres': [_uniform(-20, 3000)],
+             'clear_sky_rad': [_uniform(-20, 3000), _uniform(0.0, 45.0)],
+             'daily_mean_t': [TMIN, TMAX],
+             'daily_soil_heat_flux': [TMAX, TMIN, _uniform(1.0, 30.0), _uniform(1.0, 4.5), _uniform(0.0, 2.0)],
+             'daylight_hours': [_uniform(0.0, np.pi)],
+             'delta_sat_vap_pres': [TMAX],
+             'ea_from_tmin': [TMIN],
+             'ea_from_rhmin_rhmax': [_uniform(0.5, 2.0), _uniform(2.0, 6.0), _uniform(0, 50), _uniform(50, 100)],
+             'ea_from_rhmax': [_uniform(0.5, 2.0), _uniform(0, 100)],
+             'ea_from_rhmean': [_uniform(0.5, 2.0), _uniform(2.0, 6.0), _uniform(0, 100)],
+             'ea_from_tdew': [TMIN],
+             'ea_from_twet_tdry': [TMIN, TMAX, _uniform(0.5, 2.0), _uniform(0.0005, 0.0012)],
+             'es_from_t': [TMAX],
+             'et_rad': [_uniform(-60.0, 60.0), _uniform(-0.4, 0.4), _uniform(1.0, 2.0), _uniform(0.9669, 1.0331)],
+             'hargreaves_ETo': [TMIN, TMAX, _uniform(0.0, 25.0), _uniform(2.0, 18.0)],
+             'inv_rel_dist_earth_sun': [_integers(1, 366)],
+             'mean_es': [TMIN, TMAX],
+             'monthly_soil_heat_flux': [TMIN, TMAX],
+             'monthly_soil_heat_flux2': [TMIN, TMAX],
+             'net_out_lw_rad': [TMIN, TMAX, _uniform(5.0, 20.0), _uniform(20.0, 30.0), _uniform(0.0, 3.0)],
+             'net_rad': [_uniform(5.0, 20.0), _uniform(0.0, 10.0)],
+             'net_in_sol_rad': [_uniform(0.0, 30.0)],
+             'penman_monteith_ETo': [_uniform(0.0, 20.0), TMAX, _uniform(0.0, 10.0), _uniform(2.0, 6.0),
+                                                _uniform(0.5, 2.0), _uniform(0.05, 0.3), _uniform(0.05, 0.07)],
+             'psy_const': [_uniform(70.0, 101.3)],
+             'psy_const_of_psychrometer': [_integers(1, 3), _uniform(70.0, 101.3)],
+             'rad2equiv_evap': [_uniform(0.0, 30.0)],
+             'rh_from_ea_es': [_uniform(0.5, 2.0), _uniform(2.0, 6.0)],
+             'sol_dec': [_integers(1, 366)],
+             'sol_rad_from_sun_hours': [_uniform(10.0, 14.0), _uniform(0.0, 10.0), _uniform(10.0, 40.0)],
+             'sol_rad_island': [_uniform(10.0, 40.0)],
+             'sunset_hour_angle': [_uniform(-80.0, 80.0), _uniform(-0.4, 0.4)],
+             'wind_speed_2m': [_uniform(0.0, 20.0), _uniform(1.0, 100.0)]}
+
+@pytest.mark.parametrize('func_name', sorted(FUNC_ARGS))
+def test_matches_scalar(func_name):
+
+    rng = np.random.default_rng(sorted(FUNC_ARGS).index(func_name))
+    args = [draw(rng) for draw in FUNC_ARGS[func_name]]
+
+    result = getattr(fao_eto_np, func_name)(*args)
+    expected = [getattr(fao_eto, func_name)(*vals) for vals in zip(*[arg.tolist() for arg in args])]
+    np.testing.assert_allclose(result, expected, rtol = TOLERANCE, atol = TOLERANCE)
+
+@pytest.mark.parametrize('coastal', [True, False, -999])
+def test_sol_rad_from_t(coastal):
+
+    rng = np.random.default_rng(1)
+    args = [_uniform(10.0, 40.0)(rng), _uniform(15.0, 30.0)(rng), TMIN(rng), TMAX(rng)]
+
+    result = fao_eto_np.sol_rad_from_t(*args, coastal = coastal)
+    expected = [fao_eto.sol_rad_from_t(*vals, coastal = coastal) for vals in zip(*[arg.tolist() for arg in args])]
+    np.testing.assert_allclose(result, expected, rtol = TOLERANCE, atol = TOLERANCE)
+
+def test_range_errors():
+
+    for func_name, args in [('atmos_pres', [12000.0]), ('sol_dec', [0]), ('ea_from_tmin', [70.0])]:
+        with pytest.raises(ValueError):
+            getattr(fao_eto, func_name)(*args)
+        with pytest.raises(ValueError):
+            getattr(fao_eto_np, func_name)(np.array(args + [1.0]))
+
+@pytest.mark.parametrize('func_name, args', [
+                        ('net_out_lw_rad', [10.0, 20.0, 15.0, 25.0, -0.5]),
+                        ('sol_rad_from_t', [30.0, 25.0, 20.0, 10.0]),
+                        ('wind_speed_2m', [5.0, 0.05])])
+def test_domain_errors(func_name, args):
+    '''
+    ValueError is raised where fao_eto raises math domain error
+    '''
+    with pytest.raises(ValueError):
+        getattr(fao_eto, func_name)(*args)
+    with pytest.raises(ValueError):
+        getattr(fao_eto_np, func_name)(*[np.array([val, val]) for val in args])
+
+def test_zero_clear_sky_rad():
+
+    args = [10.0, 20.0, 15.0, 0.0, 1.0]
+    result = fao_eto_np.net_out_lw_rad(*[np.array([val]) for val in args])
+    assert result[0] == fao_eto.net_out_lw_rad(*args) == 0.0
+
+def test_hargreaves_ETo_tmax_below_tmin():
+
+    assert isinstance(fao_eto.hargreaves_ETo(20.0, 10.0, 15.0, 10.0), complex)
+    with np.errstate(invalid = 'ignore'):
+        assert np.isnan(fao_eto_np.hargreaves_ETo(np.array([20.0]), np.array([10.0]), 15.0, 10.0)).all()
@@ -0,0 +1,77 @@
+#-------------------------------------------------------------------------------
+# Name:        test_grid_weather.py
+# Purpose:     grid weather read a chunk at a time is the same for every file format
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+# Description:
+#   weather written as a directory of .npy files, NPZ and CSV is read by GridWeather, NPZ and CSV are spooled a few
+#   rows at a time to check that blocks are stitched together in cell order
+#-------------------------------------------------------------------------------
+
+import os
+
+import numpy as np
+import pytest
+from pandas import DataFrame
+
+import ora_grid_run
+from ora_grid_run import GridWeather, GRID_WEATHER_VARS
+
+NCELLS = 23
+NMNTHS = 24
+RTOL = {'npy': 0, 'npz': 0, 'csv': 1e-14}   # the pandas CSV parser may differ from repr in the last bit
+
+@pytest.fixture
+def weather_files(tmp_path, monkeypatch):
+    '''
+    random weather for NCELLS cells written in each format, CSV rows are shuffled and padded with an empty month
+    '''
+    monkeypatch.setattr(ora_grid_run, 'SPOOL_ROWS', 7)
+    rng = np.random.default_rng(18)
+    cell_ids = ['cell_' + str(icell) for icell in range(NCELLS)]
+    arrays = {var_name: rng.uniform(0, 100, (NCELLS, NMNTHS)) for var_name in GRID_WEATHER_VARS}
+
+    npy_dir = tmp_path / 'weather'
+    npy_dir.mkdir()
+    for var_name in GRID_WEATHER_VARS:
+        np.save(str(npy_dir / (var_name + '.npy')), arrays[var_name])
+
+    npz_fname = str(tmp_path / 'weather.npz')
+    np.savez_compressed(npz_fname, **arrays)
+
+    rows = []
+    for var_name in GRID_WEATHER_VARS:
+        for icell, cell_id in enumerate(cell_ids):
+            rows.append([cell_id, var_name] + list(arrays[var_name][icell]) + [np.nan])
+    mnth_cols = ['m' + str(imnth) for imnth in range(NMNTHS + 1)]
+    data_frame = DataFrame(rows, columns = ['cell_id', 'var'] + mnth_cols).sample(frac = 1, random_state = 3)
+    csv_fname = str(tmp_path / 'weather.csv')
+    data_frame.to_csv(csv_fname, index = False)
+
+    return cell_ids, arrays, {'npy': str(npy_dir), 'npz': npz_fname, 'csv': csv_fname}
+
+@pytest.mark.parametrize('fmt', ['npy', 'npz', 'csv'])
+def test_chunks_match_source(weather_files, fmt):
+
+    cell_ids, arrays, fnames = weather_files
+    grid_weather = GridWeather(fnames[fmt], cell_ids)
+    assert grid_weather.arrays is not None
+    spool_dir = grid_weather.spool_dir
+    try:
+        for start in range(0, NCELLS, 5):
+            chunk = grid_weather.read_chunk(start, start + 5)
+            for var_name in GRID_WEATHER_VARS:
+                np.testing.assert_allclose(chunk[var_name], arrays[var_name][start:start + 5], rtol = RTOL[fmt])
+    finally:
+        grid_weather.close()
+
+    if spool_dir is not None:
+        assert not os.path.exists(spool_dir)
+
+def test_csv_missing_cell(weather_files, capsys):
+
+    cell_ids, arrays, fnames = weather_files
+    grid_weather = GridWeather(fnames['csv'], cell_ids + ['cell_extra'])
+    assert grid_weather.arrays is None
+    assert 'lacks 1 cells e.g. cell_extra' in capsys.readouterr().out
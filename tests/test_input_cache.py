@@ -0,0 +1,63 @@
+#-------------------------------------------------------------------------------
+# Name:        test_input_cache.py
+# Purpose:     inputs loaded from the cache must be those read from the workbook
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_input_cache.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import math
+
+import numpy as np
+
+import ora_input_cache
+from ora_input_cache import read_inputs, workbook_hash
+
+def _same(obj_a, obj_b, path = 'inputs'):
+    '''
+    assert two objects hold the same values, recursing through attributes, dictionaries and sequences
+    '''
+    assert type(obj_a) is type(obj_b), path
+    if isinstance(obj_a, dict):
+        assert list(obj_a.keys()) == list(obj_b.keys()), path
+        for key in obj_a:
+            _same(obj_a[key], obj_b[key], path + '[' + repr(key) + ']')
+    elif isinstance(obj_a, (list, tuple)):
+        assert len(obj_a) == len(obj_b), path
+        for indx, (val_a, val_b) in enumerate(zip(obj_a, obj_b)):
+            _same(val_a, val_b, path + '[' + str(indx) + ']')
+    elif isinstance(obj_a, np.ndarray):
+        assert np.array_equal(obj_a, obj_b, equal_nan = True), path
+    elif isinstance(obj_a, float):
+        assert obj_a == obj_b or (math.isnan(obj_a) and math.isnan(obj_b)), path
+    elif hasattr(obj_a, '__dict__'):
+        _same(vars(obj_a), vars(obj_b), path)
+    else:
+        assert obj_a == obj_b, path
+
+def test_warm_load_matches_cold(workbook, tmp_path, capsys):
+
+    out_dir = str(tmp_path / 'outputs')
+    cache_dir = str(tmp_path / 'cache')
+    cold = read_inputs(workbook, out_dir, None, use_cache = False)
+    read_inputs(workbook, out_dir, None, cache_dir = cache_dir)
+    capsys.readouterr()
+
+    warm = read_inputs(workbook, out_dir, None, cache_dir = cache_dir)
+    assert 'Loaded inputs from cache' in capsys.readouterr().out
+    _same(cold, warm)
+
+def test_key_tracks_source(workbook, monkeypatch):
+
+    key = workbook_hash(workbook)
+    assert workbook_hash(workbook) == key
+
+    monkeypatch.setitem(ora_input_cache._SOURCE_DIGESTS, tuple(ora_input_cache.CACHE_MODULES), b'changed source')
+    assert workbook_hash(workbook) != key
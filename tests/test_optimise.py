@@ -0,0 +1,46 @@
+#-------------------------------------------------------------------------------
+# Name:        test_optimise.py
+# Purpose:     the baseline candidate of the optimiser must reproduce the deterministic run
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_optimise.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import numpy as np
+import pytest
+
+from ora_classes_main import MngmntSubplot
+from ora_high_level_fns import _cn_subplot_run
+from ora_optimise import optimise_subplot
+
+TOLERANCE = 1e-9
+
+@pytest.mark.parametrize('prune', [False, True])
+def test_baseline_candidate_matches_deterministic(orator_inputs, prune):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    for subplot, soil_vars in ora_subplots.soil_all_areas.items():
+        crop_mngmnt_ss = ora_subplots.crop_mngmnt_ss[subplot]
+        crop_mngmnt_fwd = ora_subplots.crop_mngmnt_fwd[subplot]
+        carbon_change, nitrogen_change, soil_water = _cn_subplot_run(ora_parms, ora_weather, study, subplot,
+                                                soil_vars, crop_mngmnt_ss, crop_mngmnt_fwd, write_outputs = False)
+        ntsteps = MngmntSubplot(crop_mngmnt_fwd, ora_parms).ntsteps
+
+        ranking = optimise_subplot(ora_parms, ora_weather, crop_mngmnt_ss, crop_mngmnt_fwd, soil_vars,
+                                            ncandidates = 8, prune = prune, seed = 1, ss_solver = study.ss_solver)
+        assert ranking is not None, subplot
+        baseline = ranking[ranking['candidate'] == 0].iloc[0]
+
+        pools = ['pool_c_dpm', 'pool_c_rpm', 'pool_c_bio', 'pool_c_hum', 'pool_c_iom']
+        soc_end = sum(carbon_change.data[var_name][-1] for var_name in pools)
+        assert baseline['soc_end'] == pytest.approx(soc_end, abs = TOLERANCE), subplot
+        for result_var, var_name in [('n2o_total', 'n2o_release'), ('no3_leach_total', 'no3_leach_adj')]:
+            expected = np.nansum(np.asarray(nitrogen_change.data[var_name][:ntsteps], dtype = float))
+            assert baseline[result_var] == pytest.approx(expected, abs = TOLERANCE), subplot + ' ' + result_var
@@ -0,0 +1,116 @@
+#-------------------------------------------------------------------------------
+# Name:        test_output_write.py
+# Purpose:     round trip checks of the CSV, Parquet and NPZ output formats against the Excel output
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   the outputs of one complete run are written in each format and read back; the A1. SOM change table must hold
+#   the columns of the Excel workbook and, once rounded as for Excel, the same values. A2. Mineral N has no Excel
+#   counterpart and is checked against the forward run nitrogen results at full precision
+#   Parquet requires pyarrow or fastparquet, its test is skipped if neither is installed
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_output_write.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+from importlib.util import find_spec
+
+import numpy as np
+import pytest
+from pandas import read_csv, read_excel, read_parquet
+
+from ora_excel_write import som_change_sheet
+from ora_high_level_fns import _cn_subplot_run
+from ora_output_write import generate_outfiles, safe_name, SHEET_SOM_CHANGE, SHEET_MINERAL_N
+
+@pytest.fixture(scope = 'module')
+def subplot_run(orator_inputs):
+    '''
+    subplot name and complete run
+    '''
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    subplot = list(ora_subplots.soil_all_areas)[0]
+    complete_run = _cn_subplot_run(ora_parms, ora_weather, study, subplot, ora_subplots.soil_all_areas[subplot],
+                ora_subplots.crop_mngmnt_ss[subplot], ora_subplots.crop_mngmnt_fwd[subplot], write_outputs = False)
+
+    return subplot, complete_run
+
+def _write_outputs(orator_inputs, subplot, complete_run, output_format, out_dir):
+    '''
+    write outputs of a complete run in output_format to out_dir, study options are restored
+    '''
+    study, ora_weather = orator_inputs[0], orator_inputs[2]
+    saved = (study.output_format, study.output_charts, study.out_dir)
+    study.output_format, study.output_charts, study.out_dir = output_format, False, out_dir
+    try:
+        fnames = generate_outfiles(study, subplot, ora_weather, complete_run)
+    finally:
+        study.output_format, study.output_charts, study.out_dir = saved
+
+    return fnames
+
+def _read_tables(fnames, output_format):
+    '''
+    dictionary of table name to dictionary of columns read back from the files written
+    '''
+    tables = {}
+    if output_format == 'npz':
+        with np.load(fnames[0]) as arrays:
+            for sheet_name in (SHEET_SOM_CHANGE, SHEET_MINERAL_N):
+                prefix = safe_name(sheet_name) + '/'
+                tables[sheet_name] = {key[len(prefix):]: arrays[key] for key in arrays.files
+                                                                                        if key.startswith(prefix)}
+        return tables
+
+    for sheet_name, fname in zip((SHEET_SOM_CHANGE, SHEET_MINERAL_N), fnames):
+        assert fname.endswith(safe_name(sheet_name) + '.' + output_format)
+        if output_format == 'csv':
+            data_frame = read_csv(fname, float_precision = 'round_trip')
+        else:
+            data_frame = read_parquet(fname)
+        tables[sheet_name] = {var_name: data_frame[var_name].values for var_name in data_frame.columns}
+
+    return tables
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet', 'npz'])
+def test_round_trip_against_excel(orator_inputs, subplot_run, output_format, tmp_path):
+
+    if output_format == 'parquet' and find_spec('pyarrow') is None and find_spec('fastparquet') is None:
+        pytest.skip('Parquet requires pyarrow or fastparquet')
+
+    subplot, complete_run = subplot_run
+    excel_fnames = _write_outputs(orator_inputs, subplot, complete_run, 'excel', str(tmp_path))
+    excel_a1 = read_excel(excel_fnames[0], sheet_name = SHEET_SOM_CHANGE, index_col = 0)
+
+    fnames = _write_outputs(orator_inputs, subplot, complete_run, output_format, str(tmp_path))
+    assert len(fnames) == (1 if output_format == 'npz' else 2)
+    tables = _read_tables(fnames, output_format)
+
+    # A1. SOM change rounded as for Excel
+    # ===================================
+    som_change_a1 = som_change_sheet(orator_inputs[2], complete_run)
+    columns = tables[SHEET_SOM_CHANGE]
+    assert list(columns) == list(excel_a1.columns)
+    for var_name in columns:
+        var_fmt = som_change_a1.var_formats[var_name].strip('{:.}')
+        if var_fmt[-1] == 'f':
+            ndecis = int(var_fmt[:-1])
+            vals = [round(float(val), ndecis) for val in columns[var_name]]
+            np.testing.assert_array_equal(np.asarray(vals), excel_a1[var_name].values, err_msg = var_name)
+        else:
+            assert list(columns[var_name]) == list(excel_a1[var_name]), var_name
+
+    # A2. Mineral N at full precision
+    # ===============================
+    nitrogen_change = complete_run[1]
+    columns = tables[SHEET_MINERAL_N]
+    assert list(columns) == nitrogen_change.var_name_list
+    for var_name in columns:
+        np.testing.assert_array_equal(np.asarray(columns[var_name], dtype = float),
+                                      np.asarray(nitrogen_change.data[var_name], dtype = float), err_msg = var_name)
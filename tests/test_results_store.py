@@ -0,0 +1,117 @@
+#-------------------------------------------------------------------------------
+# Name:        test_results_store.py
+# Purpose:     round trip checks of the consolidated SQLite results store
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#
+# Description:
+#   the output tables of a complete run are written to a store and read back, rows must come back in the order
+#   written with the values unchanged; writing a subplot again must replace its rows and a new variable must be
+#   added to an existing table
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_results_store.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import os
+
+import numpy as np
+import pytest
+
+from ora_high_level_fns import _cn_subplot_run
+from ora_output_write import output_tables, SHEET_SOM_CHANGE, SHEET_MINERAL_N
+from ora_results_store import ResultsStore, KEY_VARS, PERIOD_DFLT
+
+STUDY_NAME = 'test study'
+
+@pytest.fixture(scope = 'module')
+def subplot_tables(orator_inputs):
+    '''
+    subplot name and output tables of its complete run
+    '''
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    subplot = list(ora_subplots.soil_all_areas)[0]
+    complete_run = _cn_subplot_run(ora_parms, ora_weather, study, subplot, ora_subplots.soil_all_areas[subplot],
+                ora_subplots.crop_mngmnt_ss[subplot], ora_subplots.crop_mngmnt_fwd[subplot], write_outputs = False)
+
+    return subplot, output_tables(ora_weather, complete_run)
+
+def _check_table(columns_read, columns):
+    '''
+    columns read from the store must match those written
+    '''
+    nrows = len(columns['tstep'])
+    period = columns['period'] if 'period' in columns else nrows*[PERIOD_DFLT]
+    assert list(columns_read['period']) == list(period)
+    for var_name in columns:
+        if var_name == 'period':
+            continue
+        np.testing.assert_array_equal(np.asarray(columns_read[var_name], dtype = float),
+                                      np.asarray(columns[var_name], dtype = float), err_msg = var_name)
+
+def test_round_trip(subplot_tables, tmp_path):
+
+    subplot, tables = subplot_tables
+    store = ResultsStore(os.path.join(str(tmp_path), 'results.sqlite'))
+    nrows = store.write_subplot(STUDY_NAME, subplot, tables)
+    assert nrows == sum(len(columns['tstep']) for columns in tables.values())
+
+    for sheet_name, columns in tables.items():
+        assert store.subplots(sheet_name) == [(STUDY_NAME, subplot)]
+        columns_read = store.read_subplot(STUDY_NAME, subplot, sheet_name)
+        assert list(columns_read)[:len(KEY_VARS)] == KEY_VARS
+        _check_table(columns_read, columns)
+
+    assert store.read_subplot(STUDY_NAME, 'no such subplot', SHEET_SOM_CHANGE) is None
+    assert store.read_subplot(STUDY_NAME, subplot, 'no such sheet') is None
+    store.close()
+
+def test_rewrite_replaces_rows(subplot_tables, tmp_path):
+    '''
+    a second write of a study and subplot replaces its rows, other subplots are untouched
+    '''
+    subplot, tables = subplot_tables
+    db_fname = os.path.join(str(tmp_path), 'results.sqlite')
+    store = ResultsStore(db_fname)
+    store.write_subplot(STUDY_NAME, subplot, tables)
+    store.write_subplot(STUDY_NAME, 'other', tables)
+
+    min_n_cols = {var_name: tables[SHEET_MINERAL_N][var_name] for var_name in tables[SHEET_MINERAL_N]}
+    min_n_cols['no3_start'] = 2.0*np.asarray(min_n_cols['no3_start'])
+    store.write_subplot(STUDY_NAME, subplot, {SHEET_MINERAL_N: min_n_cols})
+    store.close()
+
+    # read back through a new connection
+    # ==================================
+    store = ResultsStore(db_fname)
+    _check_table(store.read_subplot(STUDY_NAME, subplot, SHEET_MINERAL_N), min_n_cols)
+    _check_table(store.read_subplot(STUDY_NAME, 'other', SHEET_MINERAL_N), tables[SHEET_MINERAL_N])
+    _check_table(store.read_subplot(STUDY_NAME, subplot, SHEET_SOM_CHANGE), tables[SHEET_SOM_CHANGE])
+    assert store.subplots(SHEET_MINERAL_N, STUDY_NAME) == sorted([(STUDY_NAME, 'other'), (STUDY_NAME, subplot)])
+    store.close()
+
+def test_new_column_added(subplot_tables, tmp_path):
+    '''
+    a variable not yet in a table is added as a column, earlier rows hold nulls
+    '''
+    subplot, tables = subplot_tables
+    store = ResultsStore(os.path.join(str(tmp_path), 'results.sqlite'))
+    store.write_subplot(STUDY_NAME, subplot, {SHEET_MINERAL_N: tables[SHEET_MINERAL_N]})
+
+    min_n_cols = {var_name: tables[SHEET_MINERAL_N][var_name] for var_name in tables[SHEET_MINERAL_N]}
+    min_n_cols['no3_extra'] = np.arange(len(min_n_cols['tstep']), dtype = float)
+    store.write_subplot(STUDY_NAME, 'other', {SHEET_MINERAL_N: min_n_cols})
+
+    assert store.table_columns('A2_Mineral_N')[-1] == 'no3_extra'
+    _check_table(store.read_subplot(STUDY_NAME, 'other', SHEET_MINERAL_N), min_n_cols)
+
+    columns_read = store.read_subplot(STUDY_NAME, subplot, SHEET_MINERAL_N)
+    assert all(val is None for val in columns_read['no3_extra'])
+    _check_table({var_name: columns_read[var_name] for var_name in columns_read if var_name != 'no3_extra'},
+                                                                                        tables[SHEET_MINERAL_N])
+    store.close()
@@ -0,0 +1,77 @@
+#-------------------------------------------------------------------------------
+# Name:        test_sensitivity.py
+# Purpose:     Sobol and Morris indices must recover those of functions with known indices
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_sensitivity.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import numpy as np
+
+from ora_sensitivity import saltelli_design, morris_design, sobol_indices, morris_indices
+
+COEFFS = np.array([4.0, -2.0, 1.0, 0.0])
+
+def _ishigami(design, coeff_a = 7.0, coeff_b = 0.1):
+    '''
+    Ishigami function of three factors on -pi to pi, mapped from the unit hypercube
+    '''
+    xvals = np.pi*(2*design - 1)
+
+    return np.sin(xvals[:, 0]) + coeff_a*np.sin(xvals[:, 1])**2 + coeff_b*xvals[:, 2]**4*np.sin(xvals[:, 0])
+
+def test_sobol_linear():
+
+    design = saltelli_design(8192, len(COEFFS), seed = 1)
+    indices = sobol_indices(design @ COEFFS, len(COEFFS), nboot = 100, seed = 1)
+
+    expected = COEFFS**2/(COEFFS**2).sum()
+    np.testing.assert_allclose(indices['S1'], expected, atol = 0.02)
+    np.testing.assert_allclose(indices['ST'], expected, atol = 0.02)
+    assert indices['ST'][-1] == 0
+    assert (indices['S1_low'] <= indices['S1_high']).all()
+
+def test_sobol_ishigami():
+
+    design = saltelli_design(16384, 3, seed = 2)
+    indices = sobol_indices(_ishigami(design), 3, nboot = 100, seed = 2)
+
+    np.testing.assert_allclose(indices['S1'], [0.3139, 0.4424, 0.0], atol = 0.03)
+    np.testing.assert_allclose(indices['ST'], [0.5576, 0.4424, 0.2437], atol = 0.03)
+
+def test_sobol_excludes_failed_runs():
+
+    nbase = 1024
+    design = saltelli_design(nbase, len(COEFFS), seed = 3)
+    yvals = design @ COEFFS
+    yvals[[0, 2*nbase + 5]] = np.nan
+    indices = sobol_indices(yvals, len(COEFFS), nboot = 10, seed = 3)
+
+    assert (indices['nruns'] == nbase - 2).all()
+    assert np.isfinite(indices['S1']).all() and np.isfinite(indices['ST']).all()
+
+def test_morris_linear():
+
+    design = morris_design(20, len(COEFFS), seed = 4)
+    indices = morris_indices(design, design @ COEFFS, len(COEFFS), nboot = 10, seed = 4)
+
+    np.testing.assert_allclose(indices['mu'], COEFFS, atol = 1e-12)
+    np.testing.assert_allclose(indices['mu_star'], np.abs(COEFFS), atol = 1e-12)
+    np.testing.assert_allclose(indices['sigma'], 0, atol = 1e-12)
+    assert (indices['nruns'] == 20).all()
+
+def test_morris_ishigami_ranking():
+
+    design = morris_design(200, 3, seed = 5)
+    indices = morris_indices(design, _ishigami(design), 3, nboot = 10, seed = 5)
+
+    # x3 acts only through its interaction with x1 so its effects have mean near zero but a large spread
+    assert indices['mu_star'].min() > 0
+    assert abs(indices['mu'][2]) < indices['sigma'][2]
@@ -0,0 +1,81 @@
+#-------------------------------------------------------------------------------
+# Name:        test_thornthwaite.py
+# Purpose:     vectorised daylight hours and Thornthwaite PET must agree with the scalar functions
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_thornthwaite.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import calendar
+
+import numpy as np
+import pytest
+
+import fao_eto
+from thornthwaite import thornthwaite, thornthwaite_matrix, daylight_hours_table
+
+LATITUDES = list([-66.0, -35.5, 0.0, 12.3, 51.5, 70.0])
+YEARS = list([1999, 2000, 2001, 2004])
+TOLERANCE = 1e-12
+
+def _daylight_hours_scalar(lat, year):
+    '''
+    mean daylight hours of each month computed a day at a time by the fao_eto functions
+    '''
+    monthly_mean_dlh = []
+    doy = 1
+    for imnth in range(1, 13):
+        mdays = calendar.monthrange(year, imnth)[1]
+        dlh = 0
+        for iday in range(mdays):
+            dlh += fao_eto.daylight_hours(fao_eto.sunset_hour_angle(lat, fao_eto.sol_dec(doy)))
+            doy += 1
+        monthly_mean_dlh.append(dlh/mdays)
+
+    return monthly_mean_dlh
+
+@pytest.mark.parametrize('lat', LATITUDES)
+def test_daylight_hours_table(lat):
+
+    for year in [1999, 2000]:
+        expected = _daylight_hours_scalar(lat, year)
+        assert daylight_hours_table(lat, calendar.isleap(year)) == pytest.approx(expected, abs = TOLERANCE)
+
+def test_daylight_hours_table_latitude():
+
+    with pytest.raises(ValueError):
+        daylight_hours_table(91.0)
+
+@pytest.mark.parametrize('lat', LATITUDES)
+def test_thornthwaite_matrix(lat):
+
+    rng = np.random.default_rng(1)
+    monthly_t = rng.uniform(-10.0, 35.0, (len(YEARS), 12))
+    for years in [YEARS, None]:
+        pet = thornthwaite_matrix(monthly_t, lat, years)
+        assert pet.shape == monthly_t.shape
+        for iyear, tair in enumerate(monthly_t.tolist()):
+            expected = thornthwaite(tair, lat, None if years is None else years[iyear])
+            np.testing.assert_allclose(pet[iyear], expected, rtol = TOLERANCE, atol = TOLERANCE)
+
+def test_thornthwaite_matrix_cold_year():
+
+    monthly_t = np.array([12*[-5.0], [float(imnth) for imnth in range(12)]])
+    pet = thornthwaite_matrix(monthly_t, 51.5)
+
+    assert (pet[0] == 0).all()
+    np.testing.assert_allclose(pet[1], thornthwaite(monthly_t[1].tolist(), 51.5), rtol = TOLERANCE)
+    with pytest.raises(ZeroDivisionError):
+        thornthwaite(monthly_t[0].tolist(), 51.5)
+
+def test_thornthwaite_matrix_shape():
+
+    with pytest.raises(ValueError):
+        thornthwaite_matrix(np.zeros((2, 11)), 51.5)
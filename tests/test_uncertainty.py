@@ -0,0 +1,50 @@
+#-------------------------------------------------------------------------------
+# Name:        test_uncertainty.py
+# Purpose:     an unperturbed Monte Carlo sample must reproduce the deterministic run
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_uncertainty.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import numpy as np
+import pytest
+
+from ora_classes_main import MngmntSubplot
+from ora_high_level_fns import _cn_steady_state
+from ora_forward_run import cn_forward_run
+from ora_uncertainty import cn_uncertainty_batch
+
+TOLERANCE = 1e-9
+
+@pytest.mark.parametrize('ss_solver', ['iterative', 'analytic'])
+def test_unperturbed_sample_matches_deterministic(orator_inputs, ss_solver):
+
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    for subplot, soil_vars in ora_subplots.soil_all_areas.items():
+        mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+        steady_state = _cn_steady_state(ora_parms, ora_weather, mngmnt_ss, soil_vars, study, subplot)
+        mngmnt_fwd = MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms,
+                                                                            steady_state[0].data['c_pi_mnth'])
+        carbon_change, nitrogen_change, soil_water = cn_forward_run(ora_parms, ora_weather, mngmnt_fwd, soil_vars,
+                                                                                                    steady_state)
+        ntsteps = mngmnt_fwd.ntsteps
+
+        batch = cn_uncertainty_batch(ora_parms, ora_subplots.crop_mngmnt_ss[subplot],
+                                ora_subplots.crop_mngmnt_fwd[subplot], soil_vars, ora_weather, study.latitude,
+                                {'precip': np.ones(1)}, ss_solver)
+        assert batch is not None, subplot
+        metrics = batch[0]
+
+        pools = ['pool_c_dpm', 'pool_c_rpm', 'pool_c_bio', 'pool_c_hum', 'pool_c_iom']
+        soc_fwd = sum(carbon_change.data[var_name][-1] for var_name in pools)
+        assert metrics['soc_fwd'][0] == pytest.approx(soc_fwd, abs = TOLERANCE), subplot
+        for metric, var_name in [('n2o_total', 'n2o_release'), ('no3_leach_total', 'no3_leach_adj')]:
+            expected = np.nansum(np.asarray(nitrogen_change.data[var_name][:ntsteps], dtype = float))
+            assert metrics[metric][0] == pytest.approx(expected, abs = TOLERANCE), subplot + ' ' + metric
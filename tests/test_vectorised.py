@@ -0,0 +1,72 @@
+#-------------------------------------------------------------------------------
+# Name:        test_vectorised.py
+# Purpose:     the vectorised multi subplot engine must reproduce the scalar run of each subplot
+# Author:      Mike Martin
+# Created:     18/10/2020
+# Licence:     <your licence>
+#-------------------------------------------------------------------------------
+#!/usr/bin/env python
+
+__prog__ = 'test_vectorised.py'
+__version__ = '0.0.0'
+
+# Version history
+# ---------------
+#
+import pytest
+
+from ora_classes_main import MngmntSubplot
+from ora_cn_vectorised import cn_steady_state_batch, cn_forward_run_batch
+from ora_high_level_fns import _cn_steady_state
+from ora_forward_run import cn_forward_run
+
+TOLERANCE = 1e-9
+
+def _scalar_runs(orator_inputs, ss_solver):
+    '''
+    steady state N and complete run of each subplot in turn
+    '''
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    study.ss_solver = ss_solver
+    runs = []
+    try:
+        for subplot, soil_vars in ora_subplots.soil_all_areas.items():
+            mngmnt_ss = MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms)
+            steady_state = _cn_steady_state(ora_parms, ora_weather, mngmnt_ss, soil_vars, study, subplot)
+            nitrogen_ss = steady_state[1]
+            mngmnt_fwd = MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms,
+                                                                            steady_state[0].data['c_pi_mnth'])
+            runs.append((nitrogen_ss, cn_forward_run(ora_parms, ora_weather, mngmnt_fwd, soil_vars, steady_state)))
+    finally:
+        study.ss_solver = 'iterative'
+
+    return runs
+
+def _batch_runs(orator_inputs, ss_solver):
+    '''
+    steady state N and complete run of every subplot advanced together
+    '''
+    study, ora_parms, ora_weather, ora_subplots = orator_inputs
+    subplots = list(ora_subplots.soil_all_areas.keys())
+    soil_list = [ora_subplots.soil_all_areas[subplot] for subplot in subplots]
+    mngmnt_list = [MngmntSubplot(ora_subplots.crop_mngmnt_ss[subplot], ora_parms) for subplot in subplots]
+    steady_states = cn_steady_state_batch(ora_parms, ora_weather, mngmnt_list, soil_list, ss_solver)
+    nitrogen_ss = [steady_state[1] for steady_state in steady_states]
+
+    mngmnt_list = [MngmntSubplot(ora_subplots.crop_mngmnt_fwd[subplot], ora_parms, steady_state[0].data['c_pi_mnth'])
+                                                        for subplot, steady_state in zip(subplots, steady_states)]
+    complete_runs = cn_forward_run_batch(ora_parms, ora_weather, mngmnt_list, soil_list, steady_states)
+
+    return list(zip(nitrogen_ss, complete_runs))
+
+@pytest.mark.parametrize('ss_solver', ['iterative', 'analytic'])
+def test_batch_matches_scalar(orator_inputs, max_abs_diff, ss_solver):
+
+    subplots = list(orator_inputs[3].soil_all_areas.keys())
+    for subplot, scalar_run, batch_run in zip(subplots, _scalar_runs(orator_inputs, ss_solver),
+                                                                        _batch_runs(orator_inputs, ss_solver)):
+        nitrogen_ss, complete_run = scalar_run
+        nitrogen_ss_batch, complete_run_batch = batch_run
+        assert max_abs_diff(nitrogen_ss, nitrogen_ss_batch) < TOLERANCE, subplot
+        for obj_a, obj_b in zip(complete_run, complete_run_batch):
+            assert max_abs_diff(obj_a, obj_b) < TOLERANCE, subplot + ' ' + obj_a.title